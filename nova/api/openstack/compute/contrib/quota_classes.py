@@ -120,6 +120,7 @@ class QuotaClassSetsController(wsgi.Controller):
                 db.quota_class_create(context, quota_class, key, value)
             except exception.AdminRequired:
                 raise webob.exc.HTTPForbidden()
+        QUOTAS.invalidate_cache()
 
         values = QUOTAS.get_class_quotas(context, quota_class)
         return self._format_quota_set(None, values)
@@ -20,10 +20,10 @@ import six.moves.urllib.parse as urlparse
 from webob import exc
 
 from nova.api.openstack import extensions
+from nova import db
 from nova import exception
 from nova.i18n import _
 from nova import objects
-from nova.objects import instance as instance_obj
 from nova.openstack.common import timeutils
 
 ALIAS = "os-simple-tenant-usage"
@@ -32,6 +32,9 @@ authorize_show = extensions.extension_authorizer('compute',
 authorize_list = extensions.extension_authorizer('compute',
                                                  'v3:%s:list' % ALIAS)
 
+# The number of instances loaded at a time for the detailed usage.
+USAGE_PAGE_SIZE = 1000
+
 
 def parse_strtime(dstr, fmt):
     try:
@@ -102,16 +105,62 @@ class SimpleTenantUsageController(object):
 
         return flavor_ref
 
+    def _new_summary(self, tenant_id, period_start, period_stop, detailed):
+        summary = {}
+        summary['tenant_id'] = tenant_id
+        if detailed:
+            summary['server_usages'] = []
+        summary['total_local_gb_usage'] = 0
+        summary['total_vcpus_usage'] = 0
+        summary['total_memory_mb_usage'] = 0
+        summary['total_hours'] = 0
+        summary['start'] = timeutils.normalize_time(period_start)
+        summary['stop'] = timeutils.normalize_time(period_stop)
+        return summary
+
+    def _instances_for_period(self, context, period_start, period_stop,
+                              tenant_id=None):
+        """Yield the instances active during the period, loading
+        USAGE_PAGE_SIZE of them at a time.
+        """
+        marker_id = None
+        while True:
+            instances = objects.InstanceList.get_active_by_window_joined(
+                context, period_start, period_stop, tenant_id,
+                expected_attrs=['system_metadata'], limit=USAGE_PAGE_SIZE,
+                marker_id=marker_id)
+            for instance in instances:
+                yield instance
+            if len(instances) < USAGE_PAGE_SIZE:
+                return
+            marker_id = instances[-1].id
+
+    def _tenant_usage_totals_for_period(self, context, period_start,
+                                        period_stop, tenant_id=None):
+        """Return the summaries of the tenants, summed by the database."""
+        rval = []
+        for totals in db.instance_get_usage_totals_by_window(
+                context, period_start, period_stop, project_id=tenant_id):
+            summary = self._new_summary(totals['project_id'], period_start,
+                                        period_stop, False)
+            summary['total_local_gb_usage'] = totals['local_gb_hours']
+            summary['total_vcpus_usage'] = totals['vcpus_hours']
+            summary['total_memory_mb_usage'] = totals['memory_mb_hours']
+            summary['total_hours'] = totals['hours']
+            rval.append(summary)
+        return rval
+
     def _tenant_usages_for_period(self, context, period_start,
                                   period_stop, tenant_id=None, detailed=True):
+        if not detailed:
+            return self._tenant_usage_totals_for_period(
+                context, period_start, period_stop, tenant_id=tenant_id)
 
-        instances = objects.InstanceList.get_active_by_window_joined(
-                        context, period_start, period_stop, tenant_id,
-                        expected_attrs=instance_obj.INSTANCE_DEFAULT_FIELDS)
         rval = {}
         flavors = {}
 
-        for instance in instances:
+        for instance in self._instances_for_period(context, period_start,
+                                                   period_stop, tenant_id):
             info = {}
             info['hours'] = self._hours_for(instance,
                                             period_start,
@@ -155,17 +204,8 @@ class SimpleTenantUsageController(object):
             info['uptime'] = delta.days * 24 * 3600 + delta.seconds
 
             if info['tenant_id'] not in rval:
-                summary = {}
-                summary['tenant_id'] = info['tenant_id']
-                if detailed:
-                    summary['server_usages'] = []
-                summary['total_local_gb_usage'] = 0
-                summary['total_vcpus_usage'] = 0
-                summary['total_memory_mb_usage'] = 0
-                summary['total_hours'] = 0
-                summary['start'] = timeutils.normalize_time(period_start)
-                summary['stop'] = timeutils.normalize_time(period_stop)
-                rval[info['tenant_id']] = summary
+                rval[info['tenant_id']] = self._new_summary(
+                    info['tenant_id'], period_start, period_stop, True)
 
             summary = rval[info['tenant_id']]
             summary['total_local_gb_usage'] += info['local_gb'] * info['hours']
@@ -174,8 +214,7 @@ class SimpleTenantUsageController(object):
                                                  info['hours'])
 
             summary['total_hours'] += info['hours']
-            if detailed:
-                summary['server_usages'].append(info)
+            summary['server_usages'].append(info)
 
         return rval.values()
 
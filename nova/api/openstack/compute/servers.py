@@ -596,12 +596,18 @@ class Controller(wsgi.Controller):
                 search_opts['user_id'] = context.user_id
 
         limit, marker = common.get_limit_and_marker(req)
+        if is_detail:
+            expected_attrs = self._view_builder.detail_expected_attrs
+        else:
+            expected_attrs = self._view_builder.index_expected_attrs
         try:
             instance_list = self.compute_api.get_all(context,
                                                      search_opts=search_opts,
                                                      limit=limit,
                                                      marker=marker,
-                                                     want_objects=True)
+                                                     want_objects=True,
+                                                     expected_attrs=(
+                                                         expected_attrs))
         except exception.MarkerNotFound:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
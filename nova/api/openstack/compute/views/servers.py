@@ -14,6 +14,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
 import hashlib
 
 from nova.api.openstack import common
@@ -48,6 +49,14 @@ class ViewBuilder(common.ViewBuilder):
         "ERROR", "DELETED"
     )
 
+    # The optional instance attributes the index and detail views need,
+    # loaded with the instance list so that they are not lazy-loaded one
+    # instance at a time.  security_groups is read by the security groups
+    # extension of the detail view.
+    index_expected_attrs = []
+    detail_expected_attrs = ['metadata', 'system_metadata', 'info_cache',
+                             'security_groups']
+
     def __init__(self):
         """Initialize view builder."""
         super(ViewBuilder, self).__init__()
@@ -78,7 +87,7 @@ class ViewBuilder(common.ViewBuilder):
             },
         }
 
-    def show(self, request, instance):
+    def show(self, request, instance, flavor_cache=None):
         """Detailed view of a single instance."""
         ip_v4 = instance.get('access_ip_v4')
         ip_v6 = instance.get('access_ip_v6')
@@ -92,7 +101,7 @@ class ViewBuilder(common.ViewBuilder):
                 "metadata": self._get_metadata(instance),
                 "hostId": self._get_host_id(instance) or "",
                 "image": self._get_image(request, instance),
-                "flavor": self._get_flavor(request, instance),
+                "flavor": self._get_flavor(request, instance, flavor_cache),
                 "created": timeutils.isotime(instance["created_at"]),
                 "updated": timeutils.isotime(instance["updated_at"]),
                 "addresses": self._get_addresses(request, instance),
@@ -121,7 +130,10 @@ class ViewBuilder(common.ViewBuilder):
     def detail(self, request, instances):
         """Detailed view of a list of instance."""
         coll_name = self._collection_name + '/detail'
-        return self._list_view(self.show, request, instances, coll_name)
+        # NOTE: the servers of a list share a few flavors, so the flavor of
+        # each one is only extracted from system_metadata once.
+        show = functools.partial(self.show, flavor_cache={})
+        return self._list_view(show, request, instances, coll_name)
 
     def _list_view(self, func, request, servers, coll_name):
         """Provide a view for a list of servers.
@@ -191,13 +203,28 @@ class ViewBuilder(common.ViewBuilder):
         else:
             return ""
 
-    def _get_flavor(self, request, instance):
+    def _get_flavor_id(self, instance, flavor_cache=None):
+        """Return the flavorid of an instance, or None if its flavor is
+        missing from system_metadata.
+
+        flavor_cache maps instance_type_id to flavorid for the instances
+        of a list.
+        """
+        type_id = instance.get('instance_type_id')
+        if flavor_cache is not None and type_id in flavor_cache:
+            return flavor_cache[type_id]
         instance_type = flavors.extract_flavor(instance)
-        if not instance_type:
+        flavor_id = instance_type["flavorid"] if instance_type else None
+        if flavor_cache is not None and type_id is not None:
+            flavor_cache[type_id] = flavor_id
+        return flavor_id
+
+    def _get_flavor(self, request, instance, flavor_cache=None):
+        flavor_id = self._get_flavor_id(instance, flavor_cache)
+        if flavor_id is None:
             LOG.warn(_LW("Instance has had its instance_type removed "
                          "from the DB"), instance=instance)
             return {}
-        flavor_id = instance_type["flavorid"]
         flavor_bookmark = self._flavor_builder._get_bookmark_link(request,
                                                                   flavor_id,
                                                                   "flavors")
@@ -245,7 +272,10 @@ class ViewBuilderV3(ViewBuilder):
         # use glance endpoint. We revert back it to use nova endpoint for v2.1.
         self._image_builder = views_images.ViewBuilder()
 
-    def show(self, request, instance):
+    detail_expected_attrs = (ViewBuilder.detail_expected_attrs +
+                             ['pci_devices'])
+
+    def show(self, request, instance, flavor_cache=None):
         """Detailed view of a single instance."""
         server = {
             "server": {
@@ -260,7 +290,7 @@ class ViewBuilderV3(ViewBuilder):
                 # isn't existed in V3 API, we revert it back to return "" in
                 # V2.1.
                 "image": self._get_image(request, instance),
-                "flavor": self._get_flavor(request, instance),
+                "flavor": self._get_flavor(request, instance, flavor_cache),
                 "created": timeutils.isotime(instance["created_at"]),
                 "updated": timeutils.isotime(instance["updated_at"]),
                 "addresses": self._get_addresses(request, instance),
@@ -73,7 +73,7 @@ class CellsManager(manager.Manager):
     Scheduling requests get passed to the scheduler class.
     """
 
-    target = oslo_messaging.Target(version='1.29')
+    target = oslo_messaging.Target(version='1.30')
 
     def __init__(self, *args, **kwargs):
         LOG.warn(_('The cells feature of Nova is considered experimental '
@@ -113,6 +113,12 @@ class CellsManager(manager.Manager):
         else:
             self._update_our_parents(ctxt)
 
+    def cleanup_host(self):
+        """Send the updates held for the top level cell before the service
+        stops.
+        """
+        self.msg_runner.flush_updates_at_top()
+
     @periodic_task.periodic_task
     def _update_our_parents(self, ctxt):
         """Update our parent cells with our capabilities and capacity
@@ -247,17 +253,59 @@ class CellsManager(manager.Manager):
         self.msg_runner.sync_instances(ctxt, project_id, updated_since,
                                        deleted)
 
-    def service_get_all(self, ctxt, filters):
-        """Return services in this cell and in all child cells."""
-        responses = self.msg_runner.service_get_all(ctxt, filters)
+    def _answered_responses(self, method_name, responses, timed_out):
+        """Yield the broadcast responses of the cells that answered in
+        time.  Cells that timed out are left out, so the caller returns
+        what the other cells sent.  Their names are added to the timed_out
+        list, and logged along with the call whose results they are
+        missing from.
+        """
+        for response in responses:
+            if response.failure:
+                exc = response.value
+                if isinstance(exc, (tuple, list)):
+                    exc = exc[1]
+                if isinstance(exc, exception.CellTimeout):
+                    timed_out.append(response.cell_name)
+                    continue
+            yield response
+        if timed_out:
+            LOG.warn(_('%(method)s is missing the results of cells which '
+                       'did not answer in time: %(cells)s'),
+                     {'method': method_name,
+                      'cells': ', '.join(sorted(timed_out))})
+
+    @staticmethod
+    def _partial_result(result, timed_out, with_timed_out_cells):
+        """Return the result of a call to all cells, along with the names
+        of the cells which timed out if with_timed_out_cells is True.
+        """
+        if not with_timed_out_cells:
+            return result
+        return {'result': result, 'timed_out_cells': sorted(timed_out)}
+
+    def service_get_all(self, ctxt, filters, timeout=None,
+                        with_timed_out_cells=False):
+        """Return services in this cell and in all child cells.
+
+        Cells which do not answer within 'timeout' seconds (call_timeout
+        by default) are left out.  If with_timed_out_cells is True, a dict
+        of the services as 'result' and of the names of those cells as
+        'timed_out_cells' is returned.
+        """
+        responses = self.msg_runner.service_get_all(ctxt, filters,
+                                                    timeout=timeout)
         ret_services = []
+        timed_out = []
         # 1 response per cell.  Each response is a list of services.
-        for response in responses:
+        for response in self._answered_responses('service_get_all',
+                                                  responses, timed_out):
             services = response.value_or_raise()
             for service in services:
                 cells_utils.add_cell_to_service(service, response.cell_name)
                 ret_services.append(service)
-        return ret_services
+        return self._partial_result(ret_services, timed_out,
+                                    with_timed_out_cells)
 
     def service_get_by_compute_host(self, ctxt, host_name):
         """Return a service entry for a compute host in a certain cell."""
@@ -356,31 +404,42 @@ class CellsManager(manager.Manager):
         cells_utils.add_cell_to_compute_node(node, cell_name)
         return node
 
-    def compute_node_get_all(self, ctxt, hypervisor_match=None):
-        """Return list of compute nodes in all cells."""
+    def compute_node_get_all(self, ctxt, hypervisor_match=None,
+                             timeout=None, with_timed_out_cells=False):
+        """Return list of compute nodes in all cells.  See
+        service_get_all() for 'timeout' and 'with_timed_out_cells'.
+        """
         responses = self.msg_runner.compute_node_get_all(ctxt,
-                hypervisor_match=hypervisor_match)
+                hypervisor_match=hypervisor_match, timeout=timeout)
         # 1 response per cell.  Each response is a list of compute_node
         # entries.
         ret_nodes = []
-        for response in responses:
+        timed_out = []
+        for response in self._answered_responses('compute_node_get_all',
+                                                  responses, timed_out):
             nodes = response.value_or_raise()
             for node in nodes:
                 cells_utils.add_cell_to_compute_node(node,
                                                      response.cell_name)
                 ret_nodes.append(node)
-        return ret_nodes
+        return self._partial_result(ret_nodes, timed_out,
+                                    with_timed_out_cells)
 
-    def compute_node_stats(self, ctxt):
-        """Return compute node stats totals from all cells."""
-        responses = self.msg_runner.compute_node_stats(ctxt)
+    def compute_node_stats(self, ctxt, timeout=None,
+                           with_timed_out_cells=False):
+        """Return compute node stats totals from all cells.  See
+        service_get_all() for 'timeout' and 'with_timed_out_cells'.
+        """
+        responses = self.msg_runner.compute_node_stats(ctxt, timeout=timeout)
         totals = {}
-        for response in responses:
+        timed_out = []
+        for response in self._answered_responses('compute_node_stats',
+                                                  responses, timed_out):
             data = response.value_or_raise()
             for key, val in data.iteritems():
                 totals.setdefault(key, 0)
                 totals[key] += val
-        return totals
+        return self._partial_result(totals, timed_out, with_timed_out_cells)
 
     def actions_get(self, ctxt, cell_name, instance_uuid):
         response = self.msg_runner.actions_get(ctxt, cell_name, instance_uuid)
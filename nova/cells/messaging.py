@@ -26,9 +26,16 @@ reached.
 
 The interface into this module is the MessageRunner class.
 """
+import base64
+import collections
+import copy
+import itertools
 import sys
+import time
 import traceback
+import zlib
 
+from eventlet import greenthread
 from eventlet import queue
 from oslo.config import cfg
 from oslo import messaging
@@ -64,11 +71,38 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.FloatOpt('update_batch_window',
+            default=0.0,
+            help='Seconds the instance, instance fault and bandwidth '
+                 'updates for the top cell are held so they are sent up '
+                 'as one compressed message.  Updates of the same instance '
+                 'within the window are coalesced and only the newest is '
+                 'sent.  0 sends every update as its own message.'),
+    cfg.IntOpt('update_batch_size',
+            default=200,
+            help='Number of held updates for the top cell after which they '
+                 'are sent without waiting for the end of the '
+                 'update_batch_window.'),
+    cfg.FloatOpt('broadcast_hop_margin',
+            default=1.0,
+            help='Seconds taken off the time left to answer a broadcast '
+                 'call each time it is forwarded to another cell, so that '
+                 'a cell gives up on the cells below it early enough for '
+                 'its own answer to reach the caller in time.'),
+    cfg.BoolOpt('capacity_deltas',
+            default=True,
+            help='Send parent cells only the changes of our capacities, '
+                 'with all of them every capacity_full_sync_interval '
+                 'seconds.  Parent cells running a release which does not '
+                 'accept the changes only get updated then, so disable '
+                 'this until all parent cells are upgraded.')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
 CONF.import_opt('call_timeout', 'nova.cells.opts', group='cells')
+CONF.import_opt('capacity_full_sync_interval', 'nova.cells.state',
+                group='cells')
 CONF.register_opts(cell_messaging_opts, group='cells')
 
 LOG = logging.getLogger(__name__)
@@ -77,6 +111,24 @@ LOG = logging.getLogger(__name__)
 # path.
 _PATH_CELL_SEP = cells_utils.PATH_CELL_SEP
 
+# Updates for the top cell that MessageRunner may hold and send up together
+# in an 'updates_at_top' message.
+_BATCHED_UPDATE_METHODS = ('instance_update_at_top',
+                           'instance_fault_create_at_top',
+                           'bw_usage_update_at_top')
+
+
+def _pack_updates(updates):
+    """Compress a list of JSON-ified updates into a string that can be
+    passed in method_kwargs.
+    """
+    return base64.b64encode(zlib.compress(jsonutils.dumps(updates)))
+
+
+def _unpack_updates(packed_updates):
+    """Reverse _pack_updates()."""
+    return jsonutils.loads(zlib.decompress(base64.b64decode(packed_updates)))
+
 
 def _reverse_path(path):
     """Reverse a path.  Used for sending responses upstream."""
@@ -229,7 +281,8 @@ class _BaseMessage(object):
         wait_time = CONF.cells.call_timeout
         try:
             for x in xrange(num_responses):
-                json_responses = self.resp_queue.get(timeout=wait_time)
+                _sender, json_responses = self.resp_queue.get(
+                        timeout=wait_time)
                 responses.extend(json_responses)
         except queue.Empty:
             raise exception.CellTimeout()
@@ -299,9 +352,13 @@ class _BaseMessage(object):
             _dict[key] = getattr(self, key)
         return _dict
 
-    def to_json(self):
-        """Convert a message into JSON for sending to a sibling cell."""
+    def to_json(self, exclude=None):
+        """Convert a message into JSON for sending to a sibling cell.
+        The attributes named in 'exclude' are left out.
+        """
         _dict = self._to_dict()
+        for key in exclude or []:
+            _dict.pop(key, None)
         # Convert context to dict.
         _dict['ctxt'] = _dict['ctxt'].to_dict()
         # NOTE(comstud): 'method_kwargs' needs special serialization
@@ -448,17 +505,38 @@ class _TargetedMessage(_BaseMessage):
 class _BroadcastMessage(_BaseMessage):
     """A broadcast message.  This means to call a method in every single
     cell going in a certain direction.
+
+    A broadcast that needs a response has a deadline by which the
+    responses must be back at the source.  It is passed from cell to cell
+    as the 'timeout' left, less broadcast_hop_margin at every hop, so
+    clock differences between the cells don't matter.
     """
     message_type = 'broadcast'
 
     def __init__(self, msg_runner, ctxt, method_name, method_kwargs,
-            direction, run_locally=True, **kwargs):
+            direction, run_locally=True, timeout=None, **kwargs):
         super(_BroadcastMessage, self).__init__(msg_runner, ctxt,
                 method_name, method_kwargs, direction, **kwargs)
         # The local cell creating this message has the option
         # to be able to process the message locally or not.
         self.run_locally = run_locally
         self.is_broadcast = True
+        self.deadline = None
+        if self.need_response:
+            if timeout is None:
+                timeout = CONF.cells.call_timeout
+            self.deadline = time.time() + timeout
+            # NOTE: only sent to cells accepting intercell version 1.1.
+            #       See InterCellRPCAPI.send_message_to_cell().
+            self.base_attrs_to_json.append('timeout')
+
+    @property
+    def timeout(self):
+        """Seconds the next cell has to send back its responses."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time() -
+                   CONF.cells.broadcast_hop_margin, 0)
 
     def _get_next_hops(self):
         """Set the next hops and return the number of hops.  The next
@@ -485,28 +563,47 @@ class _BroadcastMessage(_BaseMessage):
         return super(_BroadcastMessage, self)._send_json_responses(
                 json_responses, neighbor_only=True, fanout=True)
 
-    def process(self):
-        """Process a broadcast message.  This is called for all cells
-        that touch this message.
-
-        The message is sent to all cells in the certain direction and
-        the creator of this message has the option of whether or not
-        to process it locally as well.
-
-        If responses from all cells are required, each hop creates an
-        eventlet queue and waits for responses from its immediate
-        neighbor cells.  All responses are then aggregated into a
-        single list and are returned to the neighbor cell until the
-        source is reached.
-
-        When the source is reached, a list of Response instances are
-        returned to the caller.
+    def _iter_json_responses(self, next_hops):
+        """Yield the JSON-ified responses of the next hops as they are
+        put into the eventlet queue, until every next hop has answered
+        or the deadline has passed.  A CellTimeout failure is yielded
+        for each next hop that did not answer in time.
 
-        All exceptions for processing the message across the whole
-        routing path are caught and encoded within the Response and
-        returned to the caller.  It is possible to get a mix of
-        successful responses and failure responses.  The caller is
-        responsible for dealing with this.
+        Destroy the eventlet queue when done.
+        """
+        pending = set(cell.name for cell in next_hops)
+        try:
+            while pending:
+                wait_time = max(self.deadline - time.time(), 0)
+                try:
+                    sender, json_responses = self.resp_queue.get(
+                            timeout=wait_time)
+                except queue.Empty:
+                    break
+                pending.discard(sender)
+                for json_response in json_responses:
+                    yield json_response
+        finally:
+            self._cleanup_response_queue()
+        if not pending:
+            return
+        LOG.warn(_("Timed out waiting for responses to %(method)s from "
+                   "cells: %(cells)s"),
+                 {'method': self.method_name,
+                  'cells': ', '.join(sorted(pending))})
+        for cell_name in sorted(pending):
+            try:
+                raise exception.CellTimeout()
+            except exception.CellTimeout:
+                exc_info = sys.exc_info()
+            response = Response(self.routing_path + _PATH_CELL_SEP +
+                                cell_name, exc_info, True)
+            yield response.to_json()
+
+    def _iter_process(self):
+        """Do the work of process().  If a response is needed, yield the
+        JSON-ified responses of ourself and of the cells in the broadcast
+        direction as they become available.
         """
         try:
             next_hops = self._get_next_hops()
@@ -514,7 +611,8 @@ class _BroadcastMessage(_BaseMessage):
             exc_info = sys.exc_info()
             LOG.exception(_("Error locating next hops for message: %(exc)s"),
                           {'exc': exc})
-            return self._send_response_from_exception(exc_info)
+            yield Response(self.routing_path, exc_info, True).to_json()
+            return
 
         # Short circuit if we don't need to respond
         if not self.need_response:
@@ -535,7 +633,8 @@ class _BroadcastMessage(_BaseMessage):
             LOG.exception(_("Error sending message to next hops: %(exc)s"),
                           {'exc': exc})
             self._cleanup_response_queue()
-            return self._send_response_from_exception(exc_info)
+            yield Response(self.routing_path, exc_info, True).to_json()
+            return
 
         if self.run_locally:
             # Run locally and store the Response.
@@ -543,21 +642,52 @@ class _BroadcastMessage(_BaseMessage):
         else:
             local_response = None
 
-        try:
-            remote_responses = self._wait_for_json_responses(
-                    num_responses=len(next_hops))
-        except Exception as exc:
-            # Error waiting for responses, most likely a timeout.
-            # Send a single response back with the failure.
-            exc_info = sys.exc_info()
-            err_str = _("Error waiting for responses from neighbor cells: "
-                        "%(exc)s")
-            LOG.exception(err_str, {'exc': exc})
-            return self._send_response_from_exception(exc_info)
-
+        for json_response in self._iter_json_responses(next_hops):
+            yield json_response
         if local_response:
-            remote_responses.append(local_response.to_json())
-        return self._send_json_responses(remote_responses)
+            yield local_response.to_json()
+
+    def iter_responses(self):
+        """Process a broadcast message that this cell created and yield
+        a Response instance for each cell as soon as it is received.
+        Cells that did not answer before the deadline get a CellTimeout
+        failure, so the caller can use the responses it did get.
+        """
+        for json_response in self._iter_process():
+            yield Response.from_json(json_response)
+
+    def process(self):
+        """Process a broadcast message.  This is called for all cells
+        that touch this message.
+
+        The message is sent to all cells in the certain direction and
+        the creator of this message has the option of whether or not
+        to process it locally as well.
+
+        If responses from all cells are required, each hop creates an
+        eventlet queue and waits for responses from its immediate
+        neighbor cells until the deadline.  All responses are then
+        aggregated into a single list and are returned to the neighbor
+        cell until the source is reached.  Neighbor cells that did not
+        answer in time are returned as CellTimeout failures.
+
+        When the source is reached, a list of Response instances are
+        returned to the caller.  See iter_responses() to get them as
+        they arrive instead.
+
+        All exceptions for processing the message across the whole
+        routing path are caught and encoded within the Response and
+        returned to the caller.  It is possible to get a mix of
+        successful responses and failure responses.  The caller is
+        responsible for dealing with this.
+        """
+        if not self.need_response:
+            for _json_response in self._iter_process():
+                pass
+            return
+        if self.source_is_us():
+            return list(self.iter_responses())
+        return self._send_json_responses(list(self._iter_process()))
 
 
 class _ResponseMessage(_TargetedMessage):
@@ -641,8 +771,11 @@ class _ResponseMessageMethods(_BaseMessageMethods):
     eventlet queue to signal the caller that's waiting.
     """
     def parse_responses(self, message, orig_message, responses):
+        # The hop before us is the neighbor cell the responses came from.
+        path_parts = message.routing_path.split(_PATH_CELL_SEP)
+        sender = len(path_parts) > 1 and path_parts[-2] or None
         self.msg_runner._put_response(message.response_uuid,
-                responses)
+                responses, sender=sender)
 
 
 class _TargetedMessageMethods(_BaseMessageMethods):
@@ -717,6 +850,23 @@ class _TargetedMessageMethods(_BaseMessageMethods):
         # Go ahead and update our parents now that a child updated us
         self.msg_runner.tell_parents_our_capacities(message.ctxt)
 
+    def update_capacities_delta(self, message, cell_name, delta,
+                                base_digest):
+        """A child cell told us how their capacity changed."""
+        LOG.debug("Received capacities delta from child cell "
+                  "%(cell_name)s: %(delta)s",
+                  {'cell_name': cell_name, 'delta': delta})
+        if not self.state_manager.update_cell_capacities_delta(
+                cell_name, delta, base_digest):
+            # We missed an update, or restarted since the last one.
+            LOG.debug("Capacities of child cell %(cell_name)s are out of "
+                      "date, asking for all of them",
+                      {'cell_name': cell_name})
+            self.msg_runner.ask_child_for_capacities(message.ctxt,
+                                                     cell_name)
+            return
+        self.msg_runner.tell_parents_our_capacities(message.ctxt)
+
     def announce_capabilities(self, message):
         """A parent cell has told us to send our capabilities, so let's
         do so.
@@ -727,7 +877,7 @@ class _TargetedMessageMethods(_BaseMessageMethods):
         """A parent cell has told us to send our capacity, so let's
         do so.
         """
-        self.msg_runner.tell_parents_our_capacities(message.ctxt)
+        self.msg_runner.tell_parents_our_capacities(message.ctxt, full=True)
 
     def service_get_by_compute_host(self, message, host_name):
         """Return the service entry for a compute host."""
@@ -1120,6 +1270,34 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             return
         self.db.bw_usage_update(message.ctxt, **bw_update_info)
 
+    def updates_at_top(self, message, updates, **kwargs):
+        """Apply a batch of updates held and sent up together by a child
+        cell if we're a top level cell.  Each update is applied with the
+        context it was made with; one that fails doesn't stop the others.
+        """
+        if not self._at_the_top():
+            return
+        for update in _unpack_updates(updates):
+            method_name = update['method_name']
+            if method_name not in _BATCHED_UPDATE_METHODS:
+                LOG.error(_("Unexpected method %(method_name)s in a batch "
+                            "of updates"), {'method_name': method_name})
+                continue
+            ctxt = context.RequestContext.from_dict(update['ctxt'])
+            update_message = copy.copy(message)
+            update_message.ctxt = ctxt
+            update_message.method_name = method_name
+            update_message.method_kwargs = dict(
+                    (k, self.msg_runner.serializer.deserialize_entity(ctxt, v))
+                    for k, v in update['method_kwargs'].iteritems())
+            try:
+                getattr(self, method_name)(update_message,
+                                           **update_message.method_kwargs)
+            except Exception as exc:
+                LOG.exception(_("Error applying %(method_name)s from a batch "
+                                "of updates: %(exc)s"),
+                              {'method_name': method_name, 'exc': exc})
+
     def _sync_instance(self, ctxt, instance):
         if instance['deleted']:
             self.msg_runner.instance_destroy_at_top(ctxt, instance)
@@ -1280,6 +1458,15 @@ class MessageRunner(object):
         for msg_type, cls in _CELL_MESSAGE_TYPE_TO_METHODS_CLS.iteritems():
             self.methods_by_type[msg_type] = cls(self)
         self.serializer = objects_base.NovaObjectSerializer()
+        # Updates for the top cell held until the next batch is sent,
+        # keyed so that updates of the same thing are coalesced.
+        self.held_updates = collections.OrderedDict()
+        self._held_update_seq = itertools.count()
+        self._held_updates_timer = None
+        # The capacities our parent cells were last told about, and when
+        # all of them were last sent.
+        self.parent_capacities = None
+        self.parent_capacities_sent_at = None
 
     def _process_message_locally(self, message):
         """Message processing will call this when its determined that
@@ -1292,17 +1479,18 @@ class MessageRunner(object):
         fn = getattr(methods, message.method_name)
         return fn(message, **message.method_kwargs)
 
-    def _put_response(self, response_uuid, response):
+    def _put_response(self, response_uuid, response, sender=None):
         """Put a response into a response queue.  This is called when
         a _ResponseMessage is processed in the cell that initiated a
-        'call' to another cell.
+        'call' to another cell.  'sender' is the name of the neighbor
+        cell the response came from.
         """
         resp_queue = self.response_queues.get(response_uuid)
         if not resp_queue:
             # Response queue is gone.  We must have restarted or we
             # received a response after our timeout period.
             return
-        resp_queue.put(response)
+        resp_queue.put((sender, response))
 
     def _setup_response_queue(self, message):
         """Set up an eventlet queue to use to wait for replies.
@@ -1386,6 +1574,15 @@ class MessageRunner(object):
                                         dict(), 'down', child_cell)
             message.process()
 
+    def ask_child_for_capacities(self, ctxt, cell_name):
+        """Tell a child cell to send us all of its capacities."""
+        child_cell = self.state_manager.get_child_cell(cell_name)
+        if not child_cell:
+            return
+        message = _TargetedMessage(self, ctxt, 'announce_capacities',
+                                   dict(), 'down', child_cell)
+        message.process()
+
     def tell_parents_our_capabilities(self, ctxt):
         """Send our capabilities to parent cells."""
         parent_cells = self.state_manager.get_parent_cells()
@@ -1409,22 +1606,52 @@ class MessageRunner(object):
                     method_kwargs, 'up', cell, fanout=True)
             message.process()
 
-    def tell_parents_our_capacities(self, ctxt):
-        """Send our capacities to parent cells."""
+    def tell_parents_our_capacities(self, ctxt, full=False):
+        """Send our capacities to parent cells.
+
+        Once they have been sent, only the values that changed since are
+        sent if capacity_deltas is set, unless full is True or they were
+        last all sent capacity_full_sync_interval seconds ago.  Nothing is
+        sent if none changed.
+        """
         parent_cells = self.state_manager.get_parent_cells()
         if not parent_cells:
             return
         my_cell_info = self.state_manager.get_my_state()
         capacities = self.state_manager.get_our_capacities()
         parent_cell_names = ','.join(x.name for x in parent_cells)
-        LOG.debug("Updating parents [%(parent_cell_names)s] with "
-                                   "our capacities: %(capacities)s",
-                  {'parent_cell_names': parent_cell_names,
-                   'capacities': capacities})
-        method_kwargs = {'cell_name': my_cell_info.name,
-                         'capacities': capacities}
+        delta = None
+        if (not full and CONF.cells.capacity_deltas and
+                self.parent_capacities_sent_at is not None and
+                not timeutils.is_older_than(
+                    self.parent_capacities_sent_at,
+                    CONF.cells.capacity_full_sync_interval)):
+            delta = cells_state.capacities_delta(self.parent_capacities,
+                                                 capacities)
+        if delta is None:
+            LOG.debug("Updating parents [%(parent_cell_names)s] with "
+                                       "our capacities: %(capacities)s",
+                      {'parent_cell_names': parent_cell_names,
+                       'capacities': capacities})
+            method_name = 'update_capacities'
+            method_kwargs = {'cell_name': my_cell_info.name,
+                             'capacities': capacities}
+            self.parent_capacities_sent_at = timeutils.utcnow()
+        elif delta:
+            LOG.debug("Updating parents [%(parent_cell_names)s] with "
+                      "the changes of our capacities: %(delta)s",
+                      {'parent_cell_names': parent_cell_names,
+                       'delta': delta})
+            method_name = 'update_capacities_delta'
+            method_kwargs = {'cell_name': my_cell_info.name,
+                             'delta': delta,
+                             'base_digest': cells_state.capacities_digest(
+                                 self.parent_capacities)}
+        else:
+            return
+        self.parent_capacities = copy.deepcopy(capacities)
         for cell in parent_cells:
-            message = _TargetedMessage(self, ctxt, 'update_capacities',
+            message = _TargetedMessage(self, ctxt, method_name,
                     method_kwargs, 'up', cell, fanout=True)
             message.process()
 
@@ -1444,15 +1671,93 @@ class MessageRunner(object):
                                    cell_name, need_response=call)
         return message.process()
 
+    def _update_at_top(self, ctxt, method_name, method_kwargs,
+                       coalesce_key=None):
+        """Send an update to the top level cell.
+
+        When update_batch_window is set, the update is held instead and
+        sent up with the others held in the window in one compressed
+        'updates_at_top' message.  A held update with the same coalesce_key
+        is merged with this one, the values of this one winning.
+        """
+        if CONF.cells.update_batch_window <= 0:
+            message = _BroadcastMessage(self, ctxt, method_name,
+                                        method_kwargs, 'up',
+                                        run_locally=False)
+            message.process()
+            return
+
+        if coalesce_key is None:
+            coalesce_key = next(self._held_update_seq)
+        held = self.held_updates.get(coalesce_key)
+        if held is not None:
+            held_kwargs = held[2]
+            for k, v in method_kwargs.iteritems():
+                held_kwargs[k].update(v)
+            self.held_updates[coalesce_key] = (ctxt, method_name,
+                                               held_kwargs)
+        else:
+            # Copy the dicts, the caller may go on to change them.
+            method_kwargs = dict((k, dict(v))
+                                 for k, v in method_kwargs.iteritems())
+            self.held_updates[coalesce_key] = (ctxt, method_name,
+                                               method_kwargs)
+
+        if len(self.held_updates) >= CONF.cells.update_batch_size:
+            self.flush_updates_at_top()
+        elif self._held_updates_timer is None:
+            self._held_updates_timer = greenthread.spawn_after(
+                    CONF.cells.update_batch_window,
+                    self._flush_updates_at_top_from_timer)
+
+    def _flush_updates_at_top_from_timer(self):
+        self._held_updates_timer = None
+        try:
+            self.flush_updates_at_top()
+        except Exception as exc:
+            LOG.exception(_("Error sending held updates to the top level "
+                            "cell: %(exc)s"), {'exc': exc})
+
+    def flush_updates_at_top(self):
+        """Send the updates held for the top level cell, if any."""
+        timer = self._held_updates_timer
+        self._held_updates_timer = None
+        if timer is not None:
+            timer.cancel()
+        if not self.held_updates:
+            return
+        held_updates = self.held_updates.values()
+        self.held_updates = collections.OrderedDict()
+
+        if len(held_updates) == 1:
+            ctxt, method_name, method_kwargs = held_updates[0]
+        else:
+            updates = []
+            for update_ctxt, update_method_name, update_kwargs in (
+                    held_updates):
+                update_kwargs = dict(
+                        (k, self.serializer.serialize_entity(update_ctxt, v))
+                        for k, v in update_kwargs.iteritems())
+                updates.append({'method_name': update_method_name,
+                                'ctxt': update_ctxt.to_dict(),
+                                'method_kwargs': update_kwargs})
+            ctxt = context.get_admin_context()
+            method_name = 'updates_at_top'
+            method_kwargs = dict(updates=_pack_updates(updates))
+        message = _BroadcastMessage(self, ctxt, method_name, method_kwargs,
+                                    'up', run_locally=False)
+        message.process()
+
     def instance_update_at_top(self, ctxt, instance):
         """Update an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
-                                    dict(instance=instance), 'up',
-                                    run_locally=False)
-        message.process()
+        self._update_at_top(ctxt, 'instance_update_at_top',
+                            dict(instance=instance),
+                            coalesce_key=('instance', instance['uuid']))
 
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
+        # Updates held for the instance must not reach the top after this.
+        self.flush_updates_at_top()
         message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
                                     dict(instance=instance), 'up',
                                     run_locally=False)
@@ -1472,18 +1777,17 @@ class MessageRunner(object):
 
     def instance_fault_create_at_top(self, ctxt, instance_fault):
         """Create an instance fault at the top level cell."""
-        message = _BroadcastMessage(self, ctxt,
-                                    'instance_fault_create_at_top',
-                                    dict(instance_fault=instance_fault),
-                                    'up', run_locally=False)
-        message.process()
+        self._update_at_top(ctxt, 'instance_fault_create_at_top',
+                            dict(instance_fault=instance_fault))
 
     def bw_usage_update_at_top(self, ctxt, bw_update_info):
         """Update bandwidth usage at top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'bw_usage_update_at_top',
-                                    dict(bw_update_info=bw_update_info),
-                                    'up', run_locally=False)
-        message.process()
+        self._update_at_top(ctxt, 'bw_usage_update_at_top',
+                            dict(bw_update_info=bw_update_info),
+                            coalesce_key=('bw_usage',
+                                          bw_update_info['uuid'],
+                                          bw_update_info['mac'],
+                                          bw_update_info['start_period']))
 
     def sync_instances(self, ctxt, project_id, updated_since, deleted):
         """Force a sync of all instances, potentially by project_id,
@@ -1497,12 +1801,18 @@ class MessageRunner(object):
                                     run_locally=False)
         message.process()
 
-    def service_get_all(self, ctxt, filters=None):
+    def service_get_all(self, ctxt, filters=None, timeout=None):
+        """Return an iterator over the Responses of all cells, with
+        their list of services, as they arrive.  Cells that did not
+        answer within 'timeout' seconds (call_timeout by default) get a
+        CellTimeout failure.
+        """
         method_kwargs = dict(filters=filters)
         message = _BroadcastMessage(self, ctxt, 'service_get_all',
                                     method_kwargs, 'down',
-                                    run_locally=True, need_response=True)
-        return message.process()
+                                    run_locally=True, need_response=True,
+                                    timeout=timeout)
+        return message.iter_responses()
 
     def service_get_by_compute_host(self, ctxt, cell_name, host_name):
         method_kwargs = dict(host_name=host_name)
@@ -1587,21 +1897,28 @@ class MessageRunner(object):
                                     run_locally=True, need_response=True)
         return message.process()
 
-    def compute_node_get_all(self, ctxt, hypervisor_match=None):
-        """Return list of compute nodes in all child cells."""
+    def compute_node_get_all(self, ctxt, hypervisor_match=None,
+                             timeout=None):
+        """Return list of compute nodes in all child cells.  The
+        Responses are returned as they arrive, see service_get_all().
+        """
         method_kwargs = dict(hypervisor_match=hypervisor_match)
         message = _BroadcastMessage(self, ctxt, 'compute_node_get_all',
                                     method_kwargs, 'down',
-                                    run_locally=True, need_response=True)
-        return message.process()
+                                    run_locally=True, need_response=True,
+                                    timeout=timeout)
+        return message.iter_responses()
 
-    def compute_node_stats(self, ctxt):
-        """Return compute node stats from all child cells."""
+    def compute_node_stats(self, ctxt, timeout=None):
+        """Return compute node stats from all child cells.  The
+        Responses are returned as they arrive, see service_get_all().
+        """
         method_kwargs = dict()
         message = _BroadcastMessage(self, ctxt, 'compute_node_stats',
                                     method_kwargs, 'down',
-                                    run_locally=True, need_response=True)
-        return message.process()
+                                    run_locally=True, need_response=True,
+                                    timeout=timeout)
+        return message.iter_responses()
 
     def compute_node_get(self, ctxt, cell_name, compute_id):
         """Return compute node entry from a specific cell by ID."""
@@ -103,6 +103,8 @@ class InterCellRPCAPI(object):
         ... Grizzly supports message version 1.0.  So, any changes to existing
         methods in 2.x after that point should be done such that they can
         handle the version_cap being set to 1.0.
+
+        1.1 - Broadcast calls carry the 'timeout' left to answer them.
     """
 
     VERSION_ALIASES = {
@@ -150,10 +152,17 @@ class InterCellRPCAPI(object):
         topic_base = CONF.cells.rpc_driver_queue_base
         topic = '%s.%s' % (topic_base, message.message_type)
         cctxt = self._get_client(cell_state, topic)
+        if cctxt.can_send_version('1.1'):
+            cctxt = cctxt.prepare(version='1.1')
+            json_message = message.to_json()
+        else:
+            # NOTE: cells before 1.1 do not accept the deadline of
+            #       broadcast calls, they wait up to call_timeout instead.
+            json_message = message.to_json(exclude=['timeout'])
         if message.fanout:
             cctxt = cctxt.prepare(fanout=message.fanout)
         return cctxt.cast(message.ctxt, 'process_message',
-                          message=message.to_json())
+                          message=json_message)
 
 
 class InterCellRPCDispatcher(object):
@@ -165,7 +174,7 @@ class InterCellRPCDispatcher(object):
     logic is defined by the message class in the nova.cells.messaging module.
     """
 
-    target = messaging.Target(version='1.0')
+    target = messaging.Target(version='1.1')
 
     def __init__(self, msg_runner):
         """Init the Intercell RPC Dispatcher."""
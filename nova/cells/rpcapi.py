@@ -101,6 +101,9 @@ class CellsAPI(object):
         ... Juno supports message version 1.29.  So, any changes to
         existing methods in 1.x after that point should be done such that they
         can handle the version_cap being set to 1.29.
+
+        * 1.30 - Adds timeout and with_timed_out_cells to service_get_all(),
+                 compute_node_get_all() and compute_node_stats()
     '''
 
     VERSION_ALIASES = {
@@ -236,10 +239,37 @@ class CellsAPI(object):
                           updated_since=updated_since,
                           deleted=deleted)
 
-    def service_get_all(self, ctxt, filters=None):
-        """Ask all cells for their list of services."""
-        cctxt = self.client.prepare(version='1.2')
-        return cctxt.call(ctxt, 'service_get_all', filters=filters)
+    def _call_all_cells(self, ctxt, method, version, timeout,
+                        with_timed_out_cells, **kwargs):
+        """Call a method of the cells manager which gathers results from
+        all cells.
+
+        Cells which do not answer within 'timeout' seconds (call_timeout by
+        default) are left out of the result.  If with_timed_out_cells is
+        True, a tuple of the result and of the names of those cells is
+        returned; the list is empty if the cells service is too old to
+        report them.
+        """
+        if self.client.can_send_version('1.30'):
+            cctxt = self.client.prepare(version='1.30')
+            ret = cctxt.call(ctxt, method, timeout=timeout,
+                             with_timed_out_cells=True, **kwargs)
+            result, timed_out_cells = ret['result'], ret['timed_out_cells']
+        else:
+            cctxt = self.client.prepare(version=version)
+            result = cctxt.call(ctxt, method, **kwargs)
+            timed_out_cells = []
+        if with_timed_out_cells:
+            return result, timed_out_cells
+        return result
+
+    def service_get_all(self, ctxt, filters=None, timeout=None,
+                        with_timed_out_cells=False):
+        """Ask all cells for their list of services.  See
+        _call_all_cells() for 'timeout' and 'with_timed_out_cells'.
+        """
+        return self._call_all_cells(ctxt, 'service_get_all', '1.2', timeout,
+                                    with_timed_out_cells, filters=filters)
 
     def service_get_by_compute_host(self, ctxt, host_name):
         """Get the service entry for a host in a particular cell.  The
@@ -304,18 +334,23 @@ class CellsAPI(object):
         cctxt = self.client.prepare(version='1.4')
         return cctxt.call(ctxt, 'compute_node_get', compute_id=compute_id)
 
-    def compute_node_get_all(self, ctxt, hypervisor_match=None):
+    def compute_node_get_all(self, ctxt, hypervisor_match=None,
+                             timeout=None, with_timed_out_cells=False):
         """Return list of compute nodes in all cells, optionally
-        filtering by hypervisor host.
+        filtering by hypervisor host.  See _call_all_cells() for 'timeout'
+        and 'with_timed_out_cells'.
         """
-        cctxt = self.client.prepare(version='1.4')
-        return cctxt.call(ctxt, 'compute_node_get_all',
-                          hypervisor_match=hypervisor_match)
-
-    def compute_node_stats(self, ctxt):
-        """Return compute node stats from all cells."""
-        cctxt = self.client.prepare(version='1.4')
-        return cctxt.call(ctxt, 'compute_node_stats')
+        return self._call_all_cells(ctxt, 'compute_node_get_all', '1.4',
+                                    timeout, with_timed_out_cells,
+                                    hypervisor_match=hypervisor_match)
+
+    def compute_node_stats(self, ctxt, timeout=None,
+                           with_timed_out_cells=False):
+        """Return compute node stats from all cells.  See
+        _call_all_cells() for 'timeout' and 'with_timed_out_cells'.
+        """
+        return self._call_all_cells(ctxt, 'compute_node_stats', '1.4',
+                                    timeout, with_timed_out_cells)
 
     def actions_get(self, ctxt, instance):
         if not instance['cell_name']:
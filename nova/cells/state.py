@@ -19,6 +19,7 @@ CellState Manager
 import copy
 import datetime
 import functools
+import hashlib
 import time
 
 from oslo.config import cfg
@@ -46,6 +47,18 @@ cell_state_manager_opts = [
                help='Configuration file from which to read cells '
                'configuration.  If given, overrides reading cells '
                'from the database.'),
+    cfg.IntOpt('capacity_full_sync_interval',
+               default=600,
+               help='Interval, in seconds, between full computations of '
+               'the capacity of this cell.  In between, only the compute '
+               'nodes updated since the previous computation are read.'),
+    cfg.IntOpt('capacity_sync_overlap',
+               default=30,
+               help='Number of seconds each read of the compute nodes '
+               'updated since the previous capacity computation reaches '
+               'back before it, so that nodes updated in transactions '
+               'which committed late, or stamped by a clock behind this '
+               'cell\'s, are not missed.'),
 ]
 
 
@@ -141,6 +154,38 @@ def sync_after(f):
     return wrapper
 
 
+def capacities_digest(capacities):
+    """Return a digest of capacities, to check that capacities two cells
+    hold are the same.
+    """
+    return hashlib.md5(jsonutils.dumps(capacities, sort_keys=True)).hexdigest()
+
+
+def capacities_delta(old_capacities, new_capacities):
+    """Return the values to add to old_capacities to get new_capacities,
+    leaving out the ones that didn't change, or None if they don't have the
+    same keys.
+    """
+    if not isinstance(old_capacities, dict):
+        return None
+    if set(old_capacities) != set(new_capacities):
+        return None
+    delta = {}
+    for key, value in new_capacities.iteritems():
+        old_value = old_capacities[key]
+        if isinstance(value, dict):
+            value_delta = capacities_delta(old_value, value)
+            if value_delta is None:
+                return None
+            if value_delta:
+                delta[key] = value_delta
+        elif isinstance(old_value, dict):
+            return None
+        elif value != old_value:
+            delta[key] = value - old_value
+    return delta
+
+
 _unset = object()
 
 
@@ -166,6 +211,13 @@ class CellStateManager(base.Base):
         self.parent_cells = {}
         self.child_cells = {}
         self.last_cell_db_check = datetime.datetime.min
+        # The capacity each compute node adds to our cell, by compute node
+        # id, and its sum.
+        self.compute_capacities = {}
+        self.capacity_totals = {}
+        self.capacity_slots = None
+        self.last_capacity_sync = None
+        self.last_full_capacity_sync = None
 
         attempts = 0
         while True:
@@ -251,6 +303,13 @@ class CellStateManager(base.Base):
 
         Units are in MB, so 122880 = (10 + 100) * 1024.
 
+        The capacity each compute node adds is kept, and only the compute
+        nodes updated since the previous update are read.  The capacity of
+        a compute node is only computed again when its free or total RAM
+        or disk, or whether its service is disabled, changed.  Everything
+        is computed again every capacity_full_sync_interval seconds and
+        when the instance types or the reserve change.
+
         NOTE(comstud): Perhaps we should only report a single number
         available per instance_type.
         """
@@ -258,32 +317,132 @@ class CellStateManager(base.Base):
         if not ctxt:
             ctxt = context.get_admin_context()
 
-        reserve_level = CONF.cells.reserve_percent / 100.0
-        compute_hosts = {}
-
-        def _get_compute_hosts():
+        now = timeutils.utcnow()
+        full_sync = (self.last_full_capacity_sync is None or
+                     timeutils.is_older_than(
+                         self.last_full_capacity_sync,
+                         CONF.cells.capacity_full_sync_interval))
+        capacity_slots = None
+        if not full_sync:
+            capacity_slots = self._capacity_slots(ctxt)
+            full_sync = capacity_slots != self.capacity_slots
+        if full_sync:
             compute_nodes = self.db.compute_node_get_all(ctxt)
-            for compute in compute_nodes:
+            self.compute_capacities = {}
+            self.capacity_totals = {}
+            self.last_capacity_sync = now
+            self.last_full_capacity_sync = now
+            if not compute_nodes:
+                self.capacity_slots = None
+                self.my_cell_state.update_capacities({})
+                return
+            if capacity_slots is None:
+                capacity_slots = self._capacity_slots(ctxt)
+            self.capacity_slots = capacity_slots
+            memory_mb_slots, disk_mb_slots, reserve_level = capacity_slots
+            self.capacity_totals = {
+                'ram_free': {'total_mb': 0,
+                             'units_by_mb': dict((str(slot), 0)
+                                 for slot in memory_mb_slots)},
+                'disk_free': {'total_mb': 0,
+                              'units_by_mb': dict((str(slot), 0)
+                                  for slot in disk_mb_slots)}}
+        else:
+            memory_mb_slots, disk_mb_slots, reserve_level = capacity_slots
+            # NOTE: updated_at is set before the update is committed, and by
+            #       the clock of the updating service, so the nodes updated
+            #       shortly before the previous read are read again.  Those
+            #       whose values did not change are skipped below.
+            since = self.last_capacity_sync - datetime.timedelta(
+                    seconds=CONF.cells.capacity_sync_overlap)
+            compute_nodes = self.db.compute_node_get_all(
+                    ctxt, updated_since=since)
+            self.last_capacity_sync = now
+
+        services = None
+        if not full_sync:
+            # Services are disabled and enabled without their compute
+            # nodes being updated, and the delta query does not join them.
+            services = dict((service['id'], service)
+                            for service in self.db.service_get_all(ctxt)
+                            if service['binary'] == 'nova-compute')
+
+        # The values each compute node's capacity is computed from, by
+        # compute node id.
+        compute_values = {}
+        for compute in compute_nodes:
+            if compute.get('deleted'):
+                compute_values[compute['id']] = None
+                continue
+            if services is None:
                 service = compute['service']
-                if not service or service['disabled']:
+            else:
+                service = services.get(compute['service_id'])
+            compute_values[compute['id']] = {
+                    'service_id': compute['service_id'],
+                    'enabled': bool(service and not service['disabled']),
+                    'free_ram_mb': compute['free_ram_mb'],
+                    'free_disk_mb': compute['free_disk_gb'] * units.Ki,
+                    'total_ram_mb': compute['memory_mb'],
+                    'total_disk_mb': compute['local_gb'] * units.Ki}
+        if not full_sync:
+            for compute_id, compute_capacity in (
+                    self.compute_capacities.iteritems()):
+                if compute_id in compute_values:
+                    continue
+                values = compute_capacity['values']
+                service = services.get(values['service_id'])
+                enabled = bool(service and not service['disabled'])
+                if enabled != values['enabled']:
+                    compute_values[compute_id] = dict(values,
+                                                      enabled=enabled)
+
+        for compute_id, values in compute_values.iteritems():
+            compute_capacity = self.compute_capacities.get(compute_id)
+            if compute_capacity is not None:
+                if compute_capacity['values'] == values:
                     continue
-                host = service['host']
-                compute_hosts[host] = {
-                        'free_ram_mb': compute['free_ram_mb'],
-                        'free_disk_mb': compute['free_disk_gb'] * 1024,
-                        'total_ram_mb': compute['memory_mb'],
-                        'total_disk_mb': compute['local_gb'] * 1024}
-
-        _get_compute_hosts()
-        if not compute_hosts:
+                if compute_capacity['capacity']:
+                    self._subtract_from_dict(self.capacity_totals,
+                                             compute_capacity['capacity'])
+            if values is None:
+                self.compute_capacities.pop(compute_id, None)
+                continue
+            capacity = None
+            if values['enabled']:
+                capacity = self._compute_node_capacity(values,
+                                                       memory_mb_slots,
+                                                       disk_mb_slots,
+                                                       reserve_level)
+                self._add_to_dict(self.capacity_totals, capacity)
+            self.compute_capacities[compute_id] = {'values': values,
+                                                   'capacity': capacity}
+
+        if not any(compute_capacity['capacity']
+                   for compute_capacity in self.compute_capacities.values()):
             self.my_cell_state.update_capacities({})
             return
+        self.my_cell_state.update_capacities(
+                copy.deepcopy(self.capacity_totals))
 
-        ram_mb_free_units = {}
-        disk_mb_free_units = {}
-        total_ram_mb_free = 0
-        total_disk_mb_free = 0
+    def _capacity_slots(self, ctxt):
+        """Return the distinct memory and disk requirements of the instance
+        types, in MB, and the part of each compute node held in reserve.
+        """
+        instance_types = self.db.flavor_get_all(ctxt)
+        memory_mb_slots = frozenset(
+                [inst_type['memory_mb'] for inst_type in instance_types])
+        disk_mb_slots = frozenset(
+                [(inst_type['root_gb'] + inst_type['ephemeral_gb']) * units.Ki
+                    for inst_type in instance_types])
+        return (memory_mb_slots, disk_mb_slots,
+                CONF.cells.reserve_percent / 100.0)
 
+    def _compute_node_capacity(self, values, memory_mb_slots, disk_mb_slots,
+                               reserve_level):
+        """Return the capacity one compute node adds to the cell, in the
+        format of the capacities described in _update_our_capacity().
+        """
         def _free_units(total, free, per_inst):
             if per_inst:
                 min_free = total * reserve_level
@@ -292,32 +451,20 @@ class CellStateManager(base.Base):
             else:
                 return 0
 
-        instance_types = self.db.flavor_get_all(ctxt)
-        memory_mb_slots = frozenset(
-                [inst_type['memory_mb'] for inst_type in instance_types])
-        disk_mb_slots = frozenset(
-                [(inst_type['root_gb'] + inst_type['ephemeral_gb']) * units.Ki
-                    for inst_type in instance_types])
-
-        for compute_values in compute_hosts.values():
-            total_ram_mb_free += compute_values['free_ram_mb']
-            total_disk_mb_free += compute_values['free_disk_mb']
-            for memory_mb_slot in memory_mb_slots:
-                ram_mb_free_units.setdefault(str(memory_mb_slot), 0)
-                free_units = _free_units(compute_values['total_ram_mb'],
-                        compute_values['free_ram_mb'], memory_mb_slot)
-                ram_mb_free_units[str(memory_mb_slot)] += free_units
-            for disk_mb_slot in disk_mb_slots:
-                disk_mb_free_units.setdefault(str(disk_mb_slot), 0)
-                free_units = _free_units(compute_values['total_disk_mb'],
-                        compute_values['free_disk_mb'], disk_mb_slot)
-                disk_mb_free_units[str(disk_mb_slot)] += free_units
-
-        capacities = {'ram_free': {'total_mb': total_ram_mb_free,
-                                   'units_by_mb': ram_mb_free_units},
-                      'disk_free': {'total_mb': total_disk_mb_free,
-                                    'units_by_mb': disk_mb_free_units}}
-        self.my_cell_state.update_capacities(capacities)
+        ram_mb_free_units = {}
+        for memory_mb_slot in memory_mb_slots:
+            ram_mb_free_units[str(memory_mb_slot)] = _free_units(
+                    values['total_ram_mb'], values['free_ram_mb'],
+                    memory_mb_slot)
+        disk_mb_free_units = {}
+        for disk_mb_slot in disk_mb_slots:
+            disk_mb_free_units[str(disk_mb_slot)] = _free_units(
+                    values['total_disk_mb'], values['free_disk_mb'],
+                    disk_mb_slot)
+        return {'ram_free': {'total_mb': values['free_ram_mb'],
+                             'units_by_mb': ram_mb_free_units},
+                'disk_free': {'total_mb': values['free_disk_mb'],
+                              'units_by_mb': disk_mb_free_units}}
 
     @sync_before
     def get_cell_info_for_neighbors(self):
@@ -378,6 +525,26 @@ class CellStateManager(base.Base):
             return
         cell.update_capacities(capacities)
 
+    @sync_before
+    def update_cell_capacities_delta(self, cell_name, delta, base_digest):
+        """Add a delta made by capacities_delta() to the capacities of a
+        cell.  Return False, leaving the capacities as they are, if they are
+        not the ones the delta was made against.
+        """
+        cell = (self.child_cells.get(cell_name) or
+                self.parent_cells.get(cell_name))
+        if not cell:
+            LOG.error(_("Unknown cell '%(cell_name)s' when trying to "
+                        "update capacities"),
+                      {'cell_name': cell_name})
+            return True
+        if capacities_digest(cell.capacities) != base_digest:
+            return False
+        capacities = copy.deepcopy(cell.capacities)
+        self._add_to_dict(capacities, delta)
+        cell.update_capacities(capacities)
+        return True
+
     @sync_before
     def get_our_capabilities(self, include_children=True):
         capabs = copy.deepcopy(self.my_cell_state.capabilities)
@@ -401,6 +568,13 @@ class CellStateManager(base.Base):
             target.setdefault(key, 0)
             target[key] += value
 
+    def _subtract_from_dict(self, target, src):
+        for key, value in src.items():
+            if isinstance(value, dict):
+                self._subtract_from_dict(target[key], value)
+                continue
+            target[key] -= value
+
     @sync_before
     def get_our_capacities(self, include_children=True):
         capacities = copy.deepcopy(self.my_cell_state.capacities)
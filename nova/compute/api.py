@@ -1914,6 +1914,10 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        The optional instance attributes in 'expected_attrs' are loaded
+        with the instances; metadata, system_metadata, info_cache and
+        security_groups are loaded when it is None.
         """
 
         # TODO(bcwaldon): determine the best argument for target here
@@ -1981,6 +1985,11 @@ class API(base.Base):
                     except ValueError:
                         return []
 
+        if (expected_attrs is not None and
+                ('ip6' in filters or 'ip' in filters)):
+            # The addresses are matched against the info caches
+            expected_attrs = list(set(expected_attrs) | set(['info_cache']))
+
         inst_models = self._get_instances_by_filters(context, filters,
                 sort_key, sort_dir, limit=limit, marker=marker,
                 expected_attrs=expected_attrs)
@@ -2021,10 +2030,11 @@ class API(base.Base):
                                   sort_key, sort_dir,
                                   limit=None,
                                   marker=None, expected_attrs=None):
-        fields = ['metadata', 'system_metadata', 'info_cache',
-                  'security_groups']
-        if expected_attrs:
-            fields.extend(expected_attrs)
+        if expected_attrs is None:
+            fields = ['metadata', 'system_metadata', 'info_cache',
+                      'security_groups']
+        else:
+            fields = list(expected_attrs)
         return objects.InstanceList.get_by_filters(
             context, filters=filters, sort_key=sort_key, sort_dir=sort_dir,
             limit=limit, marker=marker, expected_attrs=fields)
@@ -146,6 +146,13 @@ interval_opts = [
                default=60,
                help="Number of seconds between instance info_cache self "
                     "healing updates"),
+    cfg.IntOpt("heal_instance_info_cache_batch_size",
+               default=1,
+               help="Number of instances whose info_cache is healed on each "
+                    "update. Above 1, the instances are fetched with one "
+                    "database query, their network info with as few "
+                    "network API queries as the network API allows, and "
+                    "their info caches are saved at once."),
     cfg.IntOpt('reclaim_instance_interval',
                default=0,
                help='Interval in seconds for reclaiming deleted instances'),
@@ -247,6 +254,25 @@ CONF.import_opt('destroy_after_evacuate', 'nova.utils', group='workarounds')
 LOG = logging.getLogger(__name__)
 
 get_notifier = functools.partial(rpc.get_notifier, service='compute')
+
+# NOTE: the vm_states for which _sync_instance_power_state() ignores the
+#       power state, and the power states it neither acts on nor warns about
+#       for the other vm_states. See _power_state_in_sync().
+_IGNORED_SYNC_VM_STATES = (vm_states.BUILDING,
+                           vm_states.RESCUED,
+                           vm_states.RESIZED,
+                           vm_states.SUSPENDED,
+                           vm_states.ERROR)
+_SYNCED_POWER_STATES = {
+    vm_states.ACTIVE: (power_state.RUNNING,),
+    vm_states.STOPPED: (power_state.NOSTATE,
+                        power_state.SHUTDOWN,
+                        power_state.CRASHED),
+    vm_states.PAUSED: (power_state.PAUSED,),
+    vm_states.SOFT_DELETED: (power_state.NOSTATE, power_state.SHUTDOWN),
+    vm_states.DELETED: (power_state.NOSTATE, power_state.SHUTDOWN),
+}
+
 wrap_exception = functools.partial(exception.wrap_exception,
                                    get_notifier=get_notifier)
 
@@ -5381,6 +5407,8 @@ class ComputeManager(manager.Manager):
         heal_interval = CONF.heal_instance_info_cache_interval
         if not heal_interval:
             return
+        if CONF.heal_instance_info_cache_batch_size > 1:
+            return self._heal_instance_info_cache_batch(context)
 
         instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
         instance = None
@@ -5390,8 +5418,9 @@ class ComputeManager(manager.Manager):
         if not instance_uuids:
             # The list of instances to heal is empty so rebuild it
             LOG.debug('Rebuilding the list of instances to heal')
-            db_instances = objects.InstanceList.get_by_host(
-                context, self.host, expected_attrs=[], use_slave=True)
+            db_instances = objects.InstanceList.get_projection_by_host(
+                context, self.host, ['vm_state', 'task_state'],
+                use_slave=True)
             for inst in db_instances:
                 # We don't want to refresh the cache for instances
                 # which are building or deleting so don't put them
@@ -5405,16 +5434,11 @@ class ComputeManager(manager.Manager):
                     LOG.debug('Skipping network cache update for instance '
                               'because it is being deleted.', instance=inst)
                     continue
-
-                if not instance:
-                    # Save the first one we find so we don't
-                    # have to get it again
-                    instance = inst
-                else:
-                    instance_uuids.append(inst['uuid'])
+                instance_uuids.append(inst.uuid)
 
             self._instance_uuids_to_heal = instance_uuids
-        else:
+
+        if instance_uuids:
             # Find the next valid instance on the list
             while instance_uuids:
                 try:
@@ -5459,6 +5483,58 @@ class ComputeManager(manager.Manager):
             LOG.debug("Didn't find any instances for network info cache "
                       "update.")
 
+    def _heal_instance_info_cache_batch(self, context):
+        """Update the info_cache of the next
+        heal_instance_info_cache_batch_size instances of the host at once.
+        """
+        instance_uuids = getattr(self, '_instance_uuids_to_heal', [])
+        if not instance_uuids:
+            LOG.debug('Rebuilding the list of instances to heal')
+            db_instances = objects.InstanceList.get_projection_by_host(
+                context, self.host, [], use_slave=True)
+            instance_uuids = [inst.uuid for inst in db_instances]
+            self._instance_uuids_to_heal = instance_uuids
+
+        batch_size = CONF.heal_instance_info_cache_batch_size
+        batch = instance_uuids[:batch_size]
+        del instance_uuids[:batch_size]
+        if not batch:
+            LOG.debug("Didn't find any instances for network info cache "
+                      "update.")
+            return
+
+        instances = []
+        for inst in objects.InstanceList.get_by_filters(
+                context, {'uuid': batch, 'deleted': False},
+                expected_attrs=['system_metadata', 'info_cache'],
+                use_slave=True):
+            # NOTE: building instances get their info_cache set when their
+            # network is allocated, and are healed in a later round.
+            if inst.host != self.host:
+                LOG.debug('Skipping network cache update for instance '
+                          'because it has been migrated to another '
+                          'host.', instance=inst)
+            elif inst.vm_state == vm_states.BUILDING:
+                LOG.debug('Skipping network cache update for instance '
+                          'because it is Building.', instance=inst)
+            elif inst.task_state == task_states.DELETING:
+                LOG.debug('Skipping network cache update for instance '
+                          'because it is being deleted.', instance=inst)
+            else:
+                instances.append(inst)
+        if not instances:
+            return
+
+        try:
+            nw_infos = self.network_api.get_instance_nw_info_bulk(context,
+                                                                  instances)
+            LOG.debug('Updated the network info_cache of %(updated)d of '
+                      '%(count)d instances',
+                      {'updated': len(nw_infos), 'count': len(instances)})
+        except Exception:
+            LOG.error(_('An error occurred while refreshing the network '
+                        'cache.'), exc_info=True)
+
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
         if CONF.reboot_timeout > 0:
@@ -5807,10 +5883,31 @@ class ComputeManager(manager.Manager):
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
+
+        If the driver can report the power states of all its instances at
+        once, instances whose database and hypervisor states already agree
+        are skipped without taking their lock or querying them again, and
+        only the states of the instances are read from the database.  The
+        instances to sync are read in full by the sync itself.
         """
-        db_instances = objects.InstanceList.get_by_host(context,
-                                                             self.host,
-                                                             use_slave=True)
+        try:
+            vm_infos = self.driver.get_info_all()
+        except NotImplementedError:
+            vm_infos = None
+        except Exception:
+            # NOTE: sync every instance on its own instead, so that an
+            #       error about one of them does not stop the others.
+            LOG.exception(_LE("Failed to get the power state of all "
+                              "instances at once, syncing them one by one"))
+            vm_infos = None
+        if vm_infos is None:
+            db_instances = objects.InstanceList.get_by_host(context,
+                                                            self.host,
+                                                            use_slave=True)
+        else:
+            db_instances = objects.InstanceList.get_projection_by_host(
+                context, self.host,
+                ['vm_state', 'task_state', 'power_state'], use_slave=True)
 
         num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
@@ -5828,7 +5925,13 @@ class ComputeManager(manager.Manager):
             #                They are set (in stop_instance) and read, in sync.
             @utils.synchronized(db_instance.uuid)
             def query_driver_power_state_and_sync():
-                self._query_driver_power_state_and_sync(context, db_instance)
+                instance = db_instance
+                if isinstance(instance, instance_obj.InstanceRecord):
+                    try:
+                        instance = instance.load_instance(use_slave=True)
+                    except exception.InstanceNotFound:
+                        return
+                self._query_driver_power_state_and_sync(context, instance)
 
             try:
                 query_driver_power_state_and_sync()
@@ -5843,6 +5946,14 @@ class ComputeManager(manager.Manager):
             # process syncs asynchronously - don't want instance locking to
             # block entire periodic task thread
             uuid = db_instance.uuid
+            if vm_infos is not None:
+                vm_info = vm_infos.get(uuid)
+                if vm_info is None:
+                    vm_power_state = power_state.NOSTATE
+                else:
+                    vm_power_state = vm_info['state']
+                if self._power_state_in_sync(db_instance, vm_power_state):
+                    continue
             if uuid in self._syncs_in_progress:
                 LOG.debug('Sync already in progress for %s' % uuid)
             else:
@@ -5850,6 +5961,18 @@ class ComputeManager(manager.Manager):
                 self._syncs_in_progress[uuid] = True
                 self._sync_power_pool.spawn_n(_sync, db_instance)
 
+    def _power_state_in_sync(self, db_instance, vm_power_state):
+        """Return True if _sync_instance_power_state() would have nothing to
+        do or to report for an instance with this hypervisor power state.
+        """
+        if (db_instance.task_state is not None or
+                db_instance.power_state != vm_power_state):
+            return False
+        if db_instance.vm_state in _IGNORED_SYNC_VM_STATES:
+            return True
+        return vm_power_state in _SYNCED_POWER_STATES.get(
+            db_instance.vm_state, ())
+
     def _query_driver_power_state_and_sync(self, context, db_instance):
         if db_instance.task_state is not None:
             LOG.info(_LI("During sync_power_state the instance has a "
@@ -14,9 +14,12 @@
 
 """Handles database requests from other nova services."""
 
+import collections
 import copy
 import itertools
 
+import eventlet
+from oslo.config import cfg
 from oslo import messaging
 import six
 
@@ -50,6 +53,22 @@ from nova.scheduler import utils as scheduler_utils
 
 LOG = logging.getLogger(__name__)
 
+build_opts = [
+    cfg.IntOpt('build_batch_threshold',
+               default=10,
+               help='Multi-create requests of at least this many instances '
+                    'refresh the instances and load their block device '
+                    'mappings with one query each, and cast their builds '
+                    'to the compute hosts in parallel. 0 disables it'),
+    cfg.IntOpt('build_cast_concurrency',
+               default=10,
+               help='Number of build requests of a batched multi-create '
+                    'that are cast to the compute hosts at once'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(build_opts, group='conductor')
+
 # Instead of having a huge list of arguments to instance_update(), we just
 # accept a dict of fields to update and use this whitelist to validate it.
 allowed_updates = ['task_state', 'vm_state', 'expected_task_state',
@@ -620,6 +639,13 @@ class ComputeTaskManager(base.Base):
                         instance.uuid, request_spec)
             return
 
+        batch_threshold = CONF.conductor.build_batch_threshold
+        if batch_threshold and len(instances) >= batch_threshold:
+            self._build_instances_batch(context, instances, hosts, image,
+                    request_spec, filter_properties, admin_password,
+                    injected_files, requested_networks, security_groups)
+            return
+
         for (instance, host) in itertools.izip(instances, hosts):
             try:
                 instance.refresh()
@@ -646,6 +672,56 @@ class ComputeTaskManager(base.Base):
                     block_device_mapping=bdms, node=host['nodename'],
                     limits=host['limits'])
 
+    def _build_instances_batch(self, context, instances, hosts, image,
+            request_spec, filter_properties, admin_password, injected_files,
+            requested_networks, security_groups):
+        hosts_by_uuid = dict((instance.uuid, host) for (instance, host)
+                             in itertools.izip(instances, hosts))
+        instances = instances[:len(hosts_by_uuid)]
+        refreshed = objects.InstanceList.refresh_all(context, instances)
+        if len(refreshed) != len(instances):
+            refreshed_uuids = set(instance.uuid for instance in refreshed)
+            for instance in instances:
+                if instance.uuid not in refreshed_uuids:
+                    LOG.debug('Instance deleted during build',
+                              instance=instance)
+
+        bdms_by_uuid = collections.defaultdict(list)
+        for bdm in objects.BlockDeviceMappingList.get_by_instance_uuids(
+                context, [instance.uuid for instance in refreshed]):
+            bdms_by_uuid[bdm.instance_uuid].append(bdm)
+
+        def _build(instance, host):
+            # NOTE: only the retry hosts and the limits differ between the
+            # instances, the rest of the filter properties is shared.
+            local_filter_props = dict(filter_properties)
+            retry = filter_properties.get('retry')
+            if retry:
+                local_filter_props['retry'] = dict(retry,
+                                                   hosts=list(retry['hosts']))
+            scheduler_utils.populate_filter_properties(local_filter_props,
+                host)
+            bdms = objects.BlockDeviceMappingList(
+                context, objects=bdms_by_uuid[instance.uuid])
+            bdms.obj_reset_changes()
+
+            self.compute_rpcapi.build_and_run_instance(context,
+                    instance=instance, host=host['host'], image=image,
+                    request_spec=request_spec,
+                    filter_properties=local_filter_props,
+                    admin_password=admin_password,
+                    injected_files=injected_files,
+                    requested_networks=requested_networks,
+                    security_groups=security_groups,
+                    block_device_mapping=bdms, node=host['nodename'],
+                    limits=host['limits'])
+
+        pool = eventlet.GreenPool(CONF.conductor.build_cast_concurrency)
+        builds = [pool.spawn(_build, instance, hosts_by_uuid[instance.uuid])
+                  for instance in refreshed]
+        for build in builds:
+            build.wait()
+
     def _delete_image(self, context, image_id):
         return self.image_api.delete(context, image_id)
 
@@ -181,7 +181,7 @@ def compute_node_get_by_service_id(context, service_id):
     return IMPL.compute_node_get_by_service_id(context, service_id)
 
 
-def compute_node_get_all(context, no_date_fields=False):
+def compute_node_get_all(context, no_date_fields=False, updated_since=None):
     """Get all computeNodes.
 
     :param context: The security context
@@ -189,11 +189,19 @@ def compute_node_get_all(context, no_date_fields=False):
                            'deleted_at' and 'deleted' fields from the output,
                            thus significantly reducing its size.
                            Set to False by default
+    :param updated_since: If set, only returns the compute nodes created,
+                          updated or deleted after this time. Deleted
+                          compute nodes are included so that callers can
+                          drop them, and their services are not joined in,
+                          since callers keeping the other compute nodes
+                          have to read all compute services anyway. Set to
+                          None by default
 
     :returns: List of dictionaries each containing compute node properties,
-              including corresponding service
+              including corresponding service unless updated_since is set
     """
-    return IMPL.compute_node_get_all(context, no_date_fields)
+    return IMPL.compute_node_get_all(context, no_date_fields,
+                                     updated_since=updated_since)
 
 
 def compute_node_search_by_hypervisor(context, hypervisor_match):
@@ -664,15 +672,32 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
 
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
-                                         use_slave=False):
+                                         use_slave=False,
+                                         columns_to_join=None,
+                                         limit=None, marker_id=None):
     """Get instances and joins active during a certain time window.
 
     Specifying a project_id will filter for a certain project.
     Specifying a host will filter for instances on a given compute host.
+    Specifying a limit returns at most limit instances in the order of
+    their id, starting after the instance whose id is marker_id.
     """
     return IMPL.instance_get_active_by_window_joined(context, begin, end,
                                               project_id, host,
-                                              use_slave=use_slave)
+                                              use_slave=use_slave,
+                                              columns_to_join=columns_to_join,
+                                              limit=limit,
+                                              marker_id=marker_id)
+
+
+def instance_get_usage_totals_by_window(context, begin, end,
+                                        project_id=None, use_slave=False):
+    """Get the usage of the instances active during a time window, summed
+    by project.
+    """
+    return IMPL.instance_get_usage_totals_by_window(context, begin, end,
+                                                    project_id=project_id,
+                                                    use_slave=use_slave)
 
 
 def instance_get_all_by_host(context, host,
@@ -683,6 +708,12 @@ def instance_get_all_by_host(context, host,
                                          use_slave=use_slave)
 
 
+def instance_get_columns_by_host(context, host, columns, use_slave=False):
+    """Get only the given columns of the instances of a host."""
+    return IMPL.instance_get_columns_by_host(context, host, columns,
+                                             use_slave=use_slave)
+
+
 def instance_get_all_by_host_and_node(context, host, node):
     """Get all instances belonging to a node."""
     return IMPL.instance_get_all_by_host_and_node(context, host, node)
@@ -693,6 +724,11 @@ def instance_get_all_by_host_and_not_type(context, host, type_id=None):
     return IMPL.instance_get_all_by_host_and_not_type(context, host, type_id)
 
 
+def instance_type_ids_get_all_by_host(context):
+    """Get a dict of host -> set of instance type ids of its instances."""
+    return IMPL.instance_type_ids_get_all_by_host(context)
+
+
 def instance_get_floating_address(context, instance_id):
     """Get the first floating ip address of an instance."""
     return IMPL.instance_get_floating_address(context, instance_id)
@@ -872,6 +908,16 @@ def instance_info_cache_update(context, instance_uuid, values):
     return IMPL.instance_info_cache_update(context, instance_uuid, values)
 
 
+def instance_info_cache_update_many(context, network_info_by_uuid):
+    """Set the network_info of several instance info cache records at once.
+
+    :param network_info_by_uuid: = dict of serialized network info, keyed by
+                                   the uuid of the info cache's instance
+    :returns: the uuids with no info cache record, which are not updated
+    """
+    return IMPL.instance_info_cache_update_many(context, network_info_by_uuid)
+
+
 def instance_info_cache_delete(context, instance_uuid):
     """Deletes an existing instance_info_cache record
 
@@ -1142,6 +1188,30 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
                                      user_id=user_id)
 
 
+def quota_reserve_cas(context, resources, quotas, user_quotas, deltas,
+                      expire, until_refresh, max_age, project_id=None,
+                      user_id=None):
+    """Check quotas and create reservations with conditional updates of
+    the usages instead of locking them.
+
+    Returns None, without reserving anything, if a usage is missing or
+    needs to be refreshed; quota_reserve() must be used then.
+    """
+    return IMPL.quota_reserve_cas(context, resources, quotas, user_quotas,
+                                  deltas, expire, until_refresh, max_age,
+                                  project_id=project_id, user_id=user_id)
+
+
+def reservation_commit_cas(context, reservations):
+    """Commit quota reservations without locking the usages."""
+    return IMPL.reservation_commit_cas(context, reservations)
+
+
+def reservation_rollback_cas(context, reservations):
+    """Roll back quota reservations without locking the usages."""
+    return IMPL.reservation_rollback_cas(context, reservations)
+
+
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     """Destroy all quotas associated with a given project and user."""
     return IMPL.quota_destroy_all_by_project_and_user(context,
@@ -1214,6 +1284,13 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                                                          use_slave)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    """Get all block device mapping belonging to a list of instances."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(
+        context, instance_uuids, use_slave)
+
+
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
     """Get block device mapping for a given volume."""
@@ -32,8 +32,12 @@ from oslo.db.sqlalchemy import session as db_session
 from oslo.db.sqlalchemy import utils as sqlalchemyutils
 import six
 from sqlalchemy import and_
+from sqlalchemy import BigInteger
 from sqlalchemy import Boolean
+from sqlalchemy import DateTime
 from sqlalchemy.exc import NoSuchTableError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy import Float
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
 from sqlalchemy import or_
@@ -45,6 +49,7 @@ from sqlalchemy.schema import Table
 from sqlalchemy import sql
 from sqlalchemy.sql.expression import asc
 from sqlalchemy.sql.expression import desc
+from sqlalchemy.sql.expression import FunctionElement
 from sqlalchemy.sql import false
 from sqlalchemy.sql import func
 from sqlalchemy.sql import null
@@ -558,7 +563,7 @@ def compute_node_get_by_service_id(context, service_id):
 
 
 @require_admin_context
-def compute_node_get_all(context, no_date_fields):
+def compute_node_get_all(context, no_date_fields, updated_since=None):
 
     # NOTE(msdubov): Using lower-level 'select' queries and joining the tables
     #                manually here allows to gain 3x speed-up and to have 5x
@@ -577,11 +582,22 @@ def compute_node_get_all(context, no_date_fields):
         def filter_columns(table):
             return [c for c in table.c if c.name not in redundant_columns]
 
-        compute_node_query = sql.select(filter_columns(compute_node)).\
-                                where(compute_node.c.deleted == 0).\
+        compute_node_query = sql.select(filter_columns(compute_node))
+        if updated_since is None:
+            compute_node_query = compute_node_query.\
+                                    where(compute_node.c.deleted == 0)
+        else:
+            compute_node_query = compute_node_query.\
+                        where((compute_node.c.created_at > updated_since) |
+                              (compute_node.c.updated_at > updated_since) |
+                              (compute_node.c.deleted_at > updated_since))
+        compute_node_query = compute_node_query.\
                                 order_by(compute_node.c.service_id)
         compute_node_rows = conn.execute(compute_node_query).fetchall()
 
+        if updated_since is not None:
+            return [dict(proxy.items()) for proxy in compute_node_rows]
+
         service_query = sql.select(filter_columns(service)).\
                             where((service.c.deleted == 0) &
                                   (service.c.binary == 'nova-compute')).\
@@ -2133,14 +2149,26 @@ def process_sort_params(sort_keys, sort_dirs,
 @require_context
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None,
-                                         use_slave=False):
-    """Return instances and joins that were active during window."""
+                                         use_slave=False,
+                                         columns_to_join=None,
+                                         limit=None, marker_id=None):
+    """Return instances and joins that were active during window.
+
+    With a limit, at most limit instances are returned in the order of
+    their id, starting after the instance whose id is marker_id.
+    """
     session = get_session(use_slave=use_slave)
     query = session.query(models.Instance)
 
-    query = query.options(joinedload('info_cache')).\
-                  options(joinedload('security_groups')).\
-                  filter(or_(models.Instance.terminated_at == null(),
+    if columns_to_join is None:
+        columns_to_join = ['info_cache', 'security_groups']
+        manual_joins = ['metadata', 'system_metadata']
+    else:
+        manual_joins, columns_to_join = _manual_join_columns(columns_to_join)
+    for column in columns_to_join:
+        query = query.options(joinedload(column))
+
+    query = query.filter(or_(models.Instance.terminated_at == null(),
                              models.Instance.terminated_at > begin))
     if end:
         query = query.filter(models.Instance.launched_at < end)
@@ -2148,8 +2176,107 @@ def instance_get_active_by_window_joined(context, begin, end=None,
         query = query.filter_by(project_id=project_id)
     if host:
         query = query.filter_by(host=host)
+    if marker_id is not None:
+        query = query.filter(models.Instance.id > marker_id)
+    if limit is not None:
+        query = query.order_by(models.Instance.id).limit(limit)
+
+    return _instances_fill_metadata(context, query.all(), manual_joins)
+
+
+class _MicrosecondsBetween(FunctionElement):
+    """The number of microseconds from one DateTime to another."""
+    type = BigInteger()
+    name = 'microseconds_between'
+
+
+@compiles(_MicrosecondsBetween)
+def _visit_microseconds_between(element, compiler, **kw):
+    start, stop = [compiler.process(clause) for clause in element.clauses]
+    return 'TIMESTAMPDIFF(MICROSECOND, %s, %s)' % (start, stop)
+
+
+@compiles(_MicrosecondsBetween, 'postgresql')
+def _visit_microseconds_between_postgresql(element, compiler, **kw):
+    start, stop = [compiler.process(clause) for clause in element.clauses]
+    return ('CAST(ROUND(EXTRACT(EPOCH FROM (%s - %s)) * 1000000) AS BIGINT)'
+            % (stop, start))
+
+
+@compiles(_MicrosecondsBetween, 'sqlite')
+def _visit_microseconds_between_sqlite(element, compiler, **kw):
+    # NOTE: sqlite stores DateTime columns as 'YYYY-MM-DD HH:MM:SS.ffffff'
+    # strings; strftime('%s') drops the microseconds, which start at
+    # the 21st character.  Each use of a clause is compiled on its own so
+    # that its bind parameters are counted once per use.
+    start, stop = list(element.clauses)
+    return ("((CAST(strftime('%%s', %s) AS INTEGER) - "
+            "CAST(strftime('%%s', %s) AS INTEGER)) * 1000000 + "
+            "CAST(substr(%s, 21) AS INTEGER) - "
+            "CAST(substr(%s, 21) AS INTEGER))"
+            % (compiler.process(stop), compiler.process(start),
+               compiler.process(stop), compiler.process(start)))
+
+
+@require_context
+def instance_get_usage_totals_by_window(context, begin, end,
+                                        project_id=None, use_slave=False):
+    """Return the usage of the instances active during a window, summed
+    by project.
+
+    The hours of an instance run from the later of its launch and begin to
+    the earlier of its termination and end.  Returns a list of dicts with
+    the project_id and the sums of the hours, and of the hours times the
+    vcpus, memory_mb and local_gb of each instance.
+    """
+    begin = sql.literal(timeutils.normalize_time(begin), DateTime)
+    end = sql.literal(timeutils.normalize_time(end), DateTime)
+    instance = models.Instance
+    start = sql.case([(instance.launched_at > begin, instance.launched_at)],
+                     else_=begin)
+    stop = sql.case([(and_(instance.terminated_at != null(),
+                           instance.terminated_at < end),
+                      instance.terminated_at)],
+                    else_=end)
+    microseconds = _MicrosecondsBetween(start, stop)
+    # NOTE: the API has always counted the microseconds of the difference
+    # as tenths of a millisecond (in SimpleTenantUsageController._hours_for),
+    # and the totals must not change: the seconds are
+    # floor(us / 10**6) + (us mod 10**6) / 10**5 = (us + 9 * (us mod 10**6))
+    # / 10**6, with the mod floored as in Python.
+    remainder = (microseconds % 1000000 + 1000000) % 1000000
+    hours = (microseconds + 9 * remainder) / 3600000000.0
+
+    session = get_session(use_slave=use_slave)
+    query = session.query(instance.project_id,
+                          instance.vcpus,
+                          instance.memory_mb,
+                          (instance.root_gb +
+                           instance.ephemeral_gb).label('local_gb'),
+                          hours.label('hours')).\
+                    filter(or_(instance.terminated_at == null(),
+                               instance.terminated_at > begin)).\
+                    filter(instance.launched_at < end)
+    if project_id:
+        query = query.filter_by(project_id=project_id)
+    usage = query.subquery()
 
-    return _instances_fill_metadata(context, query.all())
+    def _sum(value):
+        return sql.type_coerce(func.sum(value), Float)
+
+    query = session.query(usage.c.project_id,
+                          _sum(usage.c.hours),
+                          _sum(usage.c.hours * usage.c.vcpus),
+                          _sum(usage.c.hours * usage.c.memory_mb),
+                          _sum(usage.c.hours * usage.c.local_gb)).\
+                    group_by(usage.c.project_id)
+
+    return [{'project_id': row[0],
+             'hours': row[1],
+             'vcpus_hours': row[2],
+             'memory_mb_hours': row[3],
+             'local_gb_hours': row[4]}
+            for row in query.all()]
 
 
 def _instance_get_all_query(context, project_only=False,
@@ -2177,6 +2304,18 @@ def instance_get_all_by_host(context, host,
                               use_slave=use_slave)
 
 
+@require_context
+def instance_get_columns_by_host(context, host, columns, use_slave=False):
+    """Return the given columns of the instances of a host, as dicts."""
+    query = model_query(context,
+                        *[getattr(models.Instance, column)
+                          for column in columns],
+                        base_model=models.Instance,
+                        use_slave=use_slave).\
+                filter_by(host=host)
+    return [dict(zip(columns, row)) for row in query.all()]
+
+
 def _instance_get_all_uuids_by_host(context, host, session=None):
     """Return a list of the instance uuids on a given host.
 
@@ -2206,6 +2345,22 @@ def instance_get_all_by_host_and_not_type(context, host, type_id=None):
                    filter(models.Instance.instance_type_id != type_id).all())
 
 
+@require_admin_context
+def instance_type_ids_get_all_by_host(context):
+    rows = model_query(context, models.Instance.host,
+                       models.Instance.instance_type_id,
+                       read_deleted="no", base_model=models.Instance).\
+                filter(models.Instance.host != null()).\
+                filter(models.Instance.instance_type_id != null()).\
+                distinct().\
+                all()
+
+    type_ids = collections.defaultdict(set)
+    for host, instance_type_id in rows:
+        type_ids[host].add(instance_type_id)
+    return dict(type_ids)
+
+
 # NOTE(jkoelker) This is only being left here for compat with floating
 #                ips. Currently the network_api doesn't return floaters
 #                in network_info. Once it starts return the model. This
@@ -2449,6 +2604,42 @@ def instance_info_cache_update(context, instance_uuid, values):
     return info_cache
 
 
+@require_context
+def instance_info_cache_update_many(context, network_info_by_uuid):
+    """Set the network_info of several instance info cache records at once.
+
+    All the records are updated by a single UPDATE statement.
+
+    :param network_info_by_uuid: = dict of serialized network info, keyed by
+                                   the uuid of the info cache's instance
+    :returns: the uuids with no info cache record, which are not updated
+    """
+    if not network_info_by_uuid:
+        return []
+    uuids = network_info_by_uuid.keys()
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.InstanceInfoCache.instance_uuid,
+                           base_model=models.InstanceInfoCache,
+                           session=session, read_deleted='no').\
+                       filter(models.InstanceInfoCache.instance_uuid.in_(
+                           uuids)).\
+                       all()
+        found = set(row[0] for row in rows)
+        if found:
+            network_info = sql.case(
+                [(models.InstanceInfoCache.instance_uuid == uuid,
+                  network_info_by_uuid[uuid]) for uuid in found])
+            model_query(context, models.InstanceInfoCache, session=session,
+                        read_deleted='no').\
+                    filter(models.InstanceInfoCache.instance_uuid.in_(
+                        found)).\
+                    update({'network_info': network_info,
+                            'updated_at': timeutils.utcnow()},
+                           synchronize_session=False)
+    return [uuid for uuid in uuids if uuid not in found]
+
+
 @require_context
 def instance_info_cache_delete(context, instance_uuid):
     """Deletes an existing instance_info_cache record
@@ -3145,13 +3336,14 @@ def _reservation_create(context, uuid, usage, project_id, user_id, resource,
 # on reservations.
 
 def _get_project_user_quota_usages(context, session, project_id,
-                                   user_id):
-    rows = model_query(context, models.QuotaUsage,
-                       read_deleted="no",
-                       session=session).\
-                   filter_by(project_id=project_id).\
-                   with_lockmode('update').\
-                   all()
+                                   user_id, lock=True):
+    query = model_query(context, models.QuotaUsage,
+                        read_deleted="no",
+                        session=session).\
+                    filter_by(project_id=project_id)
+    if lock:
+        query = query.with_lockmode('update')
+    rows = query.all()
     proj_result = dict()
     user_result = dict()
     # Get the total count of in_use,reserved
@@ -3342,36 +3534,146 @@ def quota_reserve(context, resources, project_quotas, user_quotas, deltas,
         LOG.warning(_("Change will make usage less than 0 for the following "
                       "resources: %s"), unders)
     if overs:
-        if project_quotas == user_quotas:
-            usages = project_usages
+        raise _over_quota(overs, project_quotas, user_quotas, deltas,
+                          project_usages, user_usages)
+
+    return reservations
+
+
+def _over_quota(overs, project_quotas, user_quotas, deltas, project_usages,
+                user_usages):
+    """Return the OverQuota exception to raise for a failed reservation."""
+    if project_quotas == user_quotas:
+        usages = project_usages
+    else:
+        usages = user_usages
+    usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
+                  for k, v in usages.items())
+    headroom = dict((res, user_quotas[res] -
+                         (usages[res]['in_use'] + usages[res]['reserved']))
+                    for res in user_quotas.keys())
+
+    # If quota_cores is unlimited [-1]:
+    # - set cores headroom based on instances headroom:
+    if user_quotas.get('cores') == -1:
+        if deltas['cores']:
+            hc = headroom['instances'] * deltas['cores']
+            headroom['cores'] = hc / deltas['instances']
         else:
-            usages = user_usages
-        usages = dict((k, dict(in_use=v['in_use'], reserved=v['reserved']))
-                      for k, v in usages.items())
-        headroom = dict((res, user_quotas[res] -
-                             (usages[res]['in_use'] + usages[res]['reserved']))
-                        for res in user_quotas.keys())
-
-        # If quota_cores is unlimited [-1]:
-        # - set cores headroom based on instances headroom:
-        if user_quotas.get('cores') == -1:
-            if deltas['cores']:
-                hc = headroom['instances'] * deltas['cores']
-                headroom['cores'] = hc / deltas['instances']
-            else:
-                headroom['cores'] = headroom['instances']
-
-        # If quota_ram is unlimited [-1]:
-        # - set ram headroom based on instances headroom:
-        if user_quotas.get('ram') == -1:
-            if deltas['ram']:
-                hr = headroom['instances'] * deltas['ram']
-                headroom['ram'] = hr / deltas['instances']
-            else:
-                headroom['ram'] = headroom['instances']
-        raise exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
-                                  usages=usages, headroom=headroom)
+            headroom['cores'] = headroom['instances']
+
+    # If quota_ram is unlimited [-1]:
+    # - set ram headroom based on instances headroom:
+    if user_quotas.get('ram') == -1:
+        if deltas['ram']:
+            hr = headroom['instances'] * deltas['ram']
+            headroom['ram'] = hr / deltas['instances']
+        else:
+            headroom['ram'] = headroom['instances']
+    return exception.OverQuota(overs=sorted(overs), quotas=user_quotas,
+                               usages=usages, headroom=headroom)
+
+
+def _quota_usage_needs_refresh(usage, max_age):
+    """Return True if quota_reserve() would refresh the usage, or would
+    count down its until_refresh to the point of refreshing it.
+    """
+    if usage is None or usage.in_use < 0:
+        return True
+    if usage.until_refresh is not None:
+        return usage.until_refresh <= 1
+    return bool(max_age and
+                (timeutils.utcnow() - usage.updated_at).seconds >= max_age)
+
+
+def _project_usage_total(project_id, resource):
+    """Return a scalar subquery of the in_use + reserved total of a
+    resource over all the usage rows of a project.
+    """
+    usages = models.QuotaUsage.__table__
+    # NOTE: the sum is wrapped in a derived table because MySQL refuses
+    # an UPDATE whose WHERE clause selects from the table being updated.
+    total = sql.select([func.coalesce(
+                            func.sum(usages.c.in_use + usages.c.reserved), 0).
+                        label('total')]).\
+                where(and_(usages.c.project_id == project_id,
+                           usages.c.resource == resource,
+                           usages.c.deleted == 0)).\
+                alias('project_usage')
+    return sql.select([total.c.total]).as_scalar()
+
+
+@require_context
+@_retry_on_deadlock
+def quota_reserve_cas(context, resources, project_quotas, user_quotas,
+                      deltas, expire, until_refresh, max_age,
+                      project_id=None, user_id=None):
+    if project_id is None:
+        project_id = context.project_id
+    if user_id is None:
+        user_id = context.user_id
+
+    session = get_session()
+    project_usages, user_usages = _get_project_user_quota_usages(
+            context, session, project_id, user_id, lock=False)
+    if any(_quota_usage_needs_refresh(user_usages.get(res), max_age)
+           for res in deltas):
+        return None
+
+    unders = [res for res, delta in deltas.items()
+              if delta < 0 and delta + user_usages[res].in_use < 0]
+
+    start = time.time()
+    try:
+        with session.begin():
+            # NOTE: instead of locking the usages of the project, each
+            # usage is only updated if the quota still has room for the
+            # delta when the UPDATE runs; no row count means over quota.
+            overs = []
+            for res, delta in deltas.items():
+                query = model_query(context, models.QuotaUsage,
+                                    read_deleted="no", session=session).\
+                                filter_by(id=user_usages[res].id)
+                if user_quotas[res] >= 0 and delta >= 0:
+                    query = query.filter(
+                        models.QuotaUsage.in_use +
+                        models.QuotaUsage.reserved + delta <=
+                        user_quotas[res]).\
+                        filter(_project_usage_total(project_id, res) +
+                               delta <= project_quotas[res])
+                values = {'until_refresh': models.QuotaUsage.until_refresh - 1}
+                if delta > 0:
+                    values['reserved'] = models.QuotaUsage.reserved + delta
+                if not query.update(values, synchronize_session=False):
+                    overs.append(res)
+            if overs:
+                for key, value in user_usages.items():
+                    if key not in project_usages:
+                        project_usages[key] = value
+                raise _over_quota(overs, project_quotas, user_quotas, deltas,
+                                  project_usages, user_usages)
+
+            reservations = []
+            rows = []
+            for res, delta in deltas.items():
+                reservation_uuid = str(uuid.uuid4())
+                reservations.append(reservation_uuid)
+                rows.append({'uuid': reservation_uuid,
+                             'usage_id': user_usages[res].id,
+                             'project_id': project_id,
+                             'user_id': user_id,
+                             'resource': res,
+                             'delta': delta,
+                             'expire': expire})
+            session.execute(models.Reservation.__table__.insert(), rows)
+    finally:
+        LOG.debug('Quota reservation for project %(project_id)s held its '
+                  'usages for %(time).3f seconds',
+                  {'project_id': project_id, 'time': time.time() - start})
 
+    if unders:
+        LOG.warning(_("Change will make usage less than 0 for the following "
+                      "resources: %s"), unders)
     return reservations
 
 
@@ -3419,6 +3721,56 @@ def reservation_rollback(context, reservations, project_id=None, user_id=None):
         reservation_query.soft_delete(synchronize_session=False)
 
 
+def _reservations_finish(context, reservations, commit):
+    """Soft delete the reservations and apply their deltas to the usages
+    they reserved, without locking the usages of the project.
+    """
+    session = get_session()
+    with session.begin():
+        rows = model_query(context, models.Reservation, read_deleted="no",
+                           session=session).\
+                       filter(models.Reservation.uuid.in_(reservations)).\
+                       all()
+        usage_deltas = collections.defaultdict(lambda: [0, 0])
+        for reservation in rows:
+            # NOTE: a reservation only counts if this call is the one that
+            # deletes it, so that concurrent commits of the same
+            # reservation do not apply it twice.
+            if not model_query(context, models.Reservation,
+                               read_deleted="no", session=session).\
+                    filter_by(id=reservation.id).\
+                    soft_delete(synchronize_session=False):
+                continue
+            in_use, reserved = usage_deltas[reservation.usage_id]
+            if reservation.delta >= 0:
+                reserved -= reservation.delta
+            if commit:
+                in_use += reservation.delta
+            usage_deltas[reservation.usage_id] = [in_use, reserved]
+
+        for usage_id, (in_use, reserved) in usage_deltas.items():
+            if not in_use and not reserved:
+                continue
+            model_query(context, models.QuotaUsage, read_deleted="no",
+                        session=session).\
+                    filter_by(id=usage_id).\
+                    update({'in_use': models.QuotaUsage.in_use + in_use,
+                            'reserved': models.QuotaUsage.reserved + reserved},
+                           synchronize_session=False)
+
+
+@require_context
+@_retry_on_deadlock
+def reservation_commit_cas(context, reservations):
+    _reservations_finish(context, reservations, commit=True)
+
+
+@require_context
+@_retry_on_deadlock
+def reservation_rollback_cas(context, reservations):
+    _reservations_finish(context, reservations, commit=False)
+
+
 @require_admin_context
 def quota_destroy_all_by_project_and_user(context, project_id, user_id):
     session = get_session()
@@ -3669,6 +4021,17 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid,
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids,
+                                                   use_slave=False):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context, use_slave=use_slave).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                     instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_get_by_volume_id(context, volume_id,
         columns_to_join=None):
@@ -351,8 +351,8 @@ class FairnessManager(manager.Manager):
         """
         if self._cloud_supply.ready:
             self._rui_collection_helper.start()
-            instances = instance_objects.InstanceList().get_by_host(ctxt,
-                                                                    self.host)
+            instances = instance_objects.InstanceList.get_projection_by_host(
+                ctxt, self.host, ['host', 'user_id', 'vcpus', 'vm_state'])
             if self._rui_collection_helper.interval() is None:
                 host_uptime = timeutils.delta_seconds(
                     self._cloud_supply.local_boot_time,
@@ -0,0 +1,264 @@
+# Copyright 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import hashlib
+import logging
+import re
+
+import eventlet
+from eventlet import event
+from oslo.config import cfg
+import requests
+from requests.packages.urllib3 import exceptions as urllib3_exc
+
+from nova import exception
+from nova.i18n import _
+import nova.image.download.base as xfer_base
+from nova.openstack.common import excutils
+from nova.openstack.common import units
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+http_opts = [
+    cfg.IntOpt('connections',
+               default=4,
+               help=_('Number of HTTP connections used in parallel to '
+                      'download one image')),
+    cfg.IntOpt('range_size_mb',
+               default=64,
+               help=_('Size of the byte ranges, in MB, the image is split in '
+                      'to be downloaded in parallel')),
+    cfg.IntOpt('num_retries',
+               default=3,
+               help=_('Number of times the download of a byte range is '
+                      'resumed after a connection failure')),
+    cfg.FloatOpt('timeout',
+                 default=60,
+                 help=_('Seconds to wait for the image server to accept a '
+                        'connection or to send data before the request is '
+                        'considered failed')),
+]
+CONF.register_opts(http_opts, group='image_http_url')
+
+READ_CHUNK_SIZE = 64 * units.Ki
+
+# Errors raised while a response is read: requests does not wrap every
+# error of the underlying urllib3 connection in a RequestException.
+RESPONSE_ERRORS = (requests.RequestException, urllib3_exc.HTTPError, IOError)
+
+
+#  This module downloads images whose direct URL or location is an http or
+#  https URL, e.g. with the glance http store.  To use it, add http and https
+#  to allowed_direct_url_schemes in the [glance] section of nova.conf.
+#
+#  When the server reports the size of the image and accepts range requests,
+#  the image is split in byte ranges which are fetched over several
+#  connections and written in place into a preallocated sparse file.  A range
+#  whose connection fails is resumed from the last byte written.  The MD5 of
+#  the image is computed as the ranges complete, in order, and compared with
+#  the checksum glance recorded for the image.
+
+
+class HttpTransfer(xfer_base.TransferBase):
+
+    def _probe(self, url):
+        """Return the size of the image at url, or None if it is unknown or
+        the server does not accept range requests.
+        """
+        try:
+            resp = requests.head(url, allow_redirects=True,
+                                 timeout=CONF.image_http_url.timeout)
+        except requests.RequestException as e:
+            LOG.info(_('Could not probe %(url)s: %(error)s') %
+                     {'url': url, 'error': e})
+            return None
+        if (resp.status_code != 200 or
+                resp.headers.get('accept-ranges') != 'bytes'):
+            return None
+        try:
+            return int(resp.headers['content-length'])
+        except (KeyError, ValueError):
+            return None
+
+    def _iter_content(self, url, resp):
+        """Yield the body of resp, failing if the server sends nothing
+        for timeout seconds.
+
+        requests only applies its timeout to the reads of a response which
+        is not streamed.
+        """
+        chunks = resp.iter_content(READ_CHUNK_SIZE)
+        while True:
+            error = IOError(_('Timed out reading from %s') % url)
+            with eventlet.Timeout(CONF.image_http_url.timeout, error):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def _check_content_range(self, url, resp, offset):
+        """Check that the range returned by the server starts at offset."""
+        match = re.match(r'bytes\s+(\d+)-',
+                         resp.headers.get('content-range', ''))
+        if not match or int(match.group(1)) != offset:
+            msg = (_('Range request to %(url)s for byte %(offset)d returned '
+                     'Content-Range %(content_range)s') %
+                   {'url': url, 'offset': offset,
+                    'content_range': resp.headers.get('content-range')})
+            raise exception.ImageDownloadModuleError(reason=msg,
+                                                     module=str(self))
+
+    def _fetch_range(self, url, dst_path, start, end, abort):
+        """Write bytes [start, end) of the image into dst_path.
+
+        If the connection fails or ends early the request is resumed from
+        the first byte not written yet, up to num_retries times.  Stops as
+        soon as the abort event is sent.
+        """
+        offset = start
+        attempt = 0
+        with open(dst_path, 'r+b') as f:
+            while offset < end and not abort.ready():
+                if attempt > CONF.image_http_url.num_retries:
+                    msg = (_('Failed to download bytes %(start)d-%(end)d of '
+                             '%(url)s') %
+                           {'start': offset, 'end': end - 1, 'url': url})
+                    raise exception.ImageDownloadModuleError(
+                        reason=msg, module=str(self))
+                attempt += 1
+
+                headers = {'Range': 'bytes=%d-%d' % (offset, end - 1)}
+                try:
+                    resp = requests.get(url, headers=headers, stream=True,
+                                        timeout=CONF.image_http_url.timeout)
+                    if resp.status_code != 206:
+                        msg = (_('Range request to %(url)s returned '
+                                 '%(status)d') %
+                               {'url': url, 'status': resp.status_code})
+                        raise exception.ImageDownloadModuleError(
+                            reason=msg, module=str(self))
+                    self._check_content_range(url, resp, offset)
+                    f.seek(offset)
+                    for chunk in self._iter_content(url, resp):
+                        if abort.ready():
+                            break
+                        chunk = chunk[:end - offset]
+                        f.write(chunk)
+                        offset += len(chunk)
+                        if offset == end:
+                            break
+                except RESPONSE_ERRORS as e:
+                    LOG.warn(_('Download of %(url)s interrupted at byte '
+                               '%(offset)d: %(error)s') %
+                             {'url': url, 'offset': offset, 'error': e})
+        return start, end
+
+    def _hash_range(self, checksum, dst_path, start, end):
+        with open(dst_path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start
+            while remaining:
+                chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                checksum.update(chunk)
+                remaining -= len(chunk)
+
+    def _download_ranges(self, url, dst_path, size):
+        range_size = CONF.image_http_url.range_size_mb * units.Mi
+        ranges = [(start, min(start + range_size, size))
+                  for start in xrange(0, size, range_size)]
+
+        # NOTE: truncate() makes a sparse file of the final size that the
+        # ranges are written into, wherever they land.
+        with open(dst_path, 'wb') as f:
+            f.truncate(size)
+
+        checksum = hashlib.md5()
+        abort = event.Event()
+        pool = eventlet.GreenPool(CONF.image_http_url.connections)
+        # imap() returns the ranges in order, so each one can be added to
+        # the checksum as soon as all the ranges before it are complete;
+        # it is read back while it is still in the page cache.
+        results = pool.imap(
+            lambda r: self._fetch_range(url, dst_path, *(r + (abort,))),
+            ranges)
+        try:
+            for start, end in results:
+                self._hash_range(checksum, dst_path, start, end)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                # NOTE: stop the ranges still being fetched and wait for
+                # them, so that nothing writes into dst_path once the
+                # failure is reported and the file is cleaned up.
+                abort.send()
+                self._drain(results)
+        return checksum.hexdigest()
+
+    @staticmethod
+    def _drain(results):
+        while True:
+            try:
+                next(results)
+            except StopIteration:
+                return
+            except Exception:
+                pass
+
+    def _download_stream(self, url, dst_path):
+        try:
+            resp = requests.get(url, stream=True,
+                                timeout=CONF.image_http_url.timeout)
+            resp.raise_for_status()
+            checksum = hashlib.md5()
+            with open(dst_path, 'wb') as f:
+                for chunk in self._iter_content(url, resp):
+                    checksum.update(chunk)
+                    f.write(chunk)
+        except RESPONSE_ERRORS as e:
+            msg = (_('Failed to download %(url)s: %(error)s') %
+                   {'url': url, 'error': e})
+            raise exception.ImageDownloadModuleError(reason=msg,
+                                                     module=str(self))
+        return checksum.hexdigest()
+
+    def download(self, context, url_parts, dst_path, metadata, **kwargs):
+        url = url_parts.geturl()
+        size = self._probe(url)
+        if size:
+            current_checksum = self._download_ranges(url, dst_path, size)
+        else:
+            current_checksum = self._download_stream(url, dst_path)
+
+        expected_checksum = kwargs.get('checksum')
+        if expected_checksum and current_checksum != expected_checksum:
+            msg = (_('Checksum of %(url)s is %(current)s, expected '
+                     '%(expected)s') %
+                   {'url': url, 'current': current_checksum,
+                    'expected': expected_checksum})
+            raise exception.ImageDownloadModuleError(reason=msg,
+                                                     module=str(self))
+        LOG.info(_('Downloaded %(url)s using %(module_str)s') %
+                 {'url': url, 'module_str': str(self)})
+
+
+def get_download_handler(**kwargs):
+    return HttpTransfer()
+
+
+def get_schemes():
+    return ['http', 'https']
@@ -13,12 +13,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 import functools
 import inspect
 
+from nova.cells import opts as cells_opts
+from nova.cells import rpcapi as cells_rpcapi
 from nova.db import base
+from nova import exception
 from nova import hooks
 from nova.i18n import _
+from nova.i18n import _LE
 from nova.network import model as network_model
 from nova import objects
 from nova.openstack.common import excutils
@@ -49,6 +54,53 @@ def update_instance_cache_with_nw_info(impl, context, instance,
             LOG.exception(_('Failed storing info cache'), instance=instance)
 
 
+@hooks.add_hook('instance_network_info')
+def _instance_cache_updated(impl, context, instance, nw_info=None,
+                            update_cells=True):
+    """Called for each info cache stored by
+    update_instance_caches_with_nw_info(), so that the instance_network_info
+    hooks run as they do around update_instance_cache_with_nw_info(), and
+    the info cache of the API cell is updated like InstanceInfoCache.save()
+    does.
+    """
+    if not update_cells or cells_opts.get_cell_type() != 'compute':
+        return
+    info_cache = {'instance_uuid': instance['uuid'],
+                  'network_info': nw_info.json()}
+    try:
+        cells_rpcapi.CellsAPI().instance_info_cache_update_at_top(
+            context, info_cache)
+    except Exception:
+        LOG.exception(_LE("Failed to notify cells of instance info "
+                          "cache update"), instance=instance)
+
+
+def update_instance_caches_with_nw_info(impl, context, instances, nw_infos):
+    """Store the network info of several instances, keyed by instance
+    uuid, in their info caches with a single database update.
+    """
+    missing = objects.InstanceInfoCacheList.update_network_info(
+        context, dict((uuid, nw_info.json())
+                      for uuid, nw_info in nw_infos.items()))
+    deleted = set()
+    for uuid in missing:
+        # NOTE: as in update_instance_cache_with_nw_info(), save() creates
+        #       the info cache if it does not exist.
+        try:
+            ic = objects.InstanceInfoCache.new(context, uuid)
+            ic.network_info = nw_infos[uuid]
+            ic.save(update_cells=False)
+        except exception.InstanceInfoCacheNotFound:
+            LOG.debug('Instance info cache deleted, not updating it',
+                      instance_uuid=uuid)
+            deleted.add(uuid)
+    for instance in instances:
+        uuid = instance['uuid']
+        if uuid in nw_infos and uuid not in deleted:
+            _instance_cache_updated(impl, context, instance,
+                                    nw_info=nw_infos[uuid])
+
+
 def refresh_cache(f):
     """Decorator to update the instance_info_cache
 
@@ -239,6 +291,37 @@ class NetworkAPI(base.Base):
         """Returns all network info related to an instance."""
         raise NotImplementedError()
 
+    def get_instance_nw_info_bulk(self, context, instances):
+        """Returns the network info of several instances, keyed by
+        instance uuid, and updates their info caches at once.
+
+        Instances whose network info cannot be retrieved are left out.
+        """
+        uuids = sorted(instance['uuid'] for instance in instances)
+        locks = [lockutils.lock('refresh_cache-%s' % uuid) for uuid in uuids]
+        with contextlib.nested(*locks):
+            nw_infos = self._get_instance_nw_info_bulk(context, instances)
+            update_instance_caches_with_nw_info(self, context, instances,
+                                                nw_infos)
+        return nw_infos
+
+    def _get_instance_nw_info_bulk(self, context, instances):
+        # NOTE: called with the refresh_cache locks of the instances held.
+        # Implementations that can fetch the network info of several
+        # instances at once should override this.
+        nw_infos = {}
+        for instance in instances:
+            try:
+                nw_infos[instance['uuid']] = self._get_instance_nw_info(
+                    context, instance)
+            except exception.InstanceNotFound:
+                LOG.debug('Instance no longer exists, not updating its '
+                          'network info', instance=instance)
+            except Exception:
+                LOG.exception(_('Failed to get network info'),
+                              instance=instance)
+        return nw_infos
+
     def create_pci_requests_for_sriov_ports(self, context,
                                             pci_requests,
                                             requested_networks):
@@ -18,10 +18,14 @@
 """Implements vlans, bridges, and iptables rules using linux utilities."""
 
 import calendar
+import collections
 import inspect
 import os
 import re
+import sys
 
+import eventlet.event
+from eventlet import greenthread
 import netaddr
 from oslo.config import cfg
 import six
@@ -81,6 +85,25 @@ linux_net_opts = [
     cfg.StrOpt('dnsmasq_config_file',
                default='',
                help='Override the default dnsmasq settings with this file'),
+    cfg.BoolOpt('dhcp_incremental_update',
+                default=False,
+                help='Keep the dnsmasq host entries of each network in '
+                     'memory and only add or remove the entry of the fixed '
+                     'ip being allocated or deallocated, instead of '
+                     'rebuilding the host file from the database every '
+                     'time.'),
+    cfg.IntOpt('dhcp_full_rebuild_interval',
+               default=600,
+               help='Number of seconds after which the next dnsmasq host '
+                    'file update rebuilds it from the database when '
+                    'dhcp_incremental_update is set. 0 only rebuilds it '
+                    'when the network is set up.'),
+    cfg.FloatOpt('dhcp_reload_coalesce_window',
+                 default=0.0,
+                 help='Number of seconds a dnsmasq reload waits for other '
+                      'incremental host file updates, which are then '
+                      'reloaded along with it. 0 reloads after every '
+                      'update.'),
     cfg.StrOpt('linuxnet_interface_driver',
                default='nova.network.linux_net.LinuxBridgeInterfaceDriver',
                help='Driver used to create ethernet devices.'),
@@ -120,6 +143,26 @@ linux_net_opts = [
                default='DROP',
                help=('The table that iptables to jump to when a packet is '
                      'to be dropped.')),
+    cfg.BoolOpt('iptables_incremental_apply',
+                default=False,
+                help='After the first apply, only rewrite the nova chains '
+                     'that changed with iptables-restore --noflush instead '
+                     'of saving and restoring the whole ruleset. Changes to '
+                     'the shared, unwrapped chains still trigger a full '
+                     'apply. The packet counters of rewritten chains are '
+                     'reset.'),
+    cfg.IntOpt('iptables_full_apply_interval',
+               default=600,
+               help='With iptables_incremental_apply, number of seconds '
+                    'after which the next apply is a full one again, which '
+                    'restores the nova chains if they were changed or '
+                    'flushed outside of nova. 0 only does a full apply '
+                    'when one is needed.'),
+    cfg.FloatOpt('iptables_apply_coalesce_window',
+                 default=0.0,
+                 help='Number of seconds an iptables apply waits for other '
+                      'changes to the rules, which are then applied along '
+                      'with it. 0 applies every change at once.'),
     cfg.IntOpt('ovs_vsctl_timeout',
                default=120,
                help='Amount of time, in seconds, that ovs_vsctl should wait '
@@ -361,6 +404,14 @@ class IptablesManager(object):
 
         self.iptables_apply_deferred = False
 
+        # The rules last applied by each iptables command and table, used to
+        # only rewrite the changed chains when iptables_incremental_apply is
+        # set. See _apply_changed_chains().
+        self._applied = {}
+        self._last_full_apply = None
+        # The apply waiting for the coalesce window to end, if any.
+        self._pending_apply = None
+
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
         # of FORWARD and OUTPUT.
@@ -411,6 +462,22 @@ class IptablesManager(object):
         self.ipv4['nat'].add_chain('float-snat')
         self.ipv4['nat'].add_rule('snat', '-j $float-snat')
 
+    def force_full_apply(self):
+        """Make the next apply save and restore the whole ruleset, even if
+        no rule changed, so that the rules on the host match the in-memory
+        ones again.
+        """
+        self._applied = {}
+        for tables in [self.ipv4, self.ipv6]:
+            for table in tables.itervalues():
+                table.dirty = True
+
+    def _full_apply_due(self):
+        interval = CONF.iptables_full_apply_interval
+        return (self._last_full_apply is None or
+                interval > 0 and timeutils.is_older_than(
+                    self._last_full_apply, interval))
+
     def defer_apply_on(self):
         self.iptables_apply_deferred = True
 
@@ -431,11 +498,38 @@ class IptablesManager(object):
     def apply(self):
         if self.iptables_apply_deferred:
             return
-        if self.dirty():
+        if CONF.iptables_apply_coalesce_window > 0:
+            self._coalesced_apply()
+        elif self.dirty():
             self._apply()
         else:
             LOG.debug("Skipping apply due to lack of new rules")
 
+    def _coalesced_apply(self):
+        """Apply the rules after the coalesce window, together with the
+        changes made by the callers which join it in the meantime.
+        """
+        if self._pending_apply is not None:
+            LOG.debug("Joining pending iptables apply")
+            return self._pending_apply.wait()
+
+        pending = self._pending_apply = eventlet.event.Event()
+        try:
+            greenthread.sleep(CONF.iptables_apply_coalesce_window)
+        finally:
+            self._pending_apply = None
+
+        try:
+            if self.dirty():
+                self._apply()
+            else:
+                LOG.debug("Skipping apply due to lack of new rules")
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                pending.send_exception(*sys.exc_info())
+        else:
+            pending.send()
+
     @utils.synchronized('iptables', external=True)
     def _apply(self):
         """Apply the current in-memory set of iptables rules.
@@ -449,7 +543,15 @@ class IptablesManager(object):
         if CONF.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
+        incremental = CONF.iptables_incremental_apply
+        if incremental and self._full_apply_due():
+            self.force_full_apply()
+            self._last_full_apply = timeutils.utcnow()
+
         for cmd, tables in s:
+            if incremental and self._apply_changed_chains(cmd, tables):
+                continue
+
             all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
                                                 run_as_root=True,
                                                 attempts=5)
@@ -462,8 +564,105 @@ class IptablesManager(object):
             self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
                          process_input='\n'.join(all_lines),
                          attempts=5)
+
+            if CONF.iptables_incremental_apply:
+                for table_name, table in tables.iteritems():
+                    self._applied[(cmd, table_name)] = (
+                        self._unwrapped_state(table),
+                        self._wrapped_chain_rules(table))
         LOG.debug("IPTablesManager.apply completed with success")
 
+    @staticmethod
+    def _unwrapped_state(table):
+        """Return the unwrapped chains and rules of a table."""
+        return (frozenset(table.unwrapped_chains),
+                tuple(str(rule) for rule in table.rules if not rule.wrap))
+
+    @staticmethod
+    def _wrapped_chain_rules(table):
+        """Return the rules of each wrapped chain of a table, keyed by the
+        wrapped chain name, in the order _modify_rules() writes them.
+        """
+        chain_rules = dict(('%s-%s' % (binary_name, name), [])
+                           for name in table.chains)
+        for top in (True, False):
+            for rule in table.rules:
+                if rule.wrap and rule.top == top:
+                    chain_rules['%s-%s' % (binary_name, rule.chain)].append(
+                        str(rule))
+
+        # Like _modify_rules(), keep the last of duplicated rules.
+        for name, rules in chain_rules.iteritems():
+            seen = set()
+            unique_rules = []
+            for rule in reversed(rules):
+                if rule not in seen:
+                    seen.add(rule)
+                    unique_rules.append(rule)
+            unique_rules.reverse()
+            chain_rules[name] = tuple(unique_rules)
+        return chain_rules
+
+    def _apply_changed_chains(self, cmd, tables):
+        """Rewrite only the wrapped chains changed since the last apply.
+
+        The changed chains are redeclared, which flushes them, and refilled
+        through iptables-restore --noflush; the chains which were removed
+        are deleted. Returns False, without changing anything, if a full
+        apply is needed instead: on the first apply, after
+        force_full_apply() or iptables_full_apply_interval, and when the
+        unwrapped chains or rules changed since they are shared with other
+        services.
+        """
+        applied = {}
+        lines = []
+        for table_name, table in tables.iteritems():
+            previous = self._applied.get((cmd, table_name))
+            unwrapped_state = self._unwrapped_state(table)
+            if (previous is None or previous[0] != unwrapped_state or
+                    table.remove_rules or table.remove_chains):
+                return False
+
+            chain_rules = self._wrapped_chain_rules(table)
+            applied[table_name] = (unwrapped_state, chain_rules)
+            previous_rules = previous[1]
+            changed = sorted(name for name, rules in chain_rules.iteritems()
+                             if previous_rules.get(name) != rules)
+            removed = sorted(set(previous_rules) - set(chain_rules))
+            if not changed and not removed:
+                continue
+
+            lines.append('*%s' % table_name)
+            lines += [':%s - [0:0]' % name for name in changed + removed]
+            for name in changed:
+                lines += chain_rules[name]
+            lines += ['-X %s' % name for name in removed]
+            lines.append('COMMIT')
+
+        if lines:
+            LOG.debug("Rewriting %(count)d changed %(cmd)s chains",
+                      {'count': sum(1 for line in lines
+                                    if line.startswith(':')),
+                       'cmd': cmd})
+            try:
+                self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                             run_as_root=True,
+                             process_input='\n'.join(lines),
+                             attempts=5)
+            except processutils.ProcessExecutionError:
+                # NOTE: the rules on the host may not be what we last
+                # applied anymore; start over with a full apply.
+                LOG.warn(_('Incremental %s apply failed, doing a full '
+                           'apply'), cmd)
+                for table_name in tables:
+                    self._applied.pop((cmd, table_name), None)
+                return False
+
+        for table_name, state in applied.iteritems():
+            self._applied[(cmd, table_name)] = state
+            tables[table_name].dirty = False
+        return True
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -715,6 +914,9 @@ def init_host(ip_range, is_external=False):
                                           '-m conntrack ! --ctstate DNAT '
                                           '-j ACCEPT' %
                                           {'range': ip_range})
+    # NOTE: restore any nova chain which was changed or flushed while
+    # nova-network was not running.
+    iptables_manager.force_full_apply()
     iptables_manager.apply()
 
 
@@ -969,8 +1171,7 @@ def _remove_dhcp_mangle_rule(dev):
     iptables_manager.apply()
 
 
-def get_dhcp_opts(context, network_ref, fixedips):
-    """Get network's hosts config in dhcp-opts format."""
+def _dhcp_gateway(network_ref):
     gateway = network_ref['gateway']
     # NOTE(vish): if we are in multi-host mode and we are not sharing
     #             addresses, then we actually need to hand out the
@@ -978,15 +1179,17 @@ def get_dhcp_opts(context, network_ref, fixedips):
     if network_ref['multi_host'] and not (network_ref['share_address'] or
                                           CONF.share_dhcp_address):
         gateway = network_ref['dhcp_server']
+    return gateway
+
+
+def get_dhcp_opts(context, network_ref, fixedips):
+    """Get network's hosts config in dhcp-opts format."""
+    gateway = _dhcp_gateway(network_ref)
     hosts = []
     if CONF.use_single_default_gateway:
         for fixedip in fixedips:
             if fixedip.allocated:
-                vif_id = fixedip.virtual_interface_id
-                if fixedip.default_route:
-                    hosts.append(_host_dhcp_opts(vif_id, gateway))
-                else:
-                    hosts.append(_host_dhcp_opts(vif_id))
+                hosts.append(_fixedip_dhcp_opts(fixedip, gateway))
     else:
         hosts.append(_host_dhcp_opts(None, gateway))
     return '\n'.join(hosts)
@@ -1009,10 +1212,207 @@ def update_dhcp(context, dev, network_ref):
     fixedips = objects.FixedIPList.get_by_network(context,
                                                   network_ref,
                                                   host=host)
+    if CONF.dhcp_incremental_update:
+        table = DhcpHostTable(_dhcp_gateway(network_ref))
+        for fixedip in fixedips:
+            if fixedip.allocated:
+                table.add(fixedip.address, fixedip.virtual_interface,
+                          fixedip.instance.hostname, fixedip.default_route)
+        _dhcp_host_tables[dev] = table
     write_to_file(conffile, get_dhcp_hosts(context, network_ref, fixedips))
     restart_dhcp(context, dev, network_ref, fixedips)
 
 
+class DhcpHostTable(object):
+    """The dhcp-host and dhcp-opts entries of a network, kept in memory by
+    add_dhcp_host() and remove_dhcp_host() so that allocating or
+    deallocating a fixed ip does not rebuild them from the database.
+
+    Entries are grouped by MAC address and, as in get_dhcp_hosts(), only
+    the first address of a MAC gets a dhcp-host entry.
+    """
+
+    def __init__(self, gateway):
+        self.gateway = gateway
+        self.created_at = timeutils.utcnow()
+        # MAC address -> {fixed ip address: (dhcp-host, dhcp-opts)}
+        self._macs = collections.OrderedDict()
+        # fixed ip address -> MAC address
+        self._addresses = {}
+
+    def add(self, address, vif, hostname, default_route):
+        address = str(address)
+        opts = None
+        if CONF.use_single_default_gateway:
+            opts = _vif_dhcp_opts(vif.id, default_route, self.gateway)
+        self.remove(address)
+        entries = self._macs.setdefault(vif.address,
+                                        collections.OrderedDict())
+        entries[address] = (_dhcp_host_entry(vif.address, vif.id, hostname,
+                                             address), opts)
+        self._addresses[address] = vif.address
+
+    def remove(self, address):
+        """Remove the entry of a fixed ip address, return False if there
+        was none.
+        """
+        mac = self._addresses.pop(str(address), None)
+        if mac is None:
+            return False
+        entries = self._macs[mac]
+        del entries[str(address)]
+        if not entries:
+            del self._macs[mac]
+        return True
+
+    def is_expired(self):
+        interval = CONF.dhcp_full_rebuild_interval
+        return interval > 0 and timeutils.is_older_than(self.created_at,
+                                                        interval)
+
+    def get_hosts(self):
+        """Return the entries in dhcp-host format."""
+        return '\n'.join(entries.values()[0][0]
+                         for entries in self._macs.values())
+
+    def get_opts(self):
+        """Return the entries in dhcp-opts format."""
+        if not CONF.use_single_default_gateway:
+            return _host_dhcp_opts(None, self.gateway)
+        return '\n'.join(opts for entries in self._macs.values()
+                         for _host, opts in entries.values())
+
+
+# NOTE: device -> DhcpHostTable of the network, from the last update_dhcp().
+_dhcp_host_tables = {}
+# NOTE: device -> Event of the dnsmasq reload waiting for the coalesce window.
+_pending_dhcp_reloads = {}
+
+
+def _get_dhcp_host_table(dev):
+    """Return the DhcpHostTable of dev, or None if the host file has to be
+    rebuilt from the database.
+    """
+    if not CONF.dhcp_incremental_update:
+        return None
+    table = _dhcp_host_tables.get(dev)
+    if table is None or table.is_expired():
+        return None
+    return table
+
+
+def add_dhcp_host(context, dev, network_ref, address, vif, instance):
+    """Add the dhcp-host entry of a fixed ip address newly allocated to
+    the virtual interface vif of instance.
+
+    Falls back to update_dhcp() when there is no up to date DhcpHostTable
+    for dev.
+    """
+    table = _get_dhcp_host_table(dev)
+    if table is None:
+        update_dhcp(context, dev, network_ref)
+        return
+    if network_ref['multi_host'] and instance.host != CONF.host:
+        return
+    default_route = False
+    if CONF.use_single_default_gateway:
+        # NOTE: as in network_get_associated_fixed_ips(), the default route
+        #       goes through the first interface of the instance.
+        vifs = objects.VirtualInterfaceList.get_by_instance_uuid(
+            context, instance.uuid)
+        default_route = vif.id == min(other.id for other in vifs)
+    table.add(address, vif, instance.hostname, default_route)
+    _write_dhcp_files(dev, table)
+    _reload_dhcp(context, dev, network_ref)
+
+
+def remove_dhcp_host(context, dev, network_ref, address):
+    """Remove the dhcp-host entry of a deallocated fixed ip address.
+
+    Falls back to update_dhcp() when there is no up to date DhcpHostTable
+    for dev.
+    """
+    table = _get_dhcp_host_table(dev)
+    if table is None:
+        update_dhcp(context, dev, network_ref)
+        return
+    if table.remove(address):
+        _write_dhcp_files(dev, table)
+        _reload_dhcp(context, dev, network_ref)
+
+
+def _write_file_atomic(path, data):
+    tmp_path = '%s.tmp' % path
+    write_to_file(tmp_path, data)
+    # Make sure dnsmasq can actually read it (it setuid()s to "nobody")
+    os.chmod(tmp_path, 0o644)
+    os.rename(tmp_path, path)
+
+
+def _write_dhcp_files(dev, table):
+    # NOTE: dnsmasq may read the files at any time, so they are replaced
+    #       rather than rewritten in place.
+    _write_file_atomic(_dhcp_file(dev, 'conf'), table.get_hosts())
+    _write_file_atomic(_dhcp_file(dev, 'opts'), table.get_opts())
+
+
+def _reload_dhcp(context, dev, network_ref):
+    """Make the dnsmasq of dev reload its host files, or restart it if it
+    is not running.
+
+    With dhcp_reload_coalesce_window set, the reload waits for the end of
+    the window, and the updates made in the meantime join it instead of
+    sending their own.
+    """
+    window = CONF.dhcp_reload_coalesce_window
+    if window <= 0:
+        if not _hup_dnsmasq(dev):
+            update_dhcp(context, dev, network_ref)
+        return
+
+    pending = _pending_dhcp_reloads.get(dev)
+    if pending is not None:
+        LOG.debug("Joining pending dnsmasq reload for %s", dev)
+        return pending.wait()
+
+    pending = _pending_dhcp_reloads[dev] = eventlet.event.Event()
+    try:
+        greenthread.sleep(window)
+    finally:
+        del _pending_dhcp_reloads[dev]
+
+    try:
+        if not _hup_dnsmasq(dev):
+            update_dhcp(context, dev, network_ref)
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            pending.send_exception(*sys.exc_info())
+    else:
+        pending.send()
+
+
+@utils.synchronized('dnsmasq_start')
+def _hup_dnsmasq(dev):
+    """Send a HUP to the dnsmasq of dev, return False if it is not
+    running.
+    """
+    pid = _dnsmasq_pid_for(dev)
+    if not pid:
+        return False
+    conffile = _dhcp_file(dev, 'conf')
+    out, _err = _execute('cat', '/proc/%d/cmdline' % pid,
+                         check_exit_code=False)
+    if conffile.split('/')[-1] not in out:
+        LOG.debug('Pid %d is stale, relaunching dnsmasq', pid)
+        return False
+    try:
+        _execute('kill', '-HUP', pid, run_as_root=True)
+    except Exception as exc:  # pylint: disable=W0703
+        LOG.error(_('Hupping dnsmasq threw %s'), exc)
+        return False
+    return True
+
+
 def update_dns(context, dev, network_ref):
     hostsfile = _dhcp_file(dev, 'hosts')
     host = None
@@ -1188,18 +1588,25 @@ def _host_dhcp_network(vif_id):
 
 def _host_dhcp(fixedip):
     """Return a host string for an address in dhcp-host format."""
+    return _dhcp_host_entry(fixedip.virtual_interface.address,
+                            fixedip.virtual_interface_id,
+                            fixedip.instance.hostname,
+                            fixedip.address)
+
+
+def _dhcp_host_entry(mac, vif_id, hostname, address):
     if CONF.use_single_default_gateway:
-        net = _host_dhcp_network(fixedip.virtual_interface_id)
-        return '%s,%s.%s,%s,net:%s' % (fixedip.virtual_interface.address,
-                               fixedip.instance.hostname,
+        net = _host_dhcp_network(vif_id)
+        return '%s,%s.%s,%s,net:%s' % (mac,
+                               hostname,
                                CONF.dhcp_domain,
-                               fixedip.address,
+                               address,
                                net)
     else:
-        return '%s,%s.%s,%s' % (fixedip.virtual_interface.address,
-                               fixedip.instance.hostname,
+        return '%s,%s.%s,%s' % (mac,
+                               hostname,
                                CONF.dhcp_domain,
-                               fixedip.address)
+                               address)
 
 
 def _host_dns(fixedip):
@@ -1208,6 +1615,20 @@ def _host_dns(fixedip):
                           CONF.dhcp_domain)
 
 
+def _fixedip_dhcp_opts(fixedip, gateway):
+    """Return the dhcp-opts entry of a fixed ip with
+    use_single_default_gateway.
+    """
+    return _vif_dhcp_opts(fixedip.virtual_interface_id,
+                          fixedip.default_route, gateway)
+
+
+def _vif_dhcp_opts(vif_id, default_route, gateway):
+    if default_route:
+        return _host_dhcp_opts(vif_id, gateway)
+    return _host_dhcp_opts(vif_id)
+
+
 def _host_dhcp_opts(vif_id=None, gateway=None):
     """Return an empty gateway option."""
     values = []
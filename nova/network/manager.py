@@ -141,6 +141,7 @@ CONF.import_opt('use_ipv6', 'nova.netconf')
 CONF.import_opt('my_ip', 'nova.netconf')
 CONF.import_opt('network_topic', 'nova.network.rpcapi')
 CONF.import_opt('fake_network', 'nova.network.linux_net')
+CONF.import_opt('dhcp_incremental_update', 'nova.network.linux_net')
 CONF.import_opt('share_dhcp_address', 'nova.objects.network')
 CONF.import_opt('network_device_mtu', 'nova.objects.network')
 
@@ -851,6 +852,7 @@ class NetworkManager(manager.Manager):
         #             and use that network here with a method like
         #             network_get_by_compute_host
         address = None
+        dhcp_host = None
 
         # NOTE(vish) This db query could be removed if we pass az and name
         #            (or the whole instance object).
@@ -912,6 +914,8 @@ class NetworkManager(manager.Manager):
                 fip.virtual_interface_id = vif.id
                 fip.save()
                 cleanup.append(functools.partial(fip.disassociate, context))
+                dhcp_host = dict(address=fip.address, vif=vif,
+                                 instance=instance)
 
                 LOG.debug('Refreshing security group members for instance.',
                           instance=instance)
@@ -940,10 +944,12 @@ class NetworkManager(manager.Manager):
             LOG.debug('Setting up network %(network)s on host %(host)s.' %
                       {'network': network['id'], 'host': self.host},
                       instance=instance)
-            self._setup_network_on_host(context, network)
+            self._setup_network_on_host(context, network,
+                                        dhcp_host=dhcp_host)
             cleanup.append(functools.partial(
                     self._teardown_network_on_host,
-                    context, network))
+                    context, network,
+                    address=dhcp_host and dhcp_host['address']))
 
             quotas.commit(context)
             if address is None:
@@ -1030,7 +1036,8 @@ class NetworkManager(manager.Manager):
                 # NOTE(cfb): Call teardown before release_dhcp to ensure
                 #            that the IP can't be re-leased after a release
                 #            packet is sent.
-                self._teardown_network_on_host(context, network)
+                self._teardown_network_on_host(context, network,
+                                               address=address)
                 # NOTE(vish): This forces a packet so that the release_fixed_ip
                 #             callback will get called by nova-dhcpbridge.
                 try:
@@ -1053,7 +1060,8 @@ class NetworkManager(manager.Manager):
                     fixed_ip_ref.disassociate()
             else:
                 # We can't try to free the IP address so just call teardown
-                self._teardown_network_on_host(context, network)
+                self._teardown_network_on_host(context, network,
+                                               address=address)
 
         # Commit the reservations
         quotas.commit(context)
@@ -1479,14 +1487,41 @@ class NetworkManager(manager.Manager):
             self.l3driver.initialize_network(network.cidr, is_ext)
         self.l3driver.initialize_gateway(network)
 
-    def _setup_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _setup_network_on_host(self, context, network, dhcp_host=None):
+        """Sets up network on this host.
+
+        dhcp_host is a dict of the address, vif and instance of the fixed ip
+        being allocated, if any, so that only its dhcp entry has to be added.
+        """
         raise NotImplementedError()
 
-    def _teardown_network_on_host(self, context, network):
-        """Sets up network on this host."""
+    def _teardown_network_on_host(self, context, network, address=None):
+        """Sets up network on this host.
+
+        address is the fixed ip address being deallocated, if any, so that
+        only its dhcp entry has to be removed.
+        """
         raise NotImplementedError()
 
+    def _incremental_dhcp(self, function_name):
+        """Return whether single dhcp entries can be changed with the
+        given network driver function instead of update_dhcp().
+        """
+        return (CONF.dhcp_incremental_update and
+                hasattr(self.driver, function_name))
+
+    def _add_dhcp_host(self, context, dev, network, dhcp_host=None):
+        if dhcp_host and self._incremental_dhcp('add_dhcp_host'):
+            self.driver.add_dhcp_host(context, dev, network, **dhcp_host)
+        else:
+            self.driver.update_dhcp(context, dev, network)
+
+    def _remove_dhcp_host(self, context, dev, network, address=None):
+        if address and self._incremental_dhcp('remove_dhcp_host'):
+            self.driver.remove_dhcp_host(context, dev, network, address)
+        else:
+            self.driver.update_dhcp(context, dev, network)
+
     def validate_networks(self, context, networks):
         """check if the networks exists and host
         is set to each network.
@@ -1680,7 +1715,7 @@ class FlatManager(NetworkManager):
                                                      instance=instance)
         objects.FixedIP.disassociate_by_address(context, address)
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, dhcp_host=None):
         """Setup Network on this host."""
         # NOTE(tr3buchet): this does not need to happen on every ip
         # allocation, this functionality makes more sense in create_network
@@ -1688,7 +1723,7 @@ class FlatManager(NetworkManager):
         network.injected = CONF.flat_injected
         network.save()
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         """Tear down network on this host."""
         pass
 
@@ -1809,7 +1844,7 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
 
         self.driver.iptables_manager.defer_apply_off()
 
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, dhcp_host=None):
         """Sets up network on this host."""
         network.dhcp_server = self._get_dhcp_ip(context, network)
 
@@ -1820,21 +1855,21 @@ class FlatDHCPManager(RPCAllocateFixedIP, floating_ips.FloatingIP,
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._add_dhcp_host(elevated, dev, network, dhcp_host)
             if CONF.use_ipv6:
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
                 network.gateway_v6 = gateway
                 network.save()
 
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         # NOTE(vish): if dhcp server is not set then don't dhcp
         if not CONF.fake_network and network.enable_dhcp:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
             # NOTE(dprince): dhcp DB queries require elevated context
             elevated = context.elevated()
-            self.driver.update_dhcp(elevated, dev, network)
+            self._remove_dhcp_host(elevated, dev, network, address)
 
     def _get_network_dict(self, network):
         """Returns the dict representing necessary and meta network fields."""
@@ -1951,7 +1986,9 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                                                    "A",
                                                    self.instance_dns_domain)
 
-        self._setup_network_on_host(context, network)
+        self._setup_network_on_host(context, network,
+                                    dhcp_host=dict(address=address, vif=vif,
+                                                   instance=instance))
         LOG.debug('Allocated fixed ip %s on network %s', address,
                   network['uuid'], instance=instance)
         return address
@@ -2060,7 +2097,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             self, context, vpn=True, **kwargs)
 
     @utils.synchronized('setup_network', external=True)
-    def _setup_network_on_host(self, context, network):
+    def _setup_network_on_host(self, context, network, dhcp_host=None):
         """Sets up network on this host."""
         if not network.vpn_public_address:
             address = CONF.vpn_ip
@@ -2084,7 +2121,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             # NOTE(dprince): dhcp DB queries require elevated context
             if network.enable_dhcp:
                 elevated = context.elevated()
-                self.driver.update_dhcp(elevated, dev, network)
+                self._add_dhcp_host(elevated, dev, network, dhcp_host)
             if CONF.use_ipv6:
                 self.driver.update_ra(context, dev, network)
                 gateway = utils.get_my_linklocal(dev)
@@ -2092,7 +2129,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
                 network.save()
 
     @utils.synchronized('setup_network', external=True)
-    def _teardown_network_on_host(self, context, network):
+    def _teardown_network_on_host(self, context, network, address=None):
         if not CONF.fake_network:
             network['dhcp_server'] = self._get_dhcp_ip(context, network)
             dev = self.driver.get_dev(network)
@@ -2119,7 +2156,7 @@ class VlanManager(RPCAllocateFixedIP, floating_ips.FloatingIP, NetworkManager):
             elif network.enable_dhcp:
                 # NOTE(dprince): dhcp DB queries require elevated context
                 elevated = context.elevated()
-                self.driver.update_dhcp(elevated, dev, network)
+                self._remove_dhcp_host(elevated, dev, network, address)
 
     def _get_network_dict(self, network):
         """Returns the dict representing necessary and meta network fields."""
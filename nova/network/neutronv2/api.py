@@ -604,15 +604,37 @@ class API(base_api.NetworkAPI):
         return result
 
     def _get_instance_nw_info(self, context, instance, networks=None,
-                              port_ids=None):
+                              port_ids=None, neutron_ports=None):
         # NOTE(danms): This is an inner method intended to be called
         # by other code that updates instance nwinfo. It *must* be
         # called with the refresh_cache-%(instance_uuid) lock held!
         LOG.debug('get_instance_nw_info()', instance=instance)
         nw_info = self._build_network_info_model(context, instance, networks,
-                                                 port_ids)
+                                                 port_ids, neutron_ports)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def _get_instance_nw_info_bulk(self, context, instances):
+        # NOTE: the ports of all the instances are listed with one request.
+        client = neutronv2.get_client(context, admin=True)
+        data = client.list_ports(
+            device_id=[instance['uuid'] for instance in instances])
+        ports_by_device = {}
+        for port in data.get('ports', []):
+            ports_by_device.setdefault(port['device_id'], []).append(port)
+
+        nw_infos = {}
+        for instance in instances:
+            ports = [port for port in
+                     ports_by_device.get(instance['uuid'], [])
+                     if port['tenant_id'] == instance['project_id']]
+            try:
+                nw_infos[instance['uuid']] = self._get_instance_nw_info(
+                    context, instance, neutron_ports=ports)
+            except Exception:
+                LOG.exception(_LE('Failed to get network info'),
+                              instance=instance)
+        return nw_infos
+
     def _gather_port_ids_and_networks(self, context, instance, networks=None,
                                       port_ids=None):
         """Return an instance's complete list of port_ids and networks."""
@@ -1337,7 +1359,7 @@ class API(base_api.NetworkAPI):
         return network, ovs_interfaceid
 
     def _build_network_info_model(self, context, instance, networks=None,
-                                  port_ids=None):
+                                  port_ids=None, neutron_ports=None):
         """Return list of ordered VIFs attached to instance.
 
         :param context - request context.
@@ -1349,14 +1371,18 @@ class API(base_api.NetworkAPI):
                           instance in order of attachment. If value is None
                           this value will be populated from the existing
                           cached value.
+        :param neutron_ports - List of the ports of the instance, if they
+                               have already been listed from Neutron.
         """
 
-        search_opts = {'tenant_id': instance['project_id'],
-                       'device_id': instance['uuid'], }
         client = neutronv2.get_client(context, admin=True)
-        data = client.list_ports(**search_opts)
+        if neutron_ports is None:
+            search_opts = {'tenant_id': instance['project_id'],
+                           'device_id': instance['uuid'], }
+            data = client.list_ports(**search_opts)
+            neutron_ports = data.get('ports', [])
 
-        current_neutron_ports = data.get('ports', [])
+        current_neutron_ports = neutron_ports
         networks, port_ids = self._gather_port_ids_and_networks(
                 context, instance, networks, port_ids)
         nw_info = network_model.NetworkInfo()
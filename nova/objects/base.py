@@ -92,6 +92,69 @@ def make_class_properties(cls):
         setattr(cls, name, property(getter, setter))
 
 
+def _defining_class(field_type, method):
+    for cls in type(field_type).__mro__:
+        if method in cls.__dict__:
+            return cls
+
+
+def _passes_through(field_type, method):
+    """Whether the field type leaves values unchanged in method."""
+    return _defining_class(field_type, method) is fields.FieldType
+
+
+def _make_encoder(field):
+    field_type = field._type
+    if _passes_through(field_type, 'to_primitive'):
+        # NOTE: strings, integers, booleans, etc. are their own primitive.
+        return None
+    if (isinstance(field_type, fields.List) and
+            isinstance(field_type._element_type._type, fields.Object)):
+        def encode_objects(obj, attr, value):
+            return [x.obj_to_primitive() if x is not None else None
+                    for x in value]
+        return encode_objects
+    return field.to_primitive
+
+
+def _make_decoder(field):
+    """Return the function which decodes the values of field, which are
+    never None.
+    """
+    field_type = field._type
+    if _passes_through(field_type, 'from_primitive'):
+        return field_type.coerce
+
+    def decode(obj, attr, value):
+        return field.coerce(obj, attr,
+                            field_type.from_primitive(obj, attr, value))
+    return decode
+
+
+def make_class_codecs(cls):
+    """Compile the per-field functions which (de)hydrate objects of cls.
+
+    This is done once when the class is registered, so that
+    obj_to_primitive() and obj_from_primitive() do not have to work out
+    how to handle each field of each object they are given.  The fields
+    whose type keeps values as they are, like strings and integers, are
+    copied to the primitive without any call at all.
+    """
+    cls._obj_encoders = []
+    cls._obj_decoders = []
+    cls._obj_object_fields = []
+    for name, field in sorted(cls.fields.items()):
+        attrname = get_attrname(name)
+        cls._obj_encoders.append((name, attrname, _make_encoder(field)))
+        cls._obj_decoders.append((name, attrname, _make_decoder(field),
+                                  field))
+        # NOTE: only these fields can hold an object whose own changes
+        # make this one changed; see obj_what_changed().
+        if (isinstance(field._type, fields.Object) or
+                _passes_through(field._type, 'coerce')):
+            cls._obj_object_fields.append((name, attrname))
+
+
 class NovaObjectMetaclass(type):
     """Metaclass that allows tracking of object classes."""
 
@@ -104,6 +167,7 @@ class NovaObjectMetaclass(type):
             # This means this is a base class using the metaclass. I.e.,
             # the 'NovaObject' class.
             cls._obj_classes = collections.defaultdict(list)
+            make_class_codecs(cls)
             return
 
         def _vers_tuple(obj):
@@ -113,6 +177,7 @@ class NovaObjectMetaclass(type):
         # same version already exists, replace it. Otherwise,
         # keep the list with newest version first.
         make_class_properties(cls)
+        make_class_codecs(cls)
         obj_name = cls.obj_name()
         for i, obj in enumerate(cls._obj_classes[obj_name]):
             if cls.VERSION == obj.VERSION:
@@ -294,10 +359,20 @@ class NovaObject(object):
         self.VERSION = objver
         objdata = primitive['nova_object.data']
         changes = primitive.get('nova_object.changes', [])
-        for name, field in self.fields.items():
-            if name in objdata:
-                setattr(self, name, field.from_primitive(self, name,
-                                                         objdata[name]))
+        for name, attrname, decode, field in cls._obj_decoders:
+            if name not in objdata:
+                continue
+            value = objdata[name]
+            if value is not None:
+                value = decode(self, name, value)
+            elif not field.nullable:
+                value = field.coerce(self, name, value)
+            if attrname in self.__dict__:
+                # NOTE: set by __init__(); go through the property so that
+                # read-only fields are still checked.
+                setattr(self, name, value)
+            else:
+                setattr(self, attrname, value)
         self._changed_fields = set([x for x in changes if x in self.fields])
         return self
 
@@ -368,21 +443,28 @@ class NovaObject(object):
     def obj_to_primitive(self, target_version=None):
         """Simple base-case dehydration.
 
-        This calls to_primitive() for each item in fields.
+        This calls to_primitive() for each item in fields, except those
+        whose values are already primitive.
         """
         primitive = dict()
-        for name, field in self.fields.items():
-            if self.obj_attr_is_set(name):
-                primitive[name] = field.to_primitive(self, name,
-                                                     getattr(self, name))
+        unset = NotSpecifiedSentinel
+        for name, attrname, encode in self._obj_encoders:
+            value = getattr(self, attrname, unset)
+            if value is unset:
+                continue
+            if encode is None or value is None:
+                primitive[name] = value
+            else:
+                primitive[name] = encode(self, name, value)
         if target_version:
             self.obj_make_compatible(primitive, target_version)
         obj = {'nova_object.name': self.obj_name(),
                'nova_object.namespace': 'nova',
                'nova_object.version': target_version or self.VERSION,
                'nova_object.data': primitive}
-        if self.obj_what_changed():
-            obj['nova_object.changes'] = list(self.obj_what_changed())
+        changes = self.obj_what_changed()
+        if changes:
+            obj['nova_object.changes'] = list(changes)
         return obj
 
     def obj_load_attr(self, attrname):
@@ -405,11 +487,10 @@ class NovaObject(object):
     def obj_what_changed(self):
         """Returns a set of fields that have been modified."""
         changes = set(self._changed_fields)
-        for field in self.fields:
-            if (self.obj_attr_is_set(field) and
-                    isinstance(self[field], NovaObject) and
-                    self[field].obj_what_changed()):
-                changes.add(field)
+        for name, attrname in self._obj_object_fields:
+            value = getattr(self, attrname, None)
+            if isinstance(value, NovaObject) and value.obj_what_changed():
+                changes.add(name)
         return changes
 
     def obj_get_changes(self):
@@ -436,7 +517,8 @@ class NovaObject(object):
         False if not. Raises AttributeError if attrname is not
         a valid attribute for this object.
         """
-        if attrname not in self.obj_fields:
+        if (attrname not in self.fields and
+                attrname not in self.obj_extra_fields):
             raise AttributeError(
                 _("%(objname)s object has no attribute '%(attrname)s'") %
                 {'objname': self.obj_name(), 'attrname': attrname})
@@ -624,6 +706,13 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
                   items from values having had action applied.
         """
         iterable = values.__class__
+        # NOTE: plain containers, by far the most common, are rebuilt
+        # directly.
+        if iterable is list:
+            return [action_fn(context, value) for value in values]
+        if iterable is dict:
+            return dict((k, action_fn(context, v))
+                        for k, v in six.iteritems(values))
         if issubclass(iterable, dict):
             return iterable(**dict((k, action_fn(context, v))
                             for k, v in six.iteritems(values)))
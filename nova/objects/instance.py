@@ -17,7 +17,7 @@ from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
 from nova import db
 from nova import exception
-from nova.i18n import _LE
+from nova.i18n import _, _LE
 from nova import notifications
 from nova import objects
 from nova.objects import base
@@ -46,6 +46,9 @@ INSTANCE_OPTIONAL_ATTRS = (_INSTANCE_OPTIONAL_JOINED_FIELDS +
 # These are fields that most query calls load by default
 INSTANCE_DEFAULT_FIELDS = ['metadata', 'system_metadata',
                            'info_cache', 'security_groups']
+# These are fields that InstanceList.get_projection_by_host() can read alone
+# as they are plain columns of the instances table
+_INSTANCE_PROJECTION_EXCLUDED_FIELDS = ['deleted', 'cleaned']
 
 
 def _expected_cols(expected_attrs):
@@ -528,15 +531,28 @@ class Instance(base.NovaPersistentObject, base.NovaObject):
         # trigger a lazy-load (which would mean we failed to calculate the
         # expected_attrs properly)
         current._context = None
+        self._refresh_from(current)
 
+    def _refresh_from(self, current):
+        """Update the fields that are set from a current copy of this
+        instance, which must have its info_cache loaded if this instance
+        has.
+        """
         for field in self.fields:
-            if self.obj_attr_is_set(field):
-                if field == 'info_cache':
-                    self.info_cache.refresh()
-                    # NOTE(danms): Make sure this shows up as touched
-                    self.info_cache = self.info_cache
-                elif self[field] != current[field]:
-                    self[field] = current[field]
+            if not self.obj_attr_is_set(field):
+                continue
+            if field == 'info_cache':
+                for cache_field in self.info_cache.fields:
+                    if (self.info_cache.obj_attr_is_set(cache_field) and
+                            self.info_cache[cache_field] !=
+                            current.info_cache[cache_field]):
+                        self.info_cache[cache_field] = (
+                            current.info_cache[cache_field])
+                self.info_cache.obj_reset_changes()
+                # NOTE(danms): Make sure this shows up as touched
+                self.info_cache = self.info_cache
+            elif self[field] != current[field]:
+                self[field] = current[field]
         self.obj_reset_changes()
 
     def _load_generic(self, attrname):
@@ -654,6 +670,76 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     return inst_list
 
 
+class InstanceRecord(object):
+    """A few fields of an instance, as read by
+    InstanceList.get_projection_by_host().
+
+    The fields which were read are slots of the record.  Reading any other
+    field loads the whole Instance, once, and reads it there.  A record
+    cannot be saved; load_instance() returns the Instance to change.
+    """
+    __slots__ = ('_context', '_instance')
+
+    def __init__(self, context, values):
+        self._context = context
+        self._instance = None
+        for name, value in values.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return 'InstanceRecord(%s)' % ','.join(
+            '%s=%r' % (name, getattr(self, name))
+            for name in sorted(self.__slots__))
+
+    def __getattr__(self, name):
+        # NOTE: only called for attributes the record does not have.
+        if name.startswith('_') or name not in Instance.fields:
+            raise AttributeError(name)
+        return getattr(self.load_instance(), name)
+
+    def __getitem__(self, name):
+        return getattr(self, name)
+
+    def get(self, name, default=None):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            return default
+
+    @property
+    def name(self):
+        try:
+            return CONF.instance_name_template % self.id
+        except TypeError:
+            info = dict((field, getattr(self, field))
+                        for field in type(self).__slots__)
+            try:
+                return CONF.instance_name_template % info
+            except KeyError:
+                return self.uuid
+
+    def load_instance(self, expected_attrs=None, use_slave=False):
+        """Return the whole Instance this is a record of."""
+        if self._instance is None:
+            self._instance = Instance.get_by_uuid(
+                self._context, self.uuid, expected_attrs=expected_attrs,
+                use_slave=use_slave)
+        return self._instance
+
+
+_RECORD_CLASSES = {}
+
+
+def _record_class(field_names):
+    """Return the InstanceRecord class with a slot for each field."""
+    field_names = tuple(sorted(field_names))
+    if field_names not in _RECORD_CLASSES:
+        _RECORD_CLASSES[field_names] = type('InstanceRecord',
+                                            (InstanceRecord,),
+                                            {'__slots__': field_names})
+    return _RECORD_CLASSES[field_names]
+
+
 class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Added use_slave to get_by_host
@@ -666,7 +752,9 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     # Version 1.7: Added use_slave to get_active_by_window_joined
     # Version 1.8: Instance <= version 1.14
     # Version 1.9: Instance <= version 1.15
-    VERSION = '1.9'
+    # Version 1.10: Added limit and marker_id to get_active_by_window_joined
+    # Version 1.11: Added get_projection_by_host()
+    VERSION = '1.11'
 
     fields = {
         'objects': fields.ListOfObjectsField('Instance'),
@@ -682,6 +770,8 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         '1.7': '1.13',
         '1.8': '1.14',
         '1.9': '1.15',
+        '1.10': '1.15',
+        '1.11': '1.15',
         }
 
     @base.remotable_classmethod
@@ -695,6 +785,41 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
+    @classmethod
+    def refresh_all(cls, context, instances, use_slave=False):
+        """Refresh a list of instances as Instance.refresh() does, with
+        one query for all of them.
+
+        Returns the refreshed instances, in order.  Instances which have
+        been deleted, or have lost their info_cache, are left out.
+        """
+        if not instances:
+            return []
+        extra = set(field for instance in instances
+                    for field in INSTANCE_OPTIONAL_ATTRS
+                    if instance.obj_attr_is_set(field))
+        filters = {'uuid': [instance.uuid for instance in instances],
+                   'deleted': False}
+        current_instances = dict(
+            (current.uuid, current) for current in cls.get_by_filters(
+                context, filters, expected_attrs=list(extra),
+                use_slave=use_slave))
+
+        refreshed = []
+        for instance in instances:
+            current = current_instances.get(instance.uuid)
+            if current is None:
+                continue
+            if (instance.obj_attr_is_set('info_cache') and
+                    current.info_cache is None):
+                continue
+            # NOTE(danms): We orphan the instance copy so we do not
+            # unexpectedly trigger a lazy-load
+            current._context = None
+            instance._refresh_from(current)
+            refreshed.append(instance)
+        return refreshed
+
     @base.remotable_classmethod
     def get_by_host(cls, context, host, expected_attrs=None, use_slave=False):
         db_inst_list = db.instance_get_all_by_host(
@@ -703,6 +828,48 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
+    @base.remotable_classmethod
+    def _get_projection_by_host(cls, context, host, columns,
+                                use_slave=False):
+        return db.instance_get_columns_by_host(context, host, columns,
+                                               use_slave=use_slave)
+
+    @classmethod
+    def get_projection_by_host(cls, context, host, field_names,
+                               use_slave=False):
+        """Get only some fields of the instances of a host.
+
+        This is for the periodic tasks, which go through every instance of
+        their host but only read a few fields of each.  The other fields,
+        and the joined ones, are not read from the database nor sent by the
+        conductor.
+
+        :param:context: nova request context
+        :param:host: the host of the instances
+        :param:field_names: the fields to read; the id and the uuid of the
+        instances, from which their name is made, are always read
+        :param use_slave if True, ship this query off to a DB slave
+        :returns: a list of InstanceRecord
+        """
+        field_names = (set(field_names) - set(['name'])) | set(['id', 'uuid'])
+        for name in field_names:
+            if (name not in Instance.fields or
+                    name in INSTANCE_OPTIONAL_ATTRS or
+                    name in _INSTANCE_PROJECTION_EXCLUDED_FIELDS):
+                raise ValueError(_('%s cannot be read in a projection of '
+                                   'instances') % name)
+        field_names = sorted(field_names)
+        record_class = _record_class(field_names)
+        records = []
+        for row in cls._get_projection_by_host(context, host, field_names,
+                                               use_slave=use_slave):
+            # NOTE: the values are coerced as the Instance would, which also
+            # turns back the datetimes the conductor sent as strings.
+            records.append(record_class(context, dict(
+                (name, Instance.fields[name].coerce(None, name, row[name]))
+                for name in field_names)))
+        return records
+
     @base.remotable_classmethod
     def get_by_host_and_node(cls, context, host, node, expected_attrs=None):
         db_inst_list = db.instance_get_all_by_host_and_node(
@@ -730,16 +897,16 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     def _get_active_by_window_joined(cls, context, begin, end=None,
                                     project_id=None, host=None,
                                     expected_attrs=None,
-                                    use_slave=False):
+                                    use_slave=False, limit=None,
+                                    marker_id=None):
         # NOTE(mriedem): We need to convert the begin/end timestamp strings
         # to timezone-aware datetime objects for the DB API call.
         begin = timeutils.parse_isotime(begin)
         end = timeutils.parse_isotime(end) if end else None
         db_inst_list = db.instance_get_active_by_window_joined(context,
-                                                               begin,
-                                                               end,
-                                                               project_id,
-                                                               host)
+                begin, end, project_id, host,
+                columns_to_join=_expected_cols(expected_attrs),
+                limit=limit, marker_id=marker_id)
         return _make_instance_list(context, cls(), db_inst_list,
                                    expected_attrs)
 
@@ -747,7 +914,8 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
     def get_active_by_window_joined(cls, context, begin, end=None,
                                     project_id=None, host=None,
                                     expected_attrs=None,
-                                    use_slave=False):
+                                    use_slave=False, limit=None,
+                                    marker_id=None):
         """Get instances and joins active during a certain time window.
 
         :param:context: nova request context
@@ -758,6 +926,9 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         :param:expected_attrs: list of related fields that can be joined
         in the database layer when querying for instances
         :param use_slave if True, ship this query off to a DB slave
+        :param:limit: return at most limit instances, in the order of
+        their id
+        :param:marker_id: return the instances after the one with this id
         :returns: InstanceList
 
         """
@@ -768,7 +939,9 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         return cls._get_active_by_window_joined(context, begin, end,
                                                 project_id, host,
                                                 expected_attrs,
-                                                use_slave=use_slave)
+                                                use_slave=use_slave,
+                                                limit=limit,
+                                                marker_id=marker_id)
 
     @base.remotable_classmethod
     def get_by_security_group_id(cls, context, security_group_id):
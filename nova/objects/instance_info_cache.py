@@ -108,3 +108,25 @@ class InstanceInfoCache(base.NovaPersistentObject, base.NovaObject):
                 self[field] = current[field]
 
         self.obj_reset_changes()
+
+
+class InstanceInfoCacheList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+    fields = {
+        'objects': fields.ListOfObjectsField('InstanceInfoCache'),
+    }
+    child_versions = {
+        '1.0': '1.5',
+    }
+
+    @base.remotable_classmethod
+    def update_network_info(cls, context, network_info_json):
+        """Store the network info of several instances at once.
+
+        :param network_info_json: dict of network info serialized with
+                                  NetworkInfo.json(), keyed by instance uuid
+        :returns: the uuids of the instances without an info cache, which
+                  are not updated
+        """
+        return db.instance_info_cache_update_many(context, network_info_json)
@@ -16,11 +16,13 @@
 
 """Quotas for instances, and floating ips."""
 
+import copy
 import datetime
 
 from oslo.config import cfg
 import six
 
+from nova import context as nova_context
 from nova import db
 from nova import exception
 from nova.i18n import _
@@ -90,12 +92,65 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='Default driver to use for quota checks'),
+    cfg.IntOpt('quota_cache_ttl',
+               default=0,
+               help='Number of seconds the quota limits, quota classes and '
+                    'default quotas read from the database are cached for. '
+                    'Changes made through this process invalidate the '
+                    'cache at once, changes made elsewhere are seen after '
+                    'at most this long. 0 disables the cache'),
+    cfg.IntOpt('quota_usage_cache_ttl',
+               default=0,
+               help='Number of seconds the quota usages reported by the '
+                    'quota and limits APIs are cached for. Quota checks '
+                    'always use the current usages. 0 disables the cache'),
     ]
 
 CONF = cfg.CONF
 CONF.register_opts(quota_opts)
 
 
+class QuotaCache(object):
+    """Cache of quota rows read from the database, each kept for a
+    number of seconds.
+
+    Keys are tuples whose second item, if any, is the project ID the
+    entry belongs to.  Callers get a copy of the cached value, which
+    they are free to modify.
+    """
+
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, key, ttl, fetch, authorize=None):
+        """Return the cached value of key, calling fetch() to get it if
+        it is not cached, or expired.  Nothing is cached if ttl is not
+        positive.
+
+        authorize() is called instead of fetch() when the value is
+        cached, to make the access checks that fetch() would have made.
+        """
+        if ttl <= 0:
+            return fetch()
+        now = timeutils.utcnow_ts()
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= now:
+            entry = (now + ttl, fetch())
+            self._entries[key] = entry
+        elif authorize is not None:
+            authorize()
+        return copy.deepcopy(entry[1])
+
+    def invalidate(self, project_id=None):
+        """Drop the entries of a project, or all the entries."""
+        if project_id is None:
+            self._entries.clear()
+            return
+        for key in self._entries.keys():
+            if len(key) > 1 and key[1] == project_id:
+                del self._entries[key]
+
+
 class DbQuotaDriver(object):
     """Driver to perform necessary checks to enforce quotas and obtain
     quota information.  The default driver utilizes the local
@@ -103,6 +158,62 @@ class DbQuotaDriver(object):
     """
     UNLIMITED_VALUE = -1
 
+    def __init__(self):
+        self._limit_cache = QuotaCache()
+        self._usage_cache = QuotaCache()
+
+    def invalidate_cache(self, project_id=None):
+        """Forget the cached quotas and usages of a project, or of all
+        projects and quota classes if project_id is None.
+        """
+        self._limit_cache.invalidate(project_id)
+        self._usage_cache.invalidate(project_id)
+
+    # NOTE: on a cache hit, the access checks that the database API
+    # would have made are made here instead.
+
+    def _get_default_quotas(self, context):
+        return self._limit_cache.get(
+            ('default',), CONF.quota_cache_ttl,
+            lambda: db.quota_class_get_default(context))
+
+    def _get_class_quotas(self, context, quota_class):
+        return self._limit_cache.get(
+            ('class', quota_class), CONF.quota_cache_ttl,
+            lambda: db.quota_class_get_all_by_name(context, quota_class),
+            lambda: nova_context.authorize_quota_class_context(context,
+                                                               quota_class))
+
+    def _get_project_quotas(self, context, project_id):
+        return self._limit_cache.get(
+            ('project', project_id), CONF.quota_cache_ttl,
+            lambda: db.quota_get_all_by_project(context, project_id),
+            lambda: nova_context.authorize_project_context(context,
+                                                           project_id))
+
+    def _get_project_user_quotas(self, context, project_id, user_id):
+        return self._limit_cache.get(
+            ('user', project_id, user_id), CONF.quota_cache_ttl,
+            lambda: db.quota_get_all_by_project_and_user(context, project_id,
+                                                         user_id),
+            lambda: nova_context.authorize_project_context(context,
+                                                           project_id))
+
+    def _get_project_usages(self, context, project_id):
+        return self._usage_cache.get(
+            ('project', project_id), CONF.quota_usage_cache_ttl,
+            lambda: db.quota_usage_get_all_by_project(context, project_id),
+            lambda: nova_context.authorize_project_context(context,
+                                                           project_id))
+
+    def _get_project_user_usages(self, context, project_id, user_id):
+        return self._usage_cache.get(
+            ('user', project_id, user_id), CONF.quota_usage_cache_ttl,
+            lambda: db.quota_usage_get_all_by_project_and_user(
+                context, project_id, user_id),
+            lambda: nova_context.authorize_project_context(context,
+                                                           project_id))
+
     def get_by_project_and_user(self, context, project_id, user_id, resource):
         """Get a specific quota by project and user."""
 
@@ -128,7 +239,7 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        default_quotas = db.quota_class_get_default(context)
+        default_quotas = self._get_default_quotas(context)
         for resource in resources.values():
             quotas[resource.name] = default_quotas.get(resource.name,
                                                        resource.default)
@@ -150,7 +261,7 @@ class DbQuotaDriver(object):
         """
 
         quotas = {}
-        class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+        class_quotas = self._get_class_quotas(context, quota_class)
         for resource in resources.values():
             if defaults or resource.name in class_quotas:
                 quotas[resource.name] = class_quotas.get(resource.name,
@@ -169,7 +280,7 @@ class DbQuotaDriver(object):
         if project_id == context.project_id:
             quota_class = context.quota_class
         if quota_class:
-            class_quotas = db.quota_class_get_all_by_name(context, quota_class)
+            class_quotas = self._get_class_quotas(context, quota_class)
         else:
             class_quotas = {}
 
@@ -232,19 +343,18 @@ class DbQuotaDriver(object):
         :param user_quotas: Quotas dictionary for the specified project
                             and user.
         """
-        user_quotas = user_quotas or db.quota_get_all_by_project_and_user(
+        user_quotas = user_quotas or self._get_project_user_quotas(
             context, project_id, user_id)
         # Use the project quota for default user quota.
-        proj_quotas = project_quotas or db.quota_get_all_by_project(
+        proj_quotas = project_quotas or self._get_project_quotas(
             context, project_id)
         for key, value in proj_quotas.iteritems():
             if key not in user_quotas.keys():
                 user_quotas[key] = value
         user_usages = None
         if usages:
-            user_usages = db.quota_usage_get_all_by_project_and_user(context,
-                                                         project_id,
-                                                         user_id)
+            user_usages = self._get_project_user_usages(context, project_id,
+                                                        user_id)
         return self._process_quotas(context, resources, project_id,
                                     user_quotas, quota_class,
                                     defaults=defaults, usages=user_usages)
@@ -273,12 +383,11 @@ class DbQuotaDriver(object):
                         will be returned.
         :param project_quotas: Quotas dictionary for the specified project.
         """
-        project_quotas = project_quotas or db.quota_get_all_by_project(
+        project_quotas = project_quotas or self._get_project_quotas(
             context, project_id)
         project_usages = None
         if usages:
-            project_usages = db.quota_usage_get_all_by_project(context,
-                                                               project_id)
+            project_usages = self._get_project_usages(context, project_id)
         return self._process_quotas(context, resources, project_id,
                                     project_quotas, quota_class,
                                     defaults=defaults, usages=project_usages,
@@ -442,7 +551,7 @@ class DbQuotaDriver(object):
             user_id = context.user_id
 
         # Get the applicable quotas
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_quotas(context, project_id)
         quotas = self._get_quotas(context, resources, values.keys(),
                                   has_sync=False, project_id=project_id,
                                   project_quotas=project_quotas)
@@ -527,7 +636,7 @@ class DbQuotaDriver(object):
         # NOTE(Vek): We're not worried about races at this point.
         #            Yes, the admin may be in the process of reducing
         #            quotas, but that's a pretty rare thing.
-        project_quotas = db.quota_get_all_by_project(context, project_id)
+        project_quotas = self._get_project_quotas(context, project_id)
         quotas = self._get_quotas(context, resources, deltas.keys(),
                                   has_sync=True, project_id=project_id,
                                   project_quotas=project_quotas)
@@ -541,6 +650,14 @@ class DbQuotaDriver(object):
         #            which means access to the session.  Since the
         #            session isn't available outside the DBAPI, we
         #            have to do the work there.
+        try:
+            return self._reserve(context, resources, quotas, user_quotas,
+                                 deltas, expire, project_id, user_id)
+        finally:
+            self._usage_cache.invalidate(project_id)
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
         return db.quota_reserve(context, resources, quotas, user_quotas,
                                 deltas, expire,
                                 CONF.until_refresh, CONF.max_age,
@@ -568,6 +685,7 @@ class DbQuotaDriver(object):
 
         db.reservation_commit(context, reservations, project_id=project_id,
                               user_id=user_id)
+        self._usage_cache.invalidate(project_id)
 
     def rollback(self, context, reservations, project_id=None, user_id=None):
         """Roll back reservations.
@@ -591,6 +709,7 @@ class DbQuotaDriver(object):
 
         db.reservation_rollback(context, reservations, project_id=project_id,
                                 user_id=user_id)
+        self._usage_cache.invalidate(project_id)
 
     def usage_reset(self, context, resources):
         """Reset the usage records for a particular user on a list of
@@ -620,6 +739,7 @@ class DbQuotaDriver(object):
             except exception.QuotaUsageNotFound:
                 # That means it'll be refreshed anyway
                 pass
+        self._usage_cache.invalidate(context.project_id)
 
     def destroy_all_by_project_and_user(self, context, project_id, user_id):
         """Destroy all quotas, usages, and reservations associated with a
@@ -631,6 +751,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project_and_user(context, project_id, user_id)
+        self.invalidate_cache(project_id)
 
     def destroy_all_by_project(self, context, project_id):
         """Destroy all quotas, usages, and reservations associated with a
@@ -641,6 +762,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self.invalidate_cache(project_id)
 
     def expire(self, context):
         """Expire reservations.
@@ -652,6 +774,56 @@ class DbQuotaDriver(object):
         """
 
         db.reservation_expire(context)
+        self._usage_cache.invalidate()
+
+
+class CasQuotaDriver(DbQuotaDriver):
+    """Driver that reserves quota with compare-and-swap updates of the
+    usage counters instead of locking all the usages of the project.
+
+    Each usage is updated with a single UPDATE that only matches while
+    the user and project quotas still have room for the delta, so
+    concurrent reservations for one project do not wait on each other's
+    row locks.  Reservations whose usages are missing or due for a
+    refresh go through the regular DbQuotaDriver path.
+    """
+
+    def _reserve(self, context, resources, quotas, user_quotas, deltas,
+                 expire, project_id, user_id):
+        reservations = db.quota_reserve_cas(context, resources, quotas,
+                                            user_quotas, deltas, expire,
+                                            CONF.until_refresh, CONF.max_age,
+                                            project_id=project_id,
+                                            user_id=user_id)
+        if reservations is None:
+            reservations = super(CasQuotaDriver, self)._reserve(
+                context, resources, quotas, user_quotas, deltas, expire,
+                project_id, user_id)
+        return reservations
+
+    def commit(self, context, reservations, project_id=None, user_id=None):
+        """Commit reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the reservations know their usages.
+        :param user_id: Unused, the reservations know their usages.
+        """
+        db.reservation_commit_cas(context, reservations)
+        self._usage_cache.invalidate(project_id or context.project_id)
+
+    def rollback(self, context, reservations, project_id=None, user_id=None):
+        """Roll back reservations.
+
+        :param context: The request context, for access checks.
+        :param reservations: A list of the reservation UUIDs, as
+                             returned by the reserve() method.
+        :param project_id: Unused, the reservations know their usages.
+        :param user_id: Unused, the reservations know their usages.
+        """
+        db.reservation_rollback_cas(context, reservations)
+        self._usage_cache.invalidate(project_id or context.project_id)
 
 
 class NoopQuotaDriver(object):
@@ -662,6 +834,10 @@ class NoopQuotaDriver(object):
     should not.
     """
 
+    def invalidate_cache(self, project_id=None):
+        """Forget the cached quotas of a project, or of all projects."""
+        pass
+
     def get_by_project_and_user(self, context, project_id, user_id, resource):
         """Get a specific quota by project and user."""
         # Unlimited
@@ -1407,6 +1583,16 @@ class QuotaEngine(object):
 
         self._driver.expire(context)
 
+    def invalidate_cache(self, project_id=None):
+        """Forget the cached quotas and usages of a project, or of all
+        projects and quota classes if project_id is None.  Must be called
+        when quotas are changed other than through this engine.
+
+        :param project_id: The ID of the project whose quotas changed.
+        """
+
+        self._driver.invalidate_cache(project_id)
+
     @property
     def resources(self):
         return sorted(self._resources.keys())
@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo.config import cfg
@@ -47,7 +48,13 @@ filter_scheduler_opts = [
                     'chosen from. A value of 1 chooses the '
                     'first host returned by the weighing functions. '
                     'This value must be at least 1. Any value less than 1 '
-                    'will be ignored, and 1 will be used instead')
+                    'will be ignored, and 1 will be used instead'),
+    cfg.BoolOpt('scheduler_batch_placement',
+                default=False,
+                help='Filter and weigh all hosts only once for a request '
+                     'with several instances. After each placement only the '
+                     'chosen host is filtered and weighed again; the other '
+                     'hosts keep the weight they got in the first pass.'),
 ]
 
 CONF.register_opts(filter_scheduler_opts)
@@ -265,11 +272,16 @@ class FilterScheduler(driver.Scheduler):
         # are being scanned in a filter or weighing function.
         hosts = self._get_all_host_states(elevated)
 
-        selected_hosts = []
         if instance_uuids:
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+        if CONF.scheduler_batch_placement and num_instances > 1:
+            return self._schedule_batch(hosts, num_instances,
+                    instance_properties, filter_properties,
+                    update_group_hosts)
+
+        selected_hosts = []
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -285,33 +297,120 @@ class FilterScheduler(driver.Scheduler):
 
             LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
-            if scheduler_host_subset_size > len(weighed_hosts):
-                scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
-
+            scheduler_host_subset_size = self._get_host_subset_size(
+                    len(weighed_hosts))
             chosen_host = random.choice(
                 weighed_hosts[0:scheduler_host_subset_size])
             selected_hosts.append(chosen_host)
 
             # Now consume the resources so the filter/weights
             # will change for the next instance.
-            # NOTE (baoli) adding and deleting pci_requests is a temporary
-            # fix to avoid DB access in consume_from_instance() while getting
-            # pci_requests. The change can be removed once pci_requests is
-            # part of the instance object that is passed into the scheduler
-            # APIs
-            pci_requests = filter_properties.get('pci_requests')
-            if pci_requests:
-                instance_properties['pci_requests'] = pci_requests
-            chosen_host.obj.consume_from_instance(instance_properties)
-            if pci_requests:
-                del instance_properties['pci_requests']
+            self._consume_from_host(chosen_host, instance_properties,
+                    filter_properties, update_group_hosts)
+        return selected_hosts
+
+    def _schedule_batch(self, hosts, num_instances, instance_properties,
+                        filter_properties, update_group_hosts):
+        """Choose hosts for num_instances instances, filtering and weighing
+        all hosts only once.
+
+        Placing an instance only changes the state of the chosen host, so
+        only that host is filtered and weighed again before the next
+        placement; the other hosts stay in a heap ordered by weight.  For
+        server groups all remaining hosts are filtered again, as the group
+        filters decide on every host from the hosts chosen so far.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties, index=0)
+        if not hosts:
+            return []
+
+        LOG.debug("Filtered %(hosts)s", {'hosts': hosts})
+
+        weighers = self.host_manager.get_weighers()
+        weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
+                filter_properties, weighers=weighers)
+
+        LOG.debug("Weighed %(hosts)s", {'hosts': weighed_hosts})
+
+        # Equal weights are ordered like the filtered hosts, as the stable
+        # sort of the weight handler does.
+        position = dict((id(host), i) for i, host in enumerate(hosts))
+        heap = [(-weighed_host.weight, position[id(weighed_host.obj)],
+                 weighed_host) for weighed_host in weighed_hosts]
+        heapq.heapify(heap)
+        candidates = set(position)
+
+        selected_hosts = []
+        for num in xrange(num_instances):
+            subset = []
+            subset_size = self._get_host_subset_size(len(candidates))
+            while heap and len(subset) < subset_size:
+                entry = heapq.heappop(heap)
+                # Skip hosts dropped by filtering all hosts again.
+                if id(entry[2].obj) in candidates:
+                    subset.append(entry)
+            if not subset:
+                break
+
+            chosen = random.choice(subset)
+            for entry in subset:
+                if entry is not chosen:
+                    heapq.heappush(heap, entry)
+            chosen_host = chosen[2]
+            selected_hosts.append(chosen_host)
+            self._consume_from_host(chosen_host, instance_properties,
+                    filter_properties, update_group_hosts)
+            if num + 1 == num_instances:
+                break
+
             if update_group_hosts is True:
-                filter_properties['group_hosts'].add(chosen_host.obj.host)
+                hosts = self.host_manager.get_filtered_hosts(hosts,
+                        filter_properties, index=num + 1)
+                if not hosts:
+                    break
+                candidates = set(id(host) for host in hosts)
+            elif not self.host_manager.get_filtered_hosts([chosen_host.obj],
+                    filter_properties, index=num + 1):
+                candidates.discard(id(chosen_host.obj))
+
+            if id(chosen_host.obj) in candidates:
+                weighed_host = self.host_manager.weigh_host(weighers,
+                        chosen_host.obj, filter_properties)
+                heapq.heappush(heap, (-weighed_host.weight, chosen[1],
+                                      weighed_host))
         return selected_hosts
 
+    def _get_host_subset_size(self, num_hosts):
+        """Return how many of the best hosts a host is randomly chosen
+        from.
+        """
+        scheduler_host_subset_size = CONF.scheduler_host_subset_size
+        if scheduler_host_subset_size > num_hosts:
+            scheduler_host_subset_size = num_hosts
+        if scheduler_host_subset_size < 1:
+            scheduler_host_subset_size = 1
+        return scheduler_host_subset_size
+
+    def _consume_from_host(self, chosen_host, instance_properties,
+                           filter_properties, update_group_hosts):
+        """Virtually consume the resources of an instance on the chosen
+        host, so that filters and weights see them for the next instance.
+        """
+        # NOTE (baoli) adding and deleting pci_requests is a temporary
+        # fix to avoid DB access in consume_from_instance() while getting
+        # pci_requests. The change can be removed once pci_requests is
+        # part of the instance object that is passed into the scheduler
+        # APIs
+        pci_requests = filter_properties.get('pci_requests')
+        if pci_requests:
+            instance_properties['pci_requests'] = pci_requests
+        chosen_host.obj.consume_from_instance(instance_properties)
+        if pci_requests:
+            del instance_properties['pci_requests']
+        if update_group_hosts is True:
+            filter_properties['group_hosts'].add(chosen_host.obj.host)
+
     def _get_all_host_states(self, context):
         """Template method, so a subclass can implement caching."""
         return self.host_manager.get_all_host_states(context)
@@ -18,6 +18,11 @@ Scheduler host filters
 """
 
 from nova import filters
+from nova.i18n import _
+from nova.openstack.common import log as logging
+from nova.scheduler import host_table
+
+LOG = logging.getLogger(__name__)
 
 
 class BaseHostFilter(filters.BaseFilter):
@@ -32,11 +37,48 @@ class BaseHostFilter(filters.BaseFilter):
         """
         raise NotImplementedError()
 
+    # Set to a method in a subclass to let the filter run over a whole
+    # host_table.HostTable at once.  It takes the table and the filter
+    # properties and returns a boolean array with one entry per row,
+    # with the same side effects on the passing hosts as host_passes().
+    filter_table = None
+
 
 class HostFilterHandler(filters.BaseFilterHandler):
     def __init__(self):
         super(HostFilterHandler, self).__init__(BaseHostFilter)
 
+    def get_filtered_objects(self, filter_classes, objs,
+            filter_properties, index=0):
+        if not host_table.is_enabled():
+            return super(HostFilterHandler, self).get_filtered_objects(
+                    filter_classes, objs, filter_properties, index=index)
+
+        table = host_table.HostTable(objs)
+        LOG.debug("Starting with %d host(s)", len(table))
+        for filter_cls in filter_classes:
+            cls_name = filter_cls.__name__
+            filter = filter_cls()
+
+            if not filter.run_filter_for_index(index):
+                continue
+            if filter.filter_table is not None:
+                table = table.select(
+                        filter.filter_table(table, filter_properties))
+            else:
+                objs = filter.filter_all(table.hosts, filter_properties)
+                if objs is None:
+                    LOG.debug("Filter %(cls_name)s says to stop filtering",
+                              {'cls_name': cls_name})
+                    return
+                table = table.select_hosts(list(objs))
+            if not len(table):
+                LOG.info(_("Filter %s returned 0 hosts"), cls_name)
+                break
+            LOG.debug("Filter %(cls_name)s returned %(obj_len)d host(s)",
+                      {'cls_name': cls_name, 'obj_len': len(table)})
+        return table.hosts
+
 
 def all_filters():
     """Return a list of filter classes found in this directory.
@@ -30,49 +30,69 @@ class AffinityFilter(filters.BaseHostFilter):
         self.compute_api = compute.API()
 
 
-class DifferentHostFilter(AffinityFilter):
-    '''Schedule the instance on a different host from a set of instances.'''
+class _InstanceHostsAffinityFilter(AffinityFilter):
+    """Base class for filters checking hosts against the hosts of a set of
+    instances given in a scheduler hint.
+
+    The hosts of those instances are looked up with a single query for all
+    the hosts being filtered, instead of one query per host.
+    """
 
     # The hosts the instances are running on doesn't change within a request
     run_filter_once_per_request = True
 
-    def host_passes(self, host_state, filter_properties):
-        context = filter_properties['context']
+    def _get_affinity_hosts(self, filter_properties):
+        """Return the set of hosts running the hinted instances, or None if
+        there is no hint.
+        """
         scheduler_hints = filter_properties.get('scheduler_hints') or {}
 
-        affinity_uuids = scheduler_hints.get('different_host', [])
+        affinity_uuids = scheduler_hints.get(self.hint_name, [])
         if isinstance(affinity_uuids, six.string_types):
             affinity_uuids = [affinity_uuids]
-        if affinity_uuids:
-            return not self.compute_api.get_all(context,
-                                                {'host': host_state.host,
-                                                 'uuid': affinity_uuids,
-                                                 'deleted': False})
-        # With no different_host key
-        return True
+        if not affinity_uuids:
+            return None
+
+        instances = self.compute_api.get_all(filter_properties['context'],
+                                             {'uuid': affinity_uuids,
+                                              'deleted': False})
+        return set(instance['host'] for instance in instances)
+
+    def _host_passes(self, host_state, affinity_hosts):
+        raise NotImplementedError()
+
+    def filter_all(self, filter_obj_list, filter_properties):
+        affinity_hosts = self._get_affinity_hosts(filter_properties)
+        for host_state in filter_obj_list:
+            if (affinity_hosts is None or
+                    self._host_passes(host_state, affinity_hosts)):
+                yield host_state
+
+    def host_passes(self, host_state, filter_properties):
+        affinity_hosts = self._get_affinity_hosts(filter_properties)
+        if affinity_hosts is None:
+            return True
+        return self._host_passes(host_state, affinity_hosts)
+
 
+class DifferentHostFilter(_InstanceHostsAffinityFilter):
+    '''Schedule the instance on a different host from a set of instances.'''
+
+    hint_name = 'different_host'
+
+    def _host_passes(self, host_state, affinity_hosts):
+        return host_state.host not in affinity_hosts
 
-class SameHostFilter(AffinityFilter):
+
+class SameHostFilter(_InstanceHostsAffinityFilter):
     '''Schedule the instance on the same host as another instance in a set of
     instances.
     '''
 
-    # The hosts the instances are running on doesn't change within a request
-    run_filter_once_per_request = True
-
-    def host_passes(self, host_state, filter_properties):
-        context = filter_properties['context']
-        scheduler_hints = filter_properties.get('scheduler_hints') or {}
+    hint_name = 'same_host'
 
-        affinity_uuids = scheduler_hints.get('same_host', [])
-        if isinstance(affinity_uuids, six.string_types):
-            affinity_uuids = [affinity_uuids]
-        if affinity_uuids:
-            return self.compute_api.get_all(context, {'host': host_state.host,
-                                                      'uuid': affinity_uuids,
-                                                      'deleted': False})
-        # With no same_host key
-        return True
+    def _host_passes(self, host_state, affinity_hosts):
+        return host_state.host in affinity_hosts
 
 
 class SimpleCIDRAffinityFilter(AffinityFilter):
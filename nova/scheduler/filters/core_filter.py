@@ -20,6 +20,7 @@ from oslo.config import cfg
 from nova.i18n import _LW
 from nova.openstack.common import log as logging
 from nova.scheduler import filters
+from nova.scheduler import host_table
 from nova.scheduler.filters import utils
 
 LOG = logging.getLogger(__name__)
@@ -80,6 +81,23 @@ class CoreFilter(BaseCoreFilter):
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
         return CONF.cpu_allocation_ratio
 
+    def filter_table(self, table, filter_properties):
+        """Vectorized host_passes() over a HostTable."""
+        instance_type = filter_properties.get('instance_type')
+        if not instance_type:
+            return host_table.np.ones(len(table), dtype=bool)
+
+        not_reported = table.vcpus_total == 0
+        if not_reported.any():
+            # Fail safe
+            LOG.warning(_LW("VCPUs not set; assuming CPU collection broken"))
+
+        vcpus_total = table.vcpus_total * CONF.cpu_allocation_ratio
+        free_vcpus = vcpus_total - table.vcpus_used
+        passes = not_reported | (free_vcpus >= instance_type['vcpus'])
+        table.set_limits(passes & (vcpus_total > 0), 'vcpu', vcpus_total)
+        return passes
+
 
 class AggregateCoreFilter(BaseCoreFilter):
     """AggregateCoreFilter with per-aggregate CPU subscription flag.
@@ -88,12 +106,9 @@ class AggregateCoreFilter(BaseCoreFilter):
     """
 
     def _get_cpu_allocation_ratio(self, host_state, filter_properties):
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solution here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
+        aggregate_vals = utils.aggregate_values_from_key(
             filter_properties['context'],
-            host_state.host,
+            host_state,
             'cpu_allocation_ratio')
         try:
             ratio = utils.validate_num_values(
@@ -64,6 +64,20 @@ class DiskFilter(filters.BaseHostFilter):
         host_state.limits['disk_gb'] = disk_gb_limit
         return True
 
+    def filter_table(self, table, filter_properties):
+        """Vectorized host_passes() over a HostTable."""
+        instance_type = filter_properties.get('instance_type')
+        requested_disk = (1024 * (instance_type['root_gb'] +
+                                 instance_type['ephemeral_gb']) +
+                         instance_type['swap'])
+
+        total_usable_disk_mb = table.total_usable_disk_gb * 1024
+        disk_mb_limit = total_usable_disk_mb * CONF.disk_allocation_ratio
+        used_disk_mb = total_usable_disk_mb - table.free_disk_mb
+        passes = disk_mb_limit - used_disk_mb >= requested_disk
+        table.set_limits(passes, 'disk_gb', disk_mb_limit / 1024)
+        return passes
+
 
 class AggregateDiskFilter(DiskFilter):
     """AggregateDiskFilter with per-aggregate disk allocation ratio flag.
@@ -72,13 +86,13 @@ class AggregateDiskFilter(DiskFilter):
     found.
     """
 
+    # The allocation ratio depends on the aggregates of each host.
+    filter_table = None
+
     def _get_disk_allocation_ratio(self, host_state, filter_properties):
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solution here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
+        aggregate_vals = utils.aggregate_values_from_key(
             filter_properties['context'],
-            host_state.host,
+            host_state,
             'disk_allocation_ratio')
         try:
             ratio = utils.validate_num_values(
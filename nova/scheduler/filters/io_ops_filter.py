@@ -54,6 +54,10 @@ class IoOpsFilter(filters.BaseHostFilter):
                          'max_io_ops': max_io_ops})
         return passes
 
+    def filter_table(self, table, filter_properties):
+        """Vectorized host_passes() over a HostTable."""
+        return table.num_io_ops < CONF.max_io_ops_per_host
+
 
 class AggregateIoOpsFilter(IoOpsFilter):
     """AggregateIoOpsFilter with per-aggregate the max io operations.
@@ -61,13 +65,13 @@ class AggregateIoOpsFilter(IoOpsFilter):
     Fall back to global max_io_ops_per_host if no per-aggregate setting found.
     """
 
+    # The limit depends on the aggregates of each host.
+    filter_table = None
+
     def _get_max_io_ops_per_host(self, host_state, filter_properties):
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solution here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
+        aggregate_vals = utils.aggregate_values_from_key(
             filter_properties['context'],
-            host_state.host,
+            host_state,
             'max_io_ops_per_host')
         try:
             value = utils.validate_num_values(
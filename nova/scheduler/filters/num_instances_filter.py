@@ -48,6 +48,10 @@ class NumInstancesFilter(filters.BaseHostFilter):
                          'max_instances': max_instances})
         return passes
 
+    def filter_table(self, table, filter_properties):
+        """Vectorized host_passes() over a HostTable."""
+        return table.num_instances < CONF.max_instances_per_host
+
 
 class AggregateNumInstancesFilter(NumInstancesFilter):
     """AggregateNumInstancesFilter with per-aggregate the max num instances.
@@ -56,13 +60,13 @@ class AggregateNumInstancesFilter(NumInstancesFilter):
     found.
     """
 
+    # The limit depends on the aggregates of each host.
+    filter_table = None
+
     def _get_max_instances_per_host(self, host_state, filter_properties):
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solutnumn here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
+        aggregate_vals = utils.aggregate_values_from_key(
             filter_properties['context'],
-            host_state.host,
+            host_state,
             'max_instances_per_host')
         try:
             value = utils.validate_num_values(
@@ -72,6 +72,15 @@ class RamFilter(BaseRamFilter):
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
         return self.ram_allocation_ratio
 
+    def filter_table(self, table, filter_properties):
+        """Vectorized host_passes() over a HostTable."""
+        requested_ram = filter_properties.get('instance_type')['memory_mb']
+        memory_mb_limit = table.total_usable_ram_mb * self.ram_allocation_ratio
+        used_ram_mb = table.total_usable_ram_mb - table.free_ram_mb
+        passes = memory_mb_limit - used_ram_mb >= requested_ram
+        table.set_limits(passes, 'memory_mb', memory_mb_limit)
+        return passes
+
 
 class AggregateRamFilter(BaseRamFilter):
     """AggregateRamFilter with per-aggregate ram subscription flag.
@@ -80,12 +89,9 @@ class AggregateRamFilter(BaseRamFilter):
     """
 
     def _get_ram_allocation_ratio(self, host_state, filter_properties):
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solution here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
+        aggregate_vals = utils.aggregate_values_from_key(
             filter_properties['context'],
-            host_state.host,
+            host_state,
             'ram_allocation_ratio')
 
         try:
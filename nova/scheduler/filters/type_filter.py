@@ -39,6 +39,19 @@ class TypeAffinityFilter(filters.BaseHostFilter):
                      context, host_state.host, instance_type['id'])
         return len(instances_other_type) == 0
 
+    def filter_all(self, filter_obj_list, filter_properties):
+        """Look up the instance types of all hosts with a single query
+        rather than one query per host.
+        """
+        instance_type = filter_properties.get('instance_type')
+        context = filter_properties['context'].elevated()
+        type_ids_by_host = db.instance_type_ids_get_all_by_host(context)
+        requested_type_ids = set([instance_type['id']])
+        for host_state in filter_obj_list:
+            type_ids = type_ids_by_host.get(host_state.host, set())
+            if type_ids <= requested_type_ids:
+                yield host_state
+
 
 class AggregateTypeAffinityFilter(filters.BaseHostFilter):
     """AggregateTypeAffinityFilter limits instance_type by aggregate
@@ -53,11 +66,8 @@ class AggregateTypeAffinityFilter(filters.BaseHostFilter):
     def host_passes(self, host_state, filter_properties):
         instance_type = filter_properties.get('instance_type')
 
-        # TODO(uni): DB query in filter is a performance hit, especially for
-        # system with lots of hosts. Will need a general solution here to fix
-        # all filters with aggregate DB call things.
-        aggregate_vals = utils.aggregate_values_from_db(
-            filter_properties['context'], host_state.host, 'instance_type')
+        aggregate_vals = utils.aggregate_values_from_key(
+            filter_properties['context'], host_state, 'instance_type')
 
         if not aggregate_vals:
             return True
@@ -14,7 +14,9 @@
 
 """Bench of utility methods used by filters."""
 
+import collections
 
+from nova import db
 from nova.i18n import _LI
 from nova.objects import aggregate
 from nova.openstack.common import log as logging
@@ -24,15 +26,42 @@ LOG = logging.getLogger(__name__)
 
 def aggregate_values_from_db(context, host, key_name):
     """Returns a set of values based on a metadata key for a specific host."""
-    # TODO(sahid): DB query in filter is a performance hit, especially for
-    # system with lots of hosts. Will need a general solution here to fix
-    # all filters with aggregate DB call things.
     aggrlist = aggregate.AggregateList.get_by_host(
         context.elevated(), host, key=key_name)
     aggregate_vals = set(aggr.metadata[key_name] for aggr in aggrlist)
     return aggregate_vals
 
 
+def aggregate_metadata_get_by_host(context, host_state, key=None):
+    """Returns a dict of sets of aggregate metadata values for a host.
+
+    The aggregates attached to the host state by the HostManager for the
+    current request are used, so no DB query is made. Host states that
+    were built without aggregates fall back to the DB.
+    """
+    if host_state.aggregates is None:
+        return db.aggregate_metadata_get_by_host(context, host_state.host,
+                                                 key=key)
+    metadata = collections.defaultdict(set)
+    for aggr in host_state.aggregates:
+        for k, v in aggr.metadata.iteritems():
+            if key is None or k == key:
+                metadata[k].add(v)
+    return dict(metadata)
+
+
+def aggregate_values_from_key(context, host_state, key_name):
+    """Returns a set of values based on a metadata key for a specific host.
+
+    Like aggregate_metadata_get_by_host(), this only goes to the DB when
+    the host state has no aggregates attached.
+    """
+    if host_state.aggregates is None:
+        return aggregate_values_from_db(context, host_state.host, key_name)
+    return set(aggr.metadata[key_name] for aggr in host_state.aggregates
+               if key_name in aggr.metadata)
+
+
 def validate_num_values(vals, default=None, cast_to=int, based_on=min):
     """Returns a corretly casted value based on a set of values.
 
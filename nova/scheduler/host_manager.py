@@ -18,6 +18,7 @@ Manage hosts in the current zone.
 """
 
 import collections
+import datetime
 import UserDict
 
 from oslo.config import cfg
@@ -27,6 +28,7 @@ from nova.compute import vm_states
 from nova import db
 from nova import exception
 from nova.i18n import _, _LW
+from nova import objects
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
@@ -58,6 +60,23 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.BoolOpt('scheduler_host_state_delta_sync',
+                default=False,
+                help='Only fetch the compute nodes updated since the last '
+                     'request when refreshing host states, instead of '
+                     'fetching and parsing all of them on every request'),
+    cfg.IntOpt('scheduler_host_state_full_sync_interval',
+               default=600,
+               help='Interval in seconds between full refreshes of the '
+                    'compute nodes when scheduler_host_state_delta_sync '
+                    'is enabled'),
+    cfg.IntOpt('scheduler_host_state_sync_overlap',
+               default=30,
+               help='Number of seconds each delta refresh of the compute '
+                    'nodes reaches back before the previous one, so that '
+                    'nodes updated in transactions which committed late, '
+                    'or stamped by a clock behind the scheduler\'s, are '
+                    'not missed'),
     ]
 
 CONF = cfg.CONF
@@ -142,6 +161,10 @@ class HostState(object):
         # Generic metrics from compute nodes
         self.metrics = {}
 
+        # Aggregates the host belongs to, loaded by the HostManager once
+        # per request. None means they were not loaded.
+        self.aggregates = None
+
         self.updated = None
         if compute:
             self.update_from_compute_node(compute)
@@ -274,6 +297,10 @@ class HostManager(object):
 
     def __init__(self):
         self.host_state_map = {}
+        # Compute nodes by id, kept for delta syncs
+        self.compute_nodes = {}
+        self.last_sync = None
+        self.last_full_sync = None
         self.filter_handler = filters.HostFilterHandler()
         self.filter_classes = self.filter_handler.get_matching_classes(
                 CONF.scheduler_available_filters)
@@ -378,10 +405,26 @@ class HostManager(object):
         return self.filter_handler.get_filtered_objects(filter_classes,
                 hosts, filter_properties, index)
 
-    def get_weighed_hosts(self, hosts, weight_properties):
-        """Weigh the hosts."""
-        return self.weight_handler.get_weighed_objects(self.weight_classes,
-                hosts, weight_properties)
+    def get_weighers(self):
+        """Return new instances of the configured weighers."""
+        return [weigher_cls() for weigher_cls in self.weight_classes]
+
+    def get_weighed_hosts(self, hosts, weight_properties, weighers=None):
+        """Weigh the hosts.
+
+        Pass weighers from get_weighers() to be able to weigh single hosts
+        against the same bounds later on with weigh_host().
+        """
+        if weighers is None:
+            return self.weight_handler.get_weighed_objects(
+                    self.weight_classes, hosts, weight_properties)
+        return self.weight_handler.weigh_objects(weighers, hosts,
+                weight_properties)
+
+    def weigh_host(self, weighers, host, weight_properties):
+        """Weigh a single host with weighers used in get_weighed_hosts()."""
+        return self.weight_handler.weigh_object(weighers, host,
+                weight_properties)
 
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
@@ -390,7 +433,11 @@ class HostManager(object):
         """
 
         # Get resource usage across the available compute nodes:
-        compute_nodes = db.compute_node_get_all(context)
+        if CONF.scheduler_host_state_delta_sync:
+            compute_nodes, changed_ids = self._sync_compute_nodes(context)
+        else:
+            compute_nodes = db.compute_node_get_all(context)
+            changed_ids = None
         seen_nodes = set()
         for compute in compute_nodes:
             service = compute['service']
@@ -402,13 +449,16 @@ class HostManager(object):
             state_key = (host, node)
             host_state = self.host_state_map.get(state_key)
             if host_state:
-                host_state.update_from_compute_node(compute)
+                if changed_ids is None or compute['id'] in changed_ids:
+                    host_state.update_from_compute_node(compute)
             else:
                 host_state = self.host_state_cls(host, node, compute=compute)
                 self.host_state_map[state_key] = host_state
             host_state.update_service(dict(service.iteritems()))
             seen_nodes.add(state_key)
 
+        self._update_aggregates(context)
+
         # remove compute nodes from host_state_map if they are not active
         dead_nodes = set(self.host_state_map.keys()) - seen_nodes
         for state_key in dead_nodes:
@@ -418,3 +468,67 @@ class HostManager(object):
             del self.host_state_map[state_key]
 
         return self.host_state_map.itervalues()
+
+    def _sync_compute_nodes(self, context):
+        """Return all compute nodes and the ids of the ones which changed
+        since the previous sync.
+
+        Only the compute nodes created, updated or deleted since the previous
+        sync are fetched, so unchanged nodes don't have their stats, metrics
+        and the like parsed again. All of them are fetched again every
+        scheduler_host_state_full_sync_interval seconds.
+        """
+        now = timeutils.utcnow()
+        if (self.last_full_sync is None or timeutils.is_older_than(
+                self.last_full_sync,
+                CONF.scheduler_host_state_full_sync_interval)):
+            compute_nodes = db.compute_node_get_all(context)
+            self.compute_nodes = dict((compute['id'], compute)
+                                      for compute in compute_nodes)
+            changed_ids = set(self.compute_nodes)
+            self.last_full_sync = now
+        else:
+            # NOTE: updated_at is set before the update is committed, and by
+            #       the clock of the updating service, so the nodes updated
+            #       shortly before the previous sync are fetched again.
+            since = self.last_sync - datetime.timedelta(
+                seconds=CONF.scheduler_host_state_sync_overlap)
+            changed_ids = set()
+            for compute in db.compute_node_get_all(context,
+                                                   updated_since=since):
+                if compute['deleted']:
+                    self.compute_nodes.pop(compute['id'], None)
+                    continue
+                known = self.compute_nodes.get(compute['id'])
+                if (known is not None and
+                        dict(compute, service=known['service']) == known):
+                    # Already fetched by the previous sync.
+                    continue
+                self.compute_nodes[compute['id']] = compute
+                changed_ids.add(compute['id'])
+            # Services are refreshed for every node since their
+            # disabled state and heartbeats change independently.  The
+            # delta query above does not fetch them.
+            services = dict((service['id'], service)
+                            for service in db.service_get_all(context)
+                            if service['binary'] == 'nova-compute')
+            for compute in self.compute_nodes.itervalues():
+                compute['service'] = services.get(compute['service_id'])
+        self.last_sync = now
+        return self.compute_nodes.values(), changed_ids
+
+    def _update_aggregates(self, context):
+        """Attach the aggregates of each host to its HostState.
+
+        All aggregates are loaded with a single query so that aggregate
+        based filters don't have to go to the DB once per host.
+        """
+        if not self.host_state_map:
+            return
+        aggregates_by_host = collections.defaultdict(list)
+        for aggregate in objects.AggregateList.get_all(context):
+            for host in aggregate.hosts or []:
+                aggregates_by_host[host].append(aggregate)
+        for host_state in self.host_state_map.itervalues():
+            host_state.aggregates = aggregates_by_host.get(host_state.host,
+                                                           [])
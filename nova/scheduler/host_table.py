@@ -0,0 +1,128 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Columnar view of host states for vectorized filtering and weighing.
+
+A HostTable copies the resource counters of a list of HostStates into one
+NumPy array per counter, so that filters and weighers which implement
+filter_table() or weigh_table() can evaluate every host with a handful of
+array operations instead of one Python call per host.
+"""
+
+from oslo.config import cfg
+
+from nova.openstack.common import importutils
+
+np = importutils.try_import('numpy')
+
+host_table_opts = [
+    cfg.BoolOpt('scheduler_vectorized_filtering',
+                default=False,
+                help='Evaluate the filters and weighers that support it over '
+                     'a columnar table of all host states at once instead '
+                     'of host by host. Requires NumPy; the regular path is '
+                     'used when it is not installed.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(host_table_opts)
+
+
+def is_enabled():
+    """Return True if vectorized filtering and weighing should be used."""
+    return CONF.scheduler_vectorized_filtering and np is not None
+
+
+class HostTable(object):
+    """Resource counters of a list of host states, one array per field.
+
+    Row i of every column describes hosts[i].  Columns are float arrays so
+    that the arithmetic matches the per-host filters.
+    """
+
+    fields = ('free_ram_mb', 'total_usable_ram_mb',
+              'free_disk_mb', 'total_usable_disk_gb',
+              'vcpus_total', 'vcpus_used',
+              'num_instances', 'num_io_ops')
+
+    def __init__(self, hosts, columns=None):
+        self.hosts = list(hosts)
+        if columns is None:
+            columns = dict((field, np.array([getattr(host, field)
+                                             for host in self.hosts],
+                                            dtype=float))
+                           for field in self.fields)
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['columns'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def _take(self, rows):
+        return HostTable([self.hosts[i] for i in rows],
+                         dict((field, column[rows])
+                              for field, column in self.columns.items()))
+
+    def select(self, mask):
+        """Return a new table with the rows where mask is True."""
+        return self._take(np.flatnonzero(mask))
+
+    def select_hosts(self, hosts):
+        """Return a new table with the rows of the given hosts, in order.
+
+        Used after a filter without a vectorized implementation has run
+        over the host list.
+        """
+        index = dict((id(host), i) for i, host in enumerate(self.hosts))
+        return self._take(np.array([index[id(host)] for host in hosts],
+                                   dtype=int))
+
+    def set_limits(self, mask, key, values):
+        """Set host_state.limits[key] on the rows where mask is True."""
+        for i in np.flatnonzero(mask):
+            self.hosts[i].limits[key] = float(values[i])
+
+
+def record_bounds(weigher, weights):
+    """Widen the minval and maxval of a weigher to cover an array of weights,
+    as BaseWeigher.weigh_objects() does.
+    """
+    if not len(weights):
+        return
+    if weigher.minval is None or weights.min() < weigher.minval:
+        weigher.minval = weights.min()
+    if weigher.maxval is None or weights.max() > weigher.maxval:
+        weigher.maxval = weights.max()
+
+
+def normalize(weights, minval=None, maxval=None):
+    """Vectorized nova.weights.normalize() for a NumPy array of weights."""
+    if not len(weights):
+        return weights
+    if minval is None:
+        minval = weights.min()
+    if maxval is None:
+        maxval = weights.max()
+    minval = float(minval)
+    maxval = float(maxval)
+    if minval == maxval:
+        return np.zeros(len(weights))
+    return (weights - minval) / (maxval - minval)
@@ -19,6 +19,7 @@ Scheduler host weights
 
 from oslo.config import cfg
 
+from nova.scheduler import host_table
 from nova import weights
 
 CONF = cfg.CONF
@@ -37,7 +38,11 @@ class WeighedHost(weights.WeighedObject):
 
 class BaseHostWeigher(weights.BaseWeigher):
     """Base class for host weights."""
-    pass
+
+    # Set to a method in a subclass to let the weigher run over a whole
+    # host_table.HostTable at once.  It takes the table and the weight
+    # properties and returns an array with the raw weight of each row.
+    weigh_table = None
 
 
 class HostWeightHandler(weights.BaseWeightHandler):
@@ -46,6 +51,30 @@ class HostWeightHandler(weights.BaseWeightHandler):
     def __init__(self):
         super(HostWeightHandler, self).__init__(BaseHostWeigher)
 
+    def weigh_objects(self, weighers, obj_list, weighing_properties):
+        if not obj_list or not host_table.is_enabled():
+            return super(HostWeightHandler, self).weigh_objects(
+                    weighers, obj_list, weighing_properties)
+
+        table = host_table.HostTable(obj_list)
+        weighed_objs = [self.object_class(obj, 0.0) for obj in table.hosts]
+        total = host_table.np.zeros(len(table))
+        for weigher in weighers:
+            if weigher.weigh_table is not None:
+                weights = weigher.weigh_table(table, weighing_properties)
+                host_table.record_bounds(weigher, weights)
+            else:
+                weights = weigher.weigh_objects(weighed_objs,
+                                                weighing_properties)
+            weights = host_table.normalize(
+                    host_table.np.asarray(weights, dtype=float),
+                    minval=weigher.minval, maxval=weigher.maxval)
+            total += weigher.weight_multiplier() * weights
+
+        for obj, weight in zip(weighed_objs, total):
+            obj.weight = float(weight)
+        return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
 
 def all_weighers():
     """Return a list of weight plugin classes found in this directory."""
@@ -45,3 +45,7 @@ class RAMWeigher(weights.BaseHostWeigher):
     def _weigh_object(self, host_state, weight_properties):
         """Higher weights win.  We want spreading to be the default."""
         return host_state.free_ram_mb
+
+    def weigh_table(self, table, weight_properties):
+        """Vectorized _weigh_object() over a HostTable."""
+        return table.free_ram_mb
@@ -94,17 +94,25 @@ def get_fake_db_instance(start, end, instance_id, tenant_id,
     return inst
 
 
-def fake_instance_get_active_by_window_joined(context, begin, end,
-        project_id, host):
-            return [get_fake_db_instance(START,
-                                         STOP,
-                                         x,
-                                         "faketenant_%s" % (x / SERVERS))
-                                         for x in xrange(TENANTS * SERVERS)]
+def create_db_instance(ctxt, start, end, tenant_id, **kwargs):
+    values = {'project_id': tenant_id,
+              'user_id': 'fakeuser',
+              'display_name': 'name',
+              'image_ref': '1',
+              'instance_type_id': FAKE_INST_TYPE['id'],
+              'launched_at': start,
+              'terminated_at': end,
+              'vm_state': vm_states.ACTIVE,
+              'memory_mb': MEMORY_MB,
+              'vcpus': VCPUS,
+              'root_gb': ROOT_GB,
+              'ephemeral_gb': EPHEMERAL_GB,
+              'system_metadata': flavors.save_flavor_info({},
+                                                          FAKE_INST_TYPE)}
+    values.update(kwargs)
+    return db.instance_create(ctxt, values)
 
 
-@mock.patch.object(db, 'instance_get_active_by_window_joined',
-                   fake_instance_get_active_by_window_joined)
 class SimpleTenantUsageTestV21(test.TestCase):
     url = '/v3/os-simple-tenant-usage'
     alt_url = '/v3/os-simple-tenant-usage'
@@ -121,6 +129,11 @@ class SimpleTenantUsageTestV21(test.TestCase):
         self.alt_user_context = context.RequestContext('fakeadmin_0',
                                                       'faketenant_1',
                                                        is_admin=False)
+        for x in xrange(TENANTS * SERVERS):
+            create_db_instance(
+                context.get_admin_context(), START, STOP,
+                'faketenant_%s' % (x / SERVERS),
+                uuid='00000000-0000-0000-0000-00000000000000%02d' % x)
 
     def _get_wsgi_app(self, context):
         return fakes.wsgi_app_v3(fake_auth_context=context,
@@ -194,6 +207,47 @@ class SimpleTenantUsageTestV21(test.TestCase):
         for i in xrange(TENANTS):
             self.assertIsNone(usages[i].get('server_usages'))
 
+    def test_simple_index_matches_detailed_index(self):
+        # Instances which start or stop during the period, not on a second
+        ctxt = context.get_admin_context()
+        create_db_instance(ctxt,
+                           START + datetime.timedelta(minutes=90,
+                                                      microseconds=123457),
+                           None, 'faketenant_0', vcpus=3)
+        create_db_instance(ctxt, START - datetime.timedelta(days=3),
+                           STOP - datetime.timedelta(hours=5,
+                                                     microseconds=987),
+                           'faketenant_1', memory_mb=512, root_gb=1)
+        create_db_instance(ctxt,
+                           START + datetime.timedelta(seconds=1,
+                                                      microseconds=999999),
+                           START + datetime.timedelta(seconds=2),
+                           'faketenant_2', ephemeral_gb=0)
+        # Not launched during the period
+        create_db_instance(ctxt, STOP + datetime.timedelta(seconds=1), None,
+                           'faketenant_3')
+
+        simple = dict((usage['tenant_id'], usage)
+                      for usage in self._get_tenant_usages('0'))
+        detailed = dict((usage['tenant_id'], usage)
+                        for usage in self._get_tenant_usages('1'))
+        self.assertEqual(['faketenant_0', 'faketenant_1', 'faketenant_2'],
+                         sorted(simple))
+        self.assertEqual(sorted(detailed), sorted(simple))
+        for tenant_id, usage in detailed.items():
+            for key in ('total_hours', 'total_local_gb_usage',
+                        'total_memory_mb_usage', 'total_vcpus_usage'):
+                self.assertAlmostEqual(usage[key], simple[tenant_id][key],
+                                       places=6)
+
+    @mock.patch.object(simple_tenant_usage_v2, 'USAGE_PAGE_SIZE', 3)
+    @mock.patch.object(simple_tenant_usage_v21, 'USAGE_PAGE_SIZE', 3)
+    def test_verify_detailed_index_pages(self):
+        usages = self._get_tenant_usages('1')
+        self.assertEqual(TENANTS, len(usages))
+        for usage in usages:
+            self.assertEqual(SERVERS, len(usage['server_usages']))
+
     def _test_verify_show(self, start, stop):
         tenant_id = 0
         req = webob.Request.blank(
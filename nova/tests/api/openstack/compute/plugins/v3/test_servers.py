@@ -1296,12 +1296,13 @@ class ServersControllerTest(ControllerTest):
                          limit=None, marker=None, want_objects=False,
                          expected_attrs=None):
             self.expected_attrs = expected_attrs
-            return []
+            return objects.InstanceList(objects=[])
 
         self.stubs.Set(compute_api.API, 'get_all', fake_get_all)
 
-        req = fakes.HTTPRequestV3.blank('/servers', use_admin_context=True)
-        self.assertIn('servers', self.controller.index(req))
+        req = fakes.HTTPRequestV3.blank('/servers/detail',
+                                        use_admin_context=True)
+        self.assertIn('servers', self.controller.detail(req))
         self.assertIn('pci_devices', self.expected_attrs)
 
 
@@ -557,6 +557,20 @@ class ServersControllerTest(ControllerTest):
         self.assertRaises(webob.exc.HTTPBadRequest,
                           self.controller.index, req)
 
+    @mock.patch.object(compute_api.API, 'get_all')
+    def test_get_servers_expected_attrs(self, get_all_mock):
+        get_all_mock.return_value = instance_obj.InstanceList(objects=[])
+
+        req = fakes.HTTPRequest.blank('/fake/servers')
+        self.controller.index(req)
+        self.assertEqual([], get_all_mock.call_args[1]['expected_attrs'])
+
+        req = fakes.HTTPRequest.blank('/fake/servers/detail')
+        self.controller.detail(req)
+        self.assertEqual(['metadata', 'system_metadata', 'info_cache',
+                          'security_groups'],
+                         get_all_mock.call_args[1]['expected_attrs'])
+
     def test_get_server_details_empty(self):
         self.stubs.Set(db, 'instance_get_all_by_filters',
                        return_servers_empty)
@@ -640,7 +654,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             db_list = [fakes.stub_instance(100, uuid=server_uuid)]
             return instance_obj._make_instance_list(
                 context, objects.InstanceList(), db_list, FIELDS)
@@ -658,7 +673,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('image', search_opts)
             self.assertEqual(search_opts['image'], '12345')
@@ -841,7 +857,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('flavor', search_opts)
             # flavor is an integer ID
@@ -875,7 +892,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], [vm_states.ACTIVE])
@@ -912,7 +930,8 @@ class ServersControllerTest(ControllerTest):
                                     project_id='fake')
         get_all_mock.assert_called_once_with(mock.ANY,
                         search_opts=expected_search_opts, limit=mock.ANY,
-                        marker=mock.ANY, want_objects=mock.ANY)
+                        marker=mock.ANY, want_objects=mock.ANY,
+                        expected_attrs=[])
 
     @mock.patch.object(compute_api.API, 'get_all')
     def test_get_servers_system_metadata_filter(self, get_all_mock):
@@ -937,7 +956,8 @@ class ServersControllerTest(ControllerTest):
             system_metadata=expected_system_metadata, project_id='fake')
         get_all_mock.assert_called_once_with(mock.ANY,
                         search_opts=expected_search_opts, limit=mock.ANY,
-                        marker=mock.ANY, want_objects=mock.ANY)
+                        marker=mock.ANY, want_objects=mock.ANY,
+                        expected_attrs=[])
 
     @mock.patch.object(compute_api.API, 'get_all')
     def test_get_servers_allows_invalid_status(self, get_all_mock):
@@ -959,7 +979,8 @@ class ServersControllerTest(ControllerTest):
                                     project_id='fake')
         get_all_mock.assert_called_once_with(mock.ANY,
                         search_opts=expected_search_opts, limit=mock.ANY,
-                        marker=mock.ANY, want_objects=mock.ANY)
+                        marker=mock.ANY, want_objects=mock.ANY,
+                        expected_attrs=[])
 
     def test_get_servers_allows_task_status(self):
         server_uuid = str(uuid.uuid4())
@@ -967,7 +988,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('task_state', search_opts)
             self.assertEqual([task_states.REBOOT_PENDING,
@@ -993,7 +1015,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'],
                              [vm_states.ACTIVE, vm_states.STOPPED])
@@ -1028,7 +1051,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], ['deleted'])
 
@@ -1050,7 +1074,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('name', search_opts)
             self.assertEqual(search_opts['name'], 'whee.*')
@@ -1071,7 +1096,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('changes-since', search_opts)
             changes_since = datetime.datetime(2011, 1, 24, 17, 8, 1,
@@ -1105,7 +1131,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1136,7 +1163,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1165,7 +1193,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip', search_opts)
             self.assertEqual(search_opts['ip'], '10\..*')
@@ -1189,7 +1218,8 @@ class ServersControllerTest(ControllerTest):
 
         def fake_get_all(compute_self, context, search_opts=None,
                          sort_key=None, sort_dir='desc',
-                         limit=None, marker=None, want_objects=False):
+                         limit=None, marker=None, want_objects=False,
+                         expected_attrs=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -3848,6 +3878,15 @@ class ServersViewBuilderTest(test.TestCase):
         result = self.view_builder._get_flavor(self.request, self.instance)
         self.assertEqual(result, expected)
 
+    def test_build_server_list_detail_extracts_flavor_once(self):
+        instances = [self.instance, self.instance.obj_clone()]
+        with mock.patch.object(flavors, 'extract_flavor',
+                               wraps=flavors.extract_flavor) as extract:
+            output = self.view_builder.detail(self.request, instances)
+        self.assertEqual(1, extract.call_count)
+        self.assertEqual([self.expected_detailed_server['server']['flavor']] *
+                         2, [server['flavor'] for server in output['servers']])
+
     def test_build_server(self):
         output = self.view_builder.basic(self.request, self.instance)
         self.assertThat(output,
@@ -58,7 +58,10 @@ class FakeDBApi(object):
     def cell_get_all(self, ctxt):
         return self.cell_db_entries
 
-    def compute_node_get_all(self, ctxt):
+    def compute_node_get_all(self, ctxt, *args, **kwargs):
+        return []
+
+    def service_get_all(self, ctxt, *args, **kwargs):
         return []
 
     def instance_get_all_by_filters(self, ctxt, *args, **kwargs):
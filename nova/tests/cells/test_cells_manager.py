@@ -17,13 +17,16 @@ Tests For CellsManager
 """
 import copy
 import datetime
+import sys
 
 import mock
 from oslo.config import cfg
 
+from nova.cells import manager as cells_manager
 from nova.cells import messaging
 from nova.cells import utils as cells_utils
 from nova import context
+from nova import exception
 from nova.openstack.common import timeutils
 from nova import test
 from nova.tests.cells import fakes
@@ -102,6 +105,12 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
         self.mox.ReplayAll()
         cells_manager.post_start_hook()
 
+    def test_cleanup_host(self):
+        self.mox.StubOutWithMock(self.msg_runner, 'flush_updates_at_top')
+        self.msg_runner.flush_updates_at_top()
+        self.mox.ReplayAll()
+        self.cells_manager.cleanup_host()
+
     def test_update_our_parents(self):
         self.mox.StubOutWithMock(self.msg_runner,
                                  'tell_parents_our_capabilities')
@@ -270,8 +279,8 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
 
         self.mox.StubOutWithMock(self.msg_runner,
                                  'service_get_all')
-        self.msg_runner.service_get_all(self.ctxt,
-                                        'fake-filters').AndReturn(responses)
+        self.msg_runner.service_get_all(self.ctxt, 'fake-filters',
+                                        timeout=None).AndReturn(responses)
         self.mox.ReplayAll()
         response = self.cells_manager.service_get_all(self.ctxt,
                                                       filters='fake-filters')
@@ -440,7 +449,8 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
         self.mox.StubOutWithMock(self.msg_runner,
                                  'compute_node_get_all')
         self.msg_runner.compute_node_get_all(self.ctxt,
-                hypervisor_match='fake-match').AndReturn(responses)
+                hypervisor_match='fake-match',
+                timeout=None).AndReturn(responses)
         self.mox.ReplayAll()
         response = self.cells_manager.compute_node_get_all(self.ctxt,
                 hypervisor_match='fake-match')
@@ -457,11 +467,68 @@ class CellsManagerClassTestCase(test.NoDBTestCase):
 
         self.mox.StubOutWithMock(self.msg_runner,
                                  'compute_node_stats')
-        self.msg_runner.compute_node_stats(self.ctxt).AndReturn(responses)
+        self.msg_runner.compute_node_stats(self.ctxt,
+                                           timeout=None).AndReturn(responses)
         self.mox.ReplayAll()
         response = self.cells_manager.compute_node_stats(self.ctxt)
         self.assertEqual(expected_resp, response)
 
+    def test_compute_node_stats_skips_timed_out_cells(self):
+        raw_resp1 = {'key1': 1, 'key2': 2}
+        raw_resp3 = {'key3': 1, 'key4': 2}
+        try:
+            raise exception.CellTimeout()
+        except exception.CellTimeout:
+            timeout = sys.exc_info()
+        responses = [messaging.Response('cell1', raw_resp1, False),
+                     messaging.Response('cell2', timeout, True),
+                     messaging.Response('cell3', raw_resp3, False)]
+        expected_resp = {'key1': 1, 'key2': 2, 'key3': 1, 'key4': 2}
+
+        self.mox.StubOutWithMock(self.msg_runner,
+                                 'compute_node_stats')
+        self.msg_runner.compute_node_stats(self.ctxt,
+                                           timeout=None).AndReturn(responses)
+        self.mox.ReplayAll()
+        with mock.patch.object(cells_manager.LOG, 'warn') as mock_warn:
+            response = self.cells_manager.compute_node_stats(self.ctxt)
+        self.assertEqual(expected_resp, response)
+        self.assertEqual({'method': 'compute_node_stats', 'cells': 'cell2'},
+                         mock_warn.call_args[0][1])
+
+    def test_compute_node_stats_with_timed_out_cells(self):
+        raw_resp1 = {'key1': 1, 'key2': 2}
+        try:
+            raise exception.CellTimeout()
+        except exception.CellTimeout:
+            timeout = sys.exc_info()
+        responses = [messaging.Response('cell1', raw_resp1, False),
+                     messaging.Response('cell3', timeout, True),
+                     messaging.Response('cell2', timeout, True)]
+
+        self.mox.StubOutWithMock(self.msg_runner,
+                                 'compute_node_stats')
+        self.msg_runner.compute_node_stats(self.ctxt,
+                                           timeout=5).AndReturn(responses)
+        self.mox.ReplayAll()
+        response = self.cells_manager.compute_node_stats(self.ctxt,
+                timeout=5, with_timed_out_cells=True)
+        self.assertEqual({'result': raw_resp1,
+                          'timed_out_cells': ['cell2', 'cell3']}, response)
+
+    def test_compute_node_stats_raises_other_failures(self):
+        responses = [messaging.Response('cell1', {'key1': 1}, False),
+                     messaging.Response('cell2',
+                                        test.TestingException('fake'),
+                                        True)]
+        self.mox.StubOutWithMock(self.msg_runner,
+                                 'compute_node_stats')
+        self.msg_runner.compute_node_stats(self.ctxt,
+                                           timeout=None).AndReturn(responses)
+        self.mox.ReplayAll()
+        self.assertRaises(test.TestingException,
+                          self.cells_manager.compute_node_stats, self.ctxt)
+
     def test_compute_node_get(self):
         fake_cell = 'fake-cell'
         fake_response = messaging.Response(fake_cell,
@@ -18,6 +18,7 @@ Tests For Cells Messaging module
 """
 
 import contextlib
+import time
 
 import mock
 import mox
@@ -25,6 +26,7 @@ from oslo.config import cfg
 from oslo import messaging as oslo_messaging
 
 from nova.cells import messaging
+from nova.cells import state as cells_state
 from nova.cells import utils as cells_utils
 from nova.compute import task_states
 from nova.compute import vm_states
@@ -620,6 +622,82 @@ class CellsMessageClassesTestCase(test.TestCase):
             self.assertTrue(response.failure)
             self.assertRaises(test.TestingException, response.value_or_raise)
 
+    def _test_broadcast_routing_with_timeout(self, from_cell, to_cell):
+        method = 'our_fake_method'
+        method_kwargs = dict(arg1=1, arg2=2)
+        direction = 'down'
+
+        def our_fake_method(message, **kwargs):
+            return 'response-%s' % message.routing_path
+
+        fakes.stub_bcast_methods(self, 'our_fake_method', our_fake_method)
+        # Lose the message on its way to to_cell.
+        cell = fakes.get_cell_state(from_cell, to_cell)
+        self.stubs.Set(cell, 'send_message', lambda message: None)
+
+        bcast_message = messaging._BroadcastMessage(self.msg_runner,
+                                                    self.ctxt, method,
+                                                    method_kwargs,
+                                                    direction,
+                                                    run_locally=True,
+                                                    need_response=True,
+                                                    timeout=0)
+        return bcast_message.process()
+
+    def test_broadcast_routing_with_child_timing_out(self):
+        responses = self._test_broadcast_routing_with_timeout('api-cell',
+                                                              'child-cell2')
+        # child-cell2 and grandchild-cell1 did not answer.
+        self.assertEqual(len(responses), 7)
+        failure_responses = [resp for resp in responses if resp.failure]
+        success_responses = [resp for resp in responses if not resp.failure]
+        self.assertEqual(1, len(failure_responses))
+        self.assertEqual('api-cell!child-cell2',
+                         failure_responses[0].cell_name)
+        self.assertRaises(exception.CellTimeout,
+                          failure_responses[0].value_or_raise)
+        for response in success_responses:
+            self.assertEqual('response-%s' % response.cell_name,
+                    response.value_or_raise())
+
+    def test_broadcast_routing_with_grandchild_timing_out(self):
+        responses = self._test_broadcast_routing_with_timeout(
+                'child-cell3', 'grandchild-cell3')
+        # child-cell3 still sends up what it has.
+        self.assertEqual(len(responses), 8)
+        failure_responses = [resp for resp in responses if resp.failure]
+        self.assertEqual(1, len(failure_responses))
+        self.assertEqual('api-cell!child-cell3!grandchild-cell3',
+                         failure_responses[0].cell_name)
+        self.assertRaises(exception.CellTimeout,
+                          failure_responses[0].value_or_raise)
+
+    def test_broadcast_timeout_passed_on(self):
+        self.flags(broadcast_hop_margin=5.0, group='cells')
+        method = 'our_fake_method'
+        method_kwargs = dict(arg1=1, arg2=2)
+        direction = 'down'
+        time_left = {}
+
+        def our_fake_method(message, **kwargs):
+            time_left[message.routing_path] = (message.deadline -
+                                               time.time())
+
+        fakes.stub_bcast_methods(self, 'our_fake_method', our_fake_method)
+
+        bcast_message = messaging._BroadcastMessage(self.msg_runner,
+                                                    self.ctxt, method,
+                                                    method_kwargs,
+                                                    direction,
+                                                    run_locally=True,
+                                                    need_response=True,
+                                                    timeout=30)
+        bcast_message.process()
+        self.assertTrue(25 < time_left['api-cell'] <= 30)
+        self.assertTrue(20 < time_left['api-cell!child-cell2'] <= 25)
+        self.assertTrue(
+            15 < time_left['api-cell!child-cell2!grandchild-cell1'] <= 20)
+
 
 class CellsTargetedMethodsTestCase(test.TestCase):
     """Test case for _TargetedMessageMethods class.  Most of these
@@ -827,6 +905,92 @@ class CellsTargetedMethodsTestCase(test.TestCase):
 
         self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
 
+    def _capacities(self, ram_free_mb):
+        return {'ram_free': {'total_mb': ram_free_mb,
+                             'units_by_mb': {'512': ram_free_mb / 512}}}
+
+    def _tell_parents_our_capacities(self, capacities):
+        with contextlib.nested(
+                mock.patch.object(self.src_state_manager,
+                                  'get_our_capacities',
+                                  return_value=capacities),
+                mock.patch.object(self.tgt_state_manager,
+                                  'update_cell_capacities',
+                                  wraps=self.tgt_state_manager.
+                                      update_cell_capacities),
+        ) as (mock_get, mock_update):
+            self.src_msg_runner.tell_parents_our_capacities(self.ctxt)
+        return mock_update.call_count
+
+    def test_update_capacities_delta(self):
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        child_cell = self.tgt_state_manager.get_child_cell('child-cell2')
+
+        self.assertEqual(1, self._tell_parents_our_capacities(
+                self._capacities(2048)))
+        self.assertEqual(self._capacities(2048), child_cell.capacities)
+
+        with mock.patch.object(self.tgt_state_manager,
+                               'update_cell_capacities_delta',
+                               wraps=self.tgt_state_manager.
+                                   update_cell_capacities_delta
+                               ) as mock_update_delta:
+            self.assertEqual(0, self._tell_parents_our_capacities(
+                    self._capacities(1024)))
+        mock_update_delta.assert_called_once_with(
+                'child-cell2',
+                {'ram_free': {'total_mb': -1024, 'units_by_mb': {'512': -2}}},
+                cells_state.capacities_digest(self._capacities(2048)))
+        self.assertEqual(self._capacities(1024), child_cell.capacities)
+
+    def test_update_capacities_unchanged(self):
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        self._tell_parents_our_capacities(self._capacities(2048))
+
+        with mock.patch.object(messaging._TargetedMessage,
+                               'process') as mock_process:
+            self._tell_parents_our_capacities(self._capacities(2048))
+        self.assertFalse(mock_process.called)
+
+    def test_update_capacities_full_after_interval(self):
+        self.flags(capacity_full_sync_interval=600, group='cells')
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        self._tell_parents_our_capacities(self._capacities(2048))
+
+        timeutils.advance_time_seconds(600)
+        self.assertEqual(0, self._tell_parents_our_capacities(
+                self._capacities(1024)))
+
+        # Every capacity_full_sync_interval, all of them are sent again
+        # even if none changed.
+        timeutils.advance_time_seconds(1)
+        self.assertEqual(1, self._tell_parents_our_capacities(
+                self._capacities(1024)))
+
+    def test_update_capacities_without_deltas(self):
+        self.flags(capacity_deltas=False, group='cells')
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        child_cell = self.tgt_state_manager.get_child_cell('child-cell2')
+        self._tell_parents_our_capacities(self._capacities(2048))
+
+        self.assertEqual(1, self._tell_parents_our_capacities(
+                self._capacities(1024)))
+        self.assertEqual(self._capacities(1024), child_cell.capacities)
+
+    def test_update_capacities_delta_out_of_date(self):
+        self._setup_attrs('child-cell2', 'child-cell2!api-cell')
+        child_cell = self.tgt_state_manager.get_child_cell('child-cell2')
+        self._tell_parents_our_capacities(self._capacities(2048))
+        # As if the parent cell restarted.
+        child_cell.update_capacities({})
+
+        # The parent asks for all the capacities, which are sent again.
+        self.assertEqual(1, self._tell_parents_our_capacities(
+                self._capacities(1024)))
+        self.assertEqual(self._capacities(1024), child_cell.capacities)
+
     def test_announce_capabilities(self):
         self._setup_attrs('api-cell', 'api-cell!child-cell1')
         # To make this easier to test, make us only have 1 child cell.
@@ -849,7 +1013,7 @@ class CellsTargetedMethodsTestCase(test.TestCase):
 
         self.mox.StubOutWithMock(self.tgt_msg_runner,
                                  'tell_parents_our_capacities')
-        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt)
+        self.tgt_msg_runner.tell_parents_our_capacities(self.ctxt, full=True)
 
         self.mox.ReplayAll()
 
@@ -1693,6 +1857,140 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
         self.src_msg_runner.bw_usage_update_at_top(self.ctxt,
                                                    fake_bw_update_info)
 
+    def _fake_bw_update_info(self, bw_in):
+        return {'uuid': 'fake_uuid',
+                'mac': 'fake_mac',
+                'start_period': 'fake_start_period',
+                'bw_in': bw_in,
+                'bw_out': 0,
+                'last_ctr_in': bw_in,
+                'last_ctr_out': 0,
+                'last_refreshed': None}
+
+    @mock.patch.object(messaging.greenthread, 'spawn_after')
+    def test_updates_at_top_batched(self, mock_spawn_after):
+        self.flags(update_batch_window=10, group='cells')
+        instance = {'uuid': 'fake_uuid', 'vm_state': vm_states.BUILDING,
+                    'task_state': None, 'host': 'fake_host'}
+        self.src_msg_runner.instance_update_at_top(self.ctxt, instance)
+        # The held update is a copy.
+        instance['host'] = 'other_host'
+        self.src_msg_runner.instance_update_at_top(
+                self.ctxt, {'uuid': 'fake_uuid',
+                            'vm_state': vm_states.ACTIVE})
+        self.src_msg_runner.bw_usage_update_at_top(
+                self.ctxt, self._fake_bw_update_info(1))
+        self.src_msg_runner.bw_usage_update_at_top(
+                self.ctxt, self._fake_bw_update_info(2))
+        self.src_msg_runner.instance_fault_create_at_top(
+                self.ctxt, {'id': 1, 'message': 'fake-message'})
+
+        # Held in the source cell until the window ends.
+        self.assertEqual(3, len(self.src_msg_runner.held_updates))
+        mock_spawn_after.assert_called_once_with(
+                10, self.src_msg_runner._flush_updates_at_top_from_timer)
+
+        if_mock = mock.Mock(spec_set=objects.InstanceFault)
+        with contextlib.nested(
+                mock.patch.object(self.mid_db_inst, 'instance_update'),
+                mock.patch.object(self.tgt_db_inst, 'instance_update'),
+                mock.patch.object(self.tgt_db_inst, 'bw_usage_update'),
+                mock.patch.object(objects, 'InstanceFault',
+                                  return_value=if_mock),
+        ) as (mid_update, tgt_update, tgt_bw_update, if_obj_mock):
+            self.src_msg_runner.flush_updates_at_top()
+
+        self.assertFalse(mid_update.called)
+        self.assertEqual(1, tgt_update.call_count)
+        update_ctxt, update_uuid, values = tgt_update.call_args[0]
+        self.assertEqual(self.ctxt.user_id, update_ctxt.user_id)
+        self.assertEqual('fake_uuid', update_uuid)
+        self.assertEqual(vm_states.ACTIVE, values['vm_state'])
+        self.assertEqual('fake_host', values['host'])
+        self.assertEqual('api-cell!child-cell2!grandchild-cell1',
+                         values['cell_name'])
+        self.assertEqual(1, tgt_bw_update.call_count)
+        self.assertEqual(self._fake_bw_update_info(2),
+                         tgt_bw_update.call_args[1])
+        if_mock.update.assert_called_once_with({'message': 'fake-message'})
+        if_mock.create.assert_called_once_with()
+        self.assertEqual({}, self.src_msg_runner.held_updates)
+        mock_spawn_after.return_value.cancel.assert_called_once_with()
+
+    @mock.patch.object(messaging.greenthread, 'spawn_after')
+    def test_updates_at_top_batch_size(self, mock_spawn_after):
+        self.flags(update_batch_window=10, update_batch_size=2,
+                   group='cells')
+        with mock.patch.object(self.tgt_db_inst,
+                               'instance_update') as tgt_update:
+            self.src_msg_runner.instance_update_at_top(
+                    self.ctxt, {'uuid': 'fake_uuid1'})
+            self.assertFalse(tgt_update.called)
+            self.src_msg_runner.instance_update_at_top(
+                    self.ctxt, {'uuid': 'fake_uuid2'})
+        self.assertEqual(['fake_uuid1', 'fake_uuid2'],
+                         [c[0][1] for c in tgt_update.call_args_list])
+        self.assertEqual({}, self.src_msg_runner.held_updates)
+
+    @mock.patch.object(messaging.greenthread, 'spawn_after')
+    def test_updates_at_top_single_update_not_packed(self, mock_spawn_after):
+        self.flags(update_batch_window=10, group='cells')
+        self.src_msg_runner.bw_usage_update_at_top(
+                self.ctxt, self._fake_bw_update_info(1))
+
+        self.mox.StubOutWithMock(self.tgt_methods_cls, 'updates_at_top')
+        self.mox.StubOutWithMock(self.tgt_db_inst, 'bw_usage_update')
+        self.tgt_db_inst.bw_usage_update(self.ctxt,
+                                         **self._fake_bw_update_info(1))
+        self.mox.ReplayAll()
+
+        self.src_msg_runner.flush_updates_at_top()
+
+    @mock.patch.object(messaging.greenthread, 'spawn_after')
+    def test_instance_destroy_at_top_sends_held_updates(self,
+                                                        mock_spawn_after):
+        self.flags(update_batch_window=10, group='cells')
+        self.src_msg_runner.instance_update_at_top(self.ctxt,
+                                                   {'uuid': 'fake_uuid'})
+        calls = []
+        with contextlib.nested(
+                mock.patch.object(self.tgt_db_inst, 'instance_update',
+                                  side_effect=lambda *a, **k:
+                                      calls.append('update')),
+                mock.patch.object(self.tgt_db_inst, 'instance_destroy',
+                                  side_effect=lambda *a, **k:
+                                      calls.append('destroy')),
+        ):
+            self.src_msg_runner.instance_destroy_at_top(
+                    self.ctxt, {'uuid': 'fake_uuid'})
+        self.assertEqual(['update', 'destroy'], calls)
+
+    def test_updates_at_top_skips_failures_and_unknown_methods(self):
+        updates = [{'method_name': 'instance_destroy_at_top',
+                    'ctxt': self.ctxt.to_dict(),
+                    'method_kwargs': {'instance': {'uuid': 'fake_uuid'}}},
+                   {'method_name': 'bw_usage_update_at_top',
+                    'ctxt': self.ctxt.to_dict(),
+                    'method_kwargs': {
+                        'bw_update_info': self._fake_bw_update_info(1)}},
+                   {'method_name': 'bw_usage_update_at_top',
+                    'ctxt': self.ctxt.to_dict(),
+                    'method_kwargs': {
+                        'bw_update_info': self._fake_bw_update_info(2)}}]
+        message = messaging._BroadcastMessage(
+                self.src_msg_runner, self.ctxt, 'updates_at_top',
+                dict(updates=messaging._pack_updates(updates)), 'up',
+                run_locally=False)
+        with contextlib.nested(
+                mock.patch.object(self.tgt_db_inst, 'instance_destroy'),
+                mock.patch.object(self.tgt_db_inst, 'bw_usage_update',
+                                  side_effect=[test.TestingException,
+                                               None]),
+        ) as (tgt_destroy, tgt_bw_update):
+            message.process()
+        self.assertFalse(tgt_destroy.called)
+        self.assertEqual(2, tgt_bw_update.call_count)
+
     def test_sync_instances(self):
         # Reset this, as this is a broadcast down.
         self._setup_attrs(up=False)
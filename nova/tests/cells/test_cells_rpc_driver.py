@@ -25,6 +25,7 @@ from oslo import messaging as oslo_messaging
 from nova.cells import messaging
 from nova.cells import rpc_driver
 from nova import context
+from nova.openstack.common import jsonutils
 from nova import rpc
 from nova import test
 from nova.tests.cells import fakes
@@ -126,6 +127,8 @@ class CellsRPCDriverTestCase(test.NoDBTestCase):
             mox.Func(check_transport_url),
             'cells.intercell.targeted').AndReturn(rpcclient)
 
+        rpcclient.can_send_version('1.1').AndReturn(True)
+        rpcclient.prepare(version='1.1').AndReturn(rpcclient)
         rpcclient.cast(mox.IgnoreArg(), 'process_message',
                        message=message.to_json())
 
@@ -159,6 +162,8 @@ class CellsRPCDriverTestCase(test.NoDBTestCase):
             mox.Func(check_transport_url),
             'cells.intercell.targeted').AndReturn(rpcclient)
 
+        rpcclient.can_send_version('1.1').AndReturn(True)
+        rpcclient.prepare(version='1.1').AndReturn(rpcclient)
         rpcclient.prepare(fanout=True).AndReturn(rpcclient)
         rpcclient.cast(mox.IgnoreArg(), 'process_message',
                        message=message.to_json())
@@ -195,6 +200,8 @@ class CellsRPCDriverTestCase(test.NoDBTestCase):
             mox.Func(check_transport_url),
             'cells.intercell42.fake-message-type').AndReturn(rpcclient)
 
+        rpcclient.can_send_version('1.1').AndReturn(True)
+        rpcclient.prepare(version='1.1').AndReturn(rpcclient)
         rpcclient.prepare(fanout=True).AndReturn(rpcclient)
         rpcclient.cast(mox.IgnoreArg(), 'process_message',
                        message=message.to_json())
@@ -203,6 +210,32 @@ class CellsRPCDriverTestCase(test.NoDBTestCase):
 
         self.driver.send_message_to_cell(cell_state, message)
 
+    def test_send_message_to_cell_version_1_0(self):
+        msg_runner = fakes.get_message_runner('api-cell')
+        cell_state = fakes.get_cell_state('api-cell', 'child-cell2')
+        message = messaging._BroadcastMessage(msg_runner,
+                self.ctxt, 'fake', {}, 'down', need_response=True)
+        self.assertIn('timeout', jsonutils.loads(message.to_json()))
+
+        rpcapi = self.driver.intercell_rpcapi
+        rpcclient = self.mox.CreateMockAnything()
+
+        self.mox.StubOutWithMock(rpcapi, '_get_client')
+        rpcapi._get_client(
+            mox.IgnoreArg(),
+            'cells.intercell.broadcast').AndReturn(rpcclient)
+
+        def check_message(json_message):
+            return 'timeout' not in jsonutils.loads(json_message)
+
+        rpcclient.can_send_version('1.1').AndReturn(False)
+        rpcclient.cast(mox.IgnoreArg(), 'process_message',
+                       message=mox.Func(check_message))
+
+        self.mox.ReplayAll()
+
+        self.driver.send_message_to_cell(cell_state, message)
+
     def test_process_message(self):
         msg_runner = fakes.get_message_runner('api-cell')
         dispatcher = rpc_driver.InterCellRPCDispatcher(msg_runner)
@@ -261,16 +261,44 @@ class CellsAPITestCase(test.NoDBTestCase):
                            version='1.1')
 
     def test_service_get_all(self):
-        call_info = self._stub_rpc_method('call', 'fake_response')
+        call_info = self._stub_rpc_method('call',
+                {'result': 'fake_response', 'timed_out_cells': ['cell2']})
         fake_filters = {'key1': 'val1', 'key2': 'val2'}
         result = self.cells_rpcapi.service_get_all(self.fake_context,
                 filters=fake_filters)
 
-        expected_args = {'filters': fake_filters}
+        expected_args = {'filters': fake_filters,
+                         'timeout': None,
+                         'with_timed_out_cells': True}
         self._check_result(call_info, 'service_get_all', expected_args,
-                           version='1.2')
+                           version='1.30')
         self.assertEqual(result, 'fake_response')
 
+    def test_service_get_all_with_timed_out_cells(self):
+        call_info = self._stub_rpc_method('call',
+                {'result': 'fake_response', 'timed_out_cells': ['cell2']})
+        result = self.cells_rpcapi.service_get_all(self.fake_context,
+                timeout=5, with_timed_out_cells=True)
+
+        expected_args = {'filters': None,
+                         'timeout': 5,
+                         'with_timed_out_cells': True}
+        self._check_result(call_info, 'service_get_all', expected_args,
+                           version='1.30')
+        self.assertEqual(('fake_response', ['cell2']), result)
+
+    def test_service_get_all_with_timed_out_cells_old_version(self):
+        call_info = self._stub_rpc_method('call', 'fake_response')
+        self.stubs.Set(self.cells_rpcapi.client, 'can_send_version',
+                       lambda version: version != '1.30')
+        result = self.cells_rpcapi.service_get_all(self.fake_context,
+                timeout=5, with_timed_out_cells=True)
+
+        expected_args = {'filters': None}
+        self._check_result(call_info, 'service_get_all', expected_args,
+                           version='1.2')
+        self.assertEqual(('fake_response', []), result)
+
     def test_service_get_by_compute_host(self):
         call_info = self._stub_rpc_method('call', 'fake_response')
         result = self.cells_rpcapi.service_get_by_compute_host(
@@ -348,17 +376,33 @@ class CellsAPITestCase(test.NoDBTestCase):
         self.assertEqual(result, 'fake_response')
 
     def test_compute_node_get_all(self):
-        call_info = self._stub_rpc_method('call', 'fake_response')
+        call_info = self._stub_rpc_method('call',
+                {'result': 'fake_response', 'timed_out_cells': []})
         result = self.cells_rpcapi.compute_node_get_all(self.fake_context,
                 hypervisor_match='fake-match')
 
-        expected_args = {'hypervisor_match': 'fake-match'}
+        expected_args = {'hypervisor_match': 'fake-match',
+                         'timeout': None,
+                         'with_timed_out_cells': True}
         self._check_result(call_info, 'compute_node_get_all', expected_args,
-                           version='1.4')
+                           version='1.30')
         self.assertEqual(result, 'fake_response')
 
     def test_compute_node_stats(self):
+        call_info = self._stub_rpc_method('call',
+                {'result': 'fake_response', 'timed_out_cells': ['cell2']})
+        result = self.cells_rpcapi.compute_node_stats(self.fake_context,
+                timeout=5, with_timed_out_cells=True)
+        expected_args = {'timeout': 5,
+                         'with_timed_out_cells': True}
+        self._check_result(call_info, 'compute_node_stats',
+                           expected_args, version='1.30')
+        self.assertEqual(('fake_response', ['cell2']), result)
+
+    def test_compute_node_stats_old_version(self):
         call_info = self._stub_rpc_method('call', 'fake_response')
+        self.stubs.Set(self.cells_rpcapi.client, 'can_send_version',
+                       lambda version: version != '1.30')
         result = self.cells_rpcapi.compute_node_stats(self.fake_context)
         expected_args = {}
         self._check_result(call_info, 'compute_node_stats',
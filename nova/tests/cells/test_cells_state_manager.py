@@ -16,6 +16,8 @@
 Tests For CellStateManager
 """
 
+import contextlib
+import datetime
 import time
 
 import mock
@@ -30,6 +32,8 @@ from nova import exception
 from nova.openstack.common import fileutils
 from nova import test
 
+CONF = cfg.CONF
+
 FAKE_COMPUTES = [
     ('host1', 1024, 100, 0, 0),
     ('host2', 1024, 100, -1, -1),
@@ -48,16 +52,22 @@ FAKE_ITYPES = [
 ]
 
 
-def _fake_compute_node_get_all(context):
-    def _node(host, total_mem, total_disk, free_mem, free_disk):
-        service = {'host': host, 'disabled': False}
-        return {'service': service,
-                'memory_mb': total_mem,
-                'local_gb': total_disk,
-                'free_ram_mb': free_mem,
-                'free_disk_gb': free_disk}
+def _fake_node(compute_id, host, total_mem, total_disk, free_mem, free_disk,
+               disabled=False):
+    service = {'id': compute_id, 'host': host, 'binary': 'nova-compute',
+               'disabled': disabled}
+    return {'id': compute_id,
+            'service_id': compute_id,
+            'service': service,
+            'memory_mb': total_mem,
+            'local_gb': total_disk,
+            'free_ram_mb': free_mem,
+            'free_disk_gb': free_disk,
+            'deleted': False}
+
 
-    return [_node(*fake) for fake in FAKE_COMPUTES]
+def _fake_compute_node_get_all(context, updated_since=None):
+    return [_fake_node(i + 1, *fake) for i, fake in enumerate(FAKE_COMPUTES)]
 
 
 def _fake_instance_type_all(context):
@@ -162,6 +172,109 @@ class TestCellsStateManager(test.TestCase):
         my_state = state_manager.get_my_state()
         return my_state.capacities
 
+    def _full_capacity(self, compute_nodes):
+        with mock.patch.object(db, 'compute_node_get_all',
+                               return_value=compute_nodes):
+            return state.CellStateManager().get_my_state().capacities
+
+    def _update_capacity(self, state_manager, changed_nodes, services):
+        last_sync = state_manager.last_capacity_sync
+        # Delta queries do not join the services of the compute nodes.
+        changed_nodes = [dict((key, value) for key, value in node.items()
+                              if key != 'service')
+                         for node in changed_nodes]
+        with contextlib.nested(
+                mock.patch.object(db, 'compute_node_get_all',
+                                  return_value=changed_nodes),
+                mock.patch.object(db, 'service_get_all',
+                                  return_value=services),
+        ) as (mock_get_all, mock_service_get_all):
+            state_manager._update_our_capacity()
+        since = last_sync - datetime.timedelta(
+                seconds=CONF.cells.capacity_sync_overlap)
+        mock_get_all.assert_called_once_with(mock.ANY, updated_since=since)
+        return state_manager.get_my_state().capacities
+
+    def test_capacity_update_changed_node(self):
+        state_manager = self._get_state_manager(50.0)
+        compute_nodes = _fake_compute_node_get_all(None)
+        services = [compute['service'] for compute in compute_nodes]
+        compute_nodes[2] = _fake_node(3, 'host3', 1024, 100, 768, 50)
+
+        capacities = self._update_capacity(state_manager,
+                                           [compute_nodes[2]], services)
+        self.assertEqual(self._full_capacity(compute_nodes), capacities)
+        self.assertEqual(5, capacities['ram_free']['units_by_mb']['50'])
+
+    def test_capacity_update_unchanged_node(self):
+        state_manager = self._get_state_manager(50.0)
+        capacities = state_manager.get_my_state().capacities
+        compute_nodes = _fake_compute_node_get_all(None)
+        services = [compute['service'] for compute in compute_nodes]
+
+        with mock.patch.object(state_manager,
+                               '_compute_node_capacity') as mock_capacity:
+            self.assertEqual(capacities,
+                             self._update_capacity(state_manager,
+                                                   compute_nodes, services))
+        self.assertFalse(mock_capacity.called)
+
+    def test_capacity_update_disabled_service(self):
+        state_manager = self._get_state_manager(50.0)
+        compute_nodes = _fake_compute_node_get_all(None)
+        services = [compute['service'] for compute in compute_nodes]
+        services[2] = dict(services[2], disabled=True)
+        compute_nodes[2]['service'] = services[2]
+
+        capacities = self._update_capacity(state_manager, [], services)
+        self.assertEqual(self._full_capacity(compute_nodes), capacities)
+        self.assertEqual(0, capacities['ram_free']['units_by_mb']['50'])
+
+    def test_capacity_update_deleted_node(self):
+        state_manager = self._get_state_manager(50.0)
+        compute_nodes = _fake_compute_node_get_all(None)
+        services = [compute['service'] for compute in compute_nodes]
+        deleted_node = dict(compute_nodes.pop(2), deleted=True)
+
+        capacities = self._update_capacity(state_manager, [deleted_node],
+                                           services)
+        self.assertEqual(self._full_capacity(compute_nodes), capacities)
+
+    def test_capacity_update_all_nodes_deleted(self):
+        state_manager = self._get_state_manager(50.0)
+        compute_nodes = [dict(compute, deleted=True) for compute in
+                         _fake_compute_node_get_all(None)]
+
+        self.assertEqual({}, self._update_capacity(state_manager,
+                                                   compute_nodes, []))
+
+    def test_capacity_full_sync_when_flavors_change(self):
+        state_manager = self._get_state_manager(50.0)
+        flavors = _fake_instance_type_all(None)
+        flavors.append({'memory_mb': 100, 'root_gb': 1, 'ephemeral_gb': 0})
+
+        with contextlib.nested(
+                mock.patch.object(db, 'flavor_get_all',
+                                  return_value=flavors),
+                mock.patch.object(db, 'compute_node_get_all',
+                                  side_effect=_fake_compute_node_get_all),
+        ) as (mock_flavor_get_all, mock_get_all):
+            state_manager._update_our_capacity()
+        mock_get_all.assert_called_once_with(mock.ANY)
+        capacities = state_manager.get_my_state().capacities
+        self.assertEqual(5, capacities['ram_free']['units_by_mb']['100'])
+
+    def test_capacity_full_sync_interval(self):
+        state_manager = self._get_state_manager(50.0)
+        state_manager.last_full_capacity_sync -= datetime.timedelta(
+                seconds=CONF.cells.capacity_full_sync_interval + 1)
+
+        with mock.patch.object(db, 'compute_node_get_all',
+                               side_effect=_fake_compute_node_get_all
+                               ) as mock_get_all:
+            state_manager._update_our_capacity()
+        mock_get_all.assert_called_once_with(mock.ANY)
+
 
 class TestCellStateManagerException(test.TestCase):
     @mock.patch.object(time, 'sleep')
@@ -211,6 +324,73 @@ class TestCellsGetCapacity(TestCellsStateManager):
                           self.state_manager.get_capacities,
                           cell_name="invalid_cell_name")
 
+    def test_update_cell_capacities_delta(self):
+        cell = state.CellState('child_cell')
+        cell.update_capacities({'ram_free': {'total_mb': 1024,
+                                             'units_by_mb': {'512': 2}}})
+        base_digest = state.capacities_digest(cell.capacities)
+        self.stubs.Set(self.state_manager, 'child_cells',
+                       {'child_cell': cell})
+
+        self.assertTrue(self.state_manager.update_cell_capacities_delta(
+                'child_cell', {'ram_free': {'total_mb': -512,
+                                            'units_by_mb': {'512': -1}}},
+                base_digest))
+        self.assertEqual({'ram_free': {'total_mb': 512,
+                                       'units_by_mb': {'512': 1}}},
+                         cell.capacities)
+
+    def test_update_cell_capacities_delta_wrong_base(self):
+        cell = state.CellState('child_cell')
+        capacities = {'ram_free': {'total_mb': 1024,
+                                   'units_by_mb': {'512': 2}}}
+        cell.update_capacities(capacities)
+        self.stubs.Set(self.state_manager, 'child_cells',
+                       {'child_cell': cell})
+
+        self.assertFalse(self.state_manager.update_cell_capacities_delta(
+                'child_cell', {'ram_free': {'total_mb': -512}},
+                state.capacities_digest({})))
+        self.assertEqual(capacities, cell.capacities)
+
+
+class TestCapacitiesDelta(test.NoDBTestCase):
+    def test_capacities_delta(self):
+        old = {'ram_free': {'total_mb': 1024,
+                            'units_by_mb': {'512': 2, '1024': 1}},
+               'disk_free': {'total_mb': 10240,
+                             'units_by_mb': {'10240': 1}}}
+        new = {'ram_free': {'total_mb': 512,
+                            'units_by_mb': {'512': 1, '1024': 0}},
+               'disk_free': {'total_mb': 10240,
+                             'units_by_mb': {'10240': 1}}}
+        self.assertEqual({'ram_free': {'total_mb': -512,
+                                       'units_by_mb': {'512': -1,
+                                                       '1024': -1}}},
+                         state.capacities_delta(old, new))
+
+    def test_capacities_delta_unchanged(self):
+        capacities = {'ram_free': {'total_mb': 1024,
+                                   'units_by_mb': {'512': 2}}}
+        self.assertEqual({}, state.capacities_delta(capacities, capacities))
+
+    def test_capacities_delta_different_keys(self):
+        old = {'ram_free': {'total_mb': 1024, 'units_by_mb': {'512': 2}}}
+        new = {'ram_free': {'total_mb': 1024, 'units_by_mb': {'256': 4}}}
+        self.assertIsNone(state.capacities_delta(old, new))
+        self.assertIsNone(state.capacities_delta(old, {}))
+        self.assertIsNone(state.capacities_delta(None, new))
+
+    def test_capacities_digest(self):
+        capacities = {'ram_free': {'total_mb': 1024,
+                                   'units_by_mb': {'512': 2}}}
+        self.assertEqual(state.capacities_digest(capacities),
+                         state.capacities_digest(
+                             {u'ram_free': {u'units_by_mb': {u'512': 2},
+                                            u'total_mb': 1024}}))
+        self.assertNotEqual(state.capacities_digest(capacities),
+                            state.capacities_digest({}))
+
 
 class FakeCellStateManager(object):
     def __init__(self):
@@ -6273,14 +6273,16 @@ class ComputeTestCase(BaseTestCase):
             # These won't be in our instance since they're not requested
             instances.append(instance_map[inst_uuid])
 
-        call_info = {'get_all_by_host': 0, 'get_by_uuid': 0,
+        call_info = {'get_columns_by_host': 0, 'get_by_uuid': 0,
                 'get_nw_info': 0, 'expected_instance': None}
 
-        def fake_instance_get_all_by_host(context, host,
-                                          columns_to_join, use_slave=False):
-            call_info['get_all_by_host'] += 1
-            self.assertEqual([], columns_to_join)
-            return instances[:]
+        def fake_instance_get_columns_by_host(context, host, columns,
+                                              use_slave=False):
+            call_info['get_columns_by_host'] += 1
+            self.assertEqual(['id', 'task_state', 'uuid', 'vm_state'],
+                             columns)
+            return [dict((column, inst[column]) for column in columns)
+                    for inst in instances]
 
         def fake_instance_get_by_uuid(context, instance_uuid,
                                       columns_to_join, use_slave=False):
@@ -6303,8 +6305,8 @@ class ComputeTestCase(BaseTestCase):
             if _get_instance_nw_info_raise:
                 raise exception.InstanceNotFound(instance_id=instance['uuid'])
 
-        self.stubs.Set(db, 'instance_get_all_by_host',
-                fake_instance_get_all_by_host)
+        self.stubs.Set(db, 'instance_get_columns_by_host',
+                fake_instance_get_columns_by_host)
         self.stubs.Set(db, 'instance_get_by_uuid',
                 fake_instance_get_by_uuid)
         self.stubs.Set(self.compute, '_get_instance_nw_info',
@@ -6317,14 +6319,14 @@ class ComputeTestCase(BaseTestCase):
         # '0', '1' should be skipped..
         call_info['expected_instance'] = instances[2]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(0, call_info['get_by_uuid'])
+        self.assertEqual(1, call_info['get_columns_by_host'])
+        self.assertEqual(1, call_info['get_by_uuid'])
         self.assertEqual(1, call_info['get_nw_info'])
 
         call_info['expected_instance'] = instances[3]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(1, call_info['get_by_uuid'])
+        self.assertEqual(1, call_info['get_columns_by_host'])
+        self.assertEqual(2, call_info['get_by_uuid'])
         self.assertEqual(2, call_info['get_nw_info'])
 
         # Make an instance switch hosts
@@ -6336,8 +6338,8 @@ class ComputeTestCase(BaseTestCase):
         # '4', '5', and '6' should be skipped..
         call_info['expected_instance'] = instances[7]
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(4, call_info['get_by_uuid'])
+        self.assertEqual(1, call_info['get_columns_by_host'])
+        self.assertEqual(5, call_info['get_by_uuid'])
         self.assertEqual(3, call_info['get_nw_info'])
         # Should be no more left.
         self.assertEqual(0, len(self.compute._instance_uuids_to_heal))
@@ -6349,9 +6351,9 @@ class ComputeTestCase(BaseTestCase):
 
         self.compute._heal_instance_info_cache(ctxt)
         # Should have called the list once more
-        self.assertEqual(2, call_info['get_all_by_host'])
+        self.assertEqual(2, call_info['get_columns_by_host'])
         # Stays the same because we remove invalid entries from the list
-        self.assertEqual(4, call_info['get_by_uuid'])
+        self.assertEqual(5, call_info['get_by_uuid'])
         # Stays the same because we didn't find anything to process
         self.assertEqual(3, call_info['get_nw_info'])
 
@@ -6361,6 +6363,45 @@ class ComputeTestCase(BaseTestCase):
     def test_heal_instance_info_cache_with_exception(self):
         self._heal_instance_info_cache(_get_instance_nw_info_raise=True)
 
+    def test_heal_instance_info_cache_batch(self):
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=3)
+        ctxt = context.get_admin_context()
+        instances = [objects.Instance(uuid='fake-uuid-%s' % x,
+                                      host=CONF.host,
+                                      vm_state=vm_states.ACTIVE,
+                                      task_state=None)
+                     for x in xrange(6)]
+        instances[1].host = 'not-me'
+        instances[4].vm_state = vm_states.BUILDING
+        instances[5].task_state = task_states.DELETING
+
+        def fake_get_by_filters(context, filters, **kwargs):
+            return [inst for inst in instances
+                    if inst.uuid in filters['uuid']]
+
+        with contextlib.nested(
+            mock.patch.object(objects.InstanceList, 'get_projection_by_host',
+                              return_value=instances),
+            mock.patch.object(objects.InstanceList, 'get_by_filters',
+                              side_effect=fake_get_by_filters),
+            mock.patch.object(self.compute.network_api,
+                              'get_instance_nw_info_bulk', return_value={})
+        ) as (get_by_host, get_by_filters, get_nw_info_bulk):
+            self.compute._heal_instance_info_cache(ctxt)
+            get_nw_info_bulk.assert_called_once_with(
+                ctxt, [instances[0], instances[2]])
+
+            get_nw_info_bulk.reset_mock()
+            self.compute._heal_instance_info_cache(ctxt)
+            get_nw_info_bulk.assert_called_once_with(ctxt, [instances[3]])
+
+            get_nw_info_bulk.reset_mock()
+            self.compute._heal_instance_info_cache(ctxt)
+            self.assertEqual(2, get_by_host.call_count)
+            get_nw_info_bulk.assert_called_once_with(
+                ctxt, [instances[0], instances[2]])
+
     @mock.patch('nova.objects.InstanceList.get_by_filters')
     @mock.patch('nova.compute.api.API.unrescue')
     def test_poll_rescued_instances(self, unrescue, get):
@@ -8122,6 +8163,24 @@ class ComputeAPITestCase(BaseTestCase):
         db.instance_destroy(c, instance2['uuid'])
         db.instance_destroy(c, instance3['uuid'])
 
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    def test_get_all_expected_attrs(self, mock_get):
+        mock_get.return_value = objects.InstanceList(objects=[])
+        c = context.get_admin_context()
+
+        self.compute_api.get_all(c, want_objects=True)
+        self.assertEqual(['metadata', 'system_metadata', 'info_cache',
+                          'security_groups'],
+                         mock_get.call_args[1]['expected_attrs'])
+
+        self.compute_api.get_all(c, want_objects=True, expected_attrs=[])
+        self.assertEqual([], mock_get.call_args[1]['expected_attrs'])
+
+        self.compute_api.get_all(c, search_opts={'ip': '10.0.0.1'},
+                                 want_objects=True, expected_attrs=[])
+        self.assertEqual(['info_cache'],
+                         mock_get.call_args[1]['expected_attrs'])
+
     def test_get_all_by_multiple_options_at_once(self):
         # Test searching by multiple options at once.
         c = context.get_admin_context()
@@ -1103,6 +1103,116 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase):
                                                           power_state.NOSTATE,
                                                           use_slave=True)
 
+    @mock.patch.object(objects.InstanceList, 'get_projection_by_host')
+    def test_sync_power_states_bulk(self, mock_get_by_host):
+        in_sync = objects.Instance(uuid='in-sync', task_state=None,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.RUNNING)
+        changed = objects.Instance(uuid='changed', task_state=None,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.RUNNING)
+        missing = objects.Instance(uuid='missing', task_state=None,
+                                   vm_state=vm_states.STOPPED,
+                                   power_state=power_state.NOSTATE)
+        stopped = objects.Instance(uuid='stopped', task_state=None,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.SHUTDOWN)
+        pending = objects.Instance(uuid='pending',
+                                   task_state=task_states.POWERING_OFF,
+                                   vm_state=vm_states.ACTIVE,
+                                   power_state=power_state.RUNNING)
+        mock_get_by_host.return_value = [in_sync, changed, missing, stopped,
+                                         pending]
+        infos = {'in-sync': {'state': power_state.RUNNING},
+                 'changed': {'state': power_state.SHUTDOWN},
+                 'stopped': {'state': power_state.SHUTDOWN},
+                 'pending': {'state': power_state.RUNNING}}
+
+        with contextlib.nested(
+            mock.patch.object(self.compute.driver, 'get_info_all',
+                              return_value=infos),
+            mock.patch.object(self.compute.driver, 'get_num_instances',
+                              return_value=4),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_get_info_all, mock_num, mock_spawn):
+            self.compute._sync_power_states(self.context)
+
+        self.assertEqual([changed, stopped, pending],
+                         [args[1] for args, kwargs in
+                          mock_spawn.call_args_list])
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host,
+            ['vm_state', 'task_state', 'power_state'], use_slave=True)
+
+    def test_sync_power_states_loads_records(self):
+        row = {'id': 1, 'uuid': 'fake-uuid', 'vm_state': vm_states.ACTIVE,
+               'task_state': None, 'power_state': power_state.RUNNING}
+        instance = objects.Instance(uuid='fake-uuid')
+
+        with contextlib.nested(
+            mock.patch.object(db, 'instance_get_columns_by_host',
+                              return_value=[row]),
+            mock.patch.object(self.compute.driver, 'get_info_all',
+                              return_value={}),
+            mock.patch.object(self.compute.driver, 'get_num_instances',
+                              return_value=1),
+            mock.patch.object(objects.Instance, 'get_by_uuid',
+                              return_value=instance),
+            mock.patch.object(self.compute,
+                              '_query_driver_power_state_and_sync'),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n',
+                              side_effect=lambda f, *args: f(*args))
+        ) as (mock_get, mock_info_all, mock_num, mock_get_by_uuid,
+              mock_sync, mock_spawn):
+            self.compute._sync_power_states(self.context)
+
+        mock_get_by_uuid.assert_called_once_with(
+            self.context, 'fake-uuid', expected_attrs=None, use_slave=True)
+        mock_sync.assert_called_once_with(self.context, instance)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_without_bulk_info(self, mock_get_by_host):
+        instance = objects.Instance(uuid='fake-uuid', task_state=None,
+                                    vm_state=vm_states.ACTIVE,
+                                    power_state=power_state.RUNNING)
+        mock_get_by_host.return_value = [instance]
+
+        with contextlib.nested(
+            mock.patch.object(self.compute.driver, 'get_info_all',
+                              side_effect=NotImplementedError),
+            mock.patch.object(self.compute.driver, 'get_num_instances',
+                              return_value=1),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_get_info_all, mock_num, mock_spawn):
+            self.compute._sync_power_states(self.context)
+
+        self.assertEqual(1, mock_spawn.call_count)
+
+    @mock.patch.object(objects.InstanceList, 'get_projection_by_host')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    def test_sync_power_states_bulk_info_fails(self, mock_get_by_host,
+                                               mock_get_projection):
+        instance = objects.Instance(uuid='fake-uuid', task_state=None,
+                                    vm_state=vm_states.ACTIVE,
+                                    power_state=power_state.RUNNING)
+        mock_get_by_host.return_value = [instance]
+
+        with contextlib.nested(
+            mock.patch.object(self.compute.driver, 'get_info_all',
+                              side_effect=test.TestingException),
+            mock.patch.object(self.compute.driver, 'get_num_instances',
+                              return_value=1),
+            mock.patch.object(self.compute._sync_power_pool, 'spawn_n')
+        ) as (mock_get_info_all, mock_num, mock_spawn):
+            self.compute._sync_power_states(self.context)
+
+        # Every instance is synced on its own, as without bulk info.
+        mock_get_by_host.assert_called_once_with(
+            self.context, self.compute.host, use_slave=True)
+        self.assertFalse(mock_get_projection.called)
+        self.assertEqual([instance], [args[1] for args, kwargs in
+                                      mock_spawn.call_args_list])
+
     def test_run_pending_deletes(self):
         self.flags(instance_delete_interval=10)
 
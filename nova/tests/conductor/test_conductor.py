@@ -1336,6 +1336,62 @@ class _BaseTaskTestCase(object):
                 block_device_mapping='block_device_mapping',
                 legacy_bdm=False)
 
+    def test_build_instances_batch(self):
+        self.flags(build_batch_threshold=3, group='conductor')
+        fake_utils.stub_out_utils_spawn_n(self.stubs)
+        instances = [fake_instance.fake_instance_obj(self.context)
+                     for i in xrange(3)]
+        uuids = [inst.uuid for inst in instances]
+        hosts = [{'host': 'host%d' % i, 'nodename': 'node%d' % i,
+                  'limits': []} for i in xrange(3)]
+        bdms = [objects.BlockDeviceMapping(id=i, instance_uuid=uuids[j])
+                for i, j in enumerate((0, 2, 2))]
+
+        def fake_refresh_all(context, instances):
+            # The second instance was deleted in the meantime
+            return [instances[0], instances[2]]
+
+        with contextlib.nested(
+            mock.patch.object(scheduler_utils, 'build_request_spec',
+                              return_value={'num_instances': 3}),
+            mock.patch.object(self.conductor_manager.scheduler_client,
+                              'select_destinations', return_value=hosts),
+            mock.patch.object(objects.InstanceList, 'refresh_all',
+                              side_effect=fake_refresh_all),
+            mock.patch.object(objects.BlockDeviceMappingList,
+                              'get_by_instance_uuids', return_value=bdms),
+            mock.patch.object(self.conductor_manager.compute_rpcapi,
+                              'build_and_run_instance'),
+        ) as (_spec, _select, _refresh, get_bdms, build):
+            # build_instances() is a cast, we need to wait for it to complete
+            self.useFixture(cast_as_call.CastAsCall(self.stubs))
+            self.conductor.build_instances(self.context,
+                    instances=instances,
+                    image={'fake_data': 'should_pass_silently'},
+                    filter_properties={},
+                    admin_password='admin_password',
+                    injected_files='injected_files',
+                    requested_networks=None,
+                    security_groups='security_groups',
+                    block_device_mapping='block_device_mapping',
+                    legacy_bdm=False)
+
+        self.assertEqual(1, get_bdms.call_count)
+        self.assertEqual([uuids[0], uuids[2]], get_bdms.call_args[0][1])
+        self.assertEqual(2, build.call_count)
+        calls = sorted((call[1] for call in build.call_args_list),
+                       key=lambda kwargs: kwargs['host'])
+        self.assertEqual(['host0', 'host2'],
+                         [kwargs['host'] for kwargs in calls])
+        self.assertEqual([uuids[0], uuids[2]],
+                         [kwargs['instance'].uuid for kwargs in calls])
+        self.assertEqual([[['host0', 'node0']], [['host2', 'node2']]],
+                         [kwargs['filter_properties']['retry']['hosts']
+                          for kwargs in calls])
+        self.assertEqual([[0], [1, 2]],
+                         [[bdm.id for bdm in kwargs['block_device_mapping']]
+                          for kwargs in calls])
+
     def test_build_instances_scheduler_failure(self):
         instances = [fake_instance.fake_instance_obj(self.context)
                 for i in xrange(2)]
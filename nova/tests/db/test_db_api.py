@@ -747,6 +747,71 @@ class SqlAlchemyDbApiTestCase(DbTestCase):
             ctxt, begin=now2, end=now3)
         self.assertEqual(2, len(result))
 
+    def test_instance_get_columns_by_host(self):
+        ctxt = context.get_admin_context()
+        inst1 = self.create_instance_with_args(vcpus=2)
+        inst2 = self.create_instance_with_args(vcpus=4)
+        self.create_instance_with_args(host='host2')
+        deleted = self.create_instance_with_args()
+        db.instance_destroy(ctxt, deleted['uuid'])
+        result = sqlalchemy_api.instance_get_columns_by_host(
+            ctxt, 'host1', ['uuid', 'vcpus'])
+        self.assertEqual(sorted([{'uuid': inst1['uuid'], 'vcpus': 2},
+                                 {'uuid': inst2['uuid'], 'vcpus': 4}]),
+                         sorted(result))
+
+    def test_instance_get_active_by_window_joined_pages(self):
+        now = datetime.datetime(2013, 10, 10, 17, 16, 37, 156701)
+        ctxt = context.get_admin_context()
+        ids = [self.create_instance_with_args(launched_at=now)['id']
+               for i in range(5)]
+        result = sqlalchemy_api.instance_get_active_by_window_joined(
+            ctxt, begin=now, columns_to_join=[], limit=2)
+        self.assertEqual(ids[:2], [inst['id'] for inst in result])
+        result = sqlalchemy_api.instance_get_active_by_window_joined(
+            ctxt, begin=now, columns_to_join=[], limit=2,
+            marker_id=ids[1])
+        self.assertEqual(ids[2:4], [inst['id'] for inst in result])
+        result = sqlalchemy_api.instance_get_active_by_window_joined(
+            ctxt, begin=now, columns_to_join=[], limit=2,
+            marker_id=ids[3])
+        self.assertEqual(ids[4:], [inst['id'] for inst in result])
+
+    def test_instance_get_usage_totals_by_window(self):
+        begin = datetime.datetime(2013, 10, 10, 0, 0, 0)
+        end = datetime.datetime(2013, 10, 11, 0, 0, 0)
+        ctxt = context.get_admin_context()
+        # Runs for the whole window.
+        self.create_instance_with_args(
+            launched_at=begin - datetime.timedelta(days=1),
+            vcpus=2, memory_mb=512, root_gb=1, ephemeral_gb=1)
+        # Runs for 6 hours of the window.
+        self.create_instance_with_args(
+            launched_at=begin + datetime.timedelta(hours=2),
+            terminated_at=begin + datetime.timedelta(hours=8),
+            vcpus=1, memory_mb=256, root_gb=2, ephemeral_gb=0)
+        # Terminated before the window.
+        self.create_instance_with_args(
+            launched_at=begin - datetime.timedelta(days=2),
+            terminated_at=begin - datetime.timedelta(days=1))
+        self.create_instance_with_args(
+            launched_at=begin, project_id='project2', vcpus=4)
+
+        result = sqlalchemy_api.instance_get_usage_totals_by_window(
+            ctxt, begin, end, project_id=self.project_id)
+        self.assertEqual(1, len(result))
+        totals = result[0]
+        self.assertEqual(self.project_id, totals['project_id'])
+        self.assertAlmostEqual(30, totals['hours'])
+        self.assertAlmostEqual(24 * 2 + 6 * 1, totals['vcpus_hours'])
+        self.assertAlmostEqual(24 * 512 + 6 * 256, totals['memory_mb_hours'])
+        self.assertAlmostEqual(24 * 2 + 6 * 2, totals['local_gb_hours'])
+
+        result = sqlalchemy_api.instance_get_usage_totals_by_window(
+            ctxt, begin, end)
+        self.assertEqual(['fake', 'project2'],
+                         sorted(totals['project_id'] for totals in result))
+
 
 class ProcessSortParamTestCase(test.TestCase):
 
@@ -1127,6 +1192,81 @@ class ReservationTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(expected, db.quota_usage_get_all_by_project_and_user(
                                             self.ctxt, 'project1', 'user1'))
 
+    def _usages(self):
+        usages = db.quota_usage_get_all_by_project_and_user(
+            self.ctxt, 'project1', 'user1')
+        return dict((res, usages[res]) for res in
+                    ('resource0', 'resource1', 'fixed_ips'))
+
+    def _quota_reserve_cas(self, quotas, user_quotas, deltas):
+        return db.quota_reserve_cas(self.ctxt, {}, quotas, user_quotas,
+                                    deltas, self.values['expire'], 0, 0,
+                                    'project1', 'user1')
+
+    def test_quota_reserve_cas(self):
+        quotas = {'resource0': 10, 'resource1': 10, 'fixed_ips': 10}
+        reservations = self._quota_reserve_cas(
+            quotas, quotas, {'resource0': 2, 'fixed_ips': -1})
+
+        self.assertEqual(2, len(reservations))
+        self.assertEqual({'resource0': {'reserved': 2, 'in_use': 0},
+                          'resource1': {'reserved': 1, 'in_use': 1},
+                          'fixed_ips': {'reserved': 2, 'in_use': 2}},
+                         self._usages())
+        deltas = dict((r.resource, r.delta) for r in
+                      (_reservation_get(self.ctxt, uuid)
+                       for uuid in reservations))
+        self.assertEqual({'resource0': 2, 'fixed_ips': -1}, deltas)
+
+    def test_quota_reserve_cas_over_user_quota(self):
+        expected = self._usages()
+        self.assertRaises(exception.OverQuota, self._quota_reserve_cas,
+                          {'resource0': 10, 'resource1': 10},
+                          {'resource0': 10, 'resource1': 3},
+                          {'resource0': 1, 'resource1': 2})
+        self.assertEqual(expected, self._usages())
+
+    def test_quota_reserve_cas_over_project_quota(self):
+        expected = self._usages()
+        self.assertRaises(exception.OverQuota, self._quota_reserve_cas,
+                          {'resource1': 4}, {'resource1': 20},
+                          {'resource1': 3})
+        self.assertEqual(expected, self._usages())
+        self._quota_reserve_cas({'resource1': 4}, {'resource1': 20},
+                                {'resource1': 2})
+
+    def test_quota_reserve_cas_needs_refresh(self):
+        quotas = {'resource0': 10, 'resource5': 10}
+        self.assertIsNone(self._quota_reserve_cas(
+            quotas, quotas, {'resource0': 1, 'resource5': 1}))
+
+        db.quota_usage_update(self.ctxt, 'project1', 'user1', 'resource0',
+                              in_use=-1)
+        self.assertIsNone(self._quota_reserve_cas(
+            quotas, quotas, {'resource0': 1}))
+
+    def test_reservation_commit_cas(self):
+        db.reservation_commit_cas(self.ctxt, self.reservations)
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        expected = {'resource0': {'reserved': 0, 'in_use': 0},
+                    'resource1': {'reserved': 0, 'in_use': 2},
+                    'fixed_ips': {'reserved': 0, 'in_use': 4}}
+        self.assertEqual(expected, self._usages())
+
+        # Committing again does not count the reservations twice.
+        db.reservation_commit_cas(self.ctxt, self.reservations)
+        self.assertEqual(expected, self._usages())
+
+    def test_reservation_rollback_cas(self):
+        db.reservation_rollback_cas(self.ctxt, self.reservations)
+        self.assertRaises(exception.ReservationNotFound,
+            _reservation_get, self.ctxt, self.reservations[0])
+        self.assertEqual({'resource0': {'reserved': 0, 'in_use': 0},
+                          'resource1': {'reserved': 0, 'in_use': 1},
+                          'fixed_ips': {'reserved': 0, 'in_use': 2}},
+                         self._usages())
+
     def test_reservation_expire(self):
         db.reservation_expire(self.ctxt)
 
@@ -1900,6 +2040,18 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertEqual(result[0]['uuid'], instance['uuid'])
         self.assertEqual(result[0]['system_metadata'], [])
 
+    def test_instance_type_ids_get_all_by_host(self):
+        self.create_instance_with_args(host='h1', instance_type_id=1)
+        self.create_instance_with_args(host='h1', instance_type_id=1)
+        self.create_instance_with_args(host='h1', instance_type_id=2)
+        self.create_instance_with_args(host='h2', instance_type_id=2)
+        self.create_instance_with_args(host=None, instance_type_id=3)
+        inst = self.create_instance_with_args(host='h3', instance_type_id=4)
+        db.instance_destroy(self.ctxt, inst['uuid'])
+
+        result = db.instance_type_ids_get_all_by_host(self.ctxt)
+        self.assertEqual({'h1': set([1, 2]), 'h2': set([2])}, result)
+
     def test_instance_get_all_hung_in_rebooting(self):
         # Ensure no instances are returned.
         results = db.instance_get_all_hung_in_rebooting(self.ctxt, 10)
@@ -2146,6 +2298,32 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.assertIsNone(db.instance_info_cache_get(ctxt, inst_uuid))
         self.assertEqual({}, db.instance_metadata_get(ctxt, inst_uuid))
 
+    def test_instance_info_cache_update_many(self):
+        inst1 = self.create_instance_with_args()
+        inst2 = self.create_instance_with_args()
+        inst3 = self.create_instance_with_args()
+        db.instance_info_cache_delete(self.ctxt, inst3['uuid'])
+
+        missing = db.instance_info_cache_update_many(
+            self.ctxt, {inst1['uuid']: '[1]',
+                        inst2['uuid']: '[2]',
+                        inst3['uuid']: '[3]',
+                        'fake-uuid': '[4]'})
+
+        self.assertEqual(sorted([inst3['uuid'], 'fake-uuid']),
+                         sorted(missing))
+        for uuid, network_info in ((inst1['uuid'], '[1]'),
+                                   (inst2['uuid'], '[2]')):
+            info_cache = db.instance_info_cache_get(self.ctxt, uuid)
+            self.assertEqual(network_info, info_cache['network_info'])
+            self.assertIsNotNone(info_cache['updated_at'])
+        self.assertIsNone(db.instance_info_cache_get(self.ctxt,
+                                                     inst3['uuid']))
+
+    def test_instance_info_cache_update_many_empty(self):
+        self.assertEqual([], db.instance_info_cache_update_many(self.ctxt,
+                                                                {}))
+
     def test_instance_destroy_already_destroyed(self):
         ctxt = context.get_admin_context()
         instance = self.create_instance_with_args()
@@ -4775,6 +4953,28 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        bmds_values = [{'instance_uuid': uuid1,
+                        'device_name': '/dev/vda'},
+                       {'instance_uuid': uuid2,
+                        'device_name': '/dev/vdb'},
+                       {'instance_uuid': uuid3,
+                        'device_name': '/dev/vdc'}]
+
+        for bdm in bmds_values:
+            self._create_bdm(bdm)
+
+        bmd = db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, [uuid1, uuid2])
+        self.assertEqual(['/dev/vda', '/dev/vdb'],
+                         sorted(b['device_name'] for b in bmd))
+        self.assertEqual([], db.block_device_mapping_get_all_by_instance_uuids(
+            self.ctxt, []))
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -5767,6 +5967,27 @@ class ComputeNodeTestCase(test.TestCase, ModelsObjectComparatorMixin):
             # Clean up the service
             db.service_destroy(self.ctxt, service['id'])
 
+    def test_compute_node_get_all_updated_since(self):
+        since = timeutils.utcnow()
+        nodes = db.compute_node_get_all(self.ctxt, updated_since=since)
+        self.assertEqual([], nodes)
+
+        compute_node_data = self.compute_node_dict.copy()
+        compute_node_data['hypervisor_hostname'] = 'new-node'
+        new_node = db.compute_node_create(self.ctxt, compute_node_data)
+        db.compute_node_update(self.ctxt, self.item['id'], {'vcpus_used': 1})
+        nodes = db.compute_node_get_all(self.ctxt, updated_since=since)
+        self.assertEqual(set([self.item['id'], new_node['id']]),
+                         set(node['id'] for node in nodes))
+
+        since = timeutils.utcnow()
+        db.compute_node_delete(self.ctxt, new_node['id'])
+        nodes = db.compute_node_get_all(self.ctxt, updated_since=since)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(new_node['id'], nodes[0]['id'])
+        self.assertTrue(nodes[0]['deleted'])
+        self.assertNotIn('service', nodes[0])
+
     def test_compute_node_get_all_mult_compute_nodes_one_service_entry(self):
         service_data = self.service_dict.copy()
         service_data['host'] = 'host2'
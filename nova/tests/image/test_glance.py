@@ -516,6 +516,7 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
     def test_download_direct_file_uri(self, show_mock, get_tran_mock):
         self.flags(allowed_direct_url_schemes=['file'], group='glance')
         show_mock.return_value = {
+            'checksum': mock.sentinel.checksum,
             'locations': [
                 {
                     'url': 'file:///files/image',
@@ -537,9 +538,9 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
                                           mock.sentinel.image_id,
                                           include_locations=True)
         get_tran_mock.assert_called_once_with('file')
-        tran_mod.download.assert_called_once_with(ctx, mock.ANY,
-                                                  mock.sentinel.dst_path,
-                                                  mock.sentinel.loc_meta)
+        tran_mod.download.assert_called_once_with(
+            ctx, mock.ANY, mock.sentinel.dst_path, mock.sentinel.loc_meta,
+            checksum=mock.sentinel.checksum)
 
     @mock.patch('__builtin__.open')
     @mock.patch('nova.image.glance.GlanceImageService._get_transfer_module')
@@ -578,7 +579,8 @@ class TestDownloadNoDirectUri(test.NoDBTestCase):
         get_tran_mock.assert_called_once_with('file')
         tran_mod.download.assert_called_once_with(ctx, mock.ANY,
                                                   mock.sentinel.dst_path,
-                                                  mock.sentinel.loc_meta)
+                                                  mock.sentinel.loc_meta,
+                                                  checksum=None)
         client.call.assert_called_once_with(ctx, 1, 'data',
                                             mock.sentinel.image_id)
         # NOTE(jaypipes): log messages call open() in part of the
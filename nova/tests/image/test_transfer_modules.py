@@ -12,13 +12,21 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import BaseHTTPServer
+import hashlib
+import os
+import threading
+import time
 import urlparse
 
 import mock
 
 from nova import exception
 from nova.image.download import file as tm_file
+from nova.image.download import http as tm_http
+from nova.openstack.common import units
 from nova import test
+from nova import utils
 
 
 class TestFileTransferModule(test.NoDBTestCase):
@@ -99,3 +107,158 @@ class TestFileTransferModule(test.NoDBTestCase):
                           tm.download, mock.sentinel.ctx, url_parts,
                           dst_file, loc_meta)
         self.assertFalse(copy_mock.called)
+
+
+class _ImageRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves server.data, with range requests if server.accept_ranges.
+
+    The first response to a range starting at one of server.fail_once is
+    cut in the middle, and so is every response to a range request if
+    server.fail_always.  The first response to a range starting at one of
+    server.stall_once stops sending data for a second after the headers,
+    and the ranges returned start server.range_shift bytes after the ones
+    requested.
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def _send_headers(self, code, length, content_range=None):
+        self.send_response(code)
+        self.send_header('Content-Length', str(length))
+        if self.server.accept_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self._send_headers(200, len(self.server.data))
+
+    def do_GET(self):
+        data = self.server.data
+        byte_range = self.headers.get('Range')
+        self.server.ranges.append(byte_range)
+        if not byte_range or not self.server.accept_ranges:
+            self._send_headers(200, len(data))
+            self.wfile.write(data)
+            return
+
+        start, end = [int(i) for i in byte_range[6:].split('-')]
+        requested_start = start
+        start = min(start + self.server.range_shift, end)
+        body = data[start:end + 1]
+        self._send_headers(206, len(body),
+                           'bytes %d-%d/%d' % (start, end, len(data)))
+        if requested_start in self.server.stall_once:
+            self.server.stall_once.discard(requested_start)
+            time.sleep(1)
+        if start in self.server.fail_once or self.server.fail_always:
+            self.server.fail_once.discard(start)
+            body = body[:len(body) // 2]
+        self.wfile.write(body)
+
+
+class TestHttpTransferModule(test.NoDBTestCase):
+
+    def setUp(self):
+        super(TestHttpTransferModule, self).setUp()
+        self.flags(range_size_mb=1, group='image_http_url')
+        self.data = os.urandom(3 * units.Mi + 512 * units.Ki)
+        self.checksum = hashlib.md5(self.data).hexdigest()
+
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                _ImageRequestHandler)
+        self.server.data = self.data
+        self.server.accept_ranges = True
+        self.server.fail_once = set()
+        self.server.fail_always = False
+        self.server.stall_once = set()
+        self.server.range_shift = 0
+        self.server.ranges = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.url_parts = urlparse.urlparse('http://127.0.0.1:%d/image' %
+                                           self.server.server_port)
+        self.tm = tm_http.HttpTransfer()
+
+    def _download(self, checksum=None):
+        with utils.tempdir() as tmpdir:
+            dst_path = os.path.join(tmpdir, 'image')
+            self.tm.download(mock.sentinel.ctx, self.url_parts, dst_path, {},
+                             checksum=checksum)
+            with open(dst_path, 'rb') as f:
+                return f.read()
+
+    def test_http_download_ranges(self):
+        self.assertEqual(self.data, self._download(checksum=self.checksum))
+        self.assertEqual(['bytes=0-1048575',
+                          'bytes=1048576-2097151',
+                          'bytes=2097152-3145727',
+                          'bytes=3145728-3670015'],
+                         sorted(self.server.ranges))
+
+    def test_http_download_resumes_range(self):
+        self.server.fail_once.add(units.Mi)
+        self.assertEqual(self.data, self._download(checksum=self.checksum))
+        self.assertIn('bytes=%d-%d' % (units.Mi + units.Mi // 2,
+                                       2 * units.Mi - 1),
+                      self.server.ranges)
+
+    def test_http_download_retries_exhausted(self):
+        self.flags(num_retries=1, group='image_http_url')
+        self.server.fail_always = True
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self._download)
+
+    def test_http_download_resumes_after_timeout(self):
+        self.flags(timeout=0.2, group='image_http_url')
+        self.server.stall_once.add(2 * units.Mi)
+        self.assertEqual(self.data, self._download(checksum=self.checksum))
+        self.assertEqual(2, self.server.ranges.count(
+            'bytes=%d-%d' % (2 * units.Mi, 3 * units.Mi - 1)))
+
+    def test_http_download_content_range_mismatch(self):
+        self.server.range_shift = 1
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self._download)
+
+    def test_http_download_failure_stops_ranges(self):
+        self.flags(num_retries=0, group='image_http_url')
+        self.server.fail_once.add(0)
+        real_fetch_range = self.tm._fetch_range
+        fetched = []
+
+        def fetch_range(url, dst_path, start, end, abort):
+            try:
+                return real_fetch_range(url, dst_path, start, end, abort)
+            finally:
+                fetched.append((start, abort.ready()))
+
+        with mock.patch.object(self.tm, '_fetch_range',
+                               side_effect=fetch_range):
+            self.assertRaises(exception.ImageDownloadModuleError,
+                              self._download)
+        # Every range was waited for before the error was raised, and the
+        # ones still to start were aborted.
+        self.assertEqual([0, units.Mi, 2 * units.Mi, 3 * units.Mi],
+                         sorted(start for start, aborted in fetched))
+        self.assertTrue(dict(fetched)[3 * units.Mi])
+
+    def test_http_download_checksum_mismatch(self):
+        self.assertRaises(exception.ImageDownloadModuleError,
+                          self._download, checksum='0' * 32)
+
+    def test_http_download_without_ranges(self):
+        self.server.accept_ranges = False
+        self.assertEqual(self.data, self._download(checksum=self.checksum))
+        self.assertEqual([None], self.server.ranges)
+
+    def test_http_schemes(self):
+        self.assertEqual(['http', 'https'], tm_http.get_schemes())
+        self.assertIsInstance(tm_http.get_download_handler(),
+                              tm_http.HttpTransfer)
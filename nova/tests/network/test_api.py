@@ -585,7 +585,78 @@ class TestUpdateInstanceCache(test.TestCase):
                                         {'network_info': self.nw_json})
 
 
+@mock.patch('nova.db.instance_info_cache_update')
+@mock.patch('nova.db.instance_info_cache_update_many')
+class TestUpdateInstanceCaches(test.TestCase):
+    def setUp(self):
+        super(TestUpdateInstanceCaches, self).setUp()
+        self.context = context.get_admin_context()
+        self.nw_info = network_model.NetworkInfo(
+            [network_model.VIF(id='super_vif')])
+
+    def test_update_instance_caches(self, update_many_mock, update_mock):
+        update_many_mock.return_value = ['uuid2']
+        base_api.update_instance_caches_with_nw_info(
+            'impl', self.context, [{'uuid': 'uuid1'}, {'uuid': 'uuid2'}],
+            {'uuid1': self.nw_info, 'uuid2': network_model.NetworkInfo([])})
+        update_many_mock.assert_called_once_with(
+            self.context, {'uuid1': self.nw_info.json(), 'uuid2': '[]'})
+        update_mock.assert_called_once_with(self.context, 'uuid2',
+                                            {'network_info': '[]'})
+
+    @mock.patch('nova.cells.rpcapi.CellsAPI.instance_info_cache_update_at_top')
+    def test_update_instance_caches_updates_cells(self, cells_update_mock,
+                                                  update_many_mock,
+                                                  update_mock):
+        self.flags(enable=True, cell_type='compute', group='cells')
+        update_many_mock.return_value = ['uuid2']
+        update_mock.side_effect = exception.InstanceInfoCacheNotFound(
+            instance_uuid='uuid2')
+        base_api.update_instance_caches_with_nw_info(
+            'impl', self.context,
+            [{'uuid': 'uuid1'}, {'uuid': 'uuid2'}, {'uuid': 'uuid3'}],
+            {'uuid1': self.nw_info, 'uuid2': network_model.NetworkInfo([])})
+        cells_update_mock.assert_called_once_with(
+            self.context, {'instance_uuid': 'uuid1',
+                           'network_info': self.nw_info.json()})
+
+    @mock.patch('nova.cells.rpcapi.CellsAPI.instance_info_cache_update_at_top')
+    def test_update_instance_caches_no_cells(self, cells_update_mock,
+                                             update_many_mock, update_mock):
+        update_many_mock.return_value = []
+        base_api.update_instance_caches_with_nw_info(
+            'impl', self.context, [{'uuid': 'uuid1'}],
+            {'uuid1': self.nw_info})
+        self.assertFalse(cells_update_mock.called)
+
+    def test_get_instance_nw_info_bulk(self, update_many_mock, update_mock):
+        update_many_mock.return_value = []
+        instances = [{'uuid': 'uuid1'}, {'uuid': 'uuid2'}, {'uuid': 'uuid3'}]
+        network_api = api.API()
+
+        def fake_get_instance_nw_info(context, instance):
+            if instance['uuid'] == 'uuid2':
+                raise exception.InstanceNotFound(instance_id='uuid2')
+            if instance['uuid'] == 'uuid3':
+                raise test.TestingException()
+            return self.nw_info
+
+        with mock.patch.object(network_api, '_get_instance_nw_info',
+                               side_effect=fake_get_instance_nw_info):
+            nw_infos = network_api.get_instance_nw_info_bulk(self.context,
+                                                             instances)
+
+        self.assertEqual({'uuid1': self.nw_info}, nw_infos)
+        update_many_mock.assert_called_once_with(
+            self.context, {'uuid1': self.nw_info.json()})
+        self.assertFalse(update_mock.called)
+
+
 class NetworkHooksTestCase(test.BaseHookTestCase):
     def test_instance_network_info_hook(self):
         info_func = base_api.update_instance_cache_with_nw_info
         self.assert_has_hook('instance_network_info', info_func)
+
+    def test_instance_network_info_hook_in_batch(self):
+        info_func = base_api._instance_cache_updated
+        self.assert_has_hook('instance_network_info', info_func)
@@ -18,6 +18,8 @@ import contextlib
 import datetime
 import os
 
+import eventlet
+import fixtures
 import mock
 import mox
 from oslo.config import cfg
@@ -472,6 +474,116 @@ class LinuxNetworkTestCase(test.NoDBTestCase):
 
         self.assertEqual(actual_opts, expected_opts)
 
+    def _incremental_dhcp_table(self, dev, network):
+        self.flags(dhcp_incremental_update=True,
+                   networks_path=self.useFixture(fixtures.TempDir()).path)
+        self.addCleanup(linux_net._dhcp_host_tables.clear)
+        with mock.patch.object(linux_net, 'restart_dhcp'):
+            linux_net.update_dhcp(self.context, dev, network)
+        return linux_net._dhcp_host_tables[dev]
+
+    def _read_dhcp_file(self, dev, kind):
+        with open(linux_net._dhcp_file(dev, kind)) as f:
+            return f.read()
+
+    def test_dhcp_host_table_matches_update_dhcp(self):
+        self.flags(use_single_default_gateway=True)
+        table = self._incremental_dhcp_table('eth0', networks[0])
+        fixedips = self._get_fixedips(networks[0])
+
+        self.assertEqual(self.driver.get_dhcp_hosts(self.context, networks[0],
+                                                    fixedips),
+                         table.get_hosts())
+        self.assertEqual(self.driver.get_dhcp_opts(self.context, networks[0],
+                                                   fixedips),
+                         table.get_opts())
+
+    @mock.patch.object(linux_net, '_hup_dnsmasq', return_value=True)
+    def test_remove_and_add_dhcp_host(self, mock_hup):
+        self.flags(use_single_default_gateway=True)
+        self._incremental_dhcp_table('eth0', networks[0])
+        fixedips = self._get_fixedips(networks[0])
+        expected_hosts = self.driver.get_dhcp_hosts(self.context, networks[0],
+                                                    fixedips)
+        expected_opts = self.driver.get_dhcp_opts(self.context, networks[0],
+                                                  fixedips)
+
+        with mock.patch.object(linux_net, 'update_dhcp') as mock_update:
+            linux_net.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                       '192.168.0.102')
+            self.assertEqual('\n'.join(expected_hosts.split('\n')[:2]),
+                             self._read_dhcp_file('eth0', 'conf'))
+            self.assertEqual('NW-0,3,192.168.0.1\nNW-3,3',
+                             self._read_dhcp_file('eth0', 'opts'))
+
+            fixedip = [fip for fip in fixedips
+                       if str(fip.address) == '192.168.0.102'][0]
+            linux_net.add_dhcp_host(self.context, 'eth0', networks[0],
+                                    fixedip.address,
+                                    fixedip.virtual_interface,
+                                    fixedip.instance)
+            self.assertEqual(expected_hosts,
+                             self._read_dhcp_file('eth0', 'conf'))
+            self.assertEqual(expected_opts,
+                             self._read_dhcp_file('eth0', 'opts'))
+            self.assertFalse(mock_update.called)
+
+        self.assertEqual([mock.call('eth0'), mock.call('eth0')],
+                         mock_hup.call_args_list)
+
+    @mock.patch.object(linux_net, '_hup_dnsmasq')
+    def test_remove_unknown_dhcp_host(self, mock_hup):
+        self._incremental_dhcp_table('eth0', networks[0])
+        with mock.patch.object(linux_net, 'update_dhcp') as mock_update:
+            linux_net.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                       '192.168.0.200')
+        self.assertFalse(mock_update.called)
+        self.assertFalse(mock_hup.called)
+
+    @mock.patch.object(linux_net, 'update_dhcp')
+    def test_add_dhcp_host_disabled(self, mock_update):
+        fixedip = self._get_fixedips(networks[0])[0]
+        linux_net.add_dhcp_host(self.context, 'eth0', networks[0],
+                                fixedip.address, fixedip.virtual_interface,
+                                fixedip.instance)
+        mock_update.assert_called_once_with(self.context, 'eth0',
+                                            networks[0])
+
+    def test_remove_dhcp_host_expired_table(self):
+        table = self._incremental_dhcp_table('eth0', networks[0])
+        table.created_at -= datetime.timedelta(
+            seconds=CONF.dhcp_full_rebuild_interval + 1)
+        with mock.patch.object(linux_net, 'update_dhcp') as mock_update:
+            linux_net.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                       '192.168.0.102')
+        mock_update.assert_called_once_with(self.context, 'eth0',
+                                            networks[0])
+
+    @mock.patch.object(linux_net, '_hup_dnsmasq', return_value=False)
+    def test_remove_dhcp_host_dnsmasq_not_running(self, mock_hup):
+        self._incremental_dhcp_table('eth0', networks[0])
+        with mock.patch.object(linux_net, 'update_dhcp') as mock_update:
+            linux_net.remove_dhcp_host(self.context, 'eth0', networks[0],
+                                       '192.168.0.102')
+        mock_update.assert_called_once_with(self.context, 'eth0',
+                                            networks[0])
+
+    @mock.patch.object(linux_net, '_hup_dnsmasq', return_value=True)
+    def test_coalesced_dhcp_reload(self, mock_hup):
+        self._incremental_dhcp_table('eth0', networks[0])
+        self.flags(dhcp_reload_coalesce_window=0.01)
+        threads = [eventlet.spawn(linux_net.remove_dhcp_host, self.context,
+                                  'eth0', networks[0], address)
+                   for address in ('192.168.0.100', '192.168.0.102')]
+        for thread in threads:
+            thread.wait()
+
+        mock_hup.assert_called_once_with('eth0')
+        self.assertEqual('DE:AD:BE:EF:00:03,fake_instance01.novalocal,'
+                         '192.168.1.101',
+                         self._read_dhcp_file('eth0', 'conf'))
+        self.assertEqual({}, linux_net._pending_dhcp_reloads)
+
     def test_get_dhcp_leases_for_nw00(self):
         timestamp = timeutils.utcnow()
         seconds_since_epoch = calendar.timegm(timestamp.utctimetuple())
@@ -881,6 +881,49 @@ class FlatDHCPNetworkTestCase(test.TestCase):
         self.network.init_host()
         self.assertEqual(1, fake_apply.count)
 
+    def test_add_dhcp_host_incremental(self):
+        self.flags(dhcp_incremental_update=True)
+        driver = mock.Mock()
+        self.network.driver = driver
+        self.network._add_dhcp_host(self.context, 'dev', 'net',
+                                    dict(address='1.2.3.4', vif='vif',
+                                         instance='inst'))
+        driver.add_dhcp_host.assert_called_once_with(
+            self.context, 'dev', 'net', address='1.2.3.4', vif='vif',
+            instance='inst')
+        self.assertFalse(driver.update_dhcp.called)
+
+        self.network._remove_dhcp_host(self.context, 'dev', 'net',
+                                       '1.2.3.4')
+        driver.remove_dhcp_host.assert_called_once_with(
+            self.context, 'dev', 'net', '1.2.3.4')
+        self.assertFalse(driver.update_dhcp.called)
+
+    def test_add_dhcp_host_not_incremental(self):
+        driver = mock.Mock()
+        self.network.driver = driver
+        self.network._add_dhcp_host(self.context, 'dev', 'net',
+                                    dict(address='1.2.3.4', vif='vif',
+                                         instance='inst'))
+        self.network._remove_dhcp_host(self.context, 'dev', 'net',
+                                       '1.2.3.4')
+        self.assertFalse(driver.add_dhcp_host.called)
+        self.assertFalse(driver.remove_dhcp_host.called)
+        self.assertEqual([mock.call(self.context, 'dev', 'net')] * 2,
+                         driver.update_dhcp.call_args_list)
+
+    def test_add_dhcp_host_driver_without_incremental(self):
+        self.flags(dhcp_incremental_update=True)
+        driver = mock.Mock(spec=['update_dhcp'])
+        self.network.driver = driver
+        self.network._add_dhcp_host(self.context, 'dev', 'net',
+                                    dict(address='1.2.3.4', vif='vif',
+                                         instance='inst'))
+        self.network._remove_dhcp_host(self.context, 'dev', 'net',
+                                       '1.2.3.4')
+        self.assertEqual([mock.call(self.context, 'dev', 'net')] * 2,
+                         driver.update_dhcp.call_args_list)
+
 
 class VlanNetworkTestCase(test.TestCase):
     def setUp(self):
@@ -1800,7 +1843,7 @@ class VlanNetworkTestCase(test.TestCase):
     def test_deallocate_fixed_deleted(self):
         # Verify doesn't deallocate deleted fixed_ip from deleted network.
 
-        def teardown_network_on_host(_context, network):
+        def teardown_network_on_host(_context, network, **kwargs):
             if network['id'] == 0:
                 raise test.TestingException()
 
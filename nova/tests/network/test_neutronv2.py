@@ -2960,6 +2960,38 @@ class TestNeutronv2WithMock(test.TestCase):
         # make sure that we didn't try to reload nw info
         self.assertFalse(get_nw_info.called)
 
+    def test_get_instance_nw_info_bulk(self):
+        instances = [{'uuid': 'uuid1', 'project_id': 'project1'},
+                     {'uuid': 'uuid2', 'project_id': 'project2'},
+                     {'uuid': 'uuid3', 'project_id': 'project3'}]
+        ports = [{'id': 'port1', 'device_id': 'uuid1',
+                  'tenant_id': 'project1'},
+                 {'id': 'port2', 'device_id': 'uuid2',
+                  'tenant_id': 'project2'},
+                 {'id': 'port3', 'device_id': 'uuid2',
+                  'tenant_id': 'other-project'}]
+        mock_client = mock.Mock()
+        mock_client.list_ports.return_value = {'ports': ports}
+
+        def fake_get_instance_nw_info(context, instance, neutron_ports):
+            if instance['uuid'] == 'uuid3':
+                raise test.TestingException()
+            return [port['id'] for port in neutron_ports]
+
+        with contextlib.nested(
+            mock.patch.object(neutronv2, 'get_client',
+                              return_value=mock_client),
+            mock.patch.object(self.api, '_get_instance_nw_info',
+                              side_effect=fake_get_instance_nw_info)
+        ) as (get_client, get_nw_info):
+            nw_infos = self.api._get_instance_nw_info_bulk(self.context,
+                                                           instances)
+
+        get_client.assert_called_once_with(self.context, admin=True)
+        mock_client.list_ports.assert_called_once_with(
+            device_id=['uuid1', 'uuid2', 'uuid3'])
+        self.assertEqual({'uuid1': ['port1'], 'uuid2': ['port2']}, nw_infos)
+
 
 class TestNeutronv2ModuleMethods(test.TestCase):
 
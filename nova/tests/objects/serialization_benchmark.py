@@ -0,0 +1,120 @@
+#    Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measure the cost of sending objects over RPC: the time the
+NovaObjectSerializer takes to turn an object into its primitive and back,
+for the objects the conductor and the compute services pass around most.
+
+This is not a unit test and is not run by testr.  Run like:
+
+    python -m nova.tests.objects.serialization_benchmark -n 500 -r 20
+"""
+
+import argparse
+import sys
+import time
+
+from nova.compute import flavors
+from nova import context
+from nova.network import model as network_model
+from nova import objects
+from nova.objects import base
+from nova.openstack.common import jsonutils
+from nova.tests import fake_instance
+from nova.tests.objects import test_compute_node
+from nova.tests.objects import test_flavor
+
+INSTANCE_ATTRS = ['metadata', 'system_metadata', 'info_cache',
+                  'security_groups']
+
+
+def _network_info(i):
+    subnet = network_model.Subnet(
+        cidr='10.0.0.0/16',
+        ips=[network_model.FixedIP(address='10.0.%d.%d' % (i // 250,
+                                                           i % 250 + 2))])
+    network = network_model.Network(id='net', label='private',
+                                    subnets=[subnet])
+    return network_model.NetworkInfo([
+        network_model.VIF(id='vif-%d' % i, address='aa:bb:cc:00:00:01',
+                          network=network)])
+
+
+def _instance(ctxt, i):
+    return fake_instance.fake_instance_obj(
+        ctxt, id=i, display_name='server-%d' % i,
+        metadata=dict(('key%d' % k, 'value%d' % k) for k in xrange(10)),
+        system_metadata=flavors.save_flavor_info({},
+                                                 test_flavor.fake_flavor),
+        info_cache={'instance_uuid': 'fake-uuid',
+                    'network_info': jsonutils.dumps(_network_info(i)),
+                    'created_at': None, 'updated_at': None,
+                    'deleted_at': None, 'deleted': False},
+        security_groups=['default'],
+        expected_attrs=INSTANCE_ATTRS)
+
+
+def _objects(ctxt, count):
+    flavor = objects.Flavor._from_db_object(ctxt, objects.Flavor(),
+                                            test_flavor.fake_flavor)
+    compute_node = objects.ComputeNode._from_db_object(
+        ctxt, objects.ComputeNode(), test_compute_node.fake_compute_node)
+    instances = objects.InstanceList(
+        objects=[_instance(ctxt, i) for i in xrange(count)])
+    instances.obj_reset_changes()
+    return [('Flavor', flavor),
+            ('ComputeNode', compute_node),
+            ('Instance', instances[0]),
+            ('InstanceList[%d]' % count, instances)]
+
+
+def _measure(ctxt, obj, repeat):
+    serializer = base.NovaObjectSerializer()
+    to_times = []
+    from_times = []
+    for _i in xrange(repeat):
+        start = time.time()
+        primitive = serializer.serialize_entity(ctxt, obj)
+        to_times.append(time.time() - start)
+        start = time.time()
+        serializer.deserialize_entity(ctxt, primitive)
+        from_times.append(time.time() - start)
+    to_times.sort()
+    from_times.sort()
+    return to_times[repeat // 2], from_times[repeat // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--count', type=int, default=500,
+                        help='Number of instances in the InstanceList')
+    parser.add_argument('-r', '--repeat', type=int, default=20,
+                        help='Number of round trips of each object; the '
+                             'median times are reported')
+    args = parser.parse_args()
+
+    objects.register_all()
+    ctxt = context.RequestContext('user', 'project', is_admin=False)
+    print('%-20s %14s %14s %14s' % ('object', 'to ms', 'from ms',
+                                    'round trip ms'))
+    for name, obj in _objects(ctxt, args.count):
+        to_time, from_time = _measure(ctxt, obj, args.repeat)
+        print('%-20s %14.3f %14.3f %14.3f' % (name, 1000 * to_time,
+                                              1000 * from_time,
+                                              1000 * (to_time + from_time)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
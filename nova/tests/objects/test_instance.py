@@ -21,6 +21,7 @@ import netaddr
 
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
+from nova import context
 from nova import db
 from nova import exception
 from nova.network import model as network_model
@@ -224,7 +225,6 @@ class _TestInstanceObject(object):
                                                  host='new-host'))
         self.mox.StubOutWithMock(instance_info_cache.InstanceInfoCache,
                                  'refresh')
-        instance_info_cache.InstanceInfoCache.refresh()
         self.mox.ReplayAll()
         inst = instance.Instance.get_by_uuid(self.context, fake_uuid)
         self.assertEqual(inst.host, 'orig-host')
@@ -1014,6 +1014,33 @@ class _TestInstanceListObject(object):
         self.assertEqual(inst_list.objects[0].uuid, fakes[1]['uuid'])
         self.assertRemotes()
 
+    @mock.patch.object(instance.InstanceList, 'get_by_filters')
+    def test_refresh_all(self, mock_get):
+        instances = [instance.Instance(uuid='fake-uuid-%d' % i, host='old')
+                     for i in range(3)]
+        for inst in instances:
+            inst.obj_reset_changes()
+        mock_get.return_value = [
+            instance.Instance(uuid='fake-uuid-2', host='new'),
+            instance.Instance(uuid='fake-uuid-0', host='old')]
+
+        refreshed = instance.InstanceList.refresh_all(self.context,
+                                                      instances)
+
+        mock_get.assert_called_once_with(
+            self.context,
+            {'uuid': ['fake-uuid-0', 'fake-uuid-1', 'fake-uuid-2'],
+             'deleted': False},
+            expected_attrs=[], use_slave=False)
+        self.assertEqual([instances[0], instances[2]], refreshed)
+        self.assertEqual(['old', 'new'], [inst.host for inst in refreshed])
+        for inst in refreshed:
+            self.assertEqual(set(), inst.obj_what_changed())
+
+    def test_refresh_all_empty(self):
+        self.assertEqual([], instance.InstanceList.refresh_all(self.context,
+                                                               []))
+
     def test_get_by_host(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2)]
@@ -1030,6 +1057,34 @@ class _TestInstanceListObject(object):
         self.assertEqual(inst_list.obj_what_changed(), set())
         self.assertRemotes()
 
+    def test_get_projection_by_host(self):
+        now = timeutils.utcnow().replace(microsecond=0)
+        rows = [{'id': 1, 'uuid': 'fake-uuid-1', 'vcpus': 2,
+                 'launched_at': now},
+                {'id': 2, 'uuid': 'fake-uuid-2', 'vcpus': 4,
+                 'launched_at': None}]
+        self.mox.StubOutWithMock(db, 'instance_get_columns_by_host')
+        db.instance_get_columns_by_host(
+            self.context, 'foo', ['id', 'launched_at', 'uuid', 'vcpus'],
+            use_slave=False).AndReturn(rows)
+        self.mox.ReplayAll()
+        records = instance.InstanceList.get_projection_by_host(
+            self.context, 'foo', ['vcpus', 'launched_at', 'name'])
+        self.assertEqual(['fake-uuid-1', 'fake-uuid-2'],
+                         [record.uuid for record in records])
+        self.assertEqual([2, 4], [record['vcpus'] for record in records])
+        self.assertEqual('instance-00000001', records[0].name)
+        self.assertEqual(now.replace(tzinfo=iso8601.iso8601.Utc()),
+                         records[0].launched_at)
+        self.assertIsNone(records[1].launched_at)
+        self.assertRemotes()
+
+    def test_get_projection_by_host_bad_field(self):
+        for name in ('metadata', 'deleted', 'foo'):
+            self.assertRaises(ValueError,
+                              instance.InstanceList.get_projection_by_host,
+                              self.context, 'foo', [name])
+
     def test_get_by_host_and_node(self):
         fakes = [self.fake_instance(1),
                  self.fake_instance(2)]
@@ -1082,16 +1137,23 @@ class _TestInstanceListObject(object):
         dt = timeutils.utcnow()
 
         def fake_instance_get_active_by_window_joined(context, begin, end,
-                                                      project_id, host):
+                                                      project_id, host,
+                                                      columns_to_join,
+                                                      limit, marker_id):
             # make sure begin is tz-aware
             self.assertIsNotNone(begin.utcoffset())
             self.assertIsNone(end)
+            self.assertEqual(['system_metadata'], columns_to_join)
+            self.assertEqual(10, limit)
+            self.assertEqual(3, marker_id)
             return fakes
 
         with mock.patch.object(db, 'instance_get_active_by_window_joined',
                                fake_instance_get_active_by_window_joined):
             inst_list = instance.InstanceList.get_active_by_window_joined(
-                            self.context, dt)
+                            self.context, dt,
+                            expected_attrs=['system_metadata'],
+                            limit=10, marker_id=3)
 
         for fake, obj in zip(fakes, inst_list.objects):
             self.assertIsInstance(obj, instance.Instance)
@@ -1190,6 +1252,43 @@ class TestRemoteInstanceListObject(test_objects._RemoteTest,
     pass
 
 
+class TestInstanceRecord(test.NoDBTestCase):
+    def setUp(self):
+        super(TestInstanceRecord, self).setUp()
+        self.context = context.RequestContext('fake-user', 'fake-project')
+        self.record = instance._record_class(['id', 'uuid', 'vm_state'])(
+            self.context, {'id': 1, 'uuid': 'fake-uuid', 'vm_state': 'active'})
+
+    def test_record_has_slots(self):
+        self.assertFalse(hasattr(self.record, '__dict__'))
+        self.assertIs(type(self.record), type(
+            instance._record_class(['vm_state', 'uuid', 'id'])(
+                self.context, {})))
+
+    @mock.patch.object(instance.Instance, 'get_by_uuid')
+    def test_lazy_load(self, mock_get):
+        mock_get.return_value = instance.Instance(uuid='fake-uuid',
+                                                  host='fake-host',
+                                                  vm_state='stopped')
+        self.assertEqual('active', self.record.vm_state)
+        self.assertFalse(mock_get.called)
+        self.assertEqual('fake-host', self.record.host)
+        self.assertEqual('fake-host', self.record['host'])
+        mock_get.assert_called_once_with(self.context, 'fake-uuid',
+                                         expected_attrs=None,
+                                         use_slave=False)
+        # The fields which were read are kept.
+        self.assertEqual('active', self.record.vm_state)
+
+    def test_unknown_attribute(self):
+        self.assertRaises(AttributeError, getattr, self.record, 'foo')
+        self.assertIsNone(self.record.get('foo'))
+
+    def test_name_from_template(self):
+        self.flags(instance_name_template='%(uuid)s-%(vm_state)s')
+        self.assertEqual('fake-uuid-active', self.record.name)
+
+
 class TestInstanceObjectMisc(test.NoDBTestCase):
     def test_expected_cols(self):
         self.stubs.Set(instance, '_INSTANCE_OPTIONAL_JOINED_FIELDS', ['bar'])
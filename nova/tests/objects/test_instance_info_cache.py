@@ -107,6 +107,32 @@ class _TestInstanceInfoCacheObject(object):
         self.assertEqual(fake_info_cache['instance_uuid'], obj.instance_uuid)
 
 
+class _TestInstanceInfoCacheListObject(object):
+    def test_update_network_info(self):
+        nwinfo = network_model.NetworkInfo.hydrate([{'address': 'foo'}])
+        self.mox.StubOutWithMock(db, 'instance_info_cache_update_many')
+        db.instance_info_cache_update_many(
+                self.context, {'fake-uuid1': nwinfo.json(),
+                               'fake-uuid2': '[]'}).AndReturn(['fake-uuid2'])
+        self.mox.ReplayAll()
+        missing = instance_info_cache.InstanceInfoCacheList.\
+            update_network_info(self.context,
+                                {'fake-uuid1': nwinfo.json(),
+                                 'fake-uuid2': '[]'})
+        self.assertEqual(['fake-uuid2'], missing)
+        self.assertRemotes()
+
+
+class TestInstanceInfoCacheListObject(test_objects._LocalTest,
+                                      _TestInstanceInfoCacheListObject):
+    pass
+
+
+class TestInstanceInfoCacheListObjectRemote(test_objects._RemoteTest,
+                                            _TestInstanceInfoCacheListObject):
+    pass
+
+
 class TestInstanceInfoCacheObject(test_objects._LocalTest,
                                   _TestInstanceInfoCacheObject):
     pass
@@ -243,6 +243,67 @@ class TestObjToPrimitive(test.TestCase):
                          base.obj_to_primitive(obj))
 
 
+class TestObjectCodecs(test.NoDBTestCase):
+    def test_primitive_fields_are_copied(self):
+        encoders = dict((name, encode)
+                        for name, attrname, encode in MyObj._obj_encoders)
+        self.assertIsNone(encoders['foo'])
+        self.assertIsNone(encoders['bar'])
+        self.assertIsNotNone(encoders['created_at'])
+        self.assertIsNotNone(encoders['rel_object'])
+
+    def test_object_fields(self):
+        self.assertEqual([('rel_object', '_rel_object')],
+                         MyObj._obj_object_fields)
+
+    def test_codecs_match_fields(self):
+        class TestObj(base.NovaObject):
+            fields = {'int': fields.IntegerField(),
+                      'str': fields.StringField(nullable=True),
+                      'dt': fields.DateTimeField(),
+                      'ip': fields.IPAddressField(),
+                      'strs': fields.DictOfStringsField(),
+                      'ints': fields.SetOfIntegersField(),
+                      'objs': fields.ListOfObjectsField('MyOwnedObject'),
+                      'any': fields.Field(fields.FieldType())}
+
+        obj = TestObj(int=1, str=None, dt=timeutils.utcnow(),
+                      ip='1.2.3.4', strs={'foo': 'bar'}, ints=set([1, 2]),
+                      objs=[MyOwnedObject(baz=1)], any={'foo': [1]})
+        expected = dict((name, field.to_primitive(obj, name,
+                                                  getattr(obj, name)))
+                        for name, field in TestObj.fields.items())
+        primitive = obj.obj_to_primitive()
+        self.assertEqual(expected, primitive['nova_object.data'])
+
+        obj2 = TestObj.obj_from_primitive(primitive)
+        self.assertEqual(primitive['nova_object.data'],
+                         obj2.obj_to_primitive()['nova_object.data'])
+        self.assertIsInstance(obj2.objs[0], MyOwnedObject)
+        self.assertEqual(obj.obj_what_changed(), obj2.obj_what_changed())
+
+    def test_from_primitive_coerces(self):
+        primitive = MyObj(foo=1, bar='bar').obj_to_primitive()
+        primitive['nova_object.data']['foo'] = '2'
+        obj = MyObj.obj_from_primitive(primitive)
+        self.assertEqual(2, obj.foo)
+        self.assertIsInstance(obj.bar, six.text_type)
+
+    def test_from_primitive_checks_read_only(self):
+        class TestObj(base.NovaObject):
+            fields = {'id': fields.IntegerField(read_only=True)}
+
+            def __init__(self, *args, **kwargs):
+                super(TestObj, self).__init__(*args, **kwargs)
+                self.id = 1
+
+        primitive = TestObj().obj_to_primitive()
+        self.assertEqual(1, TestObj.obj_from_primitive(primitive).id)
+        primitive['nova_object.data']['id'] = 2
+        self.assertRaises(exception.ReadOnlyFieldError,
+                          TestObj.obj_from_primitive, primitive)
+
+
 class TestObjMakeList(test.TestCase):
 
     def test_obj_make_list(self):
@@ -936,7 +997,7 @@ object_data = {
     'BandwidthUsage': '1.1-bdab751673947f0ac7de108540a1a8ce',
     'BandwidthUsageList': '1.1-76898106a9db393cd5f42c557389c507',
     'BlockDeviceMapping': '1.3-9968ffe513e7672484b0f528b034cd0f',
-    'BlockDeviceMappingList': '1.4-388b059a9d47ce71d4e8f3cc4f4b760c',
+    'BlockDeviceMappingList': '1.5-5810709bc3311710b4e7957c80603fc6',
     'ComputeNode': '1.5-57ce5a07c727ffab6c51723bb8dccbfe',
     'ComputeNodeList': '1.5-a1641ab314063538470d57daaa5c7831',
     'DNSDomain': '1.0-5bdc288d7c3b723ce86ede998fd5c9ba',
@@ -961,7 +1022,8 @@ object_data = {
     'InstanceGroup': '1.8-9f3ef6ee21e424f817f76a63d35eb803',
     'InstanceGroupList': '1.5-b507229896d60fad117cb3223dbaa0cc',
     'InstanceInfoCache': '1.5-ef64b604498bfa505a8c93747a9d8b2f',
-    'InstanceList': '1.9-6f290799b0ac19eb9e72ed580520b883',
+    'InstanceInfoCacheList': '1.0-3a6e46da8ffd5feeae3fef59bbfb6019',
+    'InstanceList': '1.11-4ee4476554718e29b04321836f9434a6',
     'InstancePCIRequest': '1.1-e082d174f4643e5756ba098c47c1510f',
     'InstancePCIRequests': '1.1-bc7c6684d8579ee49d6a3b8aef756918',
     'InstanceNUMACell': '1.0-17e6ee0a24cb6651d1b084efa3027bda',
@@ -158,6 +158,14 @@ class _TestQuotasObject(object):
         mock_update.assert_called_once_with(self.context, 'fake-project',
                                             'foo', 10, user_id='user')
 
+    @mock.patch('nova.quota.QUOTAS.invalidate_cache')
+    @mock.patch('nova.db.quota_update')
+    def test_update_limit_invalidates_cache(self, mock_update,
+                                            mock_invalidate):
+        quotas_obj.Quotas.update_limit(self.context, 'fake-project',
+                                       'foo', 10, user_id='user')
+        mock_invalidate.assert_called_once_with('fake-project')
+
 
 class TestQuotasObject(_TestQuotasObject, test_objects._LocalTest):
     pass
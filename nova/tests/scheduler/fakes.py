@@ -20,6 +20,7 @@ import mox
 
 from nova.compute import vm_states
 from nova import db
+from nova import objects
 from nova.openstack.common import jsonutils
 from nova.scheduler import filter_scheduler
 from nova.scheduler import host_manager
@@ -266,3 +267,5 @@ def mox_host_manager_db_calls(mock, context):
     mock.StubOutWithMock(db, 'compute_node_get_all')
 
     db.compute_node_get_all(mox.IgnoreArg()).AndReturn(COMPUTE_NODES)
+    mock.StubOutWithMock(objects.AggregateList, 'get_all')
+    objects.AggregateList.get_all(mox.IgnoreArg()).AndReturn([])
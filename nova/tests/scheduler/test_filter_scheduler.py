@@ -30,6 +30,7 @@ from nova import exception
 from nova import objects
 from nova.scheduler import driver
 from nova.scheduler import filter_scheduler
+from nova.scheduler.filters import ram_filter
 from nova.scheduler import host_manager
 from nova.scheduler import utils as scheduler_utils
 from nova.scheduler import weights
@@ -651,6 +652,62 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
                 self.driver.select_destinations, self.context,
                 {'num_instances': 1}, {})
 
+    def _schedule_batch_hosts(self, filter_properties, num_instances=8):
+        self.flags(scheduler_host_subset_size=1,
+                   scheduler_weight_classes=[
+                       'nova.scheduler.weights.ram.RAMWeigher'])
+        self.stubs.Set(ram_filter.RamFilter, 'ram_allocation_ratio', 1.0)
+        sched = fakes.FakeFilterScheduler()
+        hosts = [fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                                     {'free_ram_mb': 1024 * i,
+                                      'total_usable_ram_mb': 1024 * i})
+                 for i in xrange(1, 5)]
+        self.stubs.Set(sched, '_get_all_host_states',
+                       lambda context: iter(hosts))
+        self.stubs.Set(sched, '_setup_instance_group',
+                       lambda context, filter_properties:
+                       'group_policies' in filter_properties)
+
+        instance_properties = {'project_id': 1,
+                               'root_gb': 0,
+                               'memory_mb': 512,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux',
+                               'uuid': 'fake-uuid'}
+        request_spec = {'num_instances': num_instances,
+                        'instance_type': {'memory_mb': 512, 'vcpus': 1},
+                        'instance_properties': instance_properties}
+        return [weighed_host.obj.host for weighed_host in
+                sched._schedule(self.context, request_spec,
+                                filter_properties)]
+
+    @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
+                return_value={'numa_topology': None,
+                              'pci_requests': None})
+    def test_schedule_batch_matches_iterative(self, mock_get_extra):
+        self.flags(scheduler_default_filters=['RamFilter'])
+        expected = self._schedule_batch_hosts({}, num_instances=21)
+        self.flags(scheduler_batch_placement=True)
+        hosts = self._schedule_batch_hosts({}, num_instances=21)
+
+        # All 20 slots of 512 MB get used, the 21st instance does not fit.
+        self.assertEqual(20, len(expected))
+        self.assertEqual(expected, hosts)
+
+    @mock.patch('nova.db.instance_extra_get_by_instance_uuid',
+                return_value={'numa_topology': None,
+                              'pci_requests': None})
+    def test_schedule_batch_group_anti_affinity(self, mock_get_extra):
+        self.flags(scheduler_batch_placement=True,
+                   scheduler_default_filters=[
+                       'RamFilter', 'ServerGroupAntiAffinityFilter'])
+        hosts = self._schedule_batch_hosts(
+                {'group_hosts': set(['host3']),
+                 'group_policies': ['anti-affinity']})
+
+        self.assertEqual(['host4', 'host2', 'host1'], hosts)
+
     def test_handles_deleted_instance(self):
         """Test instance deletion while being scheduled."""
 
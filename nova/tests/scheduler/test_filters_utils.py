@@ -42,3 +42,41 @@ class UtilsTestCase(test.NoDBTestCase):
 
         self.assertTrue(context.elevated.called)
         self.assertEqual(set([1, 3]), values)
+
+    def test_aggregate_metadata_get_by_host_from_host_state(self):
+        aggrA = mock.MagicMock()
+        aggrB = mock.MagicMock()
+        aggrA.metadata = {'k1': '1', 'k2': '2'}
+        aggrB.metadata = {'k1': '3'}
+        host_state = mock.MagicMock(aggregates=[aggrA, aggrB])
+
+        metadata = utils.aggregate_metadata_get_by_host('ctxt', host_state)
+        self.assertEqual({'k1': set(['1', '3']), 'k2': set(['2'])}, metadata)
+
+        metadata = utils.aggregate_metadata_get_by_host('ctxt', host_state,
+                                                        key='k2')
+        self.assertEqual({'k2': set(['2'])}, metadata)
+
+    @mock.patch("nova.db.aggregate_metadata_get_by_host")
+    def test_aggregate_metadata_get_by_host_not_loaded(self, get_by_host):
+        host_state = mock.MagicMock(host='h1', aggregates=None)
+        get_by_host.return_value = {'k1': set(['1'])}
+
+        metadata = utils.aggregate_metadata_get_by_host('ctxt', host_state,
+                                                        key='k1')
+
+        get_by_host.assert_called_once_with('ctxt', 'h1', key='k1')
+        self.assertEqual({'k1': set(['1'])}, metadata)
+
+    @mock.patch("nova.objects.aggregate.AggregateList.get_by_host")
+    def test_aggregate_values_from_key(self, get_by_host):
+        aggrA = mock.MagicMock()
+        aggrB = mock.MagicMock()
+        aggrA.metadata = {'k1': 1, 'k2': 2}
+        aggrB.metadata = {'k2': 4}
+        host_state = mock.MagicMock(aggregates=[aggrA, aggrB])
+
+        values = utils.aggregate_values_from_key('ctxt', host_state, 'k1')
+
+        self.assertFalse(get_by_host.called)
+        self.assertEqual(set([1]), values)
@@ -15,6 +15,7 @@
 Tests For Scheduler Host Filters.
 """
 
+import mock
 from oslo.config import cfg
 import six
 
@@ -395,6 +396,38 @@ class HostFiltersTestCase(test.NoDBTestCase):
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_affinity_same_and_different_filter_all(self):
+        host1 = fakes.FakeHostState('host1', 'node1', {})
+        host2 = fakes.FakeHostState('host2', 'node2', {})
+        host3 = fakes.FakeHostState('host3', 'node3', {})
+        instance1 = fakes.FakeInstance(context=self.context,
+                                       params={'host': 'host1'})
+        instance2 = fakes.FakeInstance(context=self.context,
+                                       params={'host': 'host2'})
+        hosts = [host1, host2, host3]
+
+        same_cls = self.class_map['SameHostFilter']()
+        different_cls = self.class_map['DifferentHostFilter']()
+        with mock.patch.object(same_cls.compute_api, 'get_all',
+                               wraps=same_cls.compute_api.get_all) as get_all:
+            filter_properties = {'context': self.context.elevated(),
+                                 'scheduler_hints': {
+                                     'same_host': [instance1.uuid,
+                                                   instance2.uuid]}}
+            result = same_cls.filter_all(hosts, filter_properties)
+            self.assertEqual([host1, host2], list(result))
+            self.assertEqual(1, get_all.call_count)
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+                                 'different_host': instance1.uuid}}
+        result = different_cls.filter_all(hosts, filter_properties)
+        self.assertEqual([host2, host3], list(result))
+
+        filter_properties = {'context': self.context.elevated()}
+        result = different_cls.filter_all(hosts, filter_properties)
+        self.assertEqual(hosts, list(result))
+
     def test_affinity_simple_cidr_filter_passes(self):
         filt_cls = self.class_map['SimpleCIDRAffinityFilter']()
         host = fakes.FakeHostState('host1', 'node1', {})
@@ -470,6 +503,25 @@ class HostFiltersTestCase(test.NoDBTestCase):
                            params={'host': 'fake_host', 'instance_type_id': 2})
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_type_filter_filter_all(self):
+        filt_cls = self.class_map['TypeAffinityFilter']()
+        host1 = fakes.FakeHostState('host1', 'node1', {})
+        host2 = fakes.FakeHostState('host2', 'node2', {})
+        host3 = fakes.FakeHostState('host3', 'node3', {})
+        fakes.FakeInstance(context=self.context,
+                           params={'host': 'host1', 'instance_type_id': 1})
+        fakes.FakeInstance(context=self.context,
+                           params={'host': 'host2', 'instance_type_id': 1})
+        fakes.FakeInstance(context=self.context,
+                           params={'host': 'host2', 'instance_type_id': 2})
+        filter_properties = {'context': self.context,
+                             'instance_type': {'id': 1}}
+
+        self.mox.StubOutWithMock(db, 'instance_get_all_by_host_and_not_type')
+        self.mox.ReplayAll()
+        result = filt_cls.filter_all([host1, host2, host3], filter_properties)
+        self.assertEqual([host1, host3], list(result))
+
     def test_aggregate_type_filter(self):
         self._stub_service_is_up(True)
         filt_cls = self.class_map['AggregateTypeAffinityFilter']()
@@ -16,14 +16,19 @@
 Tests For HostManager
 """
 
+import datetime
+
 import mock
+from oslo.config import cfg
 import six
 
 from nova.compute import task_states
 from nova.compute import vm_states
 from nova import db
 from nova import exception
+from nova import objects
 from nova.i18n import _LW
+from nova.openstack.common.fixture import mockpatch
 from nova.openstack.common import jsonutils
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
@@ -34,6 +39,8 @@ from nova.tests.scheduler import fakes
 from nova import utils
 from nova.virt import hardware
 
+CONF = cfg.CONF
+
 
 class FakeFilterClass1(filters.BaseHostFilter):
     def host_passes(self, host_state, filter_properties):
@@ -50,6 +57,9 @@ class HostManagerTestCase(test.NoDBTestCase):
 
     def setUp(self):
         super(HostManagerTestCase, self).setUp()
+        self.useFixture(mockpatch.Patch(
+            'nova.objects.aggregate.AggregateList.get_all',
+             return_value=[]))
         self.host_manager = host_manager.HostManager()
         self.fake_hosts = [host_manager.HostState('fake_host%s' % x,
                 'fake-node') for x in xrange(1, 5)]
@@ -328,12 +338,36 @@ class HostManagerTestCase(test.NoDBTestCase):
         self.assertEqual(host_states_map[('host4', 'node4')].free_disk_mb,
                          8388608)
 
+    @mock.patch.object(objects.AggregateList, 'get_all')
+    @mock.patch.object(db, 'compute_node_get_all')
+    def test_get_all_host_states_attaches_aggregates(self, mock_get_nodes,
+                                                     mock_get_aggs):
+        mock_get_nodes.return_value = fakes.COMPUTE_NODES
+        agg1 = objects.Aggregate(id=1, name='agg1', hosts=['host1', 'host2'],
+                                 metadata={'k1': 'v1'})
+        agg2 = objects.Aggregate(id=2, name='agg2', hosts=['host2'],
+                                 metadata={'k2': 'v2'})
+        mock_get_aggs.return_value = [agg1, agg2]
+
+        self.host_manager.get_all_host_states('fake_context')
+        host_states_map = self.host_manager.host_state_map
+
+        mock_get_aggs.assert_called_once_with('fake_context')
+        self.assertEqual([agg1],
+                         host_states_map[('host1', 'node1')].aggregates)
+        self.assertEqual([agg1, agg2],
+                         host_states_map[('host2', 'node2')].aggregates)
+        self.assertEqual([], host_states_map[('host3', 'node3')].aggregates)
+
 
 class HostManagerChangedNodesTestCase(test.NoDBTestCase):
     """Test case for HostManager class."""
 
     def setUp(self):
         super(HostManagerChangedNodesTestCase, self).setUp()
+        self.useFixture(mockpatch.Patch(
+            'nova.objects.aggregate.AggregateList.get_all',
+             return_value=[]))
         self.host_manager = host_manager.HostManager()
         self.fake_hosts = [
               host_manager.HostState('host1', 'node1'),
@@ -387,6 +421,96 @@ class HostManagerChangedNodesTestCase(test.NoDBTestCase):
         self.assertEqual(len(host_states_map), 0)
 
 
+class HostManagerDeltaSyncTestCase(test.NoDBTestCase):
+    """Test case for HostManager delta syncs of compute nodes."""
+
+    def setUp(self):
+        super(HostManagerDeltaSyncTestCase, self).setUp()
+        self.useFixture(mockpatch.Patch(
+            'nova.objects.aggregate.AggregateList.get_all',
+             return_value=[]))
+        self.flags(scheduler_host_state_delta_sync=True)
+        self.host_manager = host_manager.HostManager()
+        self.services = [dict(id=x, host='host%s' % x, binary='nova-compute',
+                              disabled=False) for x in xrange(1, 4)]
+        self.compute_nodes = []
+        for compute in fakes.COMPUTE_NODES[:3]:
+            compute = dict(compute, service_id=compute['id'], deleted=0,
+                           service=self.services[compute['id'] - 1])
+            self.compute_nodes.append(compute)
+        self.addCleanup(timeutils.clear_time_override)
+
+    @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
+    @mock.patch.object(db, 'service_get_all')
+    @mock.patch.object(db, 'compute_node_get_all')
+    def test_get_all_host_states_delta(self, mock_get_nodes,
+                                       mock_get_services, mock_update):
+        timeutils.set_time_override()
+        first_sync = timeutils.utcnow()
+        mock_get_nodes.return_value = self.compute_nodes
+        self.host_manager.get_all_host_states('fake_context')
+        mock_get_nodes.assert_called_once_with('fake_context')
+        self.assertEqual(3, mock_update.call_count)
+
+        mock_get_nodes.reset_mock()
+        mock_update.reset_mock()
+        timeutils.advance_time_seconds(10)
+        updated = dict(self.compute_nodes[0], free_ram_mb=128)
+        deleted = dict(self.compute_nodes[2], deleted=3)
+        mock_get_nodes.return_value = [updated, deleted]
+        disabled_service = dict(self.services[1], disabled=True)
+        mock_get_services.return_value = [self.services[0], disabled_service]
+
+        self.host_manager.get_all_host_states('fake_context')
+
+        since = first_sync - datetime.timedelta(
+            seconds=CONF.scheduler_host_state_sync_overlap)
+        mock_get_nodes.assert_called_once_with('fake_context',
+                                               updated_since=since)
+        mock_update.assert_called_once_with(updated)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(set([('host1', 'node1'), ('host2', 'node2')]),
+                         set(host_states_map))
+        self.assertTrue(host_states_map[('host2', 'node2')].service[
+                'disabled'])
+
+    @mock.patch.object(host_manager.HostState, 'update_from_compute_node')
+    @mock.patch.object(db, 'service_get_all')
+    @mock.patch.object(db, 'compute_node_get_all')
+    def test_get_all_host_states_delta_overlap(self, mock_get_nodes,
+                                               mock_get_services,
+                                               mock_update):
+        mock_get_nodes.return_value = self.compute_nodes
+        mock_get_services.return_value = self.services
+        self.host_manager.get_all_host_states('fake_context')
+        mock_update.reset_mock()
+
+        # The overlap fetches a node again that did not change since.
+        updated = dict(self.compute_nodes[1], free_ram_mb=128)
+        mock_get_nodes.return_value = [dict(self.compute_nodes[0]), updated]
+        self.host_manager.get_all_host_states('fake_context')
+        mock_update.assert_called_once_with(updated)
+
+    @mock.patch.object(db, 'service_get_all')
+    @mock.patch.object(db, 'compute_node_get_all')
+    def test_get_all_host_states_full_resync(self, mock_get_nodes,
+                                             mock_get_services):
+        self.flags(scheduler_host_state_full_sync_interval=60)
+        timeutils.set_time_override()
+        mock_get_nodes.return_value = self.compute_nodes
+        mock_get_services.return_value = self.services
+        self.host_manager.get_all_host_states('fake_context')
+
+        timeutils.advance_time_seconds(30)
+        self.host_manager.get_all_host_states('fake_context')
+        self.assertIn('updated_since', mock_get_nodes.call_args[1])
+
+        timeutils.advance_time_seconds(31)
+        self.host_manager.get_all_host_states('fake_context')
+        mock_get_nodes.assert_called_with('fake_context')
+        self.assertEqual(3, mock_get_nodes.call_count)
+
+
 class HostStateTestCase(test.NoDBTestCase):
     """Test case for HostState class."""
 
@@ -0,0 +1,161 @@
+# Copyright (c) 2014 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the vectorized HostTable filtering and weighing.
+"""
+
+from oslo.config import cfg
+import testtools
+
+from nova.scheduler import filters
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler import host_table
+from nova.scheduler import weights
+from nova import test
+from nova.tests.scheduler import fakes
+from nova import weights as base_weights
+
+CONF = cfg.CONF
+CONF.import_opt('max_instances_per_host',
+                'nova.scheduler.filters.num_instances_filter')
+CONF.import_opt('max_io_ops_per_host', 'nova.scheduler.filters.io_ops_filter')
+CONF.import_opt('ram_weight_multiplier', 'nova.scheduler.weights.ram')
+
+
+class EvenHostFilter(filters.BaseHostFilter):
+    """Filter without a vectorized implementation."""
+    def host_passes(self, host_state, filter_properties):
+        return int(host_state.host[4:]) % 2 == 0
+
+
+class StopFilter(filters.BaseHostFilter):
+    def filter_all(self, filter_obj_list, filter_properties):
+        return None
+
+
+class IoOpsWeigher(weights.BaseHostWeigher):
+    """Weigher without a vectorized implementation."""
+    def _weigh_object(self, host_state, weight_properties):
+        return -host_state.num_io_ops
+
+
+def _make_hosts():
+    hosts = []
+    for i in range(20):
+        hosts.append(fakes.FakeHostState('host%d' % i, 'node%d' % i,
+            {'free_ram_mb': 256 * (i % 7) - 512,
+             'total_usable_ram_mb': 2048,
+             'free_disk_mb': 1024 * (i % 5),
+             'total_usable_disk_gb': 4,
+             'vcpus_total': 4 if i % 6 else 0,
+             'vcpus_used': 3 * (i % 4) + 50,
+             'num_instances': i % 9,
+             'num_io_ops': i % 11}))
+    return hosts
+
+
+@testtools.skipIf(host_table.np is None, "NumPy not installed")
+class HostTableTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(HostTableTestCase, self).setUp()
+        self.filter_handler = filters.HostFilterHandler()
+        self.weight_handler = weights.HostWeightHandler()
+        self.filter_props = {'instance_type': {'memory_mb': 1024,
+                                               'vcpus': 2,
+                                               'root_gb': 1,
+                                               'ephemeral_gb': 0,
+                                               'swap': 512}}
+        self.flags(max_instances_per_host=7, max_io_ops_per_host=9)
+        self.stubs.Set(ram_filter.RamFilter, 'ram_allocation_ratio', 1.5)
+
+    def _filter(self, filter_names, vectorized):
+        self.flags(scheduler_vectorized_filtering=vectorized)
+        classes = self.filter_handler.get_matching_classes(filter_names)
+        classes.append(EvenHostFilter)
+        hosts = _make_hosts()
+        result = self.filter_handler.get_filtered_objects(
+                classes, hosts, self.filter_props)
+        return ([host.host for host in result],
+                dict((host.host, host.limits) for host in hosts))
+
+    def test_filtering_matches_host_by_host(self):
+        filter_names = ['nova.scheduler.filters.ram_filter.RamFilter',
+                        'nova.scheduler.filters.core_filter.CoreFilter',
+                        'nova.scheduler.filters.disk_filter.DiskFilter',
+                        'nova.scheduler.filters.num_instances_filter.'
+                        'NumInstancesFilter',
+                        'nova.scheduler.filters.io_ops_filter.IoOpsFilter']
+        expected_hosts, expected_limits = self._filter(filter_names, False)
+        hosts, limits = self._filter(filter_names, True)
+
+        self.assertTrue(expected_hosts)
+        self.assertEqual(expected_hosts, hosts)
+        for host in hosts:
+            self.assertEqual(expected_limits[host], limits[host])
+
+    def test_filtering_stops(self):
+        self.flags(scheduler_vectorized_filtering=True)
+        classes = [EvenHostFilter, StopFilter]
+        self.assertIsNone(self.filter_handler.get_filtered_objects(
+                classes, _make_hosts(), self.filter_props))
+
+    def test_aggregate_filters_are_not_vectorized(self):
+        self.assertIsNone(disk_filter.AggregateDiskFilter().filter_table)
+        self.assertIsNotNone(disk_filter.DiskFilter().filter_table)
+
+    def _weigh(self, vectorized):
+        self.flags(scheduler_vectorized_filtering=vectorized)
+        classes = self.weight_handler.get_matching_classes(
+                ['nova.scheduler.weights.ram.RAMWeigher'])
+        classes.append(IoOpsWeigher)
+        return [(weighed.obj.host, weighed.weight) for weighed in
+                self.weight_handler.get_weighed_objects(
+                        classes, _make_hosts(), {})]
+
+    def test_weighing_matches_host_by_host(self):
+        self.flags(ram_weight_multiplier=2.0)
+        expected = self._weigh(False)
+        result = self._weigh(True)
+        self.assertEqual([host for host, weight in expected],
+                         [host for host, weight in result])
+        for (_, expected_weight), (_, weight) in zip(expected, result):
+            self.assertAlmostEqual(expected_weight, weight)
+
+    def test_normalize(self):
+        weight_list = [-2, 3, 7, 1]
+        for minval, maxval in ((None, None), (0, None), (None, 10)):
+            expected = list(base_weights.normalize(weight_list, minval=minval,
+                                                   maxval=maxval))
+            result = host_table.normalize(
+                    host_table.np.array(weight_list, dtype=float),
+                    minval=minval, maxval=maxval)
+            self.assertEqual(expected, list(result))
+
+    def test_record_bounds(self):
+        weigher = IoOpsWeigher()
+        weigher.minval = 0
+        host_table.record_bounds(weigher, host_table.np.array([-2.0, 2.0]))
+        self.assertEqual((-2.0, 2.0), (weigher.minval, weigher.maxval))
+
+    def test_normalize_all_equal(self):
+        result = host_table.normalize(host_table.np.array([3.0, 3.0]))
+        self.assertEqual([0, 0], list(result))
+
+    def test_disabled_without_numpy(self):
+        self.flags(scheduler_vectorized_filtering=True)
+        self.assertTrue(host_table.is_enabled())
+        self.stubs.Set(host_table, 'np', None)
+        self.assertFalse(host_table.is_enabled())
@@ -47,6 +47,9 @@ class RamWeigherTestCase(test.NoDBTestCase):
         self.useFixture(mockpatch.Patch(
             'nova.db.compute_node_get_all',
              return_value=fakes.COMPUTE_NODES))
+        self.useFixture(mockpatch.Patch(
+            'nova.objects.aggregate.AggregateList.get_all',
+             return_value=[]))
         self.host_manager = fakes.FakeHostManager()
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
@@ -88,6 +91,20 @@ class RamWeigherTestCase(test.NoDBTestCase):
         weighed_host = self._get_weighed_host(hostinfo_list)
         self.assertEqual(weighed_host.weight, 0.0)
 
+    def test_weigh_object_uses_recorded_bounds(self):
+        hostinfo_list = self._get_all_hosts()
+        weighers = [cls() for cls in self.weight_classes]
+        self.weight_handler.weigh_objects(weighers, hostinfo_list, {})
+
+        # RAMWeigher has a minval of 0 and host4 has the most free RAM
+        # (8192 MB), so a host with 2048 MB free weighs 0.25.
+        host_state = fakes.FakeHostState('host5', 'node5',
+                                         {'free_ram_mb': 2048})
+        weighed_host = self.weight_handler.weigh_object(weighers,
+                                                        host_state, {})
+        self.assertEqual('host5', weighed_host.obj.host)
+        self.assertEqual(0.25, weighed_host.weight)
+
     def test_ram_filter_multiplier2(self):
         self.flags(ram_weight_multiplier=2.0)
         hostinfo_list = self._get_all_hosts()
@@ -135,6 +152,9 @@ class MetricsWeigherTestCase(test.NoDBTestCase):
         self.useFixture(mockpatch.Patch(
             'nova.db.compute_node_get_all',
              return_value=fakes.COMPUTE_NODES_METRICS))
+        self.useFixture(mockpatch.Patch(
+            'nova.objects.aggregate.AggregateList.get_all',
+             return_value=[]))
         self.host_manager = fakes.FakeHostManager()
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
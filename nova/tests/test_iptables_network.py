@@ -15,7 +15,11 @@
 #    under the License.
 """Unit Tests for network code."""
 
+import eventlet
+
 from nova.network import linux_net
+from nova.openstack.common import processutils
+from nova.openstack.common import timeutils
 from nova import test
 
 
@@ -275,3 +279,120 @@ class IptablesManagerTestCase(test.NoDBTestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def _fake_execute(self, *cmd, **kwargs):
+        self.executed.append((cmd, kwargs.get('process_input')))
+        if self.restore_error and '--noflush' in cmd:
+            raise processutils.ProcessExecutionError()
+        if cmd[0] == 'iptables-save':
+            return '\n'.join(self.sample_filter + self.sample_nat), ''
+        return '', ''
+
+    def _incremental_manager(self):
+        self.flags(iptables_incremental_apply=True,
+                   disable_process_locking=True, use_ipv6=False)
+        self.executed = []
+        self.restore_error = False
+        manager = linux_net.IptablesManager(execute=self._fake_execute)
+        manager.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         [cmd[0] for cmd, _input in self.executed])
+        self.executed = []
+        return manager
+
+    def test_incremental_apply_changed_chain(self):
+        manager = self._incremental_manager()
+        manager.ipv4['filter'].add_rule('local', '-s 1.2.3.4/5 -j DROP')
+        manager.apply()
+
+        self.assertEqual(1, len(self.executed))
+        cmd, process_input = self.executed[0]
+        self.assertEqual(('iptables-restore', '-c', '--noflush'), cmd)
+        self.assertEqual(['*filter',
+                          ':%s-local - [0:0]' % self.binary_name,
+                          '[0:0] -A %s-local -s 1.2.3.4/5 -j DROP' %
+                          self.binary_name,
+                          'COMMIT'],
+                         process_input.split('\n'))
+        self.assertFalse(manager.dirty())
+
+    def test_incremental_apply_removed_chain(self):
+        manager = self._incremental_manager()
+        table = manager.ipv4['nat']
+        table.add_chain('extra')
+        table.add_rule('snat', '-j $extra')
+        manager.apply()
+        self.executed = []
+
+        table.remove_chain('extra')
+        manager.apply()
+        self.assertEqual(1, len(self.executed))
+        self.assertEqual(['*nat',
+                          ':%s-snat - [0:0]' % self.binary_name,
+                          ':%s-extra - [0:0]' % self.binary_name,
+                          '[0:0] -A %s-snat -j %s-float-snat' %
+                          (self.binary_name, self.binary_name),
+                          '-X %s-extra' % self.binary_name,
+                          'COMMIT'],
+                         self.executed[0][1].split('\n'))
+
+    def test_incremental_apply_unwrapped_change(self):
+        manager = self._incremental_manager()
+        manager.ipv4['filter'].add_rule('nova-filter-top', '-j DROP',
+                                        wrap=False)
+        manager.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         [cmd[0] for cmd, _input in self.executed])
+
+    def test_incremental_apply_failure(self):
+        manager = self._incremental_manager()
+        self.restore_error = True
+        manager.ipv4['filter'].add_rule('local', '-s 1.2.3.4/5 -j DROP')
+        manager.apply()
+        self.assertEqual([('iptables-restore', '-c', '--noflush'),
+                          ('iptables-save', '-c'),
+                          ('iptables-restore', '-c')],
+                         [cmd for cmd, _input in self.executed])
+
+    def test_incremental_apply_full_after_interval(self):
+        self.flags(iptables_full_apply_interval=600)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        manager = self._incremental_manager()
+
+        timeutils.advance_time_seconds(599)
+        manager.ipv4['filter'].add_rule('local', '-s 1.2.3.4/5 -j DROP')
+        manager.apply()
+        self.assertEqual(['iptables-restore'],
+                         [cmd[0] for cmd, _input in self.executed])
+        self.executed = []
+
+        timeutils.advance_time_seconds(2)
+        manager.ipv4['filter'].add_rule('local', '-s 1.2.3.5/5 -j DROP')
+        manager.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         [cmd[0] for cmd, _input in self.executed])
+
+    def test_force_full_apply(self):
+        manager = self._incremental_manager()
+        self.assertFalse(manager.dirty())
+        manager.force_full_apply()
+        manager.apply()
+        self.assertEqual(['iptables-save', 'iptables-restore'],
+                         [cmd[0] for cmd, _input in self.executed])
+        self.assertFalse(manager.dirty())
+
+    def test_coalesced_apply(self):
+        self.flags(iptables_apply_coalesce_window=0.01)
+        applies = []
+        self.stubs.Set(self.manager, '_apply',
+                       lambda: applies.append(self.manager.dirty()))
+
+        pool = eventlet.GreenPool()
+        for i in range(3):
+            self.manager.ipv4['filter'].add_rule('local',
+                                                 '-s 10.0.0.%d -j DROP' % i)
+            pool.spawn(self.manager.apply)
+            eventlet.sleep(0)
+        pool.waitall()
+        self.assertEqual([True], applies)
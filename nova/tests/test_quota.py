@@ -1086,6 +1086,81 @@ class DbQuotaDriverTestCase(test.TestCase):
         self._stub_quota_class_get_all_by_name()
         self._stub_quota_class_get_default()
 
+    def test_get_project_quotas_cached(self):
+        self.flags(quota_cache_ttl=60, quota_usage_cache_ttl=5)
+        self._stub_get_by_project()
+        context = FakeContext('test_project', 'test_class')
+        result = self.driver.get_project_quotas(
+            context, quota.QUOTAS._resources, 'test_project')
+        self.assertEqual(result, self.driver.get_project_quotas(
+            context, quota.QUOTAS._resources, 'test_project'))
+        self.assertEqual(self.calls, [
+                'quota_get_all_by_project',
+                'quota_usage_get_all_by_project',
+                'quota_class_get_all_by_name',
+                'quota_class_get_default',
+                ])
+
+        # The usages expire first.
+        timeutils.advance_time_seconds(5)
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.assertEqual(5, len(self.calls))
+        self.assertEqual('quota_usage_get_all_by_project', self.calls[-1])
+
+        timeutils.advance_time_seconds(55)
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.assertEqual(9, len(self.calls))
+
+    def test_get_project_quotas_cache_invalidated(self):
+        self.flags(quota_cache_ttl=60, quota_usage_cache_ttl=60)
+        self._stub_get_by_project()
+        context = FakeContext('test_project', 'test_class')
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.driver.invalidate_cache('test_project')
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.assertEqual(self.calls, [
+                'quota_get_all_by_project',
+                'quota_usage_get_all_by_project',
+                'quota_class_get_all_by_name',
+                'quota_class_get_default',
+                'quota_get_all_by_project',
+                'quota_usage_get_all_by_project',
+                ])
+
+    def test_get_project_quotas_cached_other_project(self):
+        self.flags(quota_cache_ttl=60, quota_usage_cache_ttl=60)
+        self._stub_get_by_project()
+        self.driver.get_project_quotas(
+            FakeContext('test_project', 'test_class'),
+            quota.QUOTAS._resources, 'test_project')
+        self.assertRaises(exception.Forbidden,
+                          self.driver.get_project_quotas,
+                          FakeContext('other_project', 'test_class'),
+                          quota.QUOTAS._resources, 'test_project')
+
+    def test_commit_invalidates_usages(self):
+        self.flags(quota_cache_ttl=60, quota_usage_cache_ttl=60)
+        self._stub_get_by_project()
+        self.stubs.Set(db, 'reservation_commit',
+                       lambda *args, **kwargs: None)
+        context = FakeContext('test_project', 'test_class')
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.driver.commit(context, ['resv-1'])
+        self.driver.get_project_quotas(context, quota.QUOTAS._resources,
+                                       'test_project')
+        self.assertEqual(self.calls, [
+                'quota_get_all_by_project',
+                'quota_usage_get_all_by_project',
+                'quota_class_get_all_by_name',
+                'quota_class_get_default',
+                'quota_usage_get_all_by_project',
+                ])
+
     def test_get_project_quotas(self):
         self.maxDiff = None
         self._stub_get_by_project()
@@ -2212,6 +2287,60 @@ class DbQuotaDriverTestCase(test.TestCase):
         self.assertEqual(calls, exemplar)
 
 
+class CasQuotaDriverTestCase(test.TestCase):
+    def setUp(self):
+        super(CasQuotaDriverTestCase, self).setUp()
+        self.flags(until_refresh=0, max_age=0)
+        self.driver = quota.CasQuotaDriver()
+        self.context = FakeContext('test_project', 'test_class')
+        self.expire = timeutils.utcnow() + datetime.timedelta(seconds=120)
+        self.calls = []
+
+        def fake_quota_reserve(context, resources, quotas, user_quotas,
+                               deltas, expire, until_refresh, max_age,
+                               project_id=None, user_id=None):
+            self.calls.append(('quota_reserve', deltas))
+            return ['resv-1']
+        self.stubs.Set(db, 'quota_reserve', fake_quota_reserve)
+
+    def _stub_quota_reserve_cas(self, result):
+        def fake_quota_reserve_cas(context, resources, quotas, user_quotas,
+                                   deltas, expire, until_refresh, max_age,
+                                   project_id=None, user_id=None):
+            self.calls.append(('quota_reserve_cas', deltas))
+            return result
+        self.stubs.Set(db, 'quota_reserve_cas', fake_quota_reserve_cas)
+
+    def test_reserve(self):
+        self._stub_quota_reserve_cas(['resv-2'])
+        result = self.driver.reserve(self.context, quota.QUOTAS._resources,
+                                     dict(instances=2), expire=self.expire)
+        self.assertEqual(['resv-2'], result)
+        self.assertEqual([('quota_reserve_cas', dict(instances=2))],
+                         self.calls)
+
+    def test_reserve_falls_back_on_refresh(self):
+        self._stub_quota_reserve_cas(None)
+        result = self.driver.reserve(self.context, quota.QUOTAS._resources,
+                                     dict(instances=2), expire=self.expire)
+        self.assertEqual(['resv-1'], result)
+        self.assertEqual([('quota_reserve_cas', dict(instances=2)),
+                          ('quota_reserve', dict(instances=2))],
+                         self.calls)
+
+    def test_commit(self):
+        self.mox.StubOutWithMock(db, 'reservation_commit_cas')
+        db.reservation_commit_cas(self.context, ['resv-1'])
+        self.mox.ReplayAll()
+        self.driver.commit(self.context, ['resv-1'])
+
+    def test_rollback(self):
+        self.mox.StubOutWithMock(db, 'reservation_rollback_cas')
+        db.reservation_rollback_cas(self.context, ['resv-1'])
+        self.mox.ReplayAll()
+        self.driver.rollback(self.context, ['resv-1'])
+
+
 class FakeSession(object):
     def begin(self):
         return self
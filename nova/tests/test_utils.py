@@ -22,6 +22,8 @@ import os.path
 import StringIO
 import tempfile
 
+import fixtures
+import mock
 import mox
 import netaddr
 from oslo.config import cfg
@@ -573,6 +575,72 @@ class MkfsTestCase(test.NoDBTestCase):
         utils.mkfs('swap', '/my/swap/block/dev', 'swap-vol')
 
 
+class RootwrapDaemonTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(RootwrapDaemonTestCase, self).setUp()
+        self.flags(use_rootwrap_daemon=True)
+        self.client = mock.Mock()
+        self.client.execute.return_value = (0, 'out', 'err')
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.utils._get_rootwrap_daemon_client',
+            lambda rootwrap_config: self.client))
+
+    @mock.patch.object(processutils, 'execute')
+    def test_execute(self, mock_execute):
+        out = utils.execute('ip', 'link', 1500, run_as_root=True,
+                            process_input='data')
+        self.assertEqual(('out', 'err'), out)
+        self.client.execute.assert_called_once_with(
+            ['ip', 'link', '1500'], env=None, stdin='data')
+        self.assertFalse(mock_execute.called)
+
+    def test_execute_fails(self):
+        self.client.execute.return_value = (1, 'out', 'err')
+        self.assertRaises(processutils.ProcessExecutionError,
+                          utils.execute, 'ip', 'link', run_as_root=True)
+        self.assertEqual(('out', 'err'),
+                         utils.execute('ip', 'link', run_as_root=True,
+                                       check_exit_code=False))
+
+    def test_execute_retries(self):
+        self.client.execute.side_effect = [(1, '', ''), (0, 'out', '')]
+        out = utils.execute('ip', 'link', run_as_root=True, attempts=2,
+                            delay_on_retry=False)
+        self.assertEqual(('out', ''), out)
+        self.assertEqual(2, self.client.execute.call_count)
+
+    def test_execute_unknown_argument(self):
+        self.assertRaises(processutils.UnknownArgumentError,
+                          utils.execute, 'ip', run_as_root=True, foo='bar')
+
+    def test_trycmd(self):
+        self.assertEqual(('out', ''),
+                         utils.trycmd('ip', run_as_root=True,
+                                      discard_warnings=True))
+        self.client.execute.return_value = (1, 'out', 'err')
+        out, err = utils.trycmd('ip', run_as_root=True)
+        self.assertEqual('', out)
+        self.assertIn('err', err)
+
+    @mock.patch.object(processutils, 'execute', return_value=('', ''))
+    def test_execute_not_as_root(self, mock_execute):
+        utils.execute('ls')
+        utils.execute('ls', run_as_root=False)
+        utils.execute('ls', run_as_root=True, root_helper='sudo')
+        utils.execute('ls', run_as_root=True, shell=True)
+        self.assertEqual(4, mock_execute.call_count)
+        self.assertFalse(self.client.execute.called)
+
+    @mock.patch.object(processutils, 'execute', return_value=('', ''))
+    def test_execute_daemon_disabled(self, mock_execute):
+        self.flags(use_rootwrap_daemon=False)
+        utils.execute('ls', run_as_root=True)
+        mock_execute.assert_called_once_with(
+            'ls', run_as_root=True, root_helper=utils._get_root_helper())
+        self.assertFalse(self.client.execute.called)
+
+
 class LastBytesTestCase(test.NoDBTestCase):
     """Test the last_bytes() utility method."""
 
@@ -161,6 +161,11 @@ VIR_DOMAIN_BLOCK_COMMIT_RELATIVE = 4
 VIR_CONNECT_LIST_DOMAINS_ACTIVE = 1
 VIR_CONNECT_LIST_DOMAINS_INACTIVE = 2
 
+# getAllDomainStats stats and flags
+VIR_DOMAIN_STATS_STATE = 1
+VIR_DOMAIN_STATS_VCPU = 8
+VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE = 1
+
 
 def _parse_disk_info(element):
     disk_info = {}
@@ -56,6 +56,7 @@ from nova.network import model as network_model
 from nova import objects
 from nova.openstack.common import fileutils
 from nova.openstack.common import importutils
+from nova.openstack.common import imageutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import lockutils
 from nova.openstack.common import loopingcall
@@ -283,7 +284,8 @@ class CacheConcurrencyTestCase(test.NoDBTestCase):
             fake_libvirt_utils))
 
     def test_same_fname_concurrency(self):
-        # Ensures that the same fname cache runs at a sequentially.
+        # Ensures that a cache of the same fname waits for the fetch in
+        # progress instead of running its own.
         uuid = uuidutils.generate_uuid()
 
         backend = imagebackend.Backend(False)
@@ -311,16 +313,16 @@ class CacheConcurrencyTestCase(test.NoDBTestCase):
         wait2.send()
         eventlet.sleep(0)
         try:
-            self.assertFalse(done2.ready())
+            self.assertFalse(thr2.dead)
         finally:
             wait1.send()
         done1.wait()
-        eventlet.sleep(0)
-        self.assertTrue(done2.ready())
         # Wait on greenthreads to assert they didn't raise exceptions
         # during execution
         thr1.wait()
         thr2.wait()
+        self.assertFalse(sig2.ready())
+        self.assertFalse(done2.ready())
 
     def test_different_fname_concurrency(self):
         # Ensures that two different fname caches are concurrent.
@@ -6282,6 +6284,29 @@ class LibvirtConnTestCase(test.TestCase):
 
         db.instance_destroy(self.context, instance_ref['uuid'])
 
+    @mock.patch.object(os.path, 'getsize', return_value=3328599655)
+    def test_get_instance_disk_info_with_img_info_cache(self, mock_getsize):
+        dummyxml = ("<domain type='kvm'><name>instance-0000000a</name>"
+                    "<devices>"
+                    "<disk type='file'><driver name='qemu' type='qcow2'/>"
+                    "<source file='/test/disk.local'/>"
+                    "<target dev='vdb' bus='virtio'/></disk>"
+                    "</devices></domain>")
+        img_info = imageutils.QemuImgInfo()
+        img_info.virtual_size = 21474836480
+        img_info.backing_file = '/base/file'
+        img_info_cache = mock.Mock()
+        img_info_cache.get.return_value = img_info
+
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        info = jsonutils.loads(conn._get_instance_disk_info(
+            'instance-0000000a', dummyxml, img_info_cache=img_info_cache))
+
+        img_info_cache.get.assert_called_once_with('/test/disk.local')
+        self.assertEqual(21474836480, info[0]['virt_disk_size'])
+        self.assertEqual('file', info[0]['backing_file'])
+        self.assertEqual(18146236825, info[0]['over_committed_disk_size'])
+
     def test_post_live_migration(self):
         vol = {'block_device_mapping': [
                   {'connection_info': {
@@ -8027,7 +8052,7 @@ class LibvirtConnTestCase(test.TestCase):
                         'disk_size': '10737418240',
                         'over_committed_disk_size': '21474836480'}]}
 
-        def side_effect(name, dom):
+        def side_effect(name, dom, **kwargs):
             if name == 'instance0000001':
                 raise OSError(errno.EACCES, 'Permission denied')
             if name == 'instance0000002':
@@ -8922,6 +8947,104 @@ class LibvirtConnTestCase(test.TestCase):
         self.assertEqual(0, drvr._get_vcpu_used())
         mock_list.assert_called_with()
 
+    def _fake_domain(self, id, vcpus=1):
+        dom = mock.Mock()
+        dom.ID.return_value = id
+        dom.name.return_value = 'instance%08d' % id
+        dom.vcpus.return_value = ([1] * vcpus, [True] * vcpus)
+        dom.XMLDesc.return_value = '<domain/>'
+        return dom
+
+    @mock.patch.object(libvirt_driver.LibvirtDriver, "_conn")
+    def test_domain_snapshot_bulk_stats(self, mock_conn):
+        dom0 = self._fake_domain(0)
+        dom1 = self._fake_domain(1)
+        dom2 = self._fake_domain(2, vcpus=3)
+        mock_conn.getAllDomainStats.return_value = [
+            (dom0, {'vcpu.current': 8}),
+            (dom1, {'vcpu.current': 2}),
+            (dom2, {})]
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        with drvr._domain_snapshot():
+            self.assertEqual(5, drvr._get_vcpu_used())
+            self.assertEqual(0, drvr._get_disk_over_committed_size_total())
+
+        self.assertEqual(1, mock_conn.getAllDomainStats.call_count)
+        self.assertFalse(mock_conn.listAllDomains.called)
+        self.assertFalse(dom1.vcpus.called)
+        dom2.vcpus.assert_called_once_with()
+        self.assertFalse(dom0.XMLDesc.called)
+        self.assertEqual(1, dom1.XMLDesc.call_count)
+        self.assertIsNone(drvr._audit_domains)
+
+    @mock.patch.object(libvirt_driver.LibvirtDriver,
+                       "_list_instance_domains")
+    @mock.patch.object(libvirt_driver.LibvirtDriver, "_conn")
+    def test_domain_snapshot_lists_once(self, mock_conn, mock_list):
+        mock_conn.getAllDomainStats.side_effect = AttributeError
+        mock_list.return_value = [self._fake_domain(1, vcpus=2),
+                                  self._fake_domain(2, vcpus=3)]
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        with drvr._domain_snapshot():
+            self.assertEqual(5, drvr._get_vcpu_used())
+            self.assertEqual(0, drvr._get_disk_over_committed_size_total())
+        with drvr._domain_snapshot():
+            self.assertEqual(5, drvr._get_vcpu_used())
+
+        self.assertEqual(
+            [mock.call(only_guests=False), mock.call(only_guests=False)],
+            mock_list.call_args_list)
+        # The bulk API is not retried once it failed.
+        self.assertEqual(1, mock_conn.getAllDomainStats.call_count)
+
+    @mock.patch.object(libvirt_driver.LibvirtDriver, "_conn")
+    def test_get_info_all_bulk_stats(self, mock_conn):
+        dom0 = self._fake_domain(0)
+        dom1 = self._fake_domain(1)
+        dom1.UUIDString.return_value = 'uuid1'
+        dom2 = self._fake_domain(-1)
+        dom2.UUIDString.return_value = 'uuid2'
+        mock_conn.getAllDomainStats.return_value = [
+            (dom0, {'state.state': libvirt_driver.VIR_DOMAIN_RUNNING}),
+            (dom1, {'state.state': libvirt_driver.VIR_DOMAIN_RUNNING}),
+            (dom2, {'state.state': libvirt_driver.VIR_DOMAIN_SHUTOFF})]
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({'uuid1': {'state': power_state.RUNNING},
+                          'uuid2': {'state': power_state.SHUTDOWN}},
+                         drvr.get_info_all())
+        mock_conn.getAllDomainStats.assert_called_once_with(
+            libvirt.VIR_DOMAIN_STATS_STATE, 0)
+        self.assertFalse(mock_conn.lookupByName.called)
+        self.assertFalse(dom1.info.called)
+
+    @mock.patch.object(libvirt_driver.LibvirtDriver,
+                       "_list_instance_domains")
+    @mock.patch.object(libvirt_driver.LibvirtDriver, "_conn")
+    def test_get_info_all_without_bulk_stats(self, mock_conn, mock_list):
+        mock_conn.getAllDomainStats.side_effect = AttributeError
+        dom1 = self._fake_domain(1)
+        dom1.UUIDString.return_value = 'uuid1'
+        dom1.info.return_value = [libvirt_driver.VIR_DOMAIN_PAUSED,
+                                  2048, 1024, 2, 1000]
+        dom2 = self._fake_domain(2)
+        dom2.info.side_effect = fakelibvirt.make_libvirtError(
+            libvirt.libvirtError, 'gone',
+            error_code=libvirt.VIR_ERR_NO_DOMAIN)
+        mock_list.return_value = [dom1, dom2]
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual({'uuid1': {'state': power_state.PAUSED,
+                                    'max_mem': 2048,
+                                    'mem': 1024,
+                                    'num_cpu': 2,
+                                    'cpu_time': 1000,
+                                    'id': 1}},
+                         drvr.get_info_all())
+        mock_list.assert_called_once_with(only_running=False)
+
     def test_get_memory_used_normal(self):
         m = mock.mock_open(read_data="""
 MemTotal:       16194180 kB
@@ -10373,6 +10496,10 @@ class HostStateTestCase(test.TestCase):
     class FakeConnection(object):
         """Fake connection object."""
 
+        @contextlib.contextmanager
+        def _domain_snapshot(self):
+            yield
+
         def _get_vcpu_total(self):
             return 1
 
@@ -19,6 +19,7 @@ import os
 import shutil
 import tempfile
 
+import eventlet
 import fixtures
 import mock
 from oslo.config import cfg
@@ -1341,3 +1342,59 @@ class UtilTestCase(test.NoDBTestCase):
         self.assertIsNone(imagebackend.get_hw_disk_discard(None))
         self.assertRaises(RuntimeError, imagebackend.get_hw_disk_discard,
                           "fake")
+
+
+class FetchOnceTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(FetchOnceTestCase, self).setUp()
+        self.calls = []
+
+    def _fetch(self, target, error=None, max_size=0):
+        self.calls.append(target)
+        eventlet.sleep(0.01)
+        if error:
+            raise error
+        if max_size and max_size < 10:
+            raise exception.FlavorDiskTooSmall()
+        return target
+
+    def _fetch_concurrently(self, count, error=None, max_sizes=None):
+        pool = eventlet.GreenPool()
+        max_sizes = max_sizes or [0] * count
+        threads = [pool.spawn(imagebackend._fetch_once, 'image', self._fetch,
+                              '/base/image', error=error, max_size=max_size)
+                   for max_size in max_sizes]
+        results = []
+        for thread in threads:
+            try:
+                results.append(thread.wait())
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def test_fetch_once(self):
+        results = self._fetch_concurrently(5)
+        self.assertEqual(['/base/image'] * 5, results)
+        self.assertEqual(['/base/image'], self.calls)
+        self.assertEqual({}, imagebackend._FETCHES_IN_FLIGHT)
+
+    def test_fetch_once_error(self):
+        error = IOError('No space left on device')
+        results = self._fetch_concurrently(5, error=error)
+        self.assertEqual([error] * 5, results)
+        self.assertEqual(['/base/image'], self.calls)
+
+        # A later fetch tries again.
+        self.assertEqual('/base/image',
+                         imagebackend._fetch_once('image', self._fetch,
+                                                  '/base/image'))
+        self.assertEqual(['/base/image'] * 2, self.calls)
+
+    def test_fetch_once_error_of_other_arguments(self):
+        # The first fetch fails because its max_size is too small for the
+        # image, which does not apply to the callers with a bigger one.
+        results = self._fetch_concurrently(3, max_sizes=[5, 20, 20])
+        self.assertIsInstance(results[0], exception.FlavorDiskTooSmall)
+        self.assertEqual(['/base/image'] * 2, results[1:])
+        self.assertEqual(['/base/image'] * 2, self.calls)
+        self.assertEqual({}, imagebackend._FETCHES_IN_FLIGHT)
@@ -20,10 +20,12 @@ import hashlib
 import os
 import time
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from nova import conductor
 from nova import db
+from nova.openstack.common import imageutils
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
@@ -31,6 +33,7 @@ from nova.openstack.common import processutils
 from nova import test
 from nova.tests import fake_instance
 from nova import utils
+from nova.virt import images
 from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import utils as libvirt_utils
 
@@ -885,3 +888,215 @@ class VerifyChecksumTestCase(test.NoDBTestCase):
             # Checksum requests for a file with no checksum now have the
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
+
+
+class ImageCacheIndexTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ImageCacheIndexTestCase, self).setUp()
+        self.stubs.Set(imagecache, '_INDEXES', {})
+        self.stubs.Set(utils, 'spawn_n',
+                       lambda func, *args, **kwargs: func(*args, **kwargs))
+        self.flags(checksum_base_images=True, group='libvirt')
+
+    @contextlib.contextmanager
+    def _make_base_file(self, data='data'):
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'),
+                       image_cache_index_path=os.path.join(tmpdir,
+                                                           'index.sqlite'),
+                       group='libvirt')
+            fname = os.path.join(tmpdir, 'aaa')
+            with open(fname, 'w') as f:
+                f.write(data)
+            yield fname
+
+    def test_get_index_disabled(self):
+        self.assertIsNone(imagecache.get_index())
+        self.assertIsNone(imagecache.ImageCacheManager().index)
+
+    def test_reconcile(self):
+        with self._make_base_file() as fname:
+            imagecache.write_stored_checksum(fname)
+            index = imagecache.get_index()
+            self.assertIs(index, imagecache.get_index())
+
+            index.reconcile([fname])
+            entry = index.get(fname)
+            self.assertEqual(4, entry['size'])
+            self.assertEqual(hashlib.sha1('data').hexdigest(), entry['sha1'])
+            self.assertIsNotNone(entry['sha1_timestamp'])
+
+            os.remove(fname)
+            index.reconcile([])
+            self.assertIsNone(index.get(fname))
+
+    def test_record_base_image(self):
+        with self._make_base_file() as fname:
+            imagecache.record_base_image(fname)
+            entry = imagecache.get_index().get(fname)
+            self.assertEqual(4, entry['size'])
+            self.assertIsNone(entry['sha1'])
+
+    def test_users(self):
+        with self._make_base_file():
+            index = imagecache.get_index()
+            users = {'instance-00000001': (1, 'aaa'),
+                     'instance-00000002': (2, None)}
+            index.set_users(users)
+            self.assertEqual(users, index.get_users())
+            index.set_users({'instance-00000002': (3, 'aaa')})
+            self.assertEqual({'instance-00000002': (3, 'aaa')},
+                             index.get_users())
+
+    def test_verify_checksum_in_background(self):
+        with self._make_base_file() as fname:
+            image_cache_manager = imagecache.ImageCacheManager()
+            self.assertIsNone(image_cache_manager._verify_checksum('42',
+                                                                   fname))
+            self.assertEqual(set([fname]),
+                             image_cache_manager.pending_checksums)
+
+            image_cache_manager._start_checksum_worker()
+            self.assertEqual(hashlib.sha1('data').hexdigest(),
+                             imagecache.read_stored_checksum(
+                                 fname, timestamped=False))
+
+            image_cache_manager._reset_state()
+            self.assertTrue(image_cache_manager._verify_checksum('42', fname))
+            self.assertEqual(set(), image_cache_manager.pending_checksums)
+
+    def test_verify_checksum_in_background_fails(self):
+        self.flags(checksum_interval_seconds=0, group='libvirt')
+        with self._make_base_file() as fname:
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._verify_checksum('42', fname)
+            image_cache_manager._start_checksum_worker()
+
+            with open(fname, 'w') as f:
+                f.write('atad')
+            image_cache_manager._reset_state()
+            self.assertTrue(image_cache_manager._verify_checksum('42', fname))
+            image_cache_manager._start_checksum_worker()
+
+            image_cache_manager._reset_state()
+            self.assertFalse(image_cache_manager._verify_checksum('42',
+                                                                  fname))
+
+    def test_remove_base_file(self):
+        with self._make_base_file() as fname:
+            imagecache.record_base_image(fname)
+            os.utime(fname, (-1, time.time() - 3601))
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager._remove_base_file(fname)
+            self.assertIsNone(image_cache_manager.index.get(fname))
+
+    def _make_disk(self):
+        disk_path = os.path.join(CONF.instances_path,
+                                 'instance-00000001', 'disk')
+        os.mkdir(os.path.dirname(disk_path))
+        open(disk_path, 'w').close()
+        backing_path = os.path.join(CONF.instances_path,
+                                    CONF.image_cache_subdirectory_name,
+                                    'aaa')
+        info = imageutils.QemuImgInfo()
+        info.backing_file = backing_path
+        self.stubs.Set(images, 'qcow2_header_info', lambda path: info)
+        self.stubs.Set(libvirt_utils, 'get_disk_backing_file', None)
+        return disk_path, backing_path
+
+    def test_list_backing_images_reads_header(self):
+        with self._make_base_file():
+            disk_path, backing_path = self._make_disk()
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.instance_names = set(['instance-00000001'])
+            self.assertEqual([backing_path],
+                             image_cache_manager._list_backing_images())
+            self.assertEqual({'instance-00000001':
+                              (os.stat(disk_path).st_ino, 'aaa')},
+                             image_cache_manager.index.get_users())
+
+    def test_list_backing_images_reuses_recorded(self):
+        with self._make_base_file():
+            disk_path, backing_path = self._make_disk()
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.instance_names = set(['instance-00000001'])
+            image_cache_manager._list_backing_images()
+
+            # The disk is unchanged, so its header is not read again.
+            read = []
+            self.stubs.Set(images, 'qcow2_header_info', read.append)
+            image_cache_manager._full_scan = False
+            self.assertEqual([backing_path],
+                             image_cache_manager._list_backing_images())
+            self.assertEqual([], read)
+
+            # A disk which was replaced is read again.
+            open(disk_path + '.new', 'w').close()
+            os.rename(disk_path + '.new', disk_path)
+            self.stubs.Set(libvirt_utils, 'get_disk_backing_file',
+                           lambda path: None)
+            self.assertEqual([], image_cache_manager._list_backing_images())
+            self.assertEqual([disk_path], read)
+
+    def test_list_base_images_unchanged(self):
+        with self._make_base_file() as fname:
+            base_dir = os.path.join(CONF.instances_path,
+                                    CONF.image_cache_subdirectory_name)
+            os.mkdir(base_dir)
+            base_file = os.path.join(base_dir, hashlib.sha1('1').hexdigest())
+            os.rename(fname, base_file)
+            os.utime(base_dir, (time.time() - 10, time.time() - 10))
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.update(None, [])
+            self.assertEqual([base_file],
+                             image_cache_manager.unexplained_images)
+
+            # Nothing changed in _base, so it is not listed again.
+            stored = []
+            self.stubs.Set(image_cache_manager, '_store_image',
+                           lambda *args, **kwargs: stored.append(args))
+            image_cache_manager._reset_state()
+            image_cache_manager._full_scan = False
+            image_cache_manager._list_base_images(base_dir)
+            self.assertEqual([], stored)
+            self.assertEqual([base_file],
+                             image_cache_manager.unexplained_images)
+            self.assertEqual([base_file], image_cache_manager.originals)
+
+            # It is on a full scan.
+            image_cache_manager._reset_state()
+            image_cache_manager._full_scan = True
+            image_cache_manager._list_base_images(base_dir)
+            self.assertEqual(1, len(stored))
+
+    def test_full_scan_due(self):
+        self.flags(image_cache_full_scan_interval=60, group='libvirt')
+        image_cache_manager = imagecache.ImageCacheManager()
+        now = [time.time()]
+        self.stubs.Set(time, 'time', lambda: now[0])
+        self.assertTrue(image_cache_manager._full_scan_due())
+        self.assertFalse(image_cache_manager._full_scan_due())
+        now[0] += 60
+        self.assertTrue(image_cache_manager._full_scan_due())
+
+    def test_hash_file_rate_limited(self):
+        sleeps = []
+        self.stubs.Set(time, 'sleep', sleeps.append)
+        with self._make_base_file(data='x' * 65536) as fname:
+            self.assertEqual(hashlib.sha1('x' * 65536).hexdigest(),
+                             imagecache._hash_file(fname,
+                                                   bytes_per_second=32768))
+        self.assertEqual(2, len(sleeps))
+        self.assertTrue(sleeps[-1] > 1)
+
+    def test_hash_file_yields(self):
+        sleeps = []
+        self.stubs.Set(greenthread, 'sleep', sleeps.append)
+        with self._make_base_file(data='x' * 65536) as fname:
+            imagecache._hash_file(fname)
+        self.assertEqual([0, 0], sleeps)
@@ -13,7 +13,9 @@
 #    under the License.
 
 import os
+import struct
 
+import fixtures
 import mock
 
 from nova import exception
@@ -42,4 +44,83 @@ class QemuTestCase(test.NoDBTestCase):
                                       utils_execute):
         image_info = images.qemu_img_info('/fake/path')
         self.assertTrue(image_info)
-        self.assertTrue(str(image_info))
\ No newline at end of file
+        self.assertTrue(str(image_info))
+
+
+class Qcow2HeaderTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(Qcow2HeaderTestCase, self).setUp()
+        self.tmpdir = self.useFixture(fixtures.TempDir()).path
+
+    def _write_qcow2(self, name, size, backing_file=None):
+        path = os.path.join(self.tmpdir, name)
+        backing_file_offset = 0
+        if backing_file:
+            backing_file_offset = 512
+        header = images.QCOW2_HEADER.pack(images.QCOW2_MAGIC, 2,
+                                          backing_file_offset,
+                                          len(backing_file or ''), 16, size)
+        with open(path, 'wb') as f:
+            f.write(header)
+            if backing_file:
+                f.seek(backing_file_offset)
+                f.write(backing_file)
+        return path
+
+    def test_qcow2_header_info(self):
+        path = self._write_qcow2('disk', 10 * 1024 ** 3, '/base/abcdef')
+        info = images.qcow2_header_info(path)
+        self.assertEqual('qcow2', info.file_format)
+        self.assertEqual(10 * 1024 ** 3, info.virtual_size)
+        self.assertEqual('/base/abcdef', info.backing_file)
+        self.assertEqual(65536, info.cluster_size)
+
+    def test_qcow2_header_info_no_backing_file(self):
+        path = self._write_qcow2('disk', 1024)
+        self.assertIsNone(images.qcow2_header_info(path).backing_file)
+
+    def test_qcow2_header_info_not_qcow2(self):
+        path = os.path.join(self.tmpdir, 'raw')
+        with open(path, 'wb') as f:
+            f.write('\0' * 1024)
+        self.assertIsNone(images.qcow2_header_info(path))
+        with open(path, 'wb') as f:
+            f.write(struct.pack('>4sI', images.QCOW2_MAGIC, 1) + '\0' * 64)
+        self.assertIsNone(images.qcow2_header_info(path))
+
+    @mock.patch.object(images, 'qemu_img_info')
+    def test_cache(self, mock_qemu_img_info):
+        cache = images.QemuImgInfoCache()
+        path = self._write_qcow2('disk', 1024)
+        self.assertEqual(1024, cache.get(path).virtual_size)
+
+        with mock.patch.object(images, 'qcow2_header_info') as mock_header:
+            self.assertEqual(1024, cache.get(path).virtual_size)
+            self.assertFalse(mock_header.called)
+
+        # A changed file is inspected again.
+        self._write_qcow2('disk', 2048, '/base/abcdef')
+        self.assertEqual(2048, cache.get(path).virtual_size)
+        self.assertFalse(mock_qemu_img_info.called)
+
+    @mock.patch.object(images, 'qemu_img_info')
+    def test_cache_falls_back_to_qemu_img(self, mock_qemu_img_info):
+        cache = images.QemuImgInfoCache()
+        path = os.path.join(self.tmpdir, 'raw')
+        with open(path, 'wb') as f:
+            f.write('\0' * 1024)
+        self.assertEqual(mock_qemu_img_info.return_value, cache.get(path))
+        mock_qemu_img_info.assert_called_once_with(path)
+
+    def test_cache_prune(self):
+        cache = images.QemuImgInfoCache()
+        path1 = self._write_qcow2('disk1', 1024)
+        path2 = self._write_qcow2('disk2', 1024)
+        cache.get(path1)
+        cache.get(path2)
+        cache.prune([path2])
+        with mock.patch.object(images, 'qcow2_header_info') as mock_header:
+            cache.get(path2)
+            self.assertFalse(mock_header.called)
+            cache.get(path1)
+            mock_header.assert_called_once_with(path1)
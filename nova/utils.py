@@ -23,6 +23,7 @@ import functools
 import hashlib
 import hmac
 import inspect
+import logging as std_logging
 import os
 import pyclbr
 import random
@@ -47,6 +48,7 @@ from nova.openstack.common import importutils
 from nova.openstack.common import lockutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import processutils
+from nova.openstack.common import strutils
 from nova.openstack.common import timeutils
 
 notify_decorator = 'nova.notifications.notify_decorator'
@@ -74,6 +76,12 @@ utils_opts = [
                default="/etc/nova/rootwrap.conf",
                help='Path to the rootwrap configuration file to use for '
                     'running commands as root'),
+    cfg.BoolOpt('use_rootwrap_daemon',
+                default=False,
+                help='Run commands as root through a long-lived '
+                     'nova-rootwrap-daemon process, reached over a local '
+                     'socket, instead of starting sudo nova-rootwrap for '
+                     'every command. Requires oslo.rootwrap 1.5.0 or later'),
     cfg.StrOpt('tempdir',
                help='Explicitly specify the temporary working directory'),
 ]
@@ -180,8 +188,91 @@ def _get_root_helper():
     return 'sudo nova-rootwrap %s' % CONF.rootwrap_config
 
 
+_ROOTWRAP_DAEMON_CLIENTS = {}
+
+
+@synchronized('rootwrap-daemon-client')
+def _get_rootwrap_daemon_client(rootwrap_config):
+    """Return the client of the rootwrap daemon for a configuration file.
+
+    The daemon is started by the client on the first command and loads the
+    rootwrap filters once for all the commands that follow.
+    """
+    client = _ROOTWRAP_DAEMON_CLIENTS.get(rootwrap_config)
+    if client is None:
+        # NOTE: imported here so that nova.utils does not need the
+        # rootwrap client unless use_rootwrap_daemon is set.
+        from oslo.rootwrap import client as rootwrap_client
+        client = rootwrap_client.Client(
+            ['sudo', 'nova-rootwrap-daemon', rootwrap_config])
+        _ROOTWRAP_DAEMON_CLIENTS[rootwrap_config] = client
+    return client
+
+
+def _use_rootwrap_daemon(kwargs):
+    """Return True if a command can run through the rootwrap daemon.
+
+    Explicit root helpers, shell commands and subprocess callbacks are
+    left to processutils, as the daemon does not support them.
+    """
+    return (CONF.use_rootwrap_daemon and kwargs.get('run_as_root') and
+            'root_helper' not in kwargs and not kwargs.get('shell') and
+            'on_execute' not in kwargs and 'on_completion' not in kwargs)
+
+
+def _rootwrap_daemon_execute(*cmd, **kwargs):
+    """Run a command as root through the rootwrap daemon.
+
+    Takes the same arguments and raises the same errors as
+    processutils.execute().
+    """
+    process_input = kwargs.pop('process_input', None)
+    env_variables = kwargs.pop('env_variables', None)
+    check_exit_code = kwargs.pop('check_exit_code', [0])
+    ignore_exit_code = False
+    delay_on_retry = kwargs.pop('delay_on_retry', True)
+    attempts = kwargs.pop('attempts', 1)
+    loglevel = kwargs.pop('loglevel', std_logging.DEBUG)
+    kwargs.pop('run_as_root')
+
+    if isinstance(check_exit_code, bool):
+        ignore_exit_code = not check_exit_code
+        check_exit_code = [0]
+    elif isinstance(check_exit_code, int):
+        check_exit_code = [check_exit_code]
+
+    if kwargs:
+        raise processutils.UnknownArgumentError(
+            _('Got unknown keyword args: %r') % kwargs)
+
+    cmd = map(str, cmd)
+    sanitized_cmd = strutils.mask_password(' '.join(cmd))
+    client = _get_rootwrap_daemon_client(CONF.rootwrap_config)
+
+    while attempts > 0:
+        attempts -= 1
+        LOG.log(loglevel, 'Running cmd (rootwrap daemon): %s', sanitized_cmd)
+        returncode, stdout, stderr = client.execute(cmd, env=env_variables,
+                                                    stdin=process_input)
+        LOG.log(loglevel, 'Result was %s', returncode)
+        if ignore_exit_code or returncode in check_exit_code:
+            return stdout, stderr
+
+        if not attempts:
+            raise processutils.ProcessExecutionError(
+                exit_code=returncode,
+                stdout=strutils.mask_password(stdout),
+                stderr=strutils.mask_password(stderr),
+                cmd=sanitized_cmd)
+        LOG.log(loglevel, '%r failed. Retrying.', sanitized_cmd)
+        if delay_on_retry:
+            eventlet.sleep(random.randint(20, 200) / 100.0)
+
+
 def execute(*cmd, **kwargs):
     """Convenience wrapper around oslo's execute() method."""
+    if _use_rootwrap_daemon(kwargs):
+        return _rootwrap_daemon_execute(*cmd, **kwargs)
     if 'run_as_root' in kwargs and 'root_helper' not in kwargs:
         kwargs['root_helper'] = _get_root_helper()
     return processutils.execute(*cmd, **kwargs)
@@ -189,6 +280,15 @@ def execute(*cmd, **kwargs):
 
 def trycmd(*args, **kwargs):
     """Convenience wrapper around oslo's trycmd() method."""
+    if _use_rootwrap_daemon(kwargs):
+        discard_warnings = kwargs.pop('discard_warnings', False)
+        try:
+            out, err = _rootwrap_daemon_execute(*args, **kwargs)
+        except processutils.ProcessExecutionError as exn:
+            return '', six.text_type(exn)
+        if discard_warnings:
+            err = ''
+        return out, err
     if 'run_as_root' in kwargs and 'root_helper' not in kwargs:
         kwargs['root_helper'] = _get_root_helper()
     return processutils.trycmd(*args, **kwargs)
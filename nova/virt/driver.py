@@ -171,6 +171,16 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_info_all(self):
+        """Get the current status of all the instances on the host at once.
+
+        Returns a dict mapping the UUID of each instance known to the
+        hypervisor to a dict in the format returned by get_info(), in which
+        only :state: is required.  Instances missing from it are not found
+        on the hypervisor.
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -318,6 +318,14 @@ class FakeDriver(driver.ComputeDriver):
                 'num_cpu': 2,
                 'cpu_time': 0}
 
+    def get_info_all(self):
+        return dict((i.uuid, {'state': i.state,
+                              'max_mem': 0,
+                              'mem': 0,
+                              'num_cpu': 2,
+                              'cpu_time': 0})
+                    for i in self.instances.values())
+
     def get_diagnostics(self, instance_name):
         return {'cpu0_time': 17300000000,
                 'memory': 524288,
@@ -20,6 +20,7 @@ Handling of VM disk images.
 """
 
 import os
+import struct
 
 from oslo.config import cfg
 
@@ -62,6 +63,76 @@ def qemu_img_info(path):
     return imageutils.QemuImgInfo(out)
 
 
+QCOW2_MAGIC = 'QFI\xfb'
+# magic, version, backing_file_offset, backing_file_size, cluster_bits, size
+QCOW2_HEADER = struct.Struct('>4sIQIIQ')
+
+
+def qcow2_header_info(path):
+    """Read the virtual size and backing file of a qcow2 image from its
+    header, without running qemu-img.
+
+    Returns a QemuImgInfo, or None if the file is not a qcow2 image with a
+    header this function understands.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(QCOW2_HEADER.size)
+        if len(header) != QCOW2_HEADER.size:
+            return None
+        (magic, version, backing_file_offset, backing_file_size,
+         cluster_bits, size) = QCOW2_HEADER.unpack(header)
+        if magic != QCOW2_MAGIC or version not in (2, 3):
+            return None
+
+        backing_file = None
+        if backing_file_offset:
+            f.seek(backing_file_offset)
+            backing_file = f.read(backing_file_size)
+            if len(backing_file) != backing_file_size:
+                return None
+        st = os.fstat(f.fileno())
+
+    info = imageutils.QemuImgInfo()
+    info.image = path
+    info.file_format = 'qcow2'
+    info.virtual_size = size
+    info.cluster_size = 1 << cluster_bits
+    info.disk_size = st.st_blocks * 512
+    info.backing_file = backing_file
+    return info
+
+
+class QemuImgInfoCache(object):
+    """Cache of qemu_img_info() results for local image files.
+
+    An entry is reused as long as the inode, modification time and size of
+    the file are unchanged, so only new or modified images are inspected
+    again.  qcow2 headers are read in-process; other images go through
+    qemu-img.
+    """
+
+    def __init__(self):
+        self._cache = {}
+
+    def get(self, path):
+        st = os.stat(path)
+        key = (st.st_ino, st.st_mtime, st.st_size)
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        info = qcow2_header_info(path) or qemu_img_info(path)
+        self._cache[path] = (key, info)
+        return info
+
+    def prune(self, paths):
+        """Forget all images but the given ones."""
+        paths = set(paths)
+        for path in self._cache.keys():
+            if path not in paths:
+                del self._cache[path]
+
+
 def convert_image(source, dest, out_format, run_as_root=False):
     """Convert image to other format."""
     cmd = ('qemu-img', 'convert', '-O', out_format, source, dest)
@@ -94,6 +94,7 @@ from nova.virt import driver
 from nova.virt import event as virtevent
 from nova.virt import firewall
 from nova.virt import hardware
+from nova.virt import images
 from nova.virt.libvirt import blockinfo
 from nova.virt.libvirt import config as vconfig
 from nova.virt.libvirt import dmcrypt
@@ -385,6 +386,10 @@ class LibvirtDriver(driver.ComputeDriver):
             libvirt = importutils.import_module('libvirt')
 
         self._skip_list_all_domains = False
+        self._skip_all_domain_stats = False
+        # Running domains listed once for the current resource audit,
+        # see _domain_snapshot()
+        self._audit_domains = None
         self._host_state = None
         self._initiator = None
         self._fc_wwnns = None
@@ -410,6 +415,9 @@ class LibvirtDriver(driver.ComputeDriver):
         self._event_queue = None
 
         self._disk_cachemode = None
+        # qemu-img info results of the instance disks, reused by the
+        # periodic disk over commit accounting while the files are unchanged
+        self._img_info_cache = images.QemuImgInfoCache()
         self.image_cache_manager = imagecache.ImageCacheManager()
         self.image_backend = imagebackend.Backend(CONF.use_cow_images)
 
@@ -969,6 +977,73 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return doms
 
+    def _get_all_domain_stats(self, stats, flags=0):
+        """Get stats of all the domains in one call.
+
+        Uses the bulk domain stats API of libvirt >= 1.2.8.
+
+        :returns: list of (libvirt.Domain, dict of stats) tuples, or None if
+                  the bulk API is unavailable
+        """
+        if self._skip_all_domain_stats:
+            return None
+        try:
+            return self._conn.getAllDomainStats(stats, flags)
+        except (libvirt.libvirtError, AttributeError) as ex:
+            LOG.info(_LI("Unable to use bulk domain stats APIs, "
+                         "falling back to per domain calls: %(ex)s"),
+                     {'ex': ex})
+            self._skip_all_domain_stats = True
+            return None
+
+    def _list_domains_vcpus(self):
+        """Get the running domains and their number of vCPUs in one call.
+
+        The vCPU count of a domain is None if libvirt did not report it.
+
+        :returns: list of (libvirt.Domain, vCPU count) tuples, or None if
+                  the bulk API is unavailable
+        """
+        stats = self._get_all_domain_stats(
+            libvirt.VIR_DOMAIN_STATS_VCPU,
+            libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE)
+        if stats is None:
+            return None
+        return [(dom, record.get('vcpu.current')) for dom, record in stats]
+
+    @contextlib.contextmanager
+    def _domain_snapshot(self):
+        """Context manager listing the running domains once for a resource
+        audit.
+
+        Within the block _list_audit_domains() returns that list, along with
+        the vCPU counts fetched in bulk when libvirt supports it, instead of
+        querying libvirt again for each accessor.
+        """
+        domains_vcpus = self._list_domains_vcpus()
+        if domains_vcpus is None:
+            domains_vcpus = [(dom, None) for dom in
+                             self._list_instance_domains(only_guests=False)]
+        self._audit_domains = domains_vcpus
+        try:
+            yield
+        finally:
+            self._audit_domains = None
+
+    def _list_audit_domains(self, only_guests=True):
+        """Get the running domains for the resource audit.
+
+        :returns: list of (libvirt.Domain, vCPU count or None) tuples
+        """
+        if self._audit_domains is None:
+            if only_guests:
+                doms = self._list_instance_domains()
+            else:
+                doms = self._list_instance_domains(only_guests=False)
+            return [(dom, None) for dom in doms]
+        return [(dom, vcpus) for dom, vcpus in self._audit_domains
+                if not only_guests or dom.ID() != 0]
+
     def list_instances(self):
         names = []
         for dom in self._list_instance_domains(only_running=False):
@@ -4263,6 +4338,40 @@ class LibvirtDriver(driver.ComputeDriver):
                 'cpu_time': dom_info[4],
                 'id': virt_dom.ID()}
 
+    def get_info_all(self):
+        """Retrieve the power state of all the domains, running or not.
+
+        Uses a single bulk domain stats call when libvirt supports it,
+        otherwise one info() call per domain, but never a lookup by name.
+        """
+        infos = {}
+        stats = self._get_all_domain_stats(libvirt.VIR_DOMAIN_STATS_STATE)
+        if stats is not None:
+            for dom, record in stats:
+                if dom.ID() == 0 or 'state.state' not in record:
+                    continue
+                infos[dom.UUIDString()] = {
+                    'state': LIBVIRT_POWER_STATE[record['state.state']]}
+            return infos
+
+        for dom in self._list_instance_domains(only_running=False):
+            try:
+                dom_info = dom.info()
+            except libvirt.libvirtError as ex:
+                # NOTE: the domain may have gone away since it was listed,
+                #       which get_info() reports as InstanceNotFound.
+                if ex.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+                    raise
+                continue
+            infos[dom.UUIDString()] = {
+                'state': LIBVIRT_POWER_STATE[dom_info[0]],
+                'max_mem': dom_info[1],
+                'mem': dom_info[2],
+                'num_cpu': dom_info[3],
+                'cpu_time': dom_info[4],
+                'id': dom.ID()}
+        return infos
+
     def _create_domain_setup_lxc(self, instance, block_device_info, disk_info):
         inst_path = libvirt_utils.get_instance_path(instance)
         block_device_mapping = driver.block_device_info_get_mapping(
@@ -4596,7 +4705,10 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt.virt_type == 'lxc':
             return total + 1
 
-        for dom in self._list_instance_domains():
+        for dom, vcpu_count in self._list_audit_domains():
+            if vcpu_count is not None:
+                total += vcpu_count
+                continue
             try:
                 vcpus = dom.vcpus()
             except libvirt.libvirtError as e:
@@ -4627,7 +4739,7 @@ class LibvirtDriver(driver.ComputeDriver):
         idx3 = m.index('Cached:')
         if CONF.libvirt.virt_type == 'xen':
             used = 0
-            for dom in self._list_instance_domains(only_guests=False):
+            for dom, _vcpus in self._list_audit_domains(only_guests=False):
                 try:
                     dom_mem = int(dom.info()[2])
                 except libvirt.libvirtError as e:
@@ -5720,7 +5832,7 @@ class LibvirtDriver(driver.ComputeDriver):
             self._conn.defineXML(xml)
 
     def _get_instance_disk_info(self, instance_name, xml,
-                                block_device_info=None):
+                                block_device_info=None, img_info_cache=None):
         block_device_mapping = driver.block_device_info_get_mapping(
             block_device_info)
 
@@ -5762,8 +5874,17 @@ class LibvirtDriver(driver.ComputeDriver):
             elif disk_type == 'block':
                 dk_size = lvm.get_volume_size(path)
 
+            source_type = disk_type
             disk_type = driver_nodes[cnt].get('type')
-            if disk_type == "qcow2":
+            if (disk_type == "qcow2" and source_type == 'file' and
+                    img_info_cache is not None):
+                img_info = img_info_cache.get(path)
+                backing_file = img_info.backing_file
+                if backing_file:
+                    backing_file = os.path.basename(backing_file)
+                virt_size = int(img_info.virtual_size)
+                over_commit_size = virt_size - dk_size
+            elif disk_type == "qcow2":
                 backing_file = libvirt_utils.get_disk_backing_file(path)
                 virt_size = disk.get_disk_size(path)
                 over_commit_size = int(virt_size) - dk_size
@@ -5803,14 +5924,18 @@ class LibvirtDriver(driver.ComputeDriver):
         """Return total over committed disk size for all instances."""
         # Disk size that all instance uses : virtual_size - disk_size
         disk_over_committed_size = 0
-        for dom in self._list_instance_domains():
+        disk_paths = []
+        for dom, _vcpus in self._list_audit_domains():
             try:
                 xml = dom.XMLDesc(0)
                 disk_infos = jsonutils.loads(
-                        self._get_instance_disk_info(dom.name(), xml))
+                        self._get_instance_disk_info(
+                            dom.name(), xml,
+                            img_info_cache=self._img_info_cache))
                 for info in disk_infos:
                     disk_over_committed_size += int(
                         info['over_committed_disk_size'])
+                    disk_paths.append(info['path'])
             except libvirt.libvirtError as ex:
                 error_code = ex.get_error_code()
                 LOG.warn(_LW(
@@ -5845,6 +5970,7 @@ class LibvirtDriver(driver.ComputeDriver):
                           'error': e})
             # NOTE(gtt116): give other tasks a chance.
             greenthread.sleep(0)
+        self._img_info_cache.prune(disk_paths)
         return disk_over_committed_size
 
     def unfilter_instance(self, instance, network_info):
@@ -6448,6 +6574,10 @@ class HostState(object):
 
     def update_status(self):
         """Retrieve status info from libvirt."""
+        with self.driver._domain_snapshot():
+            return self._update_status()
+
+    def _update_status(self):
         def _get_disk_available_least():
             """Return total real disk available least size.
 
@@ -16,7 +16,9 @@
 import abc
 import contextlib
 import os
+import sys
 
+import eventlet.event
 from oslo.config import cfg
 import six
 
@@ -29,12 +31,14 @@ from nova.openstack.common import excutils
 from nova.openstack.common import fileutils
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
+from nova.openstack.common import processutils
 from nova.openstack.common import units
 from nova import utils
 from nova.virt.disk import api as disk
 from nova.virt import images
 from nova.virt.libvirt import config as vconfig
 from nova.virt.libvirt import dmcrypt
+from nova.virt.libvirt import imagecache
 from nova.virt.libvirt import lvm
 from nova.virt.libvirt import rbd_utils
 from nova.virt.libvirt import utils as libvirt_utils
@@ -87,6 +91,54 @@ CONF.import_opt('rbd_secret_uuid', 'nova.virt.libvirt.volume', group='libvirt')
 LOG = logging.getLogger(__name__)
 IMAGE_API = image.API()
 
+# Images being fetched by this process, keyed by cache file name and target,
+# mapped to the event on which the other callers wait for the fetch to finish.
+_FETCHES_IN_FLIGHT = {}
+
+# Errors of a fetch which do not depend on the arguments it was given, such
+# as the max_size or the context, and are raised to the callers waiting on it.
+_SHARED_FETCH_ERRORS = (IOError,
+                        OSError,
+                        processutils.ProcessExecutionError,
+                        exception.GlanceConnectionFailed,
+                        exception.ImageDownloadModuleError)
+
+
+def _fetch_once(filename, fetch_func, target, *args, **kwargs):
+    """Fetch target with fetch_func, or join the fetch in progress.
+
+    When instances booted at once from the same uncached image all call
+    this, the first one fetches the image and the others wait on it. They
+    wake up as soon as it is done, and raise its error if the download
+    failed instead of each trying again. If it failed for any other reason,
+    which may only apply to the arguments of the first caller, they fetch
+    the image with their own arguments.
+    """
+    key = (filename, target)
+    while key in _FETCHES_IN_FLIGHT:
+        LOG.debug('Waiting for the fetch of %s in progress', target)
+        try:
+            return _FETCHES_IN_FLIGHT[key].wait()
+        except _SHARED_FETCH_ERRORS:
+            raise
+        except Exception as e:
+            LOG.debug('The fetch of %(target)s in progress failed with '
+                      '%(error)s, fetching it again',
+                      {'target': target, 'error': e})
+
+    waiter = eventlet.event.Event()
+    _FETCHES_IN_FLIGHT[key] = waiter
+    try:
+        result = fetch_func(target=target, *args, **kwargs)
+    except Exception:
+        with excutils.save_and_reraise_exception():
+            waiter.send_exception(*sys.exc_info())
+    else:
+        waiter.send(result)
+        return result
+    finally:
+        del _FETCHES_IN_FLIGHT[key]
+
 
 @six.add_metaclass(abc.ABCMeta)
 class Image(object):
@@ -191,11 +243,16 @@ class Image(object):
         :size: Size of created image in bytes (optional)
         """
         @utils.synchronized(filename, external=True, lock_path=self.lock_path)
-        def fetch_func_sync(target, *args, **kwargs):
+        def fetch_func_locked(target, *args, **kwargs):
             # The image may have been fetched while a subsequent
-            # call was waiting to obtain the lock.
+            # call was waiting to obtain the lock, e.g. by another
+            # compute node sharing the instances path.
             if not os.path.exists(target):
                 fetch_func(target=target, *args, **kwargs)
+                imagecache.record_base_image(target)
+
+        def fetch_func_sync(target, *args, **kwargs):
+            _fetch_once(filename, fetch_func_locked, target, *args, **kwargs)
 
         base_dir = os.path.join(CONF.instances_path,
                                 CONF.image_cache_subdirectory_name)
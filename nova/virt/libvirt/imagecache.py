@@ -23,8 +23,10 @@ http://wiki.openstack.org/nova-image-cache-management.
 import hashlib
 import os
 import re
+import sqlite3
 import time
 
+from eventlet import greenthread
 from oslo.config import cfg
 
 from nova.i18n import _LE
@@ -36,6 +38,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common import processutils
 from nova import utils
 from nova.virt import imagecache
+from nova.virt import images
 from nova.virt.libvirt import utils as libvirt_utils
 
 LOG = logging.getLogger(__name__)
@@ -62,6 +65,24 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.StrOpt('image_cache_index_path',
+               help='Path of a sqlite database in which the image cache '
+                    'manager keeps the size, checksum and users of every '
+                    'base image. When set, base images are recorded as they '
+                    'are fetched and removed, checksums are computed in the '
+                    'background and each pass of the cache manager only '
+                    'reconciles what changed. Use a path on local storage, '
+                    'one per compute node'),
+    cfg.IntOpt('image_cache_full_scan_interval',
+               default=3600,
+               help='With image_cache_index_path, how often, in seconds, the '
+                    'image cache manager lists the whole base image '
+                    'directory and reads the backing file of every instance '
+                    'disk again, instead of only the ones which changed'),
+    cfg.IntOpt('checksum_bytes_per_second',
+               default=0,
+               help='Maximum rate at which base images are read to compute '
+                    'their checksum, in bytes per second. 0 means unlimited'),
     ]
 
 CONF = cfg.CONF
@@ -210,12 +231,27 @@ def write_stored_info(target, field=None, value=None):
     write_file(info_file, field, value)
 
 
-def _hash_file(filename):
-    """Generate a hash for the contents of a file."""
+def _hash_file(filename, bytes_per_second=0):
+    """Generate a hash for the contents of a file.
+
+    If bytes_per_second is set, sleep between reads so that the file is not
+    read faster than that. Other green threads get a chance to run after
+    every chunk either way.
+    """
     checksum = hashlib.sha1()
+    start = time.time()
+    read = 0
     with open(filename) as f:
         for chunk in iter(lambda: f.read(32768), b''):
             checksum.update(chunk)
+            delay = 0
+            if bytes_per_second:
+                read += len(chunk)
+                delay = float(read) / bytes_per_second - (time.time() - start)
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                greenthread.sleep(0)
     return checksum.hexdigest()
 
 
@@ -232,10 +268,155 @@ def write_stored_checksum(target):
     write_stored_info(target, field='sha1', value=_hash_file(target))
 
 
+class ImageCacheIndex(object):
+    """Persistent index of the base images in the image cache.
+
+    Records the inode, size and checksum of every base file, and the
+    backing file of every instance disk, in a sqlite database. Base files
+    are immutable once fetched, so an entry stays valid for as long as the
+    inode and size of the file are unchanged. Likewise the backing file of
+    an instance disk is set when the disk is created, so it stays valid for
+    as long as the inode of the disk is unchanged.
+    """
+
+    def __init__(self, path):
+        fileutils.ensure_tree(os.path.dirname(path))
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS base_images ('
+                               'path TEXT PRIMARY KEY, '
+                               'ino INTEGER, '
+                               'size INTEGER, '
+                               'sha1 TEXT, '
+                               'sha1_timestamp REAL, '
+                               'corrupt INTEGER NOT NULL DEFAULT 0)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS users ('
+                               'instance TEXT PRIMARY KEY, '
+                               'disk_ino INTEGER, '
+                               'backing_file TEXT)')
+
+    def get(self, path):
+        """Return the entry of a base file as a dict, or None."""
+        row = self._conn.execute('SELECT * FROM base_images WHERE path = ?',
+                                 (path,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(row.keys(), row))
+
+    def add(self, path):
+        """Record a base file, unless it is already recorded as it is.
+
+        The checksum of a new entry is seeded from the image info file,
+        if there is one.
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.remove(path)
+            return
+
+        entry = self.get(path)
+        if (entry is not None and entry['ino'] == st.st_ino
+                and entry['size'] == st.st_size):
+            return
+
+        sha1, sha1_timestamp = None, None
+        if entry is None:
+            sha1, sha1_timestamp = read_stored_checksum(path,
+                                                        timestamped=True)
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO base_images '
+                               '(path, ino, size, sha1, sha1_timestamp) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               (path, st.st_ino, st.st_size, sha1,
+                                sha1_timestamp))
+
+    def remove(self, path):
+        with self._conn:
+            self._conn.execute('DELETE FROM base_images WHERE path = ?',
+                               (path,))
+
+    def set_checksum(self, path, sha1, corrupt=False):
+        with self._conn:
+            self._conn.execute('UPDATE base_images SET sha1 = ?, '
+                               'sha1_timestamp = ?, corrupt = ? '
+                               'WHERE path = ?',
+                               (sha1, time.time(), int(corrupt), path))
+
+    def paths(self):
+        """Return the paths of the recorded base files."""
+        return [row[0] for row in
+                self._conn.execute('SELECT path FROM base_images '
+                                   'ORDER BY path')]
+
+    def reconcile(self, paths):
+        """Make the index match the base files found on disk.
+
+        Entries of files which are gone are dropped, and files which are
+        new or were replaced are (re-)recorded.
+        """
+        paths = set(paths)
+        recorded = set(self.paths())
+        for path in recorded - paths:
+            self.remove(path)
+        for path in paths:
+            self.add(path)
+
+    def get_users(self):
+        """Return a dict of instance directory name to the inode of its
+        disk and the basename of the backing file of that disk.
+        """
+        return dict((row[0], (row[1], row[2])) for row in
+                    self._conn.execute('SELECT instance, disk_ino, '
+                                       'backing_file FROM users'))
+
+    def set_users(self, users):
+        """Replace the recorded users with a dict in the format returned
+        by get_users, only writing the entries which changed.
+        """
+        recorded = self.get_users()
+        with self._conn:
+            for instance in set(recorded) - set(users):
+                self._conn.execute('DELETE FROM users WHERE instance = ?',
+                                   (instance,))
+            for instance, (disk_ino, backing_file) in users.iteritems():
+                if recorded.get(instance) != (disk_ino, backing_file):
+                    self._conn.execute('INSERT OR REPLACE INTO users '
+                                       '(instance, disk_ino, backing_file) '
+                                       'VALUES (?, ?, ?)',
+                                       (instance, disk_ino, backing_file))
+
+
+_INDEXES = {}
+
+
+def get_index():
+    """Return the configured ImageCacheIndex, or None."""
+    path = CONF.libvirt.image_cache_index_path
+    if not path:
+        return None
+    if path not in _INDEXES:
+        _INDEXES[path] = ImageCacheIndex(path)
+    return _INDEXES[path]
+
+
+def record_base_image(target):
+    """Record a newly fetched base file in the index, if there is one."""
+    index = get_index()
+    if index is not None:
+        index.add(target)
+
+
 class ImageCacheManager(imagecache.ImageCacheManager):
     def __init__(self):
         super(ImageCacheManager, self).__init__()
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        self.index = get_index()
+        self._checksum_worker_running = False
+        self._full_scan = True
+        self._last_full_scan = None
+        self._base_dir_mtime = None
         self._reset_state()
 
     def _reset_state(self):
@@ -250,6 +431,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.originals = []
         self.removable_base_files = []
         self.unexplained_images = []
+        self.pending_checksums = set()
 
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
@@ -268,6 +450,17 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         """
 
         digest_size = hashlib.sha1().digestsize * 2
+        if self.index is not None and self._base_dir_unchanged(base_dir):
+            # NOTE: nothing was added to or removed from _base since the
+            # last pass, so the index already holds its listing.
+            for path in self.index.paths():
+                if os.path.dirname(path) == base_dir:
+                    self.unexplained_images.append(path)
+                    if len(os.path.basename(path)) == digest_size:
+                        self.originals.append(path)
+            return {'unexplained_images': self.unexplained_images,
+                    'originals': self.originals}
+
         for ent in os.listdir(base_dir):
             if len(ent) == digest_size:
                 self._store_image(base_dir, ent, original=True)
@@ -277,12 +470,66 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                   not is_valid_info_file(os.path.join(base_dir, ent))):
                 self._store_image(base_dir, ent, original=False)
 
+        if self.index is not None:
+            self.index.reconcile(self.unexplained_images)
+
         return {'unexplained_images': self.unexplained_images,
                 'originals': self.originals}
 
+    def _base_dir_unchanged(self, base_dir):
+        """Return whether no file was added to or removed from base_dir
+        since the last pass, unless a full scan is due.
+
+        The mtime of the directory tells, except for a change made within
+        the same second as the listing, so a listing is only trusted once
+        the directory is older than that.
+        """
+        mtime = os.stat(base_dir).st_mtime
+        listed, self._base_dir_mtime = self._base_dir_mtime, None
+        if time.time() - mtime > 1:
+            self._base_dir_mtime = (base_dir, mtime)
+        return not self._full_scan and listed == (base_dir, mtime)
+
+    def _full_scan_due(self):
+        now = time.time()
+        if (self._last_full_scan is None or
+                now - self._last_full_scan >=
+                CONF.libvirt.image_cache_full_scan_interval):
+            self._last_full_scan = now
+            return True
+        return False
+
+    def _get_backing_file(self, ent, disk_path, recorded, users):
+        """Return the basename of the backing file of an instance disk.
+
+        With an index the backing file recorded on the previous pass is
+        reused for as long as the disk file is the same, and is otherwise
+        read from the qcow2 header instead of running qemu-img. The result
+        is stored in users.
+        """
+        if self.index is None:
+            return libvirt_utils.get_disk_backing_file(disk_path)
+
+        disk_ino = os.stat(disk_path).st_ino
+        if ent in recorded and recorded[ent][0] == disk_ino:
+            backing_file = recorded[ent][1]
+        else:
+            info = images.qcow2_header_info(disk_path)
+            if info is not None:
+                backing_file = (info.backing_file and
+                                os.path.basename(info.backing_file))
+            else:
+                backing_file = libvirt_utils.get_disk_backing_file(disk_path)
+        users[ent] = (disk_ino, backing_file)
+        return backing_file
+
     def _list_backing_images(self):
         """List the backing images currently in use."""
         inuse_images = []
+        recorded = {}
+        users = {}
+        if self.index is not None and not self._full_scan:
+            recorded = self.index.get_users()
         for ent in os.listdir(CONF.instances_path):
             if ent in self.instance_names:
                 LOG.debug('%s is a valid instance name', ent)
@@ -290,9 +537,10 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                 if os.path.exists(disk_path):
                     LOG.debug('%s has a disk file', ent)
                     try:
-                        backing_file = libvirt_utils.get_disk_backing_file(
-                            disk_path)
-                    except processutils.ProcessExecutionError:
+                        backing_file = self._get_backing_file(
+                            ent, disk_path, recorded, users)
+                    except (processutils.ProcessExecutionError, IOError,
+                            OSError):
                         # (for bug 1261442)
                         if not os.path.exists(disk_path):
                             LOG.debug('Failed to get disk backing file: %s',
@@ -321,6 +569,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
                                         {'instance': ent,
                                          'backing': backing_file})
                             self.unexplained_images.remove(backing_path)
+
+        if self.index is not None:
+            self.index.set_users(users)
         return inuse_images
 
     def _find_base_file(self, base_dir, fingerprint):
@@ -361,6 +612,9 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         if not CONF.libvirt.checksum_base_images:
             return None
 
+        if self.index is not None:
+            return self._verify_indexed_checksum(img_id, base_file)
+
         lock_name = 'hash-%s' % os.path.split(base_file)[-1]
 
         # Protect against other nova-computes performing checksums at the same
@@ -416,6 +670,83 @@ class ImageCacheManager(imagecache.ImageCacheManager):
 
         return inner_verify_checksum()
 
+    def _verify_indexed_checksum(self, img_id, base_file):
+        """Return the result of the last checksum of a base file recorded
+        in the index, and queue the file for a new checksum if that result
+        is missing or older than checksum_interval_seconds.
+        """
+        entry = self.index.get(base_file)
+        if entry is None:
+            self.index.add(base_file)
+            entry = self.index.get(base_file)
+
+        if (entry['sha1_timestamp'] is None or
+                time.time() - entry['sha1_timestamp'] >=
+                CONF.libvirt.checksum_interval_seconds):
+            self.pending_checksums.add(base_file)
+
+        if not entry['sha1']:
+            LOG.info(_LI('image %(id)s at (%(base_file)s): image '
+                         'verification skipped, no hash stored'),
+                     {'id': img_id,
+                      'base_file': base_file})
+            return None
+
+        if entry['corrupt']:
+            LOG.error(_LE('image %(id)s at (%(base_file)s): image '
+                          'verification failed'),
+                      {'id': img_id,
+                       'base_file': base_file})
+            return False
+        return True
+
+    def _checksum_base_files(self, base_files):
+        """Checksum base files and record the result in the index.
+
+        Runs in the background, reading at most checksum_bytes_per_second.
+        A file without a stored checksum gets one; otherwise the stored
+        checksum is verified.
+        """
+        try:
+            for base_file in base_files:
+                lock_name = 'hash-%s' % os.path.split(base_file)[-1]
+
+                @utils.synchronized(lock_name, external=True,
+                                    lock_path=self.lock_path)
+                def checksum_base_file():
+                    entry = self.index.get(base_file)
+                    if entry is None or not os.path.exists(base_file):
+                        return
+
+                    current_checksum = _hash_file(
+                        base_file, CONF.libvirt.checksum_bytes_per_second)
+                    if not entry['sha1']:
+                        LOG.info(_LI('%s: generated checksum'), base_file)
+                        write_stored_info(base_file, field='sha1',
+                                          value=current_checksum)
+                        self.index.set_checksum(base_file, current_checksum)
+                    elif current_checksum != entry['sha1']:
+                        LOG.error(_LE('%s: image verification failed'),
+                                  base_file)
+                        self.index.set_checksum(base_file, entry['sha1'],
+                                                corrupt=True)
+                    else:
+                        self.index.set_checksum(base_file, entry['sha1'])
+
+                checksum_base_file()
+        finally:
+            self._checksum_worker_running = False
+
+    def _start_checksum_worker(self):
+        """Checksum the queued base files in a background green thread,
+        unless the previous one is still running.
+        """
+        if not self.pending_checksums or self._checksum_worker_running:
+            return
+        self._checksum_worker_running = True
+        utils.spawn_n(self._checksum_base_files,
+                      sorted(self.pending_checksums))
+
     def _remove_base_file(self, base_file):
         """Remove a single base file if it is old enough.
 
@@ -440,6 +771,8 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             LOG.info(_LI('Removing base file: %s'), base_file)
             try:
                 os.remove(base_file)
+                if self.index is not None:
+                    self.index.remove(base_file)
                 signature = get_info_filename(base_file)
                 if os.path.exists(signature):
                     os.remove(signature)
@@ -589,6 +922,7 @@ class ImageCacheManager(imagecache.ImageCacheManager):
             return
         # reset the local statistics
         self._reset_state()
+        self._full_scan = self._full_scan_due()
         # read the cached images
         self._list_base_images(base_dir)
         # read running instances data
@@ -598,3 +932,6 @@ class ImageCacheManager(imagecache.ImageCacheManager):
         self.instance_names = running['instance_names']
         # perform the aging and image verification
         self._age_and_verify_cached_images(context, all_instances, base_dir)
+        # checksum new and stale base images in the background
+        if self.index is not None:
+            self._start_checksum_worker()
@@ -124,13 +124,20 @@ class BaseWeightHandler(loadables.BaseLoader):
     def get_weighed_objects(self, weigher_classes, obj_list,
             weighing_properties):
         """Return a sorted (descending), normalized list of WeighedObjects."""
+        weighers = [weigher_cls() for weigher_cls in weigher_classes]
+        return self.weigh_objects(weighers, obj_list, weighing_properties)
 
+    def weigh_objects(self, weighers, obj_list, weighing_properties):
+        """Same as get_weighed_objects(), using the given weigher instances.
+
+        Afterwards the minval and maxval of each weigher cover the weights
+        of obj_list, which weigh_object() relies on.
+        """
         if not obj_list:
             return []
 
         weighed_objs = [self.object_class(obj, 0.0) for obj in obj_list]
-        for weigher_cls in weigher_classes:
-            weigher = weigher_cls()
+        for weigher in weighers:
             weights = weigher.weigh_objects(weighed_objs, weighing_properties)
 
             # Normalize the weights
@@ -143,3 +150,18 @@ class BaseWeightHandler(loadables.BaseLoader):
                 obj.weight += weigher.weight_multiplier() * weight
 
         return sorted(weighed_objs, key=lambda x: x.weight, reverse=True)
+
+    def weigh_object(self, weighers, obj, weighing_properties):
+        """Return a WeighedObject for a single object.
+
+        The weights are normalized against the bounds the weighers recorded
+        in a previous weigh_objects() call, so the result can be compared
+        with the weights that call returned.
+        """
+        weighed_obj = self.object_class(obj, 0.0)
+        for weigher in weighers:
+            weights = weigher.weigh_objects([weighed_obj], weighing_properties)
+            weight = list(normalize(weights, minval=weigher.minval,
+                                    maxval=weigher.maxval))[0]
+            weighed_obj.weight += weigher.weight_multiplier() * weight
+        return weighed_obj
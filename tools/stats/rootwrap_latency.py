@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compare the per-command latency of running commands as root with
+sudo nova-rootwrap and with the rootwrap daemon.
+
+Needs the sudoers entries for both nova-rootwrap and nova-rootwrap-daemon
+and a command allowed by the rootwrap filters.  Run like:
+
+    ./tools/stats/rootwrap_latency.py --config-file /etc/nova/nova.conf \\
+                                      -n 200 cat /proc/loadavg
+"""
+
+import argparse
+import sys
+import time
+
+from oslo.config import cfg
+
+from nova import utils
+
+CONF = cfg.CONF
+
+
+def _measure(cmd, count):
+    latencies = []
+    for _i in xrange(count):
+        start = time.time()
+        utils.execute(*cmd, run_as_root=True)
+        latencies.append(time.time() - start)
+    return sorted(latencies)
+
+
+def _report(name, latencies):
+    count = len(latencies)
+    print('%-16s mean %8.2f ms  median %8.2f ms  p95 %8.2f ms  max %8.2f ms'
+          % (name,
+             1000 * sum(latencies) / count,
+             1000 * latencies[count // 2],
+             1000 * latencies[min(count - 1, int(count * 0.95))],
+             1000 * latencies[-1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config-file', default='/etc/nova/nova.conf')
+    parser.add_argument('-n', '--count', type=int, default=100,
+                        help='Number of times each command is run')
+    parser.add_argument('cmd', nargs='+', help='Command to run as root')
+    args = parser.parse_args()
+
+    CONF([], project='nova', default_config_files=[args.config_file])
+
+    CONF.set_override('use_rootwrap_daemon', False)
+    _report('sudo rootwrap', _measure(args.cmd, args.count))
+
+    CONF.set_override('use_rootwrap_daemon', True)
+    # The first command starts the daemon; keep it out of the numbers.
+    utils.execute(*args.cmd, run_as_root=True)
+    _report('rootwrap daemon', _measure(args.cmd, args.count))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# Copyright 2014 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Measure the latency and the number of SQL statements of the servers index
+and detail views against the number of instances of a project.
+
+The instances are loaded and rendered the way the servers controller does,
+with the attributes the views need joined in and the faults filled in one
+query.  The lazy rows load the instances without any of them, as if every
+server of the list loaded its own.  Run like:
+
+    ./tools/stats/servers_list_latency.py \\
+        --connection sqlite:////tmp/servers_list.sqlite -c 10,100,1000
+"""
+
+import argparse
+import sys
+import time
+
+from oslo.config import cfg
+import sqlalchemy
+
+from nova.api.openstack.compute.views import servers as views_servers
+from nova.api.openstack import wsgi
+from nova.compute import flavors
+from nova.compute import vm_states
+from nova import config
+from nova import context
+from nova import db
+from nova.db import migration
+from nova.db.sqlalchemy import api as sqlalchemy_api
+from nova.network import model as network_model
+from nova import objects
+from nova.openstack.common import jsonutils
+
+CONF = cfg.CONF
+
+PROJECT_ID = 'servers-list'
+
+
+class StatementCounter(object):
+    def __init__(self, engine):
+        self.count = 0
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+
+def _network_info(i):
+    subnet = network_model.Subnet(
+        cidr='10.0.0.0/16',
+        ips=[network_model.FixedIP(address='10.0.%d.%d' % (i // 250,
+                                                           i % 250 + 2))])
+    network = network_model.Network(id='net', label='private',
+                                    subnets=[subnet])
+    return network_model.NetworkInfo([
+        network_model.VIF(id='vif-%d' % i, address='aa:bb:cc:00:00:01',
+                          network=network)])
+
+
+def _create_instances(ctxt, count):
+    """Grow the project to count instances; one in ten is in error."""
+    existing = len(db.instance_get_all_by_filters(
+        ctxt, {'project_id': PROJECT_ID, 'deleted': False},
+        columns_to_join=[]))
+    all_flavors = flavors.get_all_flavors_sorted_list(ctxt)
+    for i in xrange(existing, count):
+        flavor = all_flavors[i % len(all_flavors)]
+        vm_state = vm_states.ERROR if i % 10 == 0 else vm_states.ACTIVE
+        instance = db.instance_create(ctxt, {
+            'project_id': PROJECT_ID,
+            'user_id': 'user',
+            'display_name': 'server-%d' % i,
+            'host': 'host-%d' % (i % 20),
+            'image_ref': 'image',
+            'instance_type_id': flavor['id'],
+            'vm_state': vm_state,
+            'metadata': {'index': str(i)},
+            'system_metadata': flavors.save_flavor_info({}, flavor)})
+        db.instance_info_cache_update(ctxt, instance['uuid'], {
+            'network_info': jsonutils.dumps(_network_info(i))})
+        if vm_state == vm_states.ERROR:
+            db.instance_fault_create(ctxt, {
+                'instance_uuid': instance['uuid'],
+                'code': 500,
+                'message': 'Failed to spawn',
+                'details': '',
+                'host': instance['host']})
+
+
+def _list(ctxt, detail, preload):
+    view_builder = views_servers.ViewBuilder()
+    req = wsgi.Request.blank('/%s/servers%s' %
+                             (PROJECT_ID, '/detail' if detail else ''),
+                             base_url='http://localhost/v2')
+    req.environ['nova.context'] = ctxt
+    if not preload:
+        expected_attrs = []
+    elif detail:
+        expected_attrs = view_builder.detail_expected_attrs
+    else:
+        expected_attrs = view_builder.index_expected_attrs
+
+    instances = objects.InstanceList.get_by_filters(
+        ctxt, {'project_id': PROJECT_ID, 'deleted': False},
+        sort_key='created_at', sort_dir='desc',
+        expected_attrs=expected_attrs)
+    if detail:
+        if preload:
+            instances.fill_faults()
+        return view_builder.detail(req, instances)
+    return view_builder.index(req, instances)
+
+
+def _measure(ctxt, counter, detail, preload, repeat):
+    latencies = []
+    statements = 0
+    for _i in xrange(repeat):
+        counter.count = 0
+        start = time.time()
+        _list(ctxt, detail, preload)
+        latencies.append(time.time() - start)
+        statements = counter.count
+    latencies.sort()
+    return latencies[len(latencies) // 2], statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--connection',
+                        default='sqlite:////tmp/servers_list.sqlite',
+                        help='SQLAlchemy URL of the benchmark database')
+    parser.add_argument('--no-sync', action='store_true',
+                        help='Do not create the database schema')
+    parser.add_argument('-c', '--counts', default='10,100,1000',
+                        help='Comma separated numbers of instances')
+    parser.add_argument('-r', '--repeat', type=int, default=5,
+                        help='Number of times each list is made; the '
+                             'median latency is reported')
+    args = parser.parse_args()
+
+    objects.register_all()
+    config.parse_args(sys.argv[:1], default_config_files=[])
+    CONF.set_override('connection', args.connection, group='database')
+    CONF.set_override('osapi_max_limit', sys.maxint)
+    if not args.no_sync:
+        migration.db_sync()
+
+    ctxt = context.RequestContext('user', PROJECT_ID, is_admin=False)
+    counter = StatementCounter(sqlalchemy_api.get_engine())
+    print('%9s  %-12s %12s %12s' % ('instances', 'view', 'median ms',
+                                    'statements'))
+    for count in sorted(int(c) for c in args.counts.split(',')):
+        _create_instances(context.get_admin_context(), count)
+        for name, detail, preload in (('index', False, True),
+                                      ('detail', True, True),
+                                      ('detail lazy', True, False)):
+            latency, statements = _measure(ctxt, counter, detail, preload,
+                                           args.repeat)
+            print('%9d  %-12s %12.1f %12d' % (count, name, 1000 * latency,
+                                              statements))
+
+
+if __name__ == '__main__':
+    sys.exit(main())